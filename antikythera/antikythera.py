@@ -13,13 +13,18 @@ import multiprocessing as mp
 
 from time import sleep
 from multiprocessing import Process, Queue
-from sqlitedict import SqliteDict
 
-import antikythera.pysharkpatch
-
-from antikythera.capture import Capture
+from antikythera.gsmtap import GSMTAP_PORT, FRAME_SIZE
+from antikythera.ring import RingBuffer
+from antikythera.backpressure import POLICIES
+from antikythera.capture import (Capture, DEFAULT_BATCH_SIZE,
+                                 DEFAULT_BATCH_DELAY, DEFAULT_SPEED)
 from antikythera.decoder import Decoder
-from antikythera.metrics import Metrics
+from antikythera.writer import Writer, WRITER_QUEUE_SIZE
+from antikythera.packets.sysinfo import DEFAULT_CACHE_SIZE
+from antikythera.storage import FLUSH_INTERVAL, connect
+from antikythera.retention import RAW_RETENTION, ROW_RETENTION
+from antikythera.metrics import Metrics, metrics_filter, METRICS_QUEUE_SIZE
 
 _logger = logging.getLogger(__name__)
 
@@ -27,24 +32,77 @@ __author__= "Finding Ray"
 __copyright__ = "Finding Ray"
 __license__ = "GNU GPLv3+"
 
+DEFAULT_DATABASE = os.path.join(
+    appdirs.user_data_dir("antikythera", __author__), "antikythera.db")
+
+STATS_INTERVAL = 10
+
 
 class Anti(Process):
     """ Start and monitor the worker processes.
 
     """
     def __init__(self, num_processes, headless, interface=None,
-                 capturefile=None, max_qsize=100000, *args, **kwargs):
+                 capturefile=None, max_qsize=100000, udp=None,
+                 batch_size=DEFAULT_BATCH_SIZE,
+                 batch_delay=DEFAULT_BATCH_DELAY,
+                 transport="queue", speed=DEFAULT_SPEED, jobs=1, arfcns=None,
+                 filter_frames=True, overflow=None, sharding=True,
+                 si_cache=DEFAULT_CACHE_SIZE, database=DEFAULT_DATABASE,
+                 flush_interval=FLUSH_INTERVAL, events=None,
+                 raw_retention=RAW_RETENTION, retention=ROW_RETENTION,
+                 max_disk=None, *args, **kwargs):
         """
 
         """
         super(Anti, self).__init__(*args, **kwargs)
         self.MAX_QUEUE_SIZE = max_qsize
-        self.pkt_queue = Queue(self.MAX_QUEUE_SIZE)
+        self.transport = transport
+        self.sharding = sharding
+        self.si_cache = si_cache
+        self.database = database
+        self.flush_interval = flush_interval
+        self.events = events
+        self.raw_retention = raw_retention
+        self.retention = retention
+        self.max_disk = max_disk
+        # Decoders send their batches to the one writer process
+        self.store_queue = Queue(WRITER_QUEUE_SIZE)
+        self.writer = None
+        # And to the metrics
+        self.metrics_queue = Queue(METRICS_QUEUE_SIZE)
+        self.metrics = None
+        # With sharding every decoder has its own queue for its cells
+        shards = max(1, num_processes) if sharding else 1
+        size = max(1, -(-self.MAX_QUEUE_SIZE // shards))
+        # A message holds a whole batch, size the queues for max_qsize packets
+        slots = -(-size // batch_size)
+        if transport == "shm":
+            self.pkt_queues = [RingBuffer(slots, batch_size * FRAME_SIZE)
+                               for _ in range(shards)]
+        else:
+            self.pkt_queues = [Queue(slots) for _ in range(shards)]
+        # Frames each sharded decoder has decoded, the capture only moves
+        # a cell to another queue once its old one has drained
+        self.decoded = None
+        if sharding:
+            self.decoded = [mp.Value("Q", 0) for _ in range(shards)]
         self.error_queue = Queue()
         self.NUMBER_OF_PROCESSES = num_processes
         self.workers = []
         self.interface = interface
         self.capturefile = capturefile
+        self.udp = udp
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.speed = speed
+        self.jobs = jobs
+        self.arfcns = arfcns
+        self.overflow = overflow
+        # Only queue the frames the metrics need
+        self.frame_filter = None
+        if filter_frames:
+            self.frame_filter = metrics_filter(arfcns=arfcns)
         self.headless = headless
         self.exit = mp.Event()
         #_logger.info(self)
@@ -52,13 +110,29 @@ class Anti(Process):
     def __str__(self):
         s = ("Initial Process Manager State:\n" +
              "[*] Headless: {}\n".format(self.headless) +
-             "[*] Queue: {}\n".format(self.queue) +
-             "[*] Queue Size: {}\n".format(self.queue.qsize()) +
+             "[*] Transport: {}\n".format(self.transport) +
+             "[*] Queues: {}\n".format(self.pkt_queues) +
+             "[*] Queue Sizes: {}\n".format(
+                 [q.qsize() for q in self.pkt_queues]) +
+             "[*] Sharding: {}\n".format(self.sharding) +
+             "[*] System Information Cache: {}\n".format(self.si_cache) +
+             "[*] Database: {}\n".format(self.database) +
+             "[*] Flush Interval: {}\n".format(self.flush_interval) +
+             "[*] Event Store: {}\n".format(self.events) +
+             "[*] Retention: raw {}s rows {}s disk {}\n".format(
+                 self.raw_retention, self.retention, self.max_disk) +
              "[*] Max Queue Size: {}\n".format(self.MAX_QUEUE_SIZE) +
+             "[*] Batch Size: {}\n".format(self.batch_size) +
+             "[*] Batch Delay: {}\n".format(self.batch_delay) +
              "[*] Number of Processes to Create: {}\n".format(self.NUMBER_OF_PROCESSES) +
              "[*] Number of Processes Created: {}\n".format(len(self.workers)) +
              "[*] Network Interface: {}\n".format(self.interface) +
-             "[*] Capture File: {}".format(self.capturefile)
+             "[*] Capture File: {}\n".format(self.capturefile) +
+             "[*] Replay Speed: {}\n".format(self.speed) +
+             "[*] Capture Jobs: {}\n".format(self.jobs) +
+             "[*] Frame Filter: {}\n".format(self.frame_filter) +
+             "[*] Overflow Policy: {}\n".format(self.overflow) +
+             "[*] UDP Address: {}".format(self.udp)
             )
         return s
 
@@ -73,26 +147,70 @@ class Anti(Process):
         except NotImplementedError as e:
             _logger.info("Anti: could not get number of available CPUs")
 
+        if self.database is not None:
+            self.create_db()
+        if self.database is not None or self.events is not None:
+            _logger.info("Anti: Creating writer process writer")
+            self.writer = Writer("writer", self.store_queue, self.database,
+                                 flush_interval=self.flush_interval,
+                                 events=self.events,
+                                 raw_retention=self.raw_retention,
+                                 retention=self.retention,
+                                 max_bytes=self.max_disk, name="writer",
+                                 daemon=True)
+            self.workers.append(self.writer)
+
         for i in range(self.NUMBER_OF_PROCESSES):
             name = "decoder-" + str(i)
             _logger.info("Anti: Creating decoder process {}".format(name))
-            decoder_worker = Decoder(name, self.pkt_queue, name=name, daemon=True)
+            q = self.pkt_queues[i % len(self.pkt_queues)]
+            store_q = self.store_queue if self.writer is not None else None
+            decoded = None
+            if self.decoded is not None:
+                decoded = self.decoded[i % len(self.decoded)]
+            decoder_worker = Decoder(name, q, si_cache=self.si_cache,
+                                     store_q=store_q,
+                                     metrics_q=self.metrics_queue,
+                                     decoded=decoded,
+                                     name=name, daemon=True)
             self.workers.append(decoder_worker)
 
         _logger.info("Anti: Creating capture process capture")
-        if self.interface != None:
-            _logger.debug("Anti: Creating capture process with network interface")
-            capture_worker = Capture("capture", self.pkt_queue, interface=self.interface, name="capture", daemon=True)
-        elif self.capturefile != None:
+        options = {"batch_size": self.batch_size,
+                   "batch_delay": self.batch_delay,
+                   "frame_filter": self.frame_filter,
+                   "overflow": self.overflow,
+                   "decoded": self.decoded}
+        if self.udp is not None:
+            _logger.debug("Anti: Creating capture process with UDP listener")
+            capture_worker = Capture("capture", self.pkt_queues,
+                                     udp=self.udp, name="capture",
+                                     daemon=True, **options)
+        elif self.interface is not None:
+            _logger.debug(
+                "Anti: Creating capture process with network interface")
+            capture_worker = Capture("capture", self.pkt_queues,
+                                     interface=self.interface, name="capture",
+                                     daemon=True, **options)
+        elif self.capturefile is not None:
             _logger.debug("Anti: Creating capture process with capture file")
-            capture_worker = Capture("capture", self.pkt_queue, capturefile=self.capturefile, name="capture", daemon=True)
+            # Daemonic processes cannot start the pool that parses in parallel
+            capture_worker = Capture("capture", self.pkt_queues,
+                                     capturefile=self.capturefile,
+                                     speed=self.speed, jobs=self.jobs,
+                                     name="capture", daemon=self.jobs <= 1,
+                                     **options)
         else:
             _logger.critical("Anti: no capture method supplied aborting!")
 
         self.workers.append(capture_worker)
 
-        metrics_worker = Metrics("metrics", name="metrics", daemon=True)
-        self.workers.append(metrics_worker)
+        # Replayed frames were captured long ago, their latency starts at
+        # the decoders
+        live = self.udp is not None or self.interface is not None
+        self.metrics = Metrics("metrics", self.metrics_queue, live=live,
+                               name="metrics", daemon=True)
+        self.workers.append(self.metrics)
 
         for worker in self.workers:
             _logger.info("Anti: Starting process {}".format(worker))
@@ -128,8 +246,12 @@ class Anti(Process):
 
         """
         _logger.info("Anti: waiting for shutdown")
+        ticks = 0
         while not self.exit.is_set():
             sleep(1)
+            ticks += 1
+            if ticks % STATS_INTERVAL == 0:
+                self.log_queue_stats()
         
         _logger.info("Anti: shutting down child processes")
         _logger.debug("Anti: Active children {}".format(mp.active_children()))
@@ -139,7 +261,12 @@ class Anti(Process):
                 self.exit_process(p)
 
         for p in mp.active_children():
-            if p.name == "decoder-0":
+            if p.name.startswith("decoder-"):
+                self.exit_process(p)
+
+        # After the decoders so it stores what they sent last
+        for p in mp.active_children():
+            if p.name == "writer":
                 self.exit_process(p)
 
         for p in mp.active_children():
@@ -152,14 +279,60 @@ class Anti(Process):
             _logger.critical("Anti: waiting forever on process {} pid {}".format(p.process_id, p.pid))
             p.join()
 
+        self.log_queue_stats()
+        if self.transport == "shm":
+            for q in self.pkt_queues:
+                q.unlink()
+
         _logger.info("Anti: Exiting")
 
 
-    def create_db():
+    def log_queue_stats(self):
+        """ Log how full the packet transport is.
+
+        """
+        for i, q in enumerate(self.pkt_queues):
+            if hasattr(q, "stats"):
+                _logger.info("Anti: packet ring {} {}".format(i, q.stats()))
+            else:
+                try:
+                    _logger.info("Anti: packet queue {} size {}".format(
+                        i, q.qsize()))
+                except NotImplementedError:
+                    pass
+        if self.writer is not None:
+            _logger.info("Anti: writer {}".format(self.writer.stats()))
+        if self.metrics is not None:
+            _logger.info("Anti: metrics {}".format(self.metrics.stats()))
+
+
+    def create_db(self):
         """ Create the database if needed.
 
+        The tables and indexes are made before the decoders start so
+        they do not race to create them, see
+        :py:data:`antikythera.storage.SCHEMA`.
+
         """
-        pass
+        _logger.info("Anti: using database {}".format(self.database))
+        connect(self.database).close()
+
+
+def retention_options(args):
+    """ The retention policy of the command line in seconds and bytes.
+
+    Args:
+        args (:obj:`argparse.Namespace`): see :func:`create_parser`.
+
+    Returns:
+        dict: the ``raw_retention``, ``retention``, and ``max_disk``
+        arguments of :obj:`Anti`, ``None`` where there is no limit.
+
+    """
+    return {"raw_retention": (args.raw_retention * 3600
+                              if args.raw_retention else None),
+            "retention": args.retention * 86400 if args.retention else None,
+            "max_disk": args.max_disk * 1024 * 1024 if args.max_disk else None}
 
 
 def create_parser():
@@ -187,6 +360,14 @@ def create_parser():
         dest="threads",
         help="Number of threads to use.",
         action='store'),
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=1,
+        dest="jobs",
+        help="Number of processes parsing a capture file in parallel.",
+        action='store'),
     parser.add_argument(
         '-q',
         '--qsize',
@@ -196,6 +377,123 @@ def create_parser():
         dest="qsize",
         help="The maximum queue size for packets waiting to be processed.",
         action='store'),
+    parser.add_argument(
+        '--batch-size',
+        type=int,
+        default=DEFAULT_BATCH_SIZE,
+        dest="batch_size",
+        help="The most packets sent to a decoder in one batch.",
+        action='store'),
+    parser.add_argument(
+        '--batch-delay',
+        type=float,
+        default=DEFAULT_BATCH_DELAY,
+        dest="batch_delay",
+        help="The longest a packet waits for its batch to fill in seconds.",
+        action='store'),
+    parser.add_argument(
+        '-s',
+        '--speed',
+        type=float,
+        default=DEFAULT_SPEED,
+        dest="speed",
+        help="Capture file replay speed, 1 is real time, 10 is ten times "
+             "faster, 0 is as fast as possible.",
+        action='store'),
+    parser.add_argument(
+        '--transport',
+        choices=["queue", "shm"],
+        default="queue",
+        dest="transport",
+        help="How packets reach the decoders, a multiprocessing queue or a "
+             "shared memory ring.",
+        action='store'),
+    parser.add_argument(
+        '-a',
+        '--arfcn',
+        nargs='+',
+        type=int,
+        default=None,
+        dest="arfcns",
+        help="Only keep frames on these ARFCNs.",
+        action='store'),
+    parser.add_argument(
+        '--no-filter',
+        default=True,
+        dest="filter_frames",
+        help="Queue every frame instead of only those the metrics need.",
+        action='store_false'),
+    parser.add_argument(
+        '--overflow',
+        choices=POLICIES,
+        default=None,
+        dest="overflow",
+        help="What to do when the packet queue is full, by default capture "
+             "files block and live captures shed by priority.",
+        action='store'),
+    parser.add_argument(
+        '--no-sharding',
+        default=True,
+        dest="sharding",
+        help="Decoders share one queue instead of each owning the cells "
+             "routed to it.",
+        action='store_false'),
+    parser.add_argument(
+        '--si-cache',
+        type=int,
+        default=DEFAULT_CACHE_SIZE,
+        dest="si_cache",
+        help="Cells times System Information types each decoder remembers "
+             "to skip repeated broadcasts, 0 decodes every repeat.",
+        action='store'),
+    parser.add_argument(
+        '-d',
+        '--database',
+        type=str,
+        default=DEFAULT_DATABASE,
+        dest="database",
+        help="The SQLite database the decoded messages are stored in "
+             "(default {}).".format(DEFAULT_DATABASE),
+        action='store'),
+    parser.add_argument(
+        '--flush-interval',
+        type=float,
+        default=FLUSH_INTERVAL,
+        dest="flush_interval",
+        help="The longest decoded messages wait before they are written to "
+             "the database in seconds.",
+        action='store'),
+    parser.add_argument(
+        '--events',
+        type=str,
+        default=None,
+        dest="events",
+        help="Also keep the decoded events in a columnar event store in "
+             "this directory.",
+        action='store'),
+    parser.add_argument(
+        '--raw-retention',
+        type=float,
+        default=RAW_RETENTION / 3600,
+        dest="raw_retention",
+        help="Hours raw messages are kept, 0 keeps them.",
+        action='store'),
+    parser.add_argument(
+        '--retention',
+        type=float,
+        default=ROW_RETENTION / 86400,
+        dest="retention",
+        help="Days decoded messages are kept before only their per cell per "
+             "minute counts are, 0 keeps them.",
+        action='store'),
+    parser.add_argument(
+        '--max-disk',
+        type=int,
+        default=None,
+        dest="max_disk",
+        help="Megabytes the database and event store may use, the oldest "
+             "data is deleted first.",
+        action='store'),
     parser.add_argument(
         '--headless',
         default=False,
@@ -230,7 +528,9 @@ def create_parser():
         type=str,
         default=None,
         dest="pcap",
-        help="Path to a capture file to use as input.",
+        help="Capture file (.pcap, .pcapng, or raw DIAG .bin), directory, "
+             "or quoted glob to use as input, several files are replayed in "
+             "capture time order.",
         action='store'),
     source.add_argument(
         '-i',
@@ -240,10 +540,17 @@ def create_parser():
         default=None,
         dest="interface",
         help="The identifier of the network interface to use.",
+        action='store'),
+    source.add_argument(
+        '-u',
+        '--udp',
+        nargs='?',
+        type=str,
+        default=None,
+        const="{}".format(GSMTAP_PORT),
+        dest="udp",
+        help="Listen for GSMTAP on a UDP [host:]port (default {}).".format(
+            GSMTAP_PORT),
         action='store')
 
     return parser
-
-
-if __name__ == '__main__':
-    a = anti(0)
@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" backpressure.py
+
+What the capture does with a batch when the packet queue is full.
+
+``block``
+    Wait for the decoders to make room, nothing is lost. This suits
+    capture files where the capture can simply slow down.
+``drop-newest``
+    Throw away the batch that did not fit.
+``drop-oldest``
+    Throw away the oldest batch in the queue to make room.
+``priority``
+    Shed the frames the metrics can best do without first. Repeated
+    System Information goes before everything else, Paging and Immediate
+    Assignment frames are shed last. Nothing waits for room, so a live
+    capture keeps running under bursty load at the cost of redundant
+    information. Frames are only classified once the queue is full, a
+    System Information message is a repeat if it was seen while shedding
+    before.
+
+Dropped frames are counted per class, see :func:`frame_class`.
+
+"""
+import logging
+
+from queue import Full, Empty
+from collections import Counter
+
+from antikythera.gsmtap import pack_frames, unpack_frames
+from antikythera.l3 import (l3_header, PD_RR, RR_SYSTEM_INFORMATION,
+                            RR_PAGING_REQUESTS, RR_IMMEDIATE_ASSIGNMENTS)
+
+_logger = logging.getLogger(__name__)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+POLICY_BLOCK = "block"
+POLICY_DROP_NEWEST = "drop-newest"
+POLICY_DROP_OLDEST = "drop-oldest"
+POLICY_PRIORITY = "priority"
+POLICIES = (POLICY_BLOCK, POLICY_DROP_NEWEST, POLICY_DROP_OLDEST,
+            POLICY_PRIORITY)
+
+# Frame classes
+PAGING = "paging"
+ASSIGNMENT = "assignment"
+SYSTEM_INFORMATION = "system_information"
+REPEATED_SYSTEM_INFORMATION = "repeated_system_information"
+OTHER = "other"
+
+# Lower is shed first, classes at PROTECTED are only dropped when there
+# is nothing else left to shed
+PRIORITIES = {
+    REPEATED_SYSTEM_INFORMATION: 0,
+    OTHER: 1,
+    SYSTEM_INFORMATION: 2,
+    ASSIGNMENT: 3,
+    PAGING: 3,
+}
+PROTECTED = 3
+
+# Seconds between checks for exit while blocked on a full queue
+BLOCK_POLL = 0.5
+
+
+def frame_class(frame):
+    """ The load shedding class of a frame, without repeat detection.
+
+    Returns:
+        str: :py:data:`PAGING`, :py:data:`ASSIGNMENT`,
+        :py:data:`SYSTEM_INFORMATION`, or :py:data:`OTHER`.
+
+    """
+    header = l3_header(frame.channel, frame.payload)
+    if header is None or header[0] != PD_RR:
+        return OTHER
+    message_type = header[1]
+    if message_type in RR_PAGING_REQUESTS:
+        return PAGING
+    if message_type in RR_IMMEDIATE_ASSIGNMENTS:
+        return ASSIGNMENT
+    if message_type in RR_SYSTEM_INFORMATION:
+        return SYSTEM_INFORMATION
+    return OTHER
+
+
+def _pack(frames):
+    """ A batch as one block of records, see
+    :func:`antikythera.gsmtap.pack_frames`, record arrays are packed
+    already.
+
+    """
+    tobytes = getattr(frames, "tobytes", None)
+    if tobytes is not None:
+        return tobytes()
+    return pack_frames(frames)
+
+
+def _frames(frames):
+    """ A batch as a list of :obj:`antikythera.gsmtap.Frame`.
+
+    """
+    if hasattr(frames, "tobytes"):
+        return list(unpack_frames(frames.tobytes()))
+    return frames
+
+
+class Backpressure(object):
+    """ Put batches of frames on a queue following an overflow policy.
+
+    Args:
+        q: the packet queue, a :obj:`multiprocessing.Queue` or
+            :obj:`antikythera.ring.RingBuffer`.
+        policy (str): one of :py:data:`POLICIES`.
+        exit (:obj:`multiprocessing.Event`): stops the ``block`` policy
+            waiting when set.
+
+    Attributes:
+        dropped (:obj:`collections.Counter`): frames dropped per class.
+        queued (int): frames put on the queue.
+        evicted (int): frames of those taken back off the queue by the
+            drop-oldest policy.
+
+    """
+    def __init__(self, q, policy=POLICY_BLOCK, exit=None):
+        if policy not in POLICIES:
+            raise ValueError("unknown overflow policy {}".format(policy))
+        self.q = q
+        self.policy = policy
+        self.exit = exit
+        self.dropped = Counter()
+        self.queued = 0
+        self.evicted = 0
+        # Last System Information payload per (ARFCN, channel, type)
+        self.system_information = {}
+        self._put = "_put_" + policy.replace("-", "_")
+
+    def put(self, frames):
+        """ Queue a batch of frames or drop some of them.
+
+        Args:
+            frames: the batch, a list of :obj:`antikythera.gsmtap.Frame`
+                or an array of
+                :py:data:`antikythera.packets.batch.FRAME_DTYPE`.
+
+        """
+        getattr(self, self._put)(frames)
+
+    def classify(self, frame):
+        """ The class of a frame, telling repeated System Information apart.
+
+        The payload of each System Information type is remembered per
+        ARFCN, a frame identical to the last one is a repeat.
+
+        """
+        cls = frame_class(frame)
+        if cls == SYSTEM_INFORMATION:
+            message_type = l3_header(frame.channel, frame.payload)[1]
+            key = (frame.arfcn, frame.channel, message_type)
+            payload = bytes(frame.payload)
+            if self.system_information.get(key) == payload:
+                return REPEATED_SYSTEM_INFORMATION
+            self.system_information[key] = payload
+        return cls
+
+    def drop(self, frames, classes=None):
+        """ Count frames as dropped.
+
+        """
+        if classes is None:
+            classes = [frame_class(frame) for frame in _frames(frames)]
+        if not self.dropped:
+            _logger.warning(
+                "Backpressure: queue full, {} policy dropping frames".format(
+                    self.policy))
+        self.dropped.update(classes)
+
+    def stats(self):
+        """ Frames queued and dropped.
+
+        Returns:
+            dict: ``queued`` and ``dropped``, a dict of counts per class.
+
+        """
+        return {"queued": self.queued, "dropped": dict(self.dropped)}
+
+    def _queue(self, frames, block=False, timeout=None):
+        self.q.put(_pack(frames), block=block, timeout=timeout)
+        self.queued += len(frames)
+
+    def _put_block(self, frames):
+        while True:
+            try:
+                self._queue(frames, block=True, timeout=BLOCK_POLL)
+                return
+            except Full:
+                if self.exit is not None and self.exit.is_set():
+                    self.drop(frames)
+                    return
+
+    def _put_drop_newest(self, frames):
+        try:
+            self._queue(frames)
+        except Full:
+            self.drop(frames)
+
+    def _put_drop_oldest(self, frames):
+        while True:
+            try:
+                self._queue(frames)
+                return
+            except Full:
+                pass
+            try:
+                oldest = self.q.get_nowait()
+            except Empty:
+                # The decoders emptied it meanwhile
+                continue
+            dropped = list(unpack_frames(oldest))
+            self.evicted += len(dropped)
+            self.drop(dropped)
+            release = getattr(self.q, "release", None)
+            if release is not None:
+                release()
+
+    def _put_priority(self, frames):
+        try:
+            self._queue(frames)
+            return
+        except Full:
+            pass
+        frames = _frames(frames)
+        classes = [self.classify(frame) for frame in frames]
+        while frames:
+            lowest = min(PRIORITIES[cls] for cls in classes)
+            if lowest >= PROTECTED:
+                # Waiting for room would stall the capture
+                self.drop(frames, classes)
+                return
+            shed = [PRIORITIES[cls] == lowest for cls in classes]
+            self.drop([f for f, s in zip(frames, shed) if s],
+                      [c for c, s in zip(classes, shed) if s])
+            frames = [f for f, s in zip(frames, shed) if not s]
+            classes = [c for c, s in zip(classes, shed) if not s]
+            if not frames:
+                return
+            try:
+                self._queue(frames)
+                return
+            except Full:
+                pass
@@ -5,25 +5,279 @@
 Interface to the radio and Pcap files.
 
 """
+import sys
 import logging
 import multiprocessing as mp
 
+from functools import partial
+
 from random import random
-from time import sleep
-from queue import Full
+from time import sleep, monotonic
 from multiprocessing import Process, Queue
 from queue import Empty
 
+from antikythera.gsmtap import GSMTAP_PORT, GSMTAP_ARFCN_MASK, parse_gsmtap
+from antikythera.pcap import (PcapReader, LINKTYPE_ETHERNET, extract_gsmtap,
+                              read_parallel)
+from antikythera.udp import GsmtapListener
+from antikythera.backpressure import (Backpressure, POLICY_BLOCK,
+                                      POLICY_PRIORITY)
+from antikythera.sharding import ShardRouter, REBALANCE_INTERVAL
+from antikythera.sources import (open_capture, expand_captures,
+                                 merge_captures, DEFAULT_MAX_OPEN)
+
 _logger = logging.getLogger(__name__)
 
 try:
-    import pyshark
+    import numpy as np
 except ImportError as e:
     _logger.error("Capture: {}".format(e))
     _logger.info("Capture: Maybe try `pip install -r requirements.txt'")
     sys.exit(1)
 
-DEFAULT_DELAY = 0.2
+DEFAULT_SPEED = 1.0
+DEFAULT_BATCH_SIZE = 64
+DEFAULT_BATCH_DELAY = 0.05
+
+# Seconds a moved cell waits for its old decoder queue to drain
+DRAIN_TIMEOUT = 5.0
+# Seconds between checks whether it has
+DRAIN_POLL = 0.01
+
+
+class Batcher(object):
+    """ Collect frames into lists that are handed on together.
+
+    A batch is flushed when it holds ``size`` frames or when the oldest
+    frame in it has waited ``delay`` seconds, whichever comes first.
+
+    Args:
+        send: called with each full batch (a list of frames).
+        size (int): the most frames in one batch.
+        delay (float): the longest a frame may wait in seconds.
+
+    """
+    def __init__(self, send, size=DEFAULT_BATCH_SIZE,
+                 delay=DEFAULT_BATCH_DELAY):
+        self.send = send
+        self.size = max(1, size)
+        self.delay = delay
+        self.frames = []
+        self.deadline = None
+
+    def __len__(self):
+        return len(self.frames)
+
+    def add(self, frame):
+        if not self.frames:
+            self.deadline = monotonic() + self.delay
+        self.frames.append(frame)
+        if len(self.frames) >= self.size or monotonic() >= self.deadline:
+            self.flush()
+
+    def poll(self):
+        """ Flush the batch if its time limit has passed.
+
+        """
+        if self.frames and monotonic() >= self.deadline:
+            self.flush()
+
+    def timeout(self):
+        """ Seconds until the pending batch is due, ``None`` if empty.
+
+        """
+        if not self.frames:
+            return None
+        return max(0, self.deadline - monotonic())
+
+    def flush(self):
+        if self.frames:
+            frames, self.frames = self.frames, []
+            self.deadline = None
+            self.send(frames)
+
+    def close(self):
+        """ Send the pending batch at the end of the capture.
+
+        """
+        self.flush()
+
+
+class _Move(object):
+    """ A cell moved to another queue, its frames are held until the old
+    queue has drained.
+
+    """
+    __slots__ = ("old", "new", "mark", "deadline", "frames")
+
+    def __init__(self, old, new, mark, deadline):
+        self.old = old
+        self.new = new
+        self.mark = mark
+        self.deadline = deadline
+        self.frames = []
+
+
+class ShardedBatcher(object):
+    """ Keep a :obj:`Batcher` for each decoder queue.
+
+    Frames are batched for the queue the router picks, see
+    :obj:`antikythera.sharding.ShardRouter`. A cell is only moved to
+    another queue once its old decoder has decoded every frame queued
+    for it before the move, so the frames of a cell are always decoded
+    in capture order. When the router moves a cell the frames batched
+    for the old queue are sent, and the cell's newer frames are held
+    until ``progress`` shows the old queue delivered what was queued up
+    to then. A queue that has not drained within ``drain_timeout``
+    seconds, e.g. because its decoder died, gets its cells moved anyway.
+
+    Args:
+        router (:obj:`antikythera.sharding.ShardRouter`): picks the
+            queue of each frame.
+        sends (list): a send function per queue, see :obj:`Batcher`.
+        size (int): the most frames in one batch.
+        delay (float): the longest a frame may wait in seconds.
+        progress: called with a queue number, returns ``(queued,
+            delivered)``, the frames put on the queue and the frames that
+            left it, decoded or dropped. ``None`` never moves cells.
+        drain_timeout (float): the longest seconds a moved cell's frames
+            are held.
+
+    Attributes:
+        pending (dict): ``{arfcn: move}`` of the cells waiting for their
+            old queue to drain.
+
+    """
+    def __init__(self, router, sends, size=DEFAULT_BATCH_SIZE,
+                 delay=DEFAULT_BATCH_DELAY, progress=None,
+                 drain_timeout=DRAIN_TIMEOUT):
+        self.router = router
+        self.batchers = [Batcher(send, size, delay) for send in sends]
+        self.progress = progress
+        self.drain_timeout = drain_timeout
+        self.pending = {}
+
+    def __len__(self):
+        return sum(len(batcher) for batcher in self.batchers) + sum(
+            len(move.frames) for move in self.pending.values())
+
+    def add(self, frame):
+        shard = self.router.shard(frame)
+        if self.pending:
+            move = self.pending.get(frame.arfcn & GSMTAP_ARFCN_MASK)
+            if move is not None:
+                move.frames.append(frame)
+                self.release()
+                return
+            self.release()
+        self.batchers[shard].add(frame)
+        if (self.progress is not None and not self.pending
+                and self.router.due()):
+            self.move(self.router.rebalance())
+
+    def move(self, moved):
+        """ Start moving cells, see
+        :py:meth:`antikythera.sharding.ShardRouter.rebalance`.
+
+        Args:
+            moved (list): ``(arfcn, old queue, new queue)`` of each cell.
+
+        """
+        for old in set(old for _, old, _ in moved):
+            self.batchers[old].flush()
+        deadline = monotonic() + self.drain_timeout
+        for arfcn, old, new in moved:
+            move = self.pending.get(arfcn)
+            if move is not None:
+                # Moved twice in one rebalance, the old queue stays
+                move.new = new
+                continue
+            self.pending[arfcn] = _Move(old, new, self.progress(old)[0],
+                                        deadline)
+
+    def release(self, force=False):
+        """ Send the held frames of the cells whose old queue has drained.
+
+        Args:
+            force (bool): send them whether the old queue drained or not.
+
+        """
+        now = monotonic()
+        for arfcn, move in list(self.pending.items()):
+            if self.progress(move.old)[1] < move.mark:
+                if not force and now < move.deadline:
+                    continue
+                _logger.warning(
+                    "ShardedBatcher: queue {} did not drain, moving ARFCN {} "
+                    "to queue {} anyway".format(move.old, arfcn, move.new))
+            del self.pending[arfcn]
+            for frame in move.frames:
+                self.batchers[move.new].add(frame)
+
+    def poll(self):
+        if self.pending:
+            self.release()
+        for batcher in self.batchers:
+            batcher.poll()
+
+    def timeout(self):
+        timeouts = [t for t in (batcher.timeout()
+                                for batcher in self.batchers)
+                    if t is not None]
+        if self.pending:
+            timeouts.append(DRAIN_POLL)
+        return min(timeouts) if timeouts else None
+
+    def flush(self):
+        if self.pending:
+            self.release()
+        for batcher in self.batchers:
+            batcher.flush()
+
+    def close(self):
+        """ Wait for the moves in progress and send every frame.
+
+        """
+        while self.pending and monotonic() < max(
+                m.deadline for m in self.pending.values()):
+            self.flush()
+            if self.pending:
+                sleep(DRAIN_POLL)
+        self.release(force=True)
+        self.flush()
+
+
+class Pacer(object):
+    """ Schedule replayed frames by their capture timestamps.
+
+    Every frame is due ``(timestamp - first timestamp) / speed`` seconds
+    after the first one was replayed. Each deadline is worked out from the
+    same starting point on the monotonic clock so time spent queueing
+    frames does not add up into drift.
+
+    Args:
+        speed (float): replay rate relative to real time, ``1`` replays
+            in real time, ``10`` ten times faster, and ``0`` or less as
+            fast as possible.
+
+    """
+    def __init__(self, speed=DEFAULT_SPEED):
+        self.speed = speed
+        self.start = None
+        self.first = None
+
+    def delay(self, timestamp):
+        """ Seconds to wait before the frame captured at ``timestamp``.
+
+        """
+        if self.speed <= 0:
+            return 0
+        if self.start is None:
+            self.start = monotonic()
+            self.first = timestamp
+            return 0
+        due = self.start + (timestamp - self.first) / self.speed
+        return max(0, due - monotonic())
 
 
 class Capture(Process):
@@ -32,15 +286,40 @@ class Capture(Process):
     """
 
     def __init__(self, process_id, q, *args, interface=None, capturefile=None,
-                 delay=None, **kwargs):
+                 udp=None, speed=DEFAULT_SPEED, batch_size=DEFAULT_BATCH_SIZE,
+                 batch_delay=DEFAULT_BATCH_DELAY, jobs=1,
+                 max_open=DEFAULT_MAX_OPEN, frame_filter=None, overflow=None,
+                 rebalance=REBALANCE_INTERVAL, decoded=None, **kwargs):
 
         super(Capture, self).__init__(*args, **kwargs)
         self.process_id = process_id
-        self.q = q
+        # One queue per decoder when frames are sharded by cell
+        self.queues = list(q) if isinstance(q, (list, tuple)) else [q]
+        self.q = self.queues[0]
         self.interface = interface
         self.capturefile = capturefile
-        self.delay = delay
+        self.udp = udp
+        self.speed = speed
+        self.jobs = jobs
+        self.max_open = max_open
+        self.frame_filter = frame_filter
+        self.filtered = 0
+        self.batch_size = batch_size
+        self.batch_delay = batch_delay
+        self.batch = None
         self.exit = mp.Event()
+        # Replaying a file can wait for the decoders, a live capture cannot
+        if overflow is None:
+            overflow = (POLICY_BLOCK if capturefile is not None
+                        else POLICY_PRIORITY)
+        self.backpressure = [Backpressure(queue, overflow, exit=self.exit)
+                             for queue in self.queues]
+        self.router = None
+        if len(self.queues) > 1:
+            self.router = ShardRouter(len(self.queues), rebalance)
+        # Frames each decoder has decoded, a moved cell waits for its old
+        # queue to drain, without them cells are not moved
+        self.decoded = decoded
 
 
     def run(self):
@@ -52,19 +331,30 @@ class Capture(Process):
             sleep(2)
 
             _logger.debug("{}: Process started successfully".format(self.process_id))
+            self.batch = self.make_batcher()
             # Todo: use exception, maybe in init
-            if self.interface != None:
+            if self.udp is not None:
+                self.udp_capture()
+            elif self.interface is not None:
                 self.radio_capture()
-            elif self.capturefile != None:
+            elif self.capturefile is not None:
                 self.pcap_capture()
             else:
                 _logger.critical("{}: no capture method supplied aborting!".format(self.process_id))
 
+            if not self.exit.is_set():
+                self.batch.close()
+            if self.frame_filter is not None:
+                _logger.info(
+                    "{}: filtered out {} frames no metric needs".format(
+                        self.process_id, self.filtered))
+            self.log_drops()
 
             if self.exit.is_set():
                 self.flush_queue()
 
-            self.q.close()
+            for q in self.queues:
+                q.close()
                 
         except Exception as e:
             _logger.error("{}: Exception in pid {}\n{}".format(self.process_id, self.pid, e))
@@ -73,41 +363,296 @@ class Capture(Process):
 
 
     def radio_capture(self):
-        """
+        """ Sniff GSMTAP frames off a network interface with tshark.
+
+        Only this source needs pyshark, it is imported here so capture
+        files and UDP work without it.
 
         """
-        capture = pyshark.LiveCapture(interface=self.interface)
+        try:
+            import pyshark
+        except ImportError as e:
+            _logger.error("{}: {}".format(self.process_id, e))
+            _logger.info("{}: Maybe try `pip install -r requirements.txt'"
+                         .format(self.process_id))
+            return
+        capture = pyshark.LiveCapture(
+            interface=self.interface,
+            bpf_filter="udp port {}".format(GSMTAP_PORT),
+            use_json=True, include_raw=True)
         for packet in capture.sniff_continuously():
-            try:
-                self.q.put(packet, timeout=10)
-                _logger.debug("{}: produced packet {} Queue size is now {}".format(self.process_id, packet['gsmtap'].frame_nr, self.q.qsize()))
-            except Full:
-                _logger.warning("{}: cannot write to full Queue".format(self.process_id))
-                sleep(1)
+            gsmtap = extract_gsmtap(LINKTYPE_ETHERNET, packet.get_raw_packet())
+            if gsmtap is None:
+                continue
+            frame = parse_gsmtap(gsmtap, float(packet.sniff_timestamp))
+            if frame is not None:
+                self.add(frame)
+
+
+    def udp_capture(self):
+        """ Receive GSMTAP frames sent to a UDP port by gr-gsm or osmocom.
+
+        The socket is drained in batches so a burst of frames costs one
+        wakeup, the frames are queued without being dissected.
+
+        """
+        with GsmtapListener(self.udp) as listener:
+            while not self.exit.is_set():
+                timeout = self.batch.timeout()
+                if timeout is None:
+                    timeout = 1
+                for frame in listener.drain(timeout=timeout):
+                    self.add(frame)
+                self.batch.poll()
 
 
     def pcap_capture(self):
+        """ Replay the frames from pcap, pcapng, or raw DIAG files.
+
+        ``capturefile`` may be a file, a directory, or a glob pattern,
+        see :func:`antikythera.sources.expand_captures`. The files are
+        read with the reader :func:`antikythera.sources.open_capture`
+        picks so no ``tshark`` process is needed. Frames are paced by
+        their capture timestamps at ``speed`` times real time, see
+        :obj:`Pacer`.
+
+        Several files are merged into one stream in capture time order
+        with at most ``max_open`` of them open at once, see
+        :func:`antikythera.sources.merge_captures`. With more than one
+        job a single pcap file is split into byte ranges that are parsed
+        by a pool of ``jobs`` processes, see
+        :func:`antikythera.pcap.read_parallel`, and the packed records
+        are queued without unpacking them, see :py:meth:`replay_records`.
+
         """
+        paths = expand_captures(self.capturefile)
+        if not paths:
+            _logger.critical("{}: no capture files match {}".format(
+                self.process_id, self.capturefile))
+            return
+
+        _logger.info("{}: replaying {} ({} files) at speed {}".format(
+            self.process_id, self.capturefile, len(paths), self.speed))
+        if len(paths) == 1:
+            with open_capture(paths[0]) as capture:
+                if self.jobs > 1 and isinstance(capture, PcapReader):
+                    blocks = read_parallel(paths[0], self.jobs)
+                    self.replay_records(blocks)
+                    blocks.close()
+                else:
+                    self.replay(capture)
+                # Frames may point into the file, send them before it is closed
+                self.batch.close()
+        else:
+            frames = merge_captures(paths, self.max_open)
+            self.replay(frames)
+            frames.close()
+            self.batch.close()
+
+        _logger.info("{}: Capture Terminated".format(self.process_id))
+
+
+    def replay(self, frames):
+        """ Queue frames paced by their timestamps until exit is set.
 
         """
-        if self.delay == None:
-            _logger.warning("{}: no delay specified setting to default {}".format(self.process_id, DEFAULT_DELAY))
-            self.delay = DEFAULT_DELAY
+        pacer = Pacer(self.speed)
+        accept = self.frame_filter
+        for frame in frames:
+            if self.exit.is_set():
+                _logger.debug("{}: Exit set aborting capture".format(
+                    self.process_id))
+                break
+            if accept is not None and not accept(frame):
+                self.filtered += 1
+                continue
+
+            self.pace(pacer.delay(frame.timestamp))
+            self.batch.add(frame)
 
-        capture = pyshark.FileCapture(self.capturefile)
-        for packet in capture:
+
+    def replay_records(self, blocks):
+        """ Queue frame records paced by their timestamps until exit is set.
+
+        The records stay packed, they are filtered with
+        :py:meth:`antikythera.filters.FrameFilter.select` and sent on in
+        slices of the array. A slice is sent when its last frame is due,
+        it holds at most ``batch_size`` frames per queue and spans at
+        most ``batch_delay`` seconds of replay time, the limits the
+        :obj:`Batcher` keeps for single frames.
+
+        Args:
+            blocks: arrays of
+                :py:data:`antikythera.packets.batch.FRAME_DTYPE` in
+                capture time order, see
+                :func:`antikythera.pcap.read_parallel`.
+
+        """
+        pacer = Pacer(self.speed)
+        size = self.batch_size * len(self.queues)
+        window = self.batch_delay * self.speed if self.speed > 0 else None
+        for records in blocks:
+            if self.frame_filter is not None:
+                keep = self.frame_filter.select(records)
+                self.filtered += len(records) - int(np.count_nonzero(keep))
+                records = records[keep]
+            timestamps = records["timestamp"]
+            start = 0
+            while start < len(records) and not self.exit.is_set():
+                end = min(start + size, len(records))
+                if window is not None:
+                    last = np.searchsorted(timestamps, timestamps[start]
+                                           + window, side="right")
+                    end = max(start + 1, min(end, int(last)))
+                self.pace(pacer.delay(float(timestamps[end - 1])))
+                self.put_records(records[start:end])
+                start = end
             if self.exit.is_set():
-                _logger.debug("{}: Exit set aborting capture".format(self.process_id, packet['gsmtap'].frame_nr, self.q.qsize()))
+                _logger.debug("{}: Exit set aborting capture".format(
+                    self.process_id))
                 break
 
-            try:
-                self.q.put(packet, block=True, timeout=10)
-                _logger.debug("{}: produced packet {} Queue size is now {}".format(self.process_id, packet['gsmtap'].frame_nr, self.q.qsize()))
-                sleep(self.delay) # simulate wait
-            except Full:
-                _logger.warning("{}: cannot write to full Queue".format(self.process_id))
 
-        _logger.info("{}: Capture Terminated".format(self.process_id))
+    def add(self, frame):
+        """ Batch a frame if it passes the frame filter.
+
+        """
+        if self.frame_filter is not None and not self.frame_filter(frame):
+            self.filtered += 1
+            return
+        self.batch.add(frame)
+
+
+    def pace(self, delay):
+        """ Wait before replaying the next frame.
+
+        A pending batch that falls due while waiting is sent first so the
+        pacing does not hold frames back longer than the batch delay.
+
+        """
+        if delay <= 0:
+            return
+        pending = self.batch.timeout()
+        if pending is not None and pending < delay:
+            self.exit.wait(pending)
+            self.batch.flush()
+            delay -= pending
+        self.exit.wait(delay)
+
+
+    def make_batcher(self):
+        """ A :obj:`Batcher`, or a :obj:`ShardedBatcher` if there are
+        several decoder queues.
+
+        """
+        if self.router is None:
+            return Batcher(self.put_batch, self.batch_size, self.batch_delay)
+        sends = [partial(self.put_batch, shard=i)
+                 for i in range(len(self.queues))]
+        progress = self.progress if self.decoded is not None else None
+        return ShardedBatcher(self.router, sends, self.batch_size,
+                              self.batch_delay, progress)
+
+
+    def progress(self, shard):
+        """ Frames put on a decoder queue and frames that left it.
+
+        Returns:
+            tuple: ``(queued, delivered)``, delivered counts the frames
+            decoded and those the overflow policy took back off the queue.
+
+        """
+        backpressure = self.backpressure[shard]
+        delivered = self.decoded[shard].value + backpressure.evicted
+        return backpressure.queued, delivered
+
+
+    def put_batch(self, frames, shard=0):
+        """ Send a batch of frames to the decoders as one queue message.
+
+        The frames are packed into fixed size records so the message is a
+        single ``bytes`` object, see :func:`antikythera.gsmtap.pack_frames`.
+        What happens when the queue is full depends on the overflow
+        policy, see :obj:`antikythera.backpressure.Backpressure`.
+
+        Args:
+            frames: the batch, a list of frames or an array of records
+                that are packed already.
+            shard (int): the decoder queue to put it on.
+
+        """
+        self.backpressure[shard].put(frames)
+        _logger.debug(
+            "{}: produced batch of {} packets for queue {} Queue size is now "
+            "{}".format(self.process_id, len(frames), shard,
+                        self.queues[shard].qsize()))
+
+
+    def put_records(self, records):
+        """ Send frame records to the decoders in batches.
+
+        With several decoder queues the records are split by cell, see
+        :py:meth:`antikythera.sharding.ShardRouter.route`. Records are
+        never held back so when the router moves cells the capture waits
+        for their old queues to drain instead, see :py:meth:`drain`.
+
+        Args:
+            records: an array of
+                :py:data:`antikythera.packets.batch.FRAME_DTYPE`.
+
+        """
+        if self.router is None:
+            for start in range(0, len(records), self.batch_size):
+                self.put_batch(records[start:start + self.batch_size])
+            return
+
+        cells, inverse, counts = np.unique(
+            records["arfcn"] & GSMTAP_ARFCN_MASK, return_inverse=True,
+            return_counts=True)
+        shards = np.array([self.router.route(arfcn, count) for arfcn, count
+                           in zip(cells.tolist(), counts.tolist())])[inverse]
+        for shard in np.unique(shards).tolist():
+            rows = records[shards == shard]
+            for start in range(0, len(rows), self.batch_size):
+                self.put_batch(rows[start:start + self.batch_size], shard)
+        if self.decoded is not None and self.router.due():
+            self.drain(self.router.rebalance())
+
+
+    def drain(self, moved):
+        """ Wait until the old queues of moved cells delivered every frame
+        queued so far, at most ``DRAIN_TIMEOUT`` seconds.
+
+        Args:
+            moved (list): ``(arfcn, old queue, new queue)`` of each cell.
+
+        """
+        marks = {old: self.progress(old)[0] for _, old, _ in moved}
+        deadline = monotonic() + DRAIN_TIMEOUT
+        for old, mark in marks.items():
+            while self.progress(old)[1] < mark and not self.exit.is_set():
+                if monotonic() >= deadline:
+                    _logger.warning(
+                        "{}: queue {} did not drain, moving its cells "
+                        "anyway".format(self.process_id, old))
+                    break
+                sleep(DRAIN_POLL)
+
+
+    def log_drops(self):
+        for shard, backpressure in enumerate(self.backpressure):
+            stats = backpressure.stats()
+            if stats["dropped"]:
+                dropped = ", ".join("{} {}".format(n, cls) for cls, n
+                                    in sorted(stats["dropped"].items()))
+                _logger.warning(
+                    "{}: queue {} {} policy queued {} frames and dropped "
+                    "{}".format(self.process_id, shard, backpressure.policy,
+                                stats["queued"], dropped))
+        if self.router is not None:
+            _logger.info("{}: {} cells on {} queues, {} moved".format(
+                self.process_id, len(self.router.table), len(self.queues),
+                self.router.moves))
 
 
     def shutdown(self):
@@ -117,12 +662,13 @@ class Capture(Process):
 
     def flush_queue(self):
         _logger.debug("{}: Flushing the Queue".format(self.process_id))
-        while True:
-            try:
-                self.q.get_nowait()
-            except Empty:
-                _logger.debug("{}: Queue empty".format(self.process_id))
-                return
+        for q in self.queues:
+            while True:
+                try:
+                    q.get_nowait()
+                except Empty:
+                    _logger.debug("{}: Queue empty".format(self.process_id))
+                    break
 
 
 
@@ -13,7 +13,7 @@ import sys
 import logging
 
 from antikythera import __version__
-from antikythera.antikythera import Anti, create_parser
+from antikythera.antikythera import Anti, create_parser, retention_options
 
 _logger = logging.getLogger(__name__)
 
@@ -51,6 +51,7 @@ def main(args):
     threads = args.threads
     pcap = args.pcap
     interface = args.interface
+    udp = args.udp
     qsize = args.qsize
     headless = args.headless
 
@@ -63,18 +64,41 @@ def main(args):
     # Save input parameters to logfile and set them
     _logger.info("Setting arguments")
     _logger.info("Threads Requested: {}".format(threads))
+    _logger.info("Batch Size: {} Delay: {}".format(
+        args.batch_size, args.batch_delay))
+    _logger.info("Transport: {}".format(args.transport))
+    _logger.info("Overflow Policy: {}".format(args.overflow))
+    _logger.info("Sharding: {}".format(args.sharding))
+    _logger.info("System Information Cache: {}".format(args.si_cache))
+    _logger.info("Database: {} Flush Interval: {}".format(
+        args.database, args.flush_interval))
+    _logger.info("Event Store: {}".format(args.events))
+    _logger.info("Retention: raw {}h rows {}d disk {}MB".format(
+        args.raw_retention, args.retention, args.max_disk))
+    _logger.info("Frame Filter: {} ARFCNs: {}".format(
+        args.filter_frames, args.arfcns))
+    options = {'batch_size': args.batch_size, 'batch_delay': args.batch_delay,
+               'transport': args.transport, 'arfcns': args.arfcns,
+               'filter_frames': args.filter_frames, 'overflow': args.overflow,
+               'sharding': args.sharding, 'si_cache': args.si_cache,
+               'database': args.database,
+               'flush_interval': args.flush_interval,
+               'events': args.events}
+    options.update(retention_options(args))
+    if qsize is not None:
+        options['max_qsize'] = qsize
     if pcap is not None:
         _logger.info("Input Source: {}".format(pcap))
-        if qsize is not None:
-            IMSI_detector = anti(threads, headless, capturefile=pcap, max_qsize=qsize)
-        else:
-            IMSI_detector = anti(threads, headless, capturefile=pcap)
+        options['capturefile'] = pcap
+        options['speed'] = args.speed
+        options['jobs'] = args.jobs
+    elif udp is not None:
+        _logger.info("Input Source: UDP {}".format(udp))
+        options['udp'] = udp
     else:
         _logger.info("Input Source: {}".format(interface))
-        if args.qsize is not None:
-            IMSI_detector = anti(threads, headless, interface=interface, max_qsize=qsize)
-        else:
-            IMSI_detector = anti(threads, headless, interface=interface)
+        options['interface'] = interface
+    IMSI_detector = Anti(threads, headless, **options)
 
     # Start Subprocesses
     _logger.info("Setup complete starting program")
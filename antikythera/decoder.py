@@ -2,36 +2,73 @@
 # -*- coding: utf-8 -*-
 """ decoder.py
 
-Unwrap the pyshark packets and put the needed data into the database.
+Unwrap the GSMTAP frames and put the needed data into the database.
 
 """
+import sys
 import logging
 import multiprocessing as mp
 
 
+from time import time
 from random import random
-from queue import Empty
+from queue import Empty, Full
 from multiprocessing import Process, Queue
 
+from antikythera.gsmtap import frame_count
+from antikythera.l3 import PD_RR, RR_SYSTEM_INFORMATION_3
+from antikythera.packets.factory import PacketFactory
+from antikythera.packets.batch import (PacketBatch, NONE, FRAME_DTYPE,
+                                       frame_headers)
+from antikythera.packets.sysinfo import SystemInfoCache, DEFAULT_CACHE_SIZE
+from antikythera.writer import writer_item
+from antikythera.metrics import metrics_item
+
 _logger = logging.getLogger(__name__)
 
 try:
-    import sqlitedict
+    import numpy as np
 except ImportError as e:
     _logger.error("Decoder: {}".format(e))
     _logger.info("Decoder: Maybe try `pip install -r requirements.txt'")
     sys.exit(1)
 
+# Seconds to wait for a batch before logging that the queue is empty
+IDLE_TIMEOUT = 10
+
+# Seconds between checks for shutdown while the writer or metrics queue is full
+PUT_POLL = 0.5
+
 
 class Decoder(Process):
     """ Decode and store the packets for analysis.
 
+    Args:
+        process_id (str): name used in the logs.
+        q: the queue of packed frame batches.
+        si_cache (int): cells times System Information types remembered
+            to drop repeated broadcasts, ``0`` decodes every repeat, see
+            :obj:`antikythera.packets.sysinfo.SystemInfoCache`.
+        store_q: the queue of the :obj:`antikythera.writer.Writer`
+            storing the decoded messages, ``None`` to not store them.
+        metrics_q: the queue of the :obj:`antikythera.metrics.Metrics`
+            process, ``None`` to not run the metrics.
+        decoded (:obj:`multiprocessing.Value`): a shared count the frames
+            decoded are added to, the capture reads it to know when a
+            cell moved off this decoder's queue may go to its new one,
+            see :obj:`antikythera.capture.ShardedBatcher`.
+
     """
 
-    def __init__(self, process_id, q, *args, **kwargs):
+    def __init__(self, process_id, q, si_cache=DEFAULT_CACHE_SIZE,
+                 store_q=None, metrics_q=None, decoded=None, *args, **kwargs):
         super(Decoder, self).__init__(*args, **kwargs)
         self.process_id = process_id
         self.q = q
+        self.si_cache = SystemInfoCache(si_cache) if si_cache else None
+        self.store_q = store_q
+        self.metrics_q = metrics_q
+        self.decoded = decoded
         self.exit = mp.Event()
 
 
@@ -42,29 +79,110 @@ class Decoder(Process):
         _logger.debug("{}: Process started successfully".format(self.process_id))
         while not self.exit.is_set():
             try:
-                packet = self.q.get(timeout=10)
-                _logger.debug("{}: Consumed packet Queue size is now {}".format(self.process_id, self.q.qsize()))
-                self.decode_packet(packet)
-                self.store_packet(packet)
+                batch = self.q.get(timeout=IDLE_TIMEOUT)
+                received = time()
+                _logger.debug(
+                    "{}: Consumed batch of {} packets Queue size is now "
+                    "{}".format(self.process_id, frame_count(batch),
+                                self.q.qsize()))
+                count = frame_count(batch)
+                self.decode_batch(batch, received)
+                if self.decoded is not None:
+                    with self.decoded.get_lock():
+                        self.decoded.value += count
             except Empty:
                 _logger.info("{}: Queue empty".format(self.process_id))
+        if PacketFactory.unknown:
+            _logger.info("{}: Skipped {} messages of unknown type".format(
+                self.process_id, sum(PacketFactory.unknown.values())))
+        if self.si_cache is not None:
+            _logger.info("{}: System Information {}".format(
+                self.process_id, self.si_cache.stats()))
         _logger.info("{}: Exiting".format(self.process_id))
 
 
-    def decode_packet(self, packet):
-        """ Get only the needed attributes from the packet.
+    def decode_batch(self, batch, received=None):
+        """ Decode and store every packet of a batch from the capture.
+
+        System Information repeating what its cell broadcast before is
+        dropped from the frame records first, see
+        :py:meth:`antikythera.packets.sysinfo.SystemInfoCache.changed_records`,
+        and the rest decoded into columns in one pass, see
+        :obj:`antikythera.packets.batch.PacketBatch`. The messages are
+        sent to the metrics first, then stored.
+
+        Args:
+            batch: packed frame records from
+                :func:`antikythera.gsmtap.pack_frames`.
+            received (float): when the batch was taken off the queue,
+                the metrics measure latency on replays from it, see
+                :func:`antikythera.metrics.metrics_item`.
+
+        Returns:
+            :obj:`antikythera.packets.batch.PacketBatch`: the decoded
+            messages.
+
+        """
+        records = np.frombuffer(batch, dtype=FRAME_DTYPE)
+        cells = None
+        if self.store_q is not None:
+            # Repeats still tell when a cell was last seen, only their
+            # System Information 3 identity is decoded
+            keep, _, pd, message_type = frame_headers(records)
+            si3 = (keep & (pd == PD_RR)
+                   & (message_type == RR_SYSTEM_INFORMATION_3))
+            cells = PacketBatch.from_records(records[si3])
+            cells = cells.select(cells.cell_id != NONE)
+        if self.si_cache is not None:
+            keep = self.si_cache.changed_records(records)
+            if not keep.all():
+                records = records[keep]
+        packets = PacketBatch.from_records(records)
+        if self.metrics_q is not None and len(packets):
+            self.put(self.metrics_q, metrics_item(packets, received))
+        self.store_batch(packets, cells)
+        return packets
+
+
+    def store_batch(self, packets, cells=None):
+        """ Put a batch of decoded messages into the database.
+
+        The batch is sent to the writer process.
+
+        Args:
+            packets (:obj:`antikythera.packets.batch.PacketBatch`): the
+                messages to store.
+            cells (:obj:`antikythera.packets.batch.PacketBatch`): System
+                Information 3 rows to update when cells were last seen.
 
         """
-        _logger.debug("{}: Decoding packet {}".format(self.process_id, packet['gsmtap'].frame_nr))
-        pass
+        _logger.debug("{}: Storing {} messages".format(
+            self.process_id, len(packets)))
+        if self.store_q is not None and (
+                len(packets) or cells is not None and len(cells)):
+            self.put(self.store_q, writer_item(packets, cells))
 
 
-    def store_packet(self, packet):
-        """ Put packet into database.
+    def put(self, q, item):
+        """ Put an item on the writer or metrics queue.
+
+        Waits while the queue is full, but not past a shutdown, the
+        process reading it may have stopped already.
+
+        Returns:
+            bool: ``False`` if the item was dropped.
 
         """
-        _logger.debug("{}: Storing packet {}".format(self.process_id, packet['gsmtap'].frame_nr))
-        pass
+        while True:
+            try:
+                q.put(item, timeout=PUT_POLL)
+                return True
+            except Full:
+                if self.exit.is_set():
+                    _logger.warning(
+                        "{}: Queue full at shutdown, dropped a batch".format(
+                            self.process_id))
+                    return False
 
 
     def shutdown(self):
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" diag.py
+
+Read the raw Qualcomm DIAG dumps (``.bin``) recorded alongside the
+pcap files by SnoopSnitch.
+
+A dump is a stream of HDLC framed DIAG log packets: every packet ends
+with ``0x7e``, ``0x7e`` and ``0x7d`` inside a packet are escaped as
+``0x7d`` followed by the byte XOR ``0x20``, and the last two bytes are a
+CRC. The file is memory mapped and packets without escaped bytes are
+handed out as :obj:`memoryview` slices of the mapping, nothing is copied.
+
+Only the GSM RR signalling log carries layer 3 messages, the RR cell
+information log is followed to know the serving ARFCN.
+
+"""
+import mmap
+import struct
+import logging
+
+from antikythera.gsmtap import (Frame, GSMTAP_TYPE_UM, GSMTAP_CHANNEL_BCCH,
+                                GSMTAP_CHANNEL_CCCH, GSMTAP_CHANNEL_SDCCH,
+                                GSMTAP_CHANNEL_ACCH, GSMTAP_ARFCN_F_UPLINK)
+
+_logger = logging.getLogger(__name__)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+HDLC_FLAG = 0x7e
+HDLC_ESCAPE = 0x7d
+HDLC_ESCAPE_XOR = 0x20
+
+DIAG_LOG_F = 0x10
+
+LOG_GSM_RR_SIGNALING_MESSAGE_C = 0x512f
+LOG_GSM_RR_CELL_INFORMATION_C = 0x5134
+
+# GPS epoch, 1980-01-06, in UNIX time
+GPS_EPOCH = 315964800
+# The upper 48 bits of a DIAG timestamp count 1.25 ms ticks
+DIAG_TICK = 1.25e-3
+
+# command, more, length, log length, log code, timestamp
+DIAG_LOG_HEADER = struct.Struct("<BBHHHQ")
+# channel type, message type, message length
+RR_SIGNALING_HEADER = struct.Struct("<BBB")
+
+RR_DOWNLINK = 0x80
+RR_CHANNELS = {
+    0x00: GSMTAP_CHANNEL_SDCCH,
+    0x01: GSMTAP_CHANNEL_BCCH,
+    0x03: GSMTAP_CHANNEL_CCCH,
+    0x04: GSMTAP_CHANNEL_SDCCH | GSMTAP_CHANNEL_ACCH,
+}
+
+# DCCH messages are logged without their layer 2 headers, they are given
+# a LAPDm UI frame header and on the SACCH an empty layer 1 header so
+# they are laid out the same as the GSMTAP frames.
+LAPDM_ADDRESS = 0x01
+LAPDM_CONTROL_UI = 0x03
+SACCH_L1_HEADER = bytes(2)
+
+
+def lapdm_header(length):
+    """ A LAPDm UI frame header for a layer 3 message of ``length`` bytes.
+
+    """
+    return bytes((LAPDM_ADDRESS, LAPDM_CONTROL_UI, (length << 2) | 0x01))
+
+
+def hdlc_unescape(data):
+    """ Remove the HDLC byte stuffing from a packet.
+
+    Args:
+        data: the escaped packet without the trailing flag.
+
+    Returns:
+        bytes: the packet with escaped bytes restored.
+
+    """
+    parts = bytes(data).split(bytes([HDLC_ESCAPE]))
+    out = bytearray(parts[0])
+    for part in parts[1:]:
+        if part:
+            out.append(part[0] ^ HDLC_ESCAPE_XOR)
+            out += part[1:]
+    return bytes(out)
+
+
+def diag_timestamp(ts):
+    """ Convert a DIAG timestamp to seconds since the UNIX epoch.
+
+    """
+    return GPS_EPOCH + (ts >> 16) * DIAG_TICK
+
+
+class DiagReader(object):
+    """ Read GSM RR frames from a memory mapped DIAG dump.
+
+    Args:
+        path (str): path to the ``.bin`` file.
+
+    Iterating over the reader yields :obj:`antikythera.gsmtap.Frame`
+    records whose payload is a :obj:`memoryview` into the mapped file.
+    The DIAG RR log has no TDMA frame number or signal level, those are
+    zero. Messages on the dedicated channels are copied to add their
+    layer 2 header, see :func:`lapdm_header`.
+
+    """
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.map = None
+        self.view = None
+        self.arfcn = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        for code, timestamp, body in self.logs():
+            if code == LOG_GSM_RR_SIGNALING_MESSAGE_C:
+                frame = self._rr_frame(timestamp, body)
+                if frame is not None:
+                    yield frame
+            elif code == LOG_GSM_RR_CELL_INFORMATION_C and len(body) >= 2:
+                self.arfcn = struct.unpack_from("<H", body)[0] & 0x0fff
+
+    def open(self):
+        if self.map is not None:
+            return
+        self.file = open(self.path, 'rb')
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.view = memoryview(self.map)
+
+    def close(self):
+        if self.map is None:
+            return
+        self.view.release()
+        self.view = None
+        try:
+            self.map.close()
+        except BufferError:
+            # Frames still hold slices, it is unmapped when they are freed
+            _logger.debug("DIAG: {} still referenced by frames".format(
+                self.path))
+        self.map = None
+        self.file.close()
+        self.file = None
+
+    def packets(self):
+        """ Iterate over the unescaped DIAG packets without their CRC.
+
+        Yields:
+            A :obj:`memoryview` of the mapping, or ``bytes`` for the
+            packets that had to be unescaped.
+
+        """
+        self.open()
+        find = self.map.find
+        view = self.view
+        flag = bytes([HDLC_FLAG])
+        escape = bytes([HDLC_ESCAPE])
+        start = 0
+        end = len(self.map)
+        while start < end:
+            stop = find(flag, start)
+            if stop < 0:
+                if start < end:
+                    _logger.debug("DIAG: {} trailing partial packet".format(
+                        self.path))
+                return
+            if stop - start > 2:
+                if find(escape, start, stop) < 0:
+                    yield view[start:stop - 2]
+                else:
+                    yield hdlc_unescape(view[start:stop])[:-2]
+            start = stop + 1
+
+    def logs(self):
+        """ Iterate over the DIAG log packets.
+
+        Yields:
+            tuple: ``(log code, timestamp, body)`` where body is the log
+            payload after the header.
+
+        """
+        size = DIAG_LOG_HEADER.size
+        for packet in self.packets():
+            if len(packet) < size or packet[0] != DIAG_LOG_F:
+                continue
+            _, _, _, length, code, ts = DIAG_LOG_HEADER.unpack_from(packet)
+            yield code, diag_timestamp(ts), packet[size:size + length - 12]
+
+    def _rr_frame(self, timestamp, body):
+        if len(body) < RR_SIGNALING_HEADER.size:
+            return None
+        chan, _msg_type, length = RR_SIGNALING_HEADER.unpack_from(body)
+        channel = RR_CHANNELS.get(chan & ~RR_DOWNLINK)
+        if channel is None:
+            return None
+        arfcn = self.arfcn
+        if not chan & RR_DOWNLINK:
+            arfcn |= GSMTAP_ARFCN_F_UPLINK
+        start = RR_SIGNALING_HEADER.size
+        payload = body[start:start + length]
+        if channel & GSMTAP_CHANNEL_ACCH:
+            payload = SACCH_L1_HEADER + lapdm_header(length) + payload
+        elif channel == GSMTAP_CHANNEL_SDCCH:
+            payload = lapdm_header(length) + payload
+        return Frame(timestamp, arfcn, 0, GSMTAP_TYPE_UM, channel, 0, 0,
+                     payload)
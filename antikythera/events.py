@@ -0,0 +1,556 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" events.py
+
+An append-only columnar store of decoded events for long deployments.
+
+Rows in SQLite carry per row overhead and a range scan over weeks of
+pagings walks a B-tree. The :obj:`EventStore` keeps each kind of event,
+a stream, as fixed width NumPy columns instead:
+
+- Time is cut into partitions of ``partition`` seconds, the events of a
+  stream in one partition are a segment, a directory holding one raw
+  file per column.
+- Segments are only ever appended to, a flush appends the pending rows
+  to the column files of their segments.
+- ``manifest.json`` lists every segment with its time range, the rows
+  committed, and the ARFCNs in it. It is replaced atomically after the
+  column files and their directories are synced to disk, rows past the
+  committed count are from an interrupted flush and are cut off when
+  the store is opened. Should a column file still hold fewer rows than
+  committed, the segment is cut back to the rows every column holds.
+
+A scan only memory maps the column files of the segments overlapping
+the query, so reading a day of events runs at disk speed, and dropping
+old data is deleting whole segments, see :py:meth:`EventStore.drop`.
+
+The streams are listed in :py:data:`STREAMS`.
+
+Example:
+    Count the pagings of each ARFCN in the last day::
+
+        from antikythera.events import EventStore
+
+        store = EventStore("events")
+        for columns in store.scan("pagings", start=time() - 86400):
+            counts += np.bincount(columns["arfcn"], minlength=1024)
+
+"""
+import os
+import sys
+import json
+import shutil
+import logging
+
+from time import monotonic
+
+from antikythera.gsmtap import GSMTAP_ARFCN_MASK
+from antikythera.l3 import (PD_RR, RR_SYSTEM_INFORMATION,
+                            RR_IMMEDIATE_ASSIGNMENT)
+from antikythera.packets.batch import NONE
+from antikythera.packets import rr
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError as e:
+    _logger.error("EventStore: {}".format(e))
+    _logger.info("EventStore: Maybe try `pip install -r requirements.txt'")
+    sys.exit(1)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+# Seconds of events in one segment
+DEFAULT_PARTITION = 3600
+
+FLUSH_ROWS = 10000
+FLUSH_INTERVAL = 1.0
+
+MANIFEST = "manifest.json"
+
+# The columns of each stream, ARFCNs are without the GSMTAP flag bits
+# and missing values are antikythera.packets.batch.NONE
+STREAMS = {
+    "pagings": np.dtype([
+        ("timestamp", "<f8"), ("arfcn", "<u2"), ("message_type", "u1"),
+        ("identity_type", "u1"), ("tmsi", "<u4"), ("imsi", "S15"),
+    ]),
+    "system": np.dtype([
+        ("timestamp", "<f8"), ("arfcn", "<u2"), ("message_type", "u1"),
+        ("lac", "<i4"), ("cid", "<i4"),
+    ]),
+    "assignments": np.dtype([
+        ("timestamp", "<f8"), ("arfcn", "<u2"), ("channel_type", "<i2"),
+        ("time_slot", "<i2"), ("timing_advance", "<i2"), ("ra", "<i2"),
+    ]),
+}
+
+_SYSTEM_INFORMATION = sorted(RR_SYSTEM_INFORMATION)
+
+
+class EventStore(object):
+    """ Time partitioned, append-only column files of decoded events.
+
+    The buffering follows :obj:`antikythera.storage.Storage` so the
+    writer process can feed both.
+
+    Args:
+        directory (str): where the segments and manifest are, created if
+            needed.
+        partition (int): seconds of events in one segment, only used
+            when the store is created.
+        flush_rows (int): pending rows that trigger a flush.
+        flush_interval (float): seconds the oldest pending row waits
+            before a flush.
+
+    Attributes:
+        manifest (dict): ``{stream: {segment: entry}}`` where an entry
+            has the ``start`` and ``end`` time, ``rows``, and sorted
+            ``arfcns`` of the segment.
+        pending (dict): ``{stream: [records]}`` waiting for the next
+            flush.
+        written (int): rows written.
+        flushes (int): flushes done.
+        write_time (float): seconds spent writing.
+
+    """
+    def __init__(self, directory, partition=DEFAULT_PARTITION,
+                 flush_rows=FLUSH_ROWS, flush_interval=FLUSH_INTERVAL):
+        self.directory = directory
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+        self.partition = partition
+        self.manifest = {stream: {} for stream in STREAMS}
+        self._load()
+        self.pending = {stream: [] for stream in STREAMS}
+        self.pending_rows = 0
+        self.oldest = None
+        self.written = 0
+        self.flushes = 0
+        self.write_time = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def _load(self):
+        """ Read the manifest, cut off uncommitted rows, and cut back
+        segments whose column files are short.
+
+        """
+        path = os.path.join(self.directory, MANIFEST)
+        if not os.path.exists(path):
+            return
+        with open(path) as f:
+            saved = json.load(f)
+        self.partition = saved["partition"]
+        short = False
+        for stream, segments in saved["streams"].items():
+            if stream not in STREAMS:
+                _logger.warning("EventStore: unknown stream {} in {}".format(
+                    stream, path))
+                continue
+            self.manifest[stream] = segments
+            for segment, entry in list(segments.items()):
+                rows = self._complete_rows(stream, segment, entry["rows"])
+                if rows < entry["rows"]:
+                    _logger.warning(
+                        "EventStore: {} segment {} holds {} of {} committed "
+                        "rows".format(stream, segment, rows, entry["rows"]))
+                    short = True
+                    if not rows:
+                        del segments[segment]
+                        shutil.rmtree(
+                            os.path.join(self.directory, stream, segment),
+                            ignore_errors=True)
+                        continue
+                    timestamps = np.fromfile(
+                        self._column_path(stream, segment, "timestamp"),
+                        dtype=STREAMS[stream]["timestamp"], count=rows)
+                    entry.update(rows=rows, start=float(timestamps.min()),
+                                 end=float(timestamps.max()))
+                for name in STREAMS[stream].names:
+                    self._truncate(self._column_path(stream, segment, name),
+                                   rows * STREAMS[stream][name].itemsize)
+        if short:
+            self._save()
+
+    def _complete_rows(self, stream, segment, rows):
+        """ The committed rows every column file of a segment holds.
+
+        """
+        for name in STREAMS[stream].names:
+            path = self._column_path(stream, segment, name)
+            size = os.path.getsize(path) if os.path.exists(path) else 0
+            rows = min(rows, size // STREAMS[stream][name].itemsize)
+        return rows
+
+    def _truncate(self, path, size):
+        if os.path.exists(path) and os.path.getsize(path) > size:
+            _logger.warning(
+                "EventStore: dropping uncommitted rows of {}".format(path))
+            with open(path, "r+b") as f:
+                f.truncate(size)
+
+    def _save(self):
+        """ Replace the manifest atomically.
+
+        """
+        path = os.path.join(self.directory, MANIFEST)
+        with open(path + ".tmp", "w") as f:
+            json.dump({"partition": self.partition,
+                       "streams": self.manifest}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        _fsync_directory(self.directory)
+
+    def _column_path(self, stream, segment, name):
+        return os.path.join(self.directory, stream, segment, name + ".col")
+
+    def append(self, stream, records):
+        """ Queue events of a stream.
+
+        Args:
+            stream (str): one of :py:data:`STREAMS`.
+            records: a structured array of the stream's dtype.
+
+        """
+        if not len(records):
+            return
+        if self.oldest is None:
+            self.oldest = monotonic()
+        self.pending[stream].append(np.asarray(records, dtype=STREAMS[stream]))
+        self.pending_rows += len(records)
+        if self.due():
+            self.flush()
+
+    def add_batch(self, batch):
+        """ Queue the System Information, paging, and assignment events
+        of a batch.
+
+        Args:
+            batch (:obj:`antikythera.packets.batch.PacketBatch`): the
+                decoded messages.
+
+        """
+        if not len(batch):
+            return
+        rr_rows = batch.pd == PD_RR
+        arfcn = batch.arfcn & GSMTAP_ARFCN_MASK
+
+        rows = np.flatnonzero(
+            rr_rows & np.isin(batch.message_type, _SYSTEM_INFORMATION))
+        system = np.empty(len(rows), dtype=STREAMS["system"])
+        system["timestamp"] = batch.timestamp[rows]
+        system["arfcn"] = arfcn[rows]
+        system["message_type"] = batch.message_type[rows]
+        system["lac"] = batch.lac[rows]
+        system["cid"] = batch.cell_id[rows]
+        self.append("system", system)
+
+        owner = np.repeat(np.arange(len(batch)), np.diff(batch.tmsi_offsets))
+        imsi_rows = np.flatnonzero(batch.imsi != "")
+        rows = np.concatenate([owner, imsi_rows])
+        pagings = np.zeros(len(rows), dtype=STREAMS["pagings"])
+        pagings["timestamp"] = batch.timestamp[rows]
+        pagings["arfcn"] = arfcn[rows]
+        pagings["message_type"] = batch.message_type[rows]
+        pagings["identity_type"][:len(owner)] = rr.MI_TMSI
+        pagings["identity_type"][len(owner):] = rr.MI_IMSI
+        pagings["tmsi"][:len(owner)] = batch.tmsis
+        pagings["imsi"][len(owner):] = np.char.encode(batch.imsi[imsi_rows],
+                                                      "ascii")
+        self.append("pagings", pagings)
+
+        rows = np.flatnonzero(
+            rr_rows & (batch.message_type == RR_IMMEDIATE_ASSIGNMENT))
+        self.append("assignments", _assignments(batch, rows, arfcn))
+
+    def add_cells(self, batch):
+        """ Cells are kept in the database only.
+
+        """
+
+    def due(self):
+        """ Whether the pending rows should be written now.
+
+        """
+        return self.oldest is not None and (
+            self.pending_rows >= self.flush_rows
+            or monotonic() - self.oldest >= self.flush_interval)
+
+    def due_in(self):
+        """ Seconds until the pending rows are due, ``None`` if there are
+        none.
+
+        """
+        if self.oldest is None:
+            return None
+        return max(0.0, self.flush_interval - (monotonic() - self.oldest))
+
+    def flush(self):
+        """ Append the pending rows to their segments and commit them in
+        the manifest.
+
+        Returns:
+            int: the rows written.
+
+        """
+        if self.oldest is None:
+            return 0
+        start = monotonic()
+        written = 0
+        directories = set()
+        for stream, parts in self.pending.items():
+            if not parts:
+                continue
+            records = np.concatenate(parts)
+            keys = ((records["timestamp"] // self.partition).astype(np.int64)
+                    * self.partition)
+            for key in np.unique(keys).tolist():
+                directories.update(self._append_segment(
+                    stream, str(key), records[keys == key]))
+            written += len(records)
+        # The rows must be on disk before the manifest commits them
+        for directory in sorted(directories, key=len, reverse=True):
+            _fsync_directory(directory)
+        self._save()
+        self.pending = {stream: [] for stream in STREAMS}
+        self.pending_rows = 0
+        self.oldest = None
+        self.written += written
+        self.flushes += 1
+        self.write_time += monotonic() - start
+        _logger.debug("EventStore: wrote {} rows in {:.3f}s".format(
+            written, monotonic() - start))
+        return written
+
+    def _append_segment(self, stream, segment, records):
+        """ Append rows to the column files of a segment and sync them.
+
+        Returns:
+            list: the directories whose entries changed and need syncing.
+
+        """
+        directory = os.path.join(self.directory, stream, segment)
+        changed = [directory]
+        if not os.path.exists(directory):
+            os.makedirs(directory)
+            changed += [os.path.dirname(directory), self.directory]
+        for name in records.dtype.names:
+            with open(self._column_path(stream, segment, name), "ab") as f:
+                f.write(np.ascontiguousarray(records[name]).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+        timestamps = records["timestamp"]
+        entry = self.manifest[stream].get(segment)
+        if entry is None:
+            entry = self.manifest[stream][segment] = {
+                "start": float(timestamps.min()),
+                "end": float(timestamps.max()),
+                "rows": 0, "arfcns": []}
+        entry["start"] = min(entry["start"], float(timestamps.min()))
+        entry["end"] = max(entry["end"], float(timestamps.max()))
+        entry["rows"] += len(records)
+        arfcns = np.unique(records["arfcn"]).tolist()
+        entry["arfcns"] = sorted(set(entry["arfcns"]).union(arfcns))
+        return changed
+
+    def segments(self, stream, start=None, end=None, arfcns=None):
+        """ The segments of a stream overlapping a query.
+
+        Args:
+            stream (str): one of :py:data:`STREAMS`.
+            start (float): earliest time, ``None`` for no limit.
+            end (float): latest time, ``None`` for no limit.
+            arfcns: only segments holding any of these ARFCNs, ``None``
+                for all.
+
+        Returns:
+            list: segment names in time order.
+
+        """
+        found = []
+        for segment, entry in self.manifest[stream].items():
+            if start is not None and entry["end"] < start:
+                continue
+            if end is not None and entry["start"] > end:
+                continue
+            if (arfcns is not None
+                    and not set(arfcns).intersection(entry["arfcns"])):
+                continue
+            found.append(segment)
+        return sorted(found, key=int)
+
+    def scan(self, stream, start=None, end=None, arfcns=None, columns=None):
+        """ The committed events of a stream, one segment at a time.
+
+        Only the segments overlapping the query are mapped, the rows of
+        a segment are filtered by time and ARFCN as needed.
+
+        Args:
+            stream (str): one of :py:data:`STREAMS`.
+            start, end, arfcns: see :py:meth:`segments`.
+            columns: the column names to read, ``None`` for all.
+
+        Yields:
+            dict: ``{column: array}`` of a segment, memory mapped when
+            no rows are filtered out.
+
+        """
+        dtype = STREAMS[stream]
+        columns = list(dtype.names if columns is None else columns)
+        for segment in self.segments(stream, start, end, arfcns):
+            entry = self.manifest[stream][segment]
+            mapped = {name: np.memmap(self._column_path(stream, segment, name),
+                                      mode="r", dtype=dtype[name],
+                                      shape=(entry["rows"],))
+                      for name in set(columns) | {"timestamp", "arfcn"}}
+            keep = None
+            if start is not None and entry["start"] < start:
+                keep = mapped["timestamp"] >= start
+            if end is not None and entry["end"] > end:
+                keep = _and(keep, mapped["timestamp"] <= end)
+            if arfcns is not None and not set(entry["arfcns"]) <= set(arfcns):
+                keep = _and(keep, np.isin(mapped["arfcn"], list(arfcns)))
+            if keep is None:
+                yield {name: mapped[name] for name in columns}
+            elif keep.any():
+                yield {name: mapped[name][keep] for name in columns}
+
+    def read(self, stream, start=None, end=None, arfcns=None, columns=None):
+        """ The events of :py:meth:`scan` in one array per column.
+
+        """
+        dtype = STREAMS[stream]
+        columns = list(dtype.names if columns is None else columns)
+        parts = list(self.scan(stream, start, end, arfcns, columns))
+        return {name: np.concatenate([part[name] for part in parts]) if parts
+                else np.empty(0, dtype=dtype[name]) for name in columns}
+
+    def drop(self, stream, before):
+        """ Delete the segments of a stream ending before a time.
+
+        Args:
+            stream (str): one of :py:data:`STREAMS`.
+            before (float): segments with every event older are dropped.
+
+        Returns:
+            int: the rows dropped.
+
+        """
+        dropped = 0
+        for segment, entry in list(self.manifest[stream].items()):
+            if entry["end"] < before:
+                del self.manifest[stream][segment]
+                dropped += entry["rows"]
+                shutil.rmtree(os.path.join(self.directory, stream, segment),
+                              ignore_errors=True)
+        if dropped:
+            self._save()
+        return dropped
+
+    def drop_oldest(self, stream):
+        """ Delete the oldest segment of a stream.
+
+        Args:
+            stream (str): one of :py:data:`STREAMS`.
+
+        Returns:
+            int: the rows dropped.
+
+        """
+        segments = self.segments(stream)
+        if not segments:
+            return 0
+        entry = self.manifest[stream].pop(segments[0])
+        shutil.rmtree(os.path.join(self.directory, stream, segments[0]),
+                      ignore_errors=True)
+        self._save()
+        return entry["rows"]
+
+    def newest(self):
+        """ The time of the newest committed event, ``None`` if there is
+        none.
+
+        """
+        return max((entry["end"] for segments in self.manifest.values()
+                    for entry in segments.values()), default=None)
+
+    def size(self):
+        """ Bytes of the committed columns.
+
+        """
+        return sum(entry["rows"] * STREAMS[stream].itemsize
+                   for stream, segments in self.manifest.items()
+                   for entry in segments.values())
+
+    def stats(self):
+        """ Rows written and the write rate.
+
+        Returns:
+            dict: ``written``, ``pending``, ``flushes``, ``rate`` in rows
+            per second of write time, and the ``segments`` held.
+
+        """
+        rate = self.written / self.write_time if self.write_time else 0.0
+        return {"written": self.written, "pending": self.pending_rows,
+                "flushes": self.flushes, "rate": round(rate),
+                "segments": sum(len(segments)
+                                for segments in self.manifest.values())}
+
+    def close(self):
+        """ Write what is pending.
+
+        """
+        self.flush()
+
+
+def _fsync_directory(path):
+    """ Sync the entries of a directory, files created or renamed in it.
+
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _and(mask, other):
+    return other if mask is None else mask & other
+
+
+def _assignments(batch, rows, arfcn):
+    """ The Immediate Assignment events of some rows of a batch.
+
+    The fields are read where
+    :py:data:`antikythera.packets.rr.IMMEDIATE_ASSIGNMENT` has them,
+    messages too short for a field get
+    :py:data:`antikythera.packets.batch.NONE`.
+
+    """
+    records = np.empty(len(rows), dtype=STREAMS["assignments"])
+    records["timestamp"] = batch.timestamp[rows]
+    records["arfcn"] = arfcn[rows]
+    offset = batch.l3_offset[rows]
+    length = batch.length[rows].astype(np.intp) - offset
+    payload = batch.payload[rows]
+    index = np.arange(len(rows))
+    for name, position, shift, mask in (("channel_type", 3, 3, 0x1f),
+                                        ("time_slot", 3, 0, 0x07),
+                                        ("ra", 6, 0, 0xff),
+                                        ("timing_advance", 9, 0, 0x3f)):
+        column = np.minimum(offset + position, payload.shape[1] - 1)
+        value = (payload[index, column] >> shift) & mask
+        records[name] = np.where(length > position, value, NONE)
+    return records
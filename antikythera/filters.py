@@ -0,0 +1,180 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" filters.py
+
+Drop the frames no metric needs before they are queued.
+
+A :obj:`FrameFilter` is declared with the GSMTAP types, channels,
+ARFCNs, and layer 3 messages wanted, any of them left as ``None``
+accepts everything. Filters are combined with :py:meth:`FrameFilter.union`
+so the filter the capture applies can be built from what each metric
+declares, see :func:`antikythera.metrics.metrics_filter`. Frame
+records that are still packed are filtered a whole array at a time with
+:py:meth:`FrameFilter.select`.
+
+Example:
+    Keep only the paging requests on the CCCH::
+
+        from antikythera.filters import FrameFilter
+        from antikythera.gsmtap import GSMTAP_CHANNEL_CCCH
+        from antikythera.l3 import PD_RR, RR_PAGING_REQUEST_1
+
+        paging = FrameFilter(channels=[GSMTAP_CHANNEL_CCCH],
+                             messages=[(PD_RR, RR_PAGING_REQUEST_1)])
+        frames = [frame for frame in frames if paging(frame)]
+
+"""
+import sys
+import logging
+
+from antikythera.gsmtap import GSMTAP_TYPE_UM, GSMTAP_ARFCN_MASK
+from antikythera.l3 import L3_OFFSETS, l3_header
+from antikythera.packets.batch import frame_headers
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError as e:
+    _logger.error("FrameFilter: {}".format(e))
+    _logger.info("FrameFilter: Maybe try `pip install -r requirements.txt'")
+    sys.exit(1)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+# Accepts every message on a channel in FrameFilter.rules
+ANY_MESSAGE = None
+
+
+class FrameFilter(object):
+    """ Accept or reject frames by type, channel, ARFCN, and message.
+
+    Calling the filter with a frame returns ``True`` if it should be
+    kept. The checks are ordered cheapest first, the layer 3 header is
+    only looked at for channels where the message type matters.
+
+    Args:
+        channels: the GSMTAP channel (sub) types to keep, ``None`` keeps
+            every channel carrying layer 3 messages if ``messages`` is
+            given and every channel otherwise.
+        messages: ``(pd, message type)`` pairs to keep, see
+            :func:`antikythera.l3.l3_header`, ``None`` keeps every
+            message on the ``channels``.
+        arfcns: the ARFCNs to keep without the GSMTAP flag bits, ``None``
+            keeps all.
+        types: the GSMTAP types to keep, ``None`` keeps all.
+
+    Attributes:
+        rules (dict): ``{channel: messages}`` where messages is a
+            :obj:`frozenset` or :py:data:`ANY_MESSAGE`, ``None`` if every
+            channel is kept.
+
+    """
+    def __init__(self, channels=None, messages=None, arfcns=None,
+                 types=(GSMTAP_TYPE_UM,)):
+        self.types = None if types is None else frozenset(types)
+        self.arfcns = None if arfcns is None else frozenset(arfcns)
+        if channels is None and messages is not None:
+            channels = L3_OFFSETS
+        if channels is None:
+            self.rules = None
+        else:
+            messages = ANY_MESSAGE if messages is None else frozenset(messages)
+            self.rules = {channel: messages for channel in channels}
+
+    def __call__(self, frame):
+        if self.types is not None and frame.type not in self.types:
+            return False
+        if (self.arfcns is not None
+                and frame.arfcn & GSMTAP_ARFCN_MASK not in self.arfcns):
+            return False
+        if self.rules is None:
+            return True
+        channel = frame.channel
+        if channel not in self.rules:
+            return False
+        messages = self.rules[channel]
+        if messages is ANY_MESSAGE:
+            return True
+        return l3_header(channel, frame.payload) in messages
+
+    def select(self, records):
+        """ Which of an array of frame records the filter keeps.
+
+        Args:
+            records: an array of
+                :py:data:`antikythera.packets.batch.FRAME_DTYPE`.
+
+        Returns:
+            a boolean array, ``True`` for the records calling the filter
+            on their frames would keep.
+
+        """
+        keep = np.ones(len(records), dtype=bool)
+        if self.types is not None:
+            keep &= np.isin(records["type"], list(self.types))
+        if self.arfcns is not None:
+            keep &= np.isin(records["arfcn"] & GSMTAP_ARFCN_MASK,
+                            list(self.arfcns))
+        if self.rules is None:
+            return keep
+        channels = records["channel"]
+        keep &= np.isin(channels, list(self.rules))
+        checked = [(channel, messages)
+                   for channel, messages in self.rules.items()
+                   if messages is not ANY_MESSAGE]
+        if not checked:
+            return keep
+        header, _, pd, message_type = frame_headers(records)
+        # (pd, message type) as one number to look up
+        codes = pd.astype(np.int32) << 8 | message_type
+        for channel, messages in checked:
+            wanted = [p << 8 | t for p, t in messages]
+            keep &= ((channels != channel)
+                     | header & np.isin(codes, wanted))
+        return keep
+
+    def __repr__(self):
+        return "FrameFilter(rules={}, arfcns={}, types={})".format(
+            self.rules, self.arfcns, self.types)
+
+    @classmethod
+    def union(cls, filters):
+        """ A filter keeping every frame any of ``filters`` keeps.
+
+        The channel rules are merged exactly, the ARFCN and type sets are
+        merged independently of the channels so the union may keep a few
+        more frames than the filters would on their own, never fewer.
+
+        Args:
+            filters: an iterable of :obj:`FrameFilter`.
+
+        Returns:
+            :obj:`FrameFilter`: the combined filter, it rejects every
+            frame if ``filters`` is empty.
+
+        """
+        union = cls(channels=(), arfcns=(), types=())
+        for f in filters:
+            union.types = _merge(union.types, f.types)
+            union.arfcns = _merge(union.arfcns, f.arfcns)
+            if union.rules is None or f.rules is None:
+                union.rules = None
+                continue
+            for channel, messages in f.rules.items():
+                if channel in union.rules:
+                    messages = _merge(union.rules[channel], messages)
+                union.rules[channel] = messages
+        return union
+
+
+def _merge(a, b):
+    """ Union of two sets where ``None`` stands for everything.
+
+    """
+    if a is None or b is None:
+        return None
+    return a | b
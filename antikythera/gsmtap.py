@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" gsmtap.py
+
+GSMTAP header parsing and the frame record passed down the pipeline.
+
+The GSMTAP version 2 header is described in the `Osmocom GSMTAP
+documentation <http://osmocom.org/projects/baseband/wiki/GSMTAP>`_,
+only the fields needed by the detector are kept in a :obj:`Frame`.
+
+"""
+import struct
+import logging
+
+from collections import namedtuple
+
+_logger = logging.getLogger(__name__)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+GSMTAP_PORT = 4729
+GSMTAP_VERSION = 2
+
+# GSMTAP types
+GSMTAP_TYPE_UM = 0x01
+GSMTAP_TYPE_ABIS = 0x02
+GSMTAP_TYPE_UM_BURST = 0x03
+
+# GSMTAP channel types, the sub type field of a GSMTAP_TYPE_UM header
+GSMTAP_CHANNEL_UNKNOWN = 0x00
+GSMTAP_CHANNEL_BCCH = 0x01
+GSMTAP_CHANNEL_CCCH = 0x02
+GSMTAP_CHANNEL_RACH = 0x03
+GSMTAP_CHANNEL_AGCH = 0x04
+GSMTAP_CHANNEL_PCH = 0x05
+GSMTAP_CHANNEL_SDCCH = 0x06
+GSMTAP_CHANNEL_SDCCH4 = 0x07
+GSMTAP_CHANNEL_SDCCH8 = 0x08
+GSMTAP_CHANNEL_TCH_F = 0x09
+GSMTAP_CHANNEL_TCH_H = 0x0a
+GSMTAP_CHANNEL_PACCH = 0x0b
+GSMTAP_CHANNEL_CBCH52 = 0x0c
+GSMTAP_CHANNEL_PDCH = 0x0d
+GSMTAP_CHANNEL_PTCCH = 0x0e
+GSMTAP_CHANNEL_CBCH51 = 0x0f
+GSMTAP_CHANNEL_ACCH = 0x80
+
+# Flags carried in the top bits of the ARFCN field
+GSMTAP_ARFCN_F_PCS = 0x8000
+GSMTAP_ARFCN_F_UPLINK = 0x4000
+GSMTAP_ARFCN_MASK = 0x3fff
+
+# version, hdr_len, type, timeslot, arfcn, signal_dbm, snr_db,
+# frame_number, sub_type, antenna_nr, sub_slot, res
+GSMTAP_HEADER = struct.Struct(">BBBBHbbIBBBB")
+
+
+# Fixed layout of a frame record crossing process boundaries: timestamp,
+# frame_nr, arfcn, type, channel, timeslot, signal_dbm, payload length,
+# payload padded with zeros. A record is exactly 64 bytes.
+FRAME_PAYLOAD_SIZE = 45
+FRAME_RECORD = struct.Struct("<dIHBBBbB{}s".format(FRAME_PAYLOAD_SIZE))
+FRAME_SIZE = FRAME_RECORD.size
+
+
+class Frame(namedtuple("Frame", ["timestamp", "arfcn", "frame_nr", "type",
+                                 "channel", "timeslot", "signal_dbm",
+                                 "payload"])):
+    """ A single GSMTAP frame reduced to what the decoders need.
+
+    Frames are packed into fixed size :py:data:`FRAME_RECORD` records
+    with :py:meth:`pack` before they are sent to another process. Layer
+    3 messages on the CCCH and BCCH are 23 bytes, longer payloads are
+    cut to :py:data:`FRAME_PAYLOAD_SIZE` bytes.
+
+    Attributes:
+        timestamp (float): capture time in seconds since the UNIX epoch.
+        arfcn (int): Absolute Radio Frequency Channel Number including the
+            GSMTAP PCS and uplink flag bits.
+        frame_nr (int): GSM TDMA frame number.
+        type (int): GSMTAP payload type, one of the ``GSMTAP_TYPE_*`` values.
+        channel (int): GSMTAP channel (sub) type, one of the
+            ``GSMTAP_CHANNEL_*`` values.
+        timeslot (int): the timeslot the frame was received on.
+        signal_dbm (int): received signal level in dBm.
+        payload (bytes): the layer 3 message following the GSMTAP header,
+            any bytes like object is accepted.
+
+    """
+    __slots__ = ()
+
+    def pack(self):
+        """ Pack the frame into a :py:data:`FRAME_RECORD`.
+
+        Returns:
+            bytes: :py:data:`FRAME_SIZE` bytes.
+
+        """
+        payload = bytes(self.payload[:FRAME_PAYLOAD_SIZE])
+        return FRAME_RECORD.pack(self.timestamp, self.frame_nr, self.arfcn,
+                                 self.type, self.channel, self.timeslot,
+                                 self.signal_dbm, len(payload), payload)
+
+    @classmethod
+    def unpack(cls, buffer, offset=0):
+        """ Build a frame from a :py:data:`FRAME_RECORD`.
+
+        Args:
+            buffer: any object supporting the buffer protocol.
+            offset (int): where the record starts in ``buffer``.
+
+        """
+        return cls._from_record(FRAME_RECORD.unpack_from(buffer, offset))
+
+    @classmethod
+    def _from_record(cls, record):
+        (timestamp, frame_nr, arfcn, gsmtap_type, channel, timeslot,
+         signal_dbm, length, payload) = record
+        return cls(timestamp, arfcn, frame_nr, gsmtap_type, channel,
+                   timeslot, signal_dbm, payload[:length])
+
+
+def pack_frames(frames):
+    """ Pack frames into one contiguous block of records.
+
+    Args:
+        frames: an iterable of :obj:`Frame`.
+
+    Returns:
+        bytes: the concatenated :py:data:`FRAME_RECORD` records.
+
+    """
+    return b"".join([frame.pack() for frame in frames])
+
+
+def unpack_frames(buffer):
+    """ Iterate over the frames in a block made by :func:`pack_frames`.
+
+    Args:
+        buffer: any object supporting the buffer protocol, it is read in
+            place without being copied.
+
+    Yields:
+        :obj:`Frame`: each frame in order.
+
+    """
+    from_record = Frame._from_record
+    for record in FRAME_RECORD.iter_unpack(buffer):
+        yield from_record(record)
+
+
+def frame_count(buffer):
+    """ The number of frames in a block made by :func:`pack_frames`.
+
+    """
+    return len(buffer) // FRAME_SIZE
+
+
+def parse_gsmtap(data, timestamp):
+    """ Build a :obj:`Frame` from a raw GSMTAP header and payload.
+
+    Args:
+        data (bytes): the UDP payload starting with the GSMTAP header.
+        timestamp (float): capture time of the frame.
+
+    Returns:
+        :obj:`Frame`: the parsed frame or ``None`` if ``data`` is not
+        a valid GSMTAP version 2 message.
+
+    """
+    if len(data) < GSMTAP_HEADER.size:
+        return None
+    (version, hdr_len, gsmtap_type, timeslot, arfcn, signal_dbm, _snr,
+     frame_nr, sub_type, _antenna, _sub_slot,
+     _res) = GSMTAP_HEADER.unpack_from(data)
+    if version != GSMTAP_VERSION:
+        _logger.debug("GSMTAP: unsupported version {}".format(version))
+        return None
+    hdr_len *= 4
+    if hdr_len < GSMTAP_HEADER.size or hdr_len > len(data):
+        return None
+    return Frame(timestamp, arfcn, frame_nr, gsmtap_type, sub_type,
+                 timeslot, signal_dbm, bytes(data[hdr_len:]))
@@ -25,7 +25,7 @@ from time import sleep
 
 
 from antikythera import __version__
-from antikythera.antikythera import Anti, create_parser
+from antikythera.antikythera import Anti, create_parser, retention_options
 
 _logger = logging.getLogger(__name__)
 
@@ -148,7 +148,23 @@ class MetricDisplay(App):
             #loglevel = LOG_LEVELS.get(Config.get(['kivy', 'log_level']))
             Logger.setLevel(level=logging.WARNING)
 
-        self.IMSI_detector = Anti(args.threads, args.headless, interface=args.interface, capturefile=args.pcap, max_qsize=args.qsize)
+        self.IMSI_detector = Anti(args.threads, args.headless,
+                                  interface=args.interface,
+                                  capturefile=args.pcap, udp=args.udp,
+                                  max_qsize=args.qsize,
+                                  batch_size=args.batch_size,
+                                  batch_delay=args.batch_delay,
+                                  transport=args.transport, speed=args.speed,
+                                  jobs=args.jobs,
+                                  arfcns=args.arfcns,
+                                  filter_frames=args.filter_frames,
+                                  overflow=args.overflow,
+                                  sharding=args.sharding,
+                                  si_cache=args.si_cache,
+                                  database=args.database,
+                                  flush_interval=args.flush_interval,
+                                  events=args.events,
+                                  **retention_options(args))
 
 
 
@@ -0,0 +1,132 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" l3.py
+
+Locate the GSM 04.08 layer 3 header inside a frame payload.
+
+The layer 3 message follows a different layer 2 header on each
+channel. Messages on the BCCH and CCCH start with the one byte L2
+pseudo length, on the dedicated channels with a three byte LAPDm
+header, and the SACCH adds the two byte layer 1 header in front of the
+LAPDm one. Only the protocol discriminator and message type are read,
+the rest of the message is left to the decoders.
+
+"""
+import logging
+
+from antikythera.gsmtap import (GSMTAP_CHANNEL_BCCH, GSMTAP_CHANNEL_CCCH,
+                                GSMTAP_CHANNEL_PCH, GSMTAP_CHANNEL_AGCH,
+                                GSMTAP_CHANNEL_SDCCH, GSMTAP_CHANNEL_SDCCH4,
+                                GSMTAP_CHANNEL_SDCCH8, GSMTAP_CHANNEL_TCH_F,
+                                GSMTAP_CHANNEL_TCH_H, GSMTAP_CHANNEL_ACCH)
+
+_logger = logging.getLogger(__name__)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+# Protocol discriminators
+PD_CC = 0x03
+PD_MM = 0x05
+PD_RR = 0x06
+PD_SMS = 0x09
+PD_SS = 0x0b
+
+# RR message types
+RR_SYSTEM_INFORMATION_13 = 0x00
+RR_SYSTEM_INFORMATION_2BIS = 0x02
+RR_SYSTEM_INFORMATION_2TER = 0x03
+RR_SYSTEM_INFORMATION_2QUATER = 0x07
+RR_SYSTEM_INFORMATION_1 = 0x19
+RR_SYSTEM_INFORMATION_2 = 0x1a
+RR_SYSTEM_INFORMATION_3 = 0x1b
+RR_SYSTEM_INFORMATION_4 = 0x1c
+RR_SYSTEM_INFORMATION_5 = 0x1d
+RR_SYSTEM_INFORMATION_6 = 0x1e
+RR_PAGING_REQUEST_1 = 0x21
+RR_PAGING_REQUEST_2 = 0x22
+RR_PAGING_REQUEST_3 = 0x24
+RR_IMMEDIATE_ASSIGNMENT_REJECT = 0x3a
+RR_IMMEDIATE_ASSIGNMENT_EXTENDED = 0x39
+RR_IMMEDIATE_ASSIGNMENT = 0x3f
+RR_CIPHERING_MODE_COMMAND = 0x35
+
+RR_SYSTEM_INFORMATION = frozenset((
+    RR_SYSTEM_INFORMATION_1, RR_SYSTEM_INFORMATION_2,
+    RR_SYSTEM_INFORMATION_2BIS, RR_SYSTEM_INFORMATION_2TER,
+    RR_SYSTEM_INFORMATION_2QUATER, RR_SYSTEM_INFORMATION_3,
+    RR_SYSTEM_INFORMATION_4, RR_SYSTEM_INFORMATION_5,
+    RR_SYSTEM_INFORMATION_6, RR_SYSTEM_INFORMATION_13))
+RR_PAGING_REQUESTS = frozenset((
+    RR_PAGING_REQUEST_1, RR_PAGING_REQUEST_2, RR_PAGING_REQUEST_3))
+RR_IMMEDIATE_ASSIGNMENTS = frozenset((
+    RR_IMMEDIATE_ASSIGNMENT, RR_IMMEDIATE_ASSIGNMENT_EXTENDED,
+    RR_IMMEDIATE_ASSIGNMENT_REJECT))
+
+# Bytes in front of the layer 3 message on each channel
+PSEUDO_LENGTH_SIZE = 1
+LAPDM_SIZE = 3
+SACCH_L1_SIZE = 2
+
+L3_OFFSETS = {
+    GSMTAP_CHANNEL_BCCH: PSEUDO_LENGTH_SIZE,
+    GSMTAP_CHANNEL_CCCH: PSEUDO_LENGTH_SIZE,
+    GSMTAP_CHANNEL_PCH: PSEUDO_LENGTH_SIZE,
+    GSMTAP_CHANNEL_AGCH: PSEUDO_LENGTH_SIZE,
+    GSMTAP_CHANNEL_SDCCH: LAPDM_SIZE,
+    GSMTAP_CHANNEL_SDCCH4: LAPDM_SIZE,
+    GSMTAP_CHANNEL_SDCCH8: LAPDM_SIZE,
+    GSMTAP_CHANNEL_TCH_F: LAPDM_SIZE,
+    GSMTAP_CHANNEL_TCH_H: LAPDM_SIZE,
+}
+for _channel, _offset in list(L3_OFFSETS.items()):
+    if _offset == LAPDM_SIZE:
+        L3_OFFSETS[_channel | GSMTAP_CHANNEL_ACCH] = SACCH_L1_SIZE + LAPDM_SIZE
+
+# Protocols whose message type carries a send sequence number in bits 7-8
+_SEQUENCED = frozenset((PD_CC, PD_MM, PD_SS))
+
+
+def l3_header(channel, payload):
+    """ The protocol discriminator and message type of a frame.
+
+    Args:
+        channel (int): the GSMTAP channel (sub) type of the frame.
+        payload: the frame payload, any bytes like object.
+
+    Returns:
+        tuple: ``(pd, message type)`` or ``None`` if the channel does not
+        carry layer 3 messages, or the frame is a LAPDm frame without an
+        information field.
+
+    """
+    offset = L3_OFFSETS.get(channel)
+    if offset is None or len(payload) < offset + 2:
+        return None
+    if offset >= LAPDM_SIZE and payload[offset - 1] >> 2 < 2:
+        return None
+    pd = payload[offset] & 0x0f
+    message_type = payload[offset + 1]
+    if pd in _SEQUENCED:
+        message_type &= 0x3f
+    return pd, message_type
+
+
+def l3_message(channel, payload):
+    """ The layer 3 message of a frame without its layer 2 header.
+
+    Args:
+        channel (int): the GSMTAP channel (sub) type of the frame.
+        payload: the frame payload, any bytes like object.
+
+    Returns:
+        the payload from the protocol discriminator on, ``None`` if the
+        channel does not carry layer 3 messages.
+
+    """
+    offset = L3_OFFSETS.get(channel)
+    if offset is None:
+        return None
+    return payload[offset:]
@@ -4,24 +4,566 @@
 
 Implementation of the metrics that detect IMSI Catchers
 
+Each metric declares the channels and layer 3 messages it looks at, the
+capture only queues the frames at least one metric needs, see
+:func:`metrics_filter`.
+
+The decoders send every decoded batch to the :obj:`Metrics` process. Its
+:obj:`MetricEngine` hands each registered metric the rows it declared
+as soon as the batch arrives, and the metric updates its state one
+event at a time, with the sliding windows of
+:mod:`antikythera.windows` where it counts. What a metric finds is a
+:obj:`Detection`, logged as a warning with its latency: on a live
+capture the seconds since the oldest frame of the batch was captured,
+batching and queueing included, on a replayed capture file, whose
+capture times are in the past, the seconds since a decoder took the
+batch off its queue.
+
+Example:
+    A metric is a small class registered with the engine::
+
+        class Rejects(Metric):
+            messages = frozenset([(PD_RR, RR_IMMEDIATE_ASSIGNMENT_REJECT)])
+
+            def update(self, packets, rows):
+                return [self.detection(packets, i, "assignment rejected")
+                        for i in rows.tolist()]
+
+        engine = MetricEngine()
+        engine.register(Rejects())
+
 """
+import sys
 import logging
 import multiprocessing as mp
 
-from time import sleep
+from time import time
+from queue import Empty
+from collections import deque, namedtuple
 from multiprocessing import Process, Queue
 
+from antikythera.filters import FrameFilter
+from antikythera.windows import SlidingCounter, SlidingDistinct
+from antikythera.packets import rr
+from antikythera.packets.batch import NONE
+from antikythera.gsmtap import (GSMTAP_ARFCN_MASK, GSMTAP_CHANNEL_BCCH,
+                                GSMTAP_CHANNEL_CCCH, GSMTAP_CHANNEL_PCH,
+                                GSMTAP_CHANNEL_AGCH)
+from antikythera.l3 import (PD_RR, PD_SMS, RR_SYSTEM_INFORMATION_2,
+                            RR_SYSTEM_INFORMATION_2BIS,
+                            RR_SYSTEM_INFORMATION_2TER,
+                            RR_SYSTEM_INFORMATION_3, RR_PAGING_REQUEST_1,
+                            RR_PAGING_REQUEST_2, RR_PAGING_REQUEST_3,
+                            RR_IMMEDIATE_ASSIGNMENT,
+                            RR_IMMEDIATE_ASSIGNMENT_EXTENDED,
+                            RR_IMMEDIATE_ASSIGNMENT_REJECT,
+                            RR_CIPHERING_MODE_COMMAND)
+
 _logger = logging.getLogger(__name__)
 
+try:
+    import numpy as np
+except ImportError as e:
+    _logger.error("Metrics: {}".format(e))
+    _logger.info("Metrics: Maybe try `pip install -r requirements.txt'")
+    sys.exit(1)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+# The channels the BTS broadcasts and pages on, gr-gsm tags the CCCH
+# blocks it decodes as BCCH
+COMMON_CHANNELS = (GSMTAP_CHANNEL_BCCH, GSMTAP_CHANNEL_CCCH,
+                   GSMTAP_CHANNEL_PCH, GSMTAP_CHANNEL_AGCH)
+
+# SMS control protocol CP-DATA
+SMS_CP_DATA = 0x01
+
+# Seconds the metrics count over
+DEFAULT_WINDOW = 60
+
+# Times an identity is paged in the window before it is reported
+REPEATED_PAGING = 5
+
+# Batches waiting for the metrics before the decoders block
+METRICS_QUEUE_SIZE = 1000
+
+# Detections the engine remembers
+DETECTIONS_KEPT = 1000
+
+# Seconds to wait for a batch before logging that the queue is empty
+IDLE_TIMEOUT = 10
+
+# Cipher mode setting of the Ciphering Mode Command, 3GPP TS 44.018
+# 10.5.2.9, the algorithm is A5/(n + 1)
+CIPHER_START = 0x01
+CIPHER_A5_2 = 1
+
+_PAGING = (RR_PAGING_REQUEST_1, RR_PAGING_REQUEST_2, RR_PAGING_REQUEST_3)
+
+
+Detection = namedtuple("Detection",
+                       ["timestamp", "arfcn", "metric", "description"])
+Detection.__doc__ = """ Something a metric found.
+
+Attributes:
+    timestamp (float): capture time of the triggering message.
+    arfcn (int): the ARFCN it was on, without the GSMTAP flag bits.
+    metric (str): the name of the metric.
+    description (str): what was found.
+
+"""
+
+
+def metrics_item(packets, received=None):
+    """ What a decoder puts on the metrics queue.
+
+    Args:
+        packets (:obj:`antikythera.packets.batch.PacketBatch`): the
+            decoded messages.
+        received (float): when the decoder took the batch off its
+            queue, ``None`` for now.
+
+    Returns:
+        tuple: ``(received, packets)``
+
+    """
+    return (time() if received is None else received, packets)
+
+
+class Metric(object):
+    """ A detection metric and the frames it needs.
+
+    Subclasses declare what they look at as class attributes, these are
+    turned into a :obj:`antikythera.filters.FrameFilter` by
+    :py:meth:`frame_filter`. An instance registered with a
+    :obj:`MetricEngine` is handed those messages by :py:meth:`update`.
+
+    Args:
+        window (float): seconds the metric counts over.
+
+    Attributes:
+        channels: GSMTAP channel types the metric reads, ``None`` for
+            every channel carrying layer 3 messages.
+        messages: ``(pd, message type)`` pairs the metric reads.
+
+    """
+    channels = None
+    messages = frozenset()
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        self.window = window
+
+    @property
+    def name(self):
+        return type(self).__name__
+
+    @classmethod
+    def frame_filter(cls):
+        return FrameFilter(channels=cls.channels, messages=cls.messages)
+
+    def update(self, packets, rows):
+        """ Take in new messages.
+
+        Args:
+            packets (:obj:`antikythera.packets.batch.PacketBatch`): the
+                decoded messages in capture order.
+            rows: indices of the rows of :py:attr:`messages` on
+                :py:attr:`channels`.
+
+        Returns:
+            list: the :obj:`Detection` found.
+
+        """
+        return []
+
+    def detection(self, packets, row, description):
+        """ A :obj:`Detection` of a row of a batch.
+
+        """
+        return Detection(float(packets.timestamp[row]),
+                         int(packets.arfcn[row]) & GSMTAP_ARFCN_MASK,
+                         self.name, description)
+
+    def stats(self):
+        """ What the metric counts, for the logs.
+
+        """
+        return {}
+
+
+class CellConfiguration(Metric):
+    """ Changes to a cell's identity and selection parameters.
+
+    Reports an ARFCN whose System Information 3 changes the cell's
+    identity, and a cell identity broadcast in more than one location
+    area, as a catcher copying a real cell's identity does.
+
+    """
+    channels = COMMON_CHANNELS
+    messages = frozenset([(PD_RR, RR_SYSTEM_INFORMATION_3)])
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        super(CellConfiguration, self).__init__(window)
+        # {arfcn: (mcc, mnc, lac, cid)}
+        self.cells = {}
+        # {(mcc, mnc, cid): {lac}}
+        self.areas = {}
+        self._lais = {}
+
+    def update(self, packets, rows):
+        found = []
+        rows = rows[packets.cell_id[rows] != NONE]
+        arfcns = (packets.arfcn[rows] & GSMTAP_ARFCN_MASK).tolist()
+        cids = packets.cell_id[rows].tolist()
+        for i, row in enumerate(rows.tolist()):
+            start = packets.l3_offset[row] + 4
+            octets = packets.payload[row, start:start + 5].tobytes()
+            lai = self._lais.get(octets)
+            if lai is None:
+                lai = self._lais[octets] = rr.lai(octets)
+            cell = (lai.mcc, lai.mnc, lai.lac, cids[i])
+            before = self.cells.get(arfcns[i])
+            if before == cell:
+                continue
+            self.cells[arfcns[i]] = cell
+            if before is not None:
+                found.append(self.detection(
+                    packets, row, "cell {}-{} LAC {} CID {} became {}-{} "
+                    "LAC {} CID {}".format(*(before + cell))))
+            lacs = self.areas.setdefault((lai.mcc, lai.mnc, cids[i]), set())
+            if lai.lac not in lacs:
+                if lacs:
+                    others = ", ".join(str(lac) for lac in sorted(lacs))
+                    found.append(self.detection(
+                        packets, row, "CID {} in LAC {} is also in LAC "
+                        "{}".format(cids[i], lai.lac, others)))
+                lacs.add(lai.lac)
+        return found
+
+    def stats(self):
+        return {"cells": len(self.cells)}
+
+
+class NeighborList(Metric):
+    """ Missing or inconsistent neighboring cell lists.
+
+    Reports a cell broadcasting no neighbours, which keeps phones from
+    leaving it, and a neighbour list that changes. A cell may split its
+    list over System Information 2, 2bis, and 2ter, the parts are
+    combined and the first broadcast of a part is not a change.
+
+    """
+    channels = COMMON_CHANNELS
+    messages = frozenset((PD_RR, t) for t in (
+        RR_SYSTEM_INFORMATION_2, RR_SYSTEM_INFORMATION_2BIS,
+        RR_SYSTEM_INFORMATION_2TER))
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        super(NeighborList, self).__init__(window)
+        # {arfcn: {message type: neighbour ARFCNs}}
+        self.lists = {}
+
+    def update(self, packets, rows):
+        found = []
+        arfcns = (packets.arfcn[rows] & GSMTAP_ARFCN_MASK).tolist()
+        message_types = packets.message_type[rows].tolist()
+        for i, row in enumerate(rows.tolist()):
+            part = tuple(packets.neighbors_of(row).tolist())
+            parts = self.lists.setdefault(arfcns[i], {})
+            before = parts.get(message_types[i])
+            if before == part:
+                continue
+            combined = _combined(parts)
+            parts[message_types[i]] = part
+            neighbors = _combined(parts)
+            if not neighbors and RR_SYSTEM_INFORMATION_2 in parts:
+                found.append(self.detection(packets, row,
+                                            "no neighbouring cells"))
+            elif before is not None and neighbors != combined:
+                found.append(self.detection(
+                    packets, row, "neighbours changed from {} to {}".format(
+                        combined, neighbors)))
+        return found
+
+    def stats(self):
+        return {"cells": len(self.lists)}
+
+
+class Paging(Metric):
+    """ Paging and channel assignment patterns of silent SMS and tracking.
+
+    Counts the pagings, identities paged, assignments and SMS of each
+    cell in the window and reports an identity paged ``repeat`` times in
+    it, as an unseen SMS sent to locate a phone does.
+
+    Args:
+        repeat (int): pagings of one identity that are reported.
+
+    """
+    messages = frozenset([(PD_RR, t) for t in (
+        RR_PAGING_REQUEST_1, RR_PAGING_REQUEST_2, RR_PAGING_REQUEST_3,
+        RR_IMMEDIATE_ASSIGNMENT, RR_IMMEDIATE_ASSIGNMENT_EXTENDED,
+        RR_IMMEDIATE_ASSIGNMENT_REJECT)] + [(PD_SMS, SMS_CP_DATA)])
+
+    def __init__(self, window=DEFAULT_WINDOW, repeat=REPEATED_PAGING):
+        super(Paging, self).__init__(window)
+        self.repeat = repeat
+        # {arfcn: window}
+        self.pagings = {}
+        self.identities = {}
+        self.assignments = {}
+        self.sms = {}
+
+    def _window(self, windows, arfcn, kind=SlidingCounter):
+        window = windows.get(arfcn)
+        if window is None:
+            window = windows[arfcn] = kind(self.window)
+        return window
+
+    def update(self, packets, rows):
+        found = []
+        arfcn = packets.arfcn & GSMTAP_ARFCN_MASK
+        timestamps = packets.timestamp
+        for row in rows.tolist():
+            cell, timestamp = int(arfcn[row]), float(timestamps[row])
+            if packets.pd[row] == PD_SMS:
+                self._window(self.sms, cell).add(timestamp)
+            elif packets.message_type[row] in _PAGING:
+                # A message may page an identity twice, it counts once
+                tmsis = packets.tmsis_of(row).tolist()
+                identities = list(dict.fromkeys("{:08x}".format(tmsi)
+                                                for tmsi in tmsis))
+                if packets.imsi[row]:
+                    identities.append(str(packets.imsi[row]))
+                self._window(self.pagings, cell).add(timestamp,
+                                                     len(identities))
+                paged = self._window(self.identities, cell, SlidingDistinct)
+                for identity in identities:
+                    if paged.add(timestamp, identity) == self.repeat:
+                        found.append(self.detection(
+                            packets, row, "{} paged {} times in {}s".format(
+                                identity, self.repeat, self.window)))
+            else:
+                self._window(self.assignments, cell).add(timestamp)
+        return found
+
+    def stats(self):
+        cells = set(self.pagings) | set(self.assignments) | set(self.sms)
+        return {arfcn: {"pagings": _rate(self.pagings, arfcn),
+                        "identities": (self.identities[arfcn].distinct()
+                                       if arfcn in self.identities else 0),
+                        "assignments": _rate(self.assignments, arfcn),
+                        "sms": _rate(self.sms, arfcn)}
+                for arfcn in sorted(cells)}
+
+
+def _combined(parts):
+    """ The sorted ARFCNs of all the parts of a neighbour list.
+
+    """
+    return sorted(set().union(*parts.values()))
+
+
+def _rate(windows, arfcn):
+    return round(windows[arfcn].rate(), 3) if arfcn in windows else 0.0
+
+
+class Ciphering(Metric):
+    """ Connections set up without, or with weak, encryption.
+
+    Reports a Ciphering Mode Command that leaves ciphering off or starts
+    A5/2, and counts them per cell in the window.
+
+    """
+    messages = frozenset([(PD_RR, RR_CIPHERING_MODE_COMMAND)])
+
+    def __init__(self, window=DEFAULT_WINDOW):
+        super(Ciphering, self).__init__(window)
+        # {arfcn: window}
+        self.commands = {}
+        self.weak = {}
+
+    def update(self, packets, rows):
+        found = []
+        for row in rows.tolist():
+            arfcn = int(packets.arfcn[row]) & GSMTAP_ARFCN_MASK
+            timestamp = float(packets.timestamp[row])
+            self.commands.setdefault(
+                arfcn, SlidingCounter(self.window)).add(timestamp)
+            message = packets.message(row)
+            if len(message) < 3:
+                continue
+            setting = message[2] & 0x0f
+            if not setting & CIPHER_START:
+                description = "ciphering not started"
+            elif setting >> 1 == CIPHER_A5_2:
+                description = "ciphering with A5/2"
+            else:
+                continue
+            self.weak.setdefault(
+                arfcn, SlidingCounter(self.window)).add(timestamp)
+            found.append(self.detection(packets, row, description))
+        return found
+
+    def stats(self):
+        return {arfcn: {"commands": window.count(),
+                        "weak": (self.weak[arfcn].count()
+                                 if arfcn in self.weak else 0)}
+                for arfcn, window in sorted(self.commands.items())}
+
+
+METRICS = (CellConfiguration, NeighborList, Paging, Ciphering)
+
+
+def metrics_filter(metrics=METRICS, arfcns=None):
+    """ The frame filter keeping what any of the metrics needs.
+
+    Args:
+        metrics: the :obj:`Metric` classes in use.
+        arfcns: only keep frames on these ARFCNs, ``None`` keeps all.
+
+    Returns:
+        :obj:`antikythera.filters.FrameFilter`
+
+    """
+    frame_filter = FrameFilter.union(metric.frame_filter()
+                                     for metric in metrics)
+    if arfcns is not None:
+        frame_filter.arfcns = frozenset(arfcns)
+    return frame_filter
+
+
+class MetricEngine(object):
+    """ Hand each registered metric the messages it reads.
+
+    Args:
+        metrics: the :obj:`Metric` instances, ``None`` for one of each
+            of :py:data:`METRICS`.
+
+    Attributes:
+        metrics (list): the registered metrics.
+        detections (:obj:`collections.deque`): the latest
+            :obj:`Detection`.
+        events (int): messages handed to the metrics.
+        max_latency (float): the most seconds from the start passed to
+            :py:meth:`feed` to the detections of a batch.
+
+    """
+    def __init__(self, metrics=None):
+        self.metrics = []
+        self._routes = []
+        self.detections = deque(maxlen=DETECTIONS_KEPT)
+        self.detected = 0
+        self.events = 0
+        self.batches = 0
+        self.latency = 0.0
+        self.max_latency = 0.0
+        if metrics is None:
+            metrics = [cls() for cls in METRICS]
+        for metric in metrics:
+            self.register(metric)
+
+    def register(self, metric):
+        """ Add a metric.
+
+        Args:
+            metric (:obj:`Metric`): the metric.
+
+        Returns:
+            the metric.
+
+        """
+        codes = np.array(sorted(pd << 8 | message_type
+                                for pd, message_type in metric.messages),
+                         dtype=np.int32)
+        channels = None
+        if metric.channels is not None:
+            channels = np.array(sorted(metric.channels))
+        self.metrics.append(metric)
+        self._routes.append((metric, codes, channels))
+        return metric
+
+    def feed(self, packets, start=None):
+        """ Update the metrics with a batch.
+
+        Args:
+            packets (:obj:`antikythera.packets.batch.PacketBatch`): the
+                decoded messages.
+            start (float): the time the latency is measured from,
+                ``None`` for no latency.
+
+        Returns:
+            list: the :obj:`Detection` found.
+
+        """
+        if not len(packets):
+            return []
+        codes = packets.pd.astype(np.int32) << 8 | packets.message_type
+        found = []
+        for metric, metric_codes, channels in self._routes:
+            keep = np.isin(codes, metric_codes)
+            if channels is not None:
+                keep &= np.isin(packets.channel, channels)
+            rows = np.flatnonzero(keep)
+            if len(rows):
+                self.events += len(rows)
+                found.extend(metric.update(packets, rows))
+        self.batches += 1
+        if found:
+            latency = time() - start if start is not None else 0.0
+            self.latency = latency
+            self.max_latency = max(self.max_latency, latency)
+            for detection in found:
+                _logger.warning(
+                    "MetricEngine: {} ARFCN {} at {}: {} ({:.3f}s)".format(
+                        detection.metric, detection.arfcn, detection.timestamp,
+                        detection.description, latency))
+            self.detections.extend(found)
+            self.detected += len(found)
+        return found
+
+    def stats(self):
+        """ Messages seen and detections made.
+
+        Returns:
+            dict: ``events``, ``batches``, ``detections``, the
+            ``latency`` of the last detection and ``max_latency`` in
+            seconds.
+
+        """
+        return {"events": self.events, "batches": self.batches,
+                "detections": self.detected,
+                "latency": round(self.latency, 3),
+                "max_latency": round(self.max_latency, 3)}
+
+
 class Metrics(Process):
-    """ The metrics
+    """ Run the metrics on what the decoders decode.
+
+    Args:
+        process_id (str): name used in the logs.
+        q: the queue of :func:`metrics_item` tuples.
+        metrics: the :obj:`Metric` instances, ``None`` for one of each
+            of :py:data:`METRICS`.
+        live (bool): the frames are captured now, the latency is
+            measured from their capture time rather than from when a
+            decoder received the batch.
 
     """
 
-    def __init__(self, process_id, *args, **kwargs):
+    def __init__(self, process_id, q=None, metrics=None, live=False, *args,
+                 **kwargs):
         super(Metrics, self).__init__(*args, **kwargs)
         self.process_id = process_id
-        _logger.debug("{}: Process started successfully".format(self.process_id))
+        self.q = q
+        self.live = live
+        self.engine = MetricEngine(metrics)
+        # Shared so the manager can report them
+        self.events = mp.Value("q", 0)
+        self.detections = mp.Value("q", 0)
+        self.max_latency = mp.Value("d", 0.0)
         self.exit = mp.Event()
 
 
@@ -29,16 +571,68 @@ class Metrics(Process):
         """
 
         """
+        _logger.debug("{}: Process started successfully".format(
+            self.process_id))
         while not self.exit.is_set():
-            _logger.debug("{}: doing metrics stuff".format(self.process_id))
-            sleep(3)
+            if self.q is None:
+                self.exit.wait(IDLE_TIMEOUT)
+                continue
+            try:
+                self.feed(self.q.get(timeout=IDLE_TIMEOUT))
+            except Empty:
+                _logger.info("{}: Queue empty".format(self.process_id))
+        # The decoders have stopped, look at what they sent last
+        while self.q is not None:
+            try:
+                self.feed(self.q.get_nowait())
+            except Empty:
+                break
+        for metric in self.engine.metrics:
+            _logger.info("{}: {} {}".format(self.process_id, metric.name,
+                                            metric.stats()))
+        _logger.info("{}: {}".format(self.process_id, self.stats()))
         _logger.info("{}: Exiting".format(self.process_id))
 
 
+    def feed(self, item):
+        """ Update the metrics with a batch from a decoder.
+
+        Args:
+            item (tuple): see :func:`metrics_item`.
+
+        Returns:
+            list: the :obj:`Detection` found.
+
+        """
+        start, packets = item
+        if self.live and len(packets):
+            # The oldest frame waited longest, in the batcher and queues
+            start = float(packets.timestamp.min())
+        found = self.engine.feed(packets, start)
+        self.events.value = self.engine.events
+        self.detections.value = self.engine.detected
+        self.max_latency.value = self.engine.max_latency
+        return found
+
+
+    def stats(self):
+        """ Messages seen and detections made.
+
+        Returns:
+            dict: ``events``, ``detections``, ``max_latency`` in
+            seconds, and the ``queued`` batches if the queue can tell.
+
+        """
+        stats = {"events": self.events.value,
+                 "detections": self.detections.value,
+                 "max_latency": round(self.max_latency.value, 3)}
+        try:
+            stats["queued"] = self.q.qsize()
+        except (AttributeError, NotImplementedError):
+            pass
+        return stats
+
+
     def shutdown(self):
         _logger.info("{}: Recieved shutdown command".format(self.process_id))
         self.exit.set()
-
-
-if __name__ == "__main__":
-    decoder()
@@ -4,10 +4,10 @@
 
 """
 
-import sys
 import logging
 
-from antikythera.packets.packet import Packet
+from antikythera.packets.packet import Packet, LazyField
+from antikythera.packets.rr import IMMEDIATE_ASSIGNMENT
 
 __copyright__ = "Finding Ray"
 __license__ = "gpl3"
@@ -18,45 +18,71 @@ class  Assign(Packet):
     """ Immediate assignment packet attributes and factory.
 
     """
-    def __init__(self):
-        super().__init__()
-        self.packet_class = "Immediate Assignment"
+    __slots__ = ()
+
+    packet_class = "Immediate Assignment"
 
     class Factory:
         """ Immediate assignment packet factory.
 
+        Attributes:
+            types (dict): ``{type : packet class}`` of every type the
+                factory creates.
+
         """
+        types = {}
+
         @staticmethod
-        def create(type, data):
+        def create(type, data, unix_time=None):
             """ Create an immediate assignment packet of the given type.
 
             Args:
                 type (str): the type of packet subclass to create.
                 data: the data to construct the packet with.
+                unix_time (float): capture time of the packet.
+
+            Returns:
+                the packet, ``None`` if the type is unknown.
 
             """
-            if type == "Immediate": return Immediate(data)
-            else:
-                _logger.critical("Bad packet creation of type: " + type)
-                sys.exit(127)
+            constructor = Assign.Factory.types.get(type)
+            if constructor is None:
+                _logger.warning("Bad packet creation of type: {}".format(type))
+                return None
+            return constructor(data, unix_time)
 
 class Immediate(Assign):
     """ GSM Immediate Assignment Packet.
 
     Args:
         data: the data to construct the packet with.
+        unix_time (float): capture time of the packet.
 
     Attributes:
         time_slot: When to connect.
         page_mode: Extended Paging.
+        channel_type: The channel type and TDMA offset of the assigned
+            channel, ``0b00001`` is a TCH/F and ``0b01xxx`` an SDCCH/8.
+        timing_advance: The timing advance the mobile is assigned.
+        dedicated_mode: The dedicated mode or TBF octet.
+        ra: The random access reference the assignment answers.
 
     """
-    def __init__(self, data):
-        super().__init__()
-        self.data = self.decode(data)
-        self.time_slot = None
-        self.page_mode = None
+    __slots__ = ("_time_slot", "_page_mode", "_channel_type",
+                 "_timing_advance", "_dedicated_mode", "_ra")
+
+    layout = IMMEDIATE_ASSIGNMENT
+
+    time_slot = LazyField()
+    page_mode = LazyField()
+    channel_type = LazyField()
+    timing_advance = LazyField()
+    dedicated_mode = LazyField()
+    ra = LazyField()
+
     def __str__(self):
         return "Immediate assignment packet"
-    def decode(self, data):
-        return data
+
+Assign.Factory.types = {
+    "Immediate": Immediate,
+}
@@ -0,0 +1,408 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Columnar batches of decoded messages.
+
+A :obj:`PacketBatch` holds the messages of a batch of frames as NumPy
+columns, one row per message, so the metrics and storage can work on
+thousands of messages with array operations instead of one packet
+object at a time. The frame records sent by the capture have a fixed
+layout, see :py:data:`antikythera.gsmtap.FRAME_RECORD`, and are read
+into the columns in place with :py:data:`FRAME_DTYPE`.
+
+The mobile identities of paging requests are decoded for the whole
+batch at once, see :mod:`antikythera.packets.identities`.
+
+Fields a message may hold several of, the TMSIs of a paging request or
+the ARFCNs of a neighbour list, are ragged columns: the values of all
+rows in one array and an offsets array where the values of row ``i``
+are ``values[offsets[i]:offsets[i + 1]]``.
+
+Example:
+    Count the TMSIs paged on each ARFCN of a batch from the queue::
+
+        from antikythera.packets.batch import PacketBatch
+
+        packets = PacketBatch.from_records(q.get())
+        counts = np.bincount(packets.arfcn,
+                             weights=np.diff(packets.tmsi_offsets))
+
+    Existing code reading packet attributes gets a packet per row::
+
+        for packet in packets:
+            packet.cell_id
+
+"""
+
+import sys
+import logging
+
+from antikythera.gsmtap import FRAME_SIZE, FRAME_PAYLOAD_SIZE, pack_frames
+from antikythera.l3 import (L3_OFFSETS, LAPDM_SIZE, PD_RR, PD_CC, PD_MM,
+                            PD_SS, RR_SYSTEM_INFORMATION_2,
+                            RR_SYSTEM_INFORMATION_2BIS,
+                            RR_SYSTEM_INFORMATION_2TER,
+                            RR_SYSTEM_INFORMATION_3, RR_SYSTEM_INFORMATION_4,
+                            RR_PAGING_REQUEST_1, RR_PAGING_REQUEST_2,
+                            RR_PAGING_REQUEST_3)
+from antikythera.packets import rr
+from antikythera.packets.factory import PacketFactory
+from antikythera.packets.identities import (MESSAGE_WIDTH, fill_page,
+                                            paging_identities)
+
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError as e:
+    _logger.error("PacketBatch: {}".format(e))
+    _logger.info("PacketBatch: Maybe try `pip install -r requirements.txt'")
+    sys.exit(1)
+
+
+# A frame record as a NumPy structured type, see FRAME_RECORD
+FRAME_DTYPE = np.dtype([
+    ("timestamp", "<f8"),
+    ("frame_nr", "<u4"),
+    ("arfcn", "<u2"),
+    ("type", "u1"),
+    ("channel", "u1"),
+    ("timeslot", "u1"),
+    ("signal_dbm", "i1"),
+    ("length", "u1"),
+    ("payload", "u1", (FRAME_PAYLOAD_SIZE,)),
+])
+assert FRAME_DTYPE.itemsize == FRAME_SIZE
+
+# L3 offset of each GSMTAP channel, -1 where there is no layer 3 message
+_OFFSETS = np.full(256, -1, dtype=np.intp)
+for _channel, _offset in L3_OFFSETS.items():
+    _OFFSETS[_channel] = _offset
+
+_SEQUENCED = np.array([PD_CC, PD_MM, PD_SS], dtype=np.uint8)
+
+_PAGING = (RR_PAGING_REQUEST_1, RR_PAGING_REQUEST_2, RR_PAGING_REQUEST_3)
+_NEIGHBORS = (RR_SYSTEM_INFORMATION_2, RR_SYSTEM_INFORMATION_2BIS,
+              RR_SYSTEM_INFORMATION_2TER)
+
+# Missing LAC or cell ID
+NONE = -1
+
+
+class PacketBatch(object):
+    """ The messages of a batch of frames as columns.
+
+    Args:
+        **columns: the arrays of :py:data:`COLUMNS` and
+            :py:data:`RAGGED`, columns not given are empty.
+
+    Attributes:
+        timestamp: capture time of each message, ``float64``.
+        arfcn: ARFCN with the GSMTAP flag bits, ``uint16``.
+        frame_nr: GSM TDMA frame number, ``uint32``.
+        channel: GSMTAP channel (sub) type, ``uint8``.
+        pd: protocol discriminator, ``uint8``.
+        message_type: message type, ``uint8``.
+        lac: Location Area Code of System Information 3 and 4, else
+            :py:data:`NONE`, ``int32``.
+        cell_id: Cell ID of System Information 3, else :py:data:`NONE`,
+            ``int32``.
+        imsi: IMSI paged, an empty string if none, ``str``.
+        tmsis, tmsi_offsets: ragged TMSIs and P-TMSIs paged, ``uint32``.
+        neighbors, neighbor_offsets: ragged neighbour cell ARFCNs of
+            System Information 2, 2bis, and 2ter, ``uint16``.
+        payload: the frame payloads, a ``uint8`` matrix.
+        l3_offset: where the layer 3 message starts in ``payload``.
+        length: the payload length.
+
+    """
+    COLUMNS = ("timestamp", "arfcn", "frame_nr", "channel", "pd",
+               "message_type", "lac", "cell_id", "imsi", "payload",
+               "l3_offset", "length")
+    RAGGED = (("tmsis", "tmsi_offsets"), ("neighbors", "neighbor_offsets"))
+
+    _dtypes = {
+        "timestamp": np.float64, "arfcn": np.uint16, "frame_nr": np.uint32,
+        "channel": np.uint8, "pd": np.uint8, "message_type": np.uint8,
+        "lac": np.int32, "cell_id": np.int32, "imsi": "U15",
+        "l3_offset": np.intp, "length": np.uint8,
+        "tmsis": np.uint32, "neighbors": np.uint16,
+    }
+
+    def __init__(self, **columns):
+        for name in self.COLUMNS:
+            if name == "payload":
+                empty = np.empty((0, FRAME_PAYLOAD_SIZE), dtype=np.uint8)
+            else:
+                empty = np.empty(0, dtype=self._dtypes[name])
+            setattr(self, name, columns.get(name, empty))
+        for values, offsets in self.RAGGED:
+            empty = np.empty(0, dtype=self._dtypes[values])
+            setattr(self, values, columns.get(values, empty))
+            empty = np.zeros(len(self.timestamp) + 1, dtype=np.intp)
+            setattr(self, offsets, columns.get(offsets, empty))
+
+    def __len__(self):
+        return len(self.timestamp)
+
+    def __getitem__(self, index):
+        """ The packet object of a row, ``None`` if it has no packet
+        class.
+
+        The identities of a paging request are taken from the columns
+        instead of being decoded again.
+
+        """
+        pd = int(self.pd[index])
+        message_type = int(self.message_type[index])
+        packet = PacketFactory.createMessage(pd, message_type,
+                                             self.message(index),
+                                             float(self.timestamp[index]))
+        if packet is not None and pd == PD_RR and message_type in _PAGING:
+            fill_page(packet, self.imsi[index], self.tmsis_of(index).tolist())
+        return packet
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def message(self, index):
+        """ The layer 3 message of a row.
+
+        Returns:
+            bytes: the message from the protocol discriminator on.
+
+        """
+        start, end = self.l3_offset[index], self.length[index]
+        return self.payload[index, start:end].tobytes()
+
+    def tmsis_of(self, index):
+        """ The TMSIs paged in a row.
+
+        """
+        offsets = self.tmsi_offsets
+        return self.tmsis[offsets[index]:offsets[index + 1]]
+
+    def neighbors_of(self, index):
+        """ The neighbour cell ARFCNs of a row.
+
+        """
+        offsets = self.neighbor_offsets
+        return self.neighbors[offsets[index]:offsets[index + 1]]
+
+    def select(self, rows):
+        """ A batch of some of the rows.
+
+        Args:
+            rows: a boolean mask or an array of row indices.
+
+        Returns:
+            :obj:`PacketBatch`
+
+        """
+        rows = np.arange(len(self))[rows]
+        columns = {name: getattr(self, name)[rows] for name in self.COLUMNS}
+        for values, offsets in self.RAGGED:
+            columns[values], columns[offsets] = _take_ragged(
+                getattr(self, values), getattr(self, offsets), rows)
+        return PacketBatch(**columns)
+
+    @classmethod
+    def concatenate(cls, batches):
+        """ One batch of the rows of several.
+
+        """
+        batches = [batch for batch in batches if len(batch)]
+        if not batches:
+            return cls()
+        columns = {name: np.concatenate([getattr(b, name) for b in batches])
+                   for name in cls.COLUMNS}
+        for values, offsets in cls.RAGGED:
+            columns[values] = np.concatenate([getattr(b, values)
+                                              for b in batches])
+            starts = np.cumsum([0] + [len(getattr(b, values))
+                                      for b in batches[:-1]])
+            columns[offsets] = np.concatenate(
+                [getattr(batches[0], offsets)[:1]] +
+                [getattr(b, offsets)[1:] + start
+                 for b, start in zip(batches, starts)])
+        return cls(**columns)
+
+    @classmethod
+    def from_frames(cls, frames):
+        """ Build a batch from :obj:`antikythera.gsmtap.Frame` objects.
+
+        """
+        return cls.from_records(pack_frames(frames))
+
+    @classmethod
+    def from_records(cls, buffer):
+        """ Build a batch from packed frame records.
+
+        Frames without a layer 3 message are left out.
+
+        Args:
+            buffer: records made by :func:`antikythera.gsmtap.pack_frames`,
+                any object supporting the buffer protocol, or an array of
+                :py:data:`FRAME_DTYPE`.
+
+        Returns:
+            :obj:`PacketBatch`
+
+        """
+        records = _records(buffer)
+        keep, offset, pd, message_type = frame_headers(records)
+        records = records[keep]
+        payload = records["payload"]
+        length = records["length"]
+        offset, pd, message_type = offset[keep], pd[keep], message_type[keep]
+        rows = np.arange(len(records))
+
+        rr_rows = pd == PD_RR
+
+        lac = np.full(len(records), NONE, dtype=np.int32)
+        cell_id = np.full(len(records), NONE, dtype=np.int32)
+        si3 = (rr_rows & (message_type == RR_SYSTEM_INFORMATION_3)
+               & (length >= offset + rr.SYSTEM_INFORMATION_3.size))
+        si4 = (rr_rows & (message_type == RR_SYSTEM_INFORMATION_4)
+               & (length >= offset + rr.SYSTEM_INFORMATION_4.size))
+        cell_id[si3] = _u16(payload, rows[si3], offset[si3] + 2)
+        lac[si3] = _u16(payload, rows[si3], offset[si3] + 7)
+        lac[si4] = _u16(payload, rows[si4], offset[si4] + 5)
+
+        batch = cls(timestamp=records["timestamp"].copy(),
+                    arfcn=records["arfcn"].copy(),
+                    frame_nr=records["frame_nr"].copy(),
+                    channel=records["channel"].copy(),
+                    pd=pd, message_type=message_type, lac=lac,
+                    cell_id=cell_id,
+                    imsi=np.full(len(records), "", dtype="U15"),
+                    payload=payload.copy(), l3_offset=offset,
+                    length=length.copy())
+        paging = rr_rows & np.isin(message_type, list(_PAGING))
+        batch._decode_identities(paging)
+        batch._decode_neighbors(rr_rows & np.isin(message_type, _NEIGHBORS))
+        return batch
+
+    def _decode_identities(self, paging):
+        """ Fill ``imsi`` and the ragged ``tmsis`` of the paging rows.
+
+        The messages are aligned on the protocol discriminator and
+        decoded together, see
+        :func:`antikythera.packets.identities.paging_identities`.
+
+        """
+        rows = np.flatnonzero(paging)
+        width = max(MESSAGE_WIDTH, FRAME_PAYLOAD_SIZE)
+        padded = np.zeros((len(rows), FRAME_PAYLOAD_SIZE + width),
+                          dtype=np.uint8)
+        padded[:, :FRAME_PAYLOAD_SIZE] = self.payload[rows]
+        offset = self.l3_offset[rows]
+        matrix = padded[np.arange(len(rows))[:, None],
+                        offset[:, None] + np.arange(width)]
+        lengths = self.length[rows].astype(np.intp) - offset
+        matrix[np.arange(width) >= lengths[:, None]] = 0
+
+        imsi, tmsis, offsets = paging_identities(matrix, lengths,
+                                                 self.message_type[rows])
+        self.imsi[rows] = imsi
+        counts = np.zeros(len(self), dtype=np.intp)
+        counts[rows] = np.diff(offsets)
+        self.tmsis = tmsis
+        self.tmsi_offsets = _offsets(counts)
+
+    def _decode_neighbors(self, neighbors):
+        """ Fill the ragged ``neighbors`` of the System Information 2,
+        2bis, and 2ter rows.
+
+        """
+        arfcns = []
+        counts = np.zeros(len(self), dtype=np.intp)
+        # Cells repeat their System Information, decode each list once
+        decoded = {}
+        for index in np.flatnonzero(neighbors):
+            start = self.l3_offset[index] + 2
+            octets = self.payload[index, start:start + 16].tobytes()
+            if self.message_type[index] == RR_SYSTEM_INFORMATION_2TER:
+                decode = rr.extended_frequency_list
+            else:
+                decode = rr.frequency_list
+            key = (decode, octets)
+            if key not in decoded:
+                decoded[key] = decode(octets)
+            arfcns.extend(decoded[key])
+            counts[index] = len(decoded[key])
+        self.neighbors = np.array(arfcns, dtype=np.uint16)
+        self.neighbor_offsets = _offsets(counts)
+
+
+def frame_headers(records):
+    """ The layer 3 header of each frame record, read without decoding
+    the messages.
+
+    Args:
+        records: an array of :py:data:`FRAME_DTYPE`.
+
+    Returns:
+        tuple: ``(keep, offset, pd, message_type)`` arrays, ``keep`` is
+        ``False`` for frames without a layer 3 message, the other
+        arrays only hold meaningful values where it is ``True``.
+
+    """
+    payload = records["payload"]
+    length = records["length"]
+    offset = _OFFSETS[records["channel"]]
+    rows = np.arange(len(records))
+
+    keep = (offset >= 0) & (length >= offset + 2)
+    # LAPDm frames without an information field
+    lapdm = payload[rows, np.maximum(offset - 1, 0)] >> 2
+    keep &= (offset < LAPDM_SIZE) | (lapdm >= 2)
+
+    # Frames without a header read the first two octets instead
+    columns = np.where(keep, offset, 0)
+    pd = payload[rows, columns] & 0x0f
+    message_type = payload[rows, columns + 1]
+    message_type = np.where(np.isin(pd, _SEQUENCED), message_type & 0x3f,
+                            message_type)
+    return keep, offset, pd, message_type
+
+
+def _records(buffer):
+    """ Frame records as an array of :py:data:`FRAME_DTYPE`.
+
+    """
+    if isinstance(buffer, np.ndarray) and buffer.dtype == FRAME_DTYPE:
+        return buffer
+    return np.frombuffer(buffer, dtype=FRAME_DTYPE)
+
+
+def _u16(payload, rows, columns):
+    """ Big endian 16 bit values at ``columns`` of the ``rows``.
+
+    """
+    return (payload[rows, columns].astype(np.int32) << 8
+            | payload[rows, columns + 1])
+
+
+def _offsets(counts):
+    """ Ragged offsets from the number of values in each row.
+
+    """
+    offsets = np.zeros(len(counts) + 1, dtype=np.intp)
+    np.cumsum(counts, out=offsets[1:])
+    return offsets
+
+
+def _take_ragged(values, offsets, rows):
+    """ The ragged values and offsets of some rows.
+
+    """
+    starts = offsets[rows]
+    counts = offsets[rows + 1] - starts
+    new_offsets = _offsets(counts)
+    index = (np.repeat(starts - new_offsets[:-1], counts)
+             + np.arange(new_offsets[-1]))
+    return values[index], new_offsets
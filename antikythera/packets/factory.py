@@ -24,6 +24,13 @@
             >>> sys_pkt.data
             'B'
 
+        Decoders that have the layer 3 header of a frame create packets
+        by its protocol discriminator and message type instead, see
+        :py:meth:`PacketFactory.createMessage()`. Each pair is looked up
+        in :py:data:`PacketFactory.messages` with a single dictionary
+        lookup and new messages are registered with
+        :py:meth:`PacketFactory.addMessage()`.
+
     Note:
         The ``Factory`` objects that will be added must each be imported.
 
@@ -31,13 +38,48 @@
 
 import logging
 
+from collections import Counter
+
 # Local Imports
+from antikythera.l3 import (PD_RR, RR_SYSTEM_INFORMATION_1,
+                            RR_SYSTEM_INFORMATION_2,
+                            RR_SYSTEM_INFORMATION_2TER,
+                            RR_SYSTEM_INFORMATION_2QUATER,
+                            RR_SYSTEM_INFORMATION_3, RR_SYSTEM_INFORMATION_4,
+                            RR_SYSTEM_INFORMATION_13, RR_PAGING_REQUEST_1,
+                            RR_PAGING_REQUEST_2, RR_PAGING_REQUEST_3,
+                            RR_IMMEDIATE_ASSIGNMENT)
+from antikythera.packets import system, page, assign
 from antikythera.packets.system import System
-from antikythera.packets.page import Page 
+from antikythera.packets.page import Page
 from antikythera.packets.assign import Assign
 
 # from antikythera import __version__
 
+_logger = logging.getLogger(__name__)
+
+# Factories createPacket() falls back to when an id was not added
+FACTORIES = {
+    "System": System.Factory,
+    "Page": Page.Factory,
+    "Assign": Assign.Factory,
+}
+
+# Packet class of each (protocol discriminator, message type)
+MESSAGES = {
+    (PD_RR, RR_SYSTEM_INFORMATION_1): system.Type1,
+    (PD_RR, RR_SYSTEM_INFORMATION_2): system.Type2,
+    (PD_RR, RR_SYSTEM_INFORMATION_2TER): system.Type2ter,
+    (PD_RR, RR_SYSTEM_INFORMATION_2QUATER): system.Type2quarter,
+    (PD_RR, RR_SYSTEM_INFORMATION_3): system.Type3,
+    (PD_RR, RR_SYSTEM_INFORMATION_4): system.Type4,
+    (PD_RR, RR_SYSTEM_INFORMATION_13): system.Type13,
+    (PD_RR, RR_PAGING_REQUEST_1): page.Type1,
+    (PD_RR, RR_PAGING_REQUEST_2): page.Type2,
+    (PD_RR, RR_PAGING_REQUEST_3): page.Type3,
+    (PD_RR, RR_IMMEDIATE_ASSIGNMENT): assign.Immediate,
+}
+
 class PacketFactory:
     """ A Polymorphic Packet Factory
 
@@ -46,9 +88,15 @@ class PacketFactory:
     Attributes:
         factories (dict): a dictionary containing some identifier value as keys
             and ``Factory`` objects stored as the pair. 
+        messages (dict): ``{(pd, message type) : constructor}`` pairs,
+            initially :py:data:`MESSAGES`.
+        unknown (:obj:`collections.Counter`): the identifiers and types, or
+            ``(pd, message type)`` pairs, no packet could be created for.
 
     """
     factories = {}
+    messages = dict(MESSAGES)
+    unknown = Counter()
 
 
     @staticmethod
@@ -65,7 +113,7 @@ class PacketFactory:
 
 
     @staticmethod
-    def createPacket(id, type, data):
+    def createPacket(id, type, data, unix_time=None):
         """ Create a packet
 
         Packets are created from the given identifier coresponding to a
@@ -81,6 +129,7 @@ class PacketFactory:
                 factory selected.
             data: the data to construct the packet from, type is dependant
                 on ``Factory``.
+            unix_time (float): capture time of the packet.
 
         Returns:
             :obj:`antikythera.packets.packet.Packet`:
@@ -92,6 +141,57 @@ class PacketFactory:
                 parameter and its attributes depend on that input.
 
         """
-        if PacketFactory.factories[id] not in PacketFactory.factories:
-            PacketFactory.factories[id] = eval(id + '.Factory()')
-        return PacketFactory.factories[id].create(type, data)
+        factory = PacketFactory.factories.get(id)
+        if factory is None:
+            factory = FACTORIES.get(id)
+            if factory is None:
+                _logger.warning("Unknown packet factory: {}".format(id))
+                PacketFactory.unknown[(id, type)] += 1
+                return None
+            PacketFactory.factories[id] = factory
+        packet = factory.create(type, data, unix_time)
+        if packet is None:
+            PacketFactory.unknown[(id, type)] += 1
+        return packet
+
+
+    @staticmethod
+    def addMessage(pd, message_type, constructor):
+        """ Register the packet constructor of a layer 3 message.
+
+        Args:
+            pd (int): the protocol discriminator.
+            message_type (int): the message type, see
+                :func:`antikythera.l3.l3_header`.
+            constructor: called with the layer 3 message, returns a
+                :obj:`antikythera.packets.packet.Packet`.
+
+        """
+        PacketFactory.messages[(pd, message_type)] = constructor
+
+
+    @staticmethod
+    def createMessage(pd, message_type, data, unix_time=None):
+        """ Create a packet from a layer 3 message.
+
+        Unlike :py:meth:`createPacket` this is meant for the decode loop,
+        the constructor is found with one dictionary lookup and messages
+        without one are counted in :py:data:`unknown` and skipped.
+
+        Args:
+            pd (int): the protocol discriminator.
+            message_type (int): the message type.
+            data: the layer 3 message, see
+                :func:`antikythera.l3.l3_message`.
+            unix_time (float): capture time of the frame.
+
+        Returns:
+            :obj:`antikythera.packets.packet.Packet`: the packet, or
+            ``None`` if the message is unknown.
+
+        """
+        constructor = PacketFactory.messages.get((pd, message_type))
+        if constructor is None:
+            PacketFactory.unknown[(pd, message_type)] += 1
+            return None
+        return constructor(data, unix_time)
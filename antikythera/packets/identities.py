@@ -0,0 +1,256 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Decode the mobile identities of many paging requests at once.
+
+Paging requests carry up to four mobile identities, a TMSI or P-TMSI
+as a 32 bit number or an IMSI as BCD digits. During a paging storm
+decoding them one message at a time is most of the decoder's work, here
+the messages are a NumPy byte matrix, one message per row aligned on the
+protocol discriminator, and every identity is decoded with array
+operations on the whole matrix.
+
+The results match :func:`antikythera.packets.rr.paging_identities`:
+the first IMSI of a message and all its TMSIs in order.
+
+Example:
+    Fill the identities of a list of paging packets::
+
+        from antikythera.packets.identities import decode_pages
+
+        decode_pages(packets)
+        packets[0].tmsis
+
+"""
+
+import sys
+import logging
+
+from antikythera.l3 import (RR_PAGING_REQUEST_1, RR_PAGING_REQUEST_2,
+                            RR_PAGING_REQUEST_3)
+from antikythera.packets.rr import (IEI_MOBILE_IDENTITY, MI_IMSI, MI_TMSI,
+                                    BCD_DIGITS, PAGING_REQUEST_1,
+                                    PAGING_REQUEST_2, PAGING_REQUEST_3)
+
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError as e:
+    _logger.error("Identities: {}".format(e))
+    _logger.info("Identities: Maybe try `pip install -r requirements.txt'")
+    sys.exit(1)
+
+
+# Longest IMSI and the octets of its Mobile Identity value
+IMSI_DIGITS = 15
+IMSI_OCTETS = 8
+
+# Columns read past the longest paging request, reads beyond a message
+# land in this zero padding
+MESSAGE_WIDTH = 23 + 2 + IMSI_OCTETS
+
+_DIGITS = np.frombuffer(BCD_DIGITS.encode("ascii") + b"\0", dtype=np.uint8)
+
+# Messages shorter than the fixed part are not decoded
+_SIZES = {
+    RR_PAGING_REQUEST_1: PAGING_REQUEST_1.size,
+    RR_PAGING_REQUEST_2: PAGING_REQUEST_2.size,
+    RR_PAGING_REQUEST_3: PAGING_REQUEST_3.size,
+}
+
+# Fixed TMSI positions of Paging Request Type 2 and 3
+_FIXED_TMSIS = {
+    RR_PAGING_REQUEST_2: (3, 7),
+    RR_PAGING_REQUEST_3: (3, 7, 11, 15),
+}
+
+
+def message_matrix(messages):
+    """ Stack layer 3 messages into a zero padded byte matrix.
+
+    Args:
+        messages: bytes like layer 3 messages.
+
+    Returns:
+        tuple: ``(matrix, lengths)`` with one message per row.
+
+    """
+    lengths = np.array([len(m) for m in messages], dtype=np.intp)
+    width = max(MESSAGE_WIDTH, lengths.max(initial=0))
+    matrix = np.zeros((len(messages), width), dtype=np.uint8)
+    for row, message in enumerate(messages):
+        matrix[row, :len(message)] = np.frombuffer(message, dtype=np.uint8)
+    return matrix, lengths
+
+
+def paging_identities(matrix, lengths, message_types):
+    """ The identities of paging requests.
+
+    Args:
+        matrix: ``uint8`` matrix of layer 3 messages from the protocol
+            discriminator on, at least :py:data:`MESSAGE_WIDTH` wide and
+            zero past the end of each message.
+        lengths: the length of each message.
+        message_types: the RR message type of each row, rows that are
+            not paging requests get no identities.
+
+    Returns:
+        tuple: ``(imsi, tmsis, tmsi_offsets)``, the IMSI of each row as
+        a ``U15`` array with an empty string for none and the ragged
+        ``uint32`` TMSIs of each row.
+
+    """
+    matrix = np.asarray(matrix, dtype=np.uint8)
+    lengths = np.asarray(lengths, dtype=np.intp)
+    message_types = np.asarray(message_types)
+    count = len(matrix)
+    short = np.zeros(count, dtype=bool)
+    for message_type, size in _SIZES.items():
+        short |= (message_types == message_type) & (lengths < size)
+    message_types = np.where(short, 0, message_types)
+    if matrix.shape[1] < MESSAGE_WIDTH:
+        matrix = np.pad(matrix, ((0, 0), (0, MESSAGE_WIDTH - matrix.shape[1])))
+    rows = np.arange(count)
+
+    # (row, order, kind, start, length) of every identity, start is the
+    # octet holding the type, the value of a fixed TMSI starts one later
+    entries = []
+
+    type1 = message_types == RR_PAGING_REQUEST_1
+    start = np.full(count, 4, dtype=np.intp)
+    size = matrix[:, 3].astype(np.intp)
+    entries.append(_lv(matrix, lengths, type1 & (lengths > 3), start, size, 0))
+    optional = start + size
+    entries.append(_optional(matrix, lengths, type1, optional, 1))
+
+    for message_type, positions in _FIXED_TMSIS.items():
+        selected = message_types == message_type
+        paged = rows[selected]
+        for order, position in enumerate(positions):
+            entries.append((paged, np.full(len(paged), order),
+                            np.full(len(paged), MI_TMSI),
+                            np.full(len(paged), position - 1, dtype=np.intp),
+                            np.full(len(paged), 5)))
+        if message_type == RR_PAGING_REQUEST_2:
+            element = np.full(count, 11, dtype=np.intp)
+            entries.append(_optional(matrix, lengths, selected, element, 2))
+
+    row, order, kind, start, size = (np.concatenate(column)
+                                     for column in zip(*entries))
+    sort = np.lexsort((order, row))
+    row, kind, start, size = row[sort], kind[sort], start[sort], size[sort]
+
+    is_tmsi = (kind == MI_TMSI) & (size >= 5)
+    tmsis = _u32(matrix, row[is_tmsi], start[is_tmsi] + 1)
+    tmsi_offsets = np.zeros(count + 1, dtype=np.intp)
+    np.cumsum(np.bincount(row[is_tmsi], minlength=count), out=tmsi_offsets[1:])
+
+    imsi = np.full(count, "", dtype="U{}".format(IMSI_DIGITS))
+    is_imsi = kind == MI_IMSI
+    first, index = np.unique(row[is_imsi], return_index=True)
+    imsi[first] = _bcd(matrix, first, start[is_imsi][index],
+                       size[is_imsi][index])
+    return imsi, tmsis, tmsi_offsets
+
+
+def decode_pages(packets):
+    """ Decode the identities of paging packets and cache them.
+
+    The identity attributes of each packet are set, see
+    :func:`fill_page`. Packets without bytes like
+    data are left alone.
+
+    Args:
+        packets: :obj:`antikythera.packets.page.Page` packets.
+
+    """
+    packets = [p for p in packets
+               if isinstance(p.data, (bytes, bytearray, memoryview))]
+    if not packets:
+        return
+    matrix, lengths = message_matrix([p.data for p in packets])
+    imsi, tmsis, offsets = paging_identities(matrix, lengths, matrix[:, 1])
+    for row, packet in enumerate(packets):
+        if lengths[row] >= packet.layout.size:
+            fill_page(packet, imsi[row], tmsis[offsets[row]:offsets[row + 1]])
+
+
+def fill_page(packet, imsi, tmsis):
+    """ Set the identities of a paging packet from decoded values.
+
+    P-TMSIs are coded like TMSIs on the CCCH, they are in ``tmsis`` and
+    the ``ptmsi`` or ``ptmsis`` of the packet are left empty.
+
+    Args:
+        packet: a :obj:`antikythera.packets.page.Page` packet.
+        imsi (str): the IMSI, an empty string for none.
+        tmsis: the TMSIs in order.
+
+    """
+    packet.tmsis = [int(tmsi) for tmsi in tmsis]
+    cls = type(packet)
+    if hasattr(cls, "imsi"):
+        packet.imsi = str(imsi) or None
+    if hasattr(cls, "ptmsi"):
+        packet.ptmsi = None
+    if hasattr(cls, "ptmsis"):
+        packet.ptmsis = []
+
+
+def _lv(matrix, lengths, valid, start, size, order):
+    """ A length prefixed Mobile Identity of the ``valid`` rows.
+
+    """
+    valid = valid & (size > 0) & (start + size <= lengths)
+    rows = np.flatnonzero(valid)
+    kind = matrix[rows, start[rows]] & 0x07
+    return rows, np.full(len(rows), order), kind, start[rows], size[rows]
+
+
+def _optional(matrix, lengths, valid, position, order):
+    """ An optional Mobile Identity element at ``position`` of the
+    ``valid`` rows.
+
+    """
+    position = np.minimum(position, matrix.shape[1] - 2)
+    rows = np.arange(len(matrix))
+    valid = (valid & (position < lengths)
+             & (matrix[rows, position] == IEI_MOBILE_IDENTITY))
+    size = matrix[rows, position + 1].astype(np.intp)
+    return _lv(matrix, lengths, valid, position + 2, size, order)
+
+
+def _u32(matrix, rows, start):
+    """ Big endian 32 bit values at ``start`` of the ``rows``.
+
+    """
+    columns = start[:, None] + np.arange(4)
+    octets = matrix[rows[:, None], columns].astype(np.uint32)
+    return (octets[:, 0] << 24 | octets[:, 1] << 16 | octets[:, 2] << 8
+            | octets[:, 3])
+
+
+def _bcd(matrix, rows, start, size):
+    """ The IMSI digits of the Mobile Identities at ``start`` of the
+    ``rows``.
+
+    """
+    columns = np.minimum(start[:, None] + np.arange(IMSI_OCTETS),
+                         matrix.shape[1] - 1)
+    octets = matrix[rows[:, None], columns]
+    # Digit 1 is the high nibble of the type octet, then low and high
+    # nibbles of each following octet
+    nibbles = np.empty((len(rows), IMSI_DIGITS), dtype=np.uint8)
+    nibbles[:, 0] = octets[:, 0] >> 4
+    nibbles[:, 1::2] = octets[:, 1:] & 0x0f
+    nibbles[:, 2::2] = octets[:, 1:] >> 4
+    position = np.arange(IMSI_DIGITS)
+    # A 0xf nibble ends the number, so does the end of the element
+    valid = ((position < 2 * size[:, None] - 1)
+             & (np.cumsum(nibbles == 0x0f, axis=1) == 0))
+    digits = np.where(valid, _DIGITS[nibbles], 0).astype(np.uint8)
+    digits = np.ascontiguousarray(digits).view("S{}".format(IMSI_DIGITS))
+    return digits.ravel().astype("U{}".format(IMSI_DIGITS))
@@ -10,10 +10,10 @@ Todo:
 # Standard Library
 import logging
 
-from time import time
-from datetime import datetime
+from datetime import datetime, timezone
 
 # Local
+from antikythera.packets.rr import decode as decode_layout, decode_field
 
 
 __copyright__ = "Finding Ray"
@@ -21,16 +21,151 @@ __license__ = "gpl3"
 
 _logger = logging.getLogger(__name__)
 
+class LazyField(object):
+    """ A packet attribute decoded from the message when first read.
+
+    The decoded value is kept in the ``_<name>`` slot of the packet, a
+    class with a lazy ``cell_id`` declares ``"_cell_id"`` in its
+    ``__slots__`` and::
+
+        cell_id = LazyField()
+
+    Reading the attribute asks the packet to decode it with
+    :py:meth:`Packet.decode_field`, if the message does not hold it the
+    default is cached instead. Setting the attribute replaces the cached
+    value.
+
+    Args:
+        default: the value if the field cannot be decoded.
+        factory: called to make the default instead, for mutable ones.
+
+    """
+    def __init__(self, default=None, factory=None):
+        self.default = default
+        self.factory = factory
+
+    def __set_name__(self, owner, name):
+        self.name = name
+        self.slot = owner.__dict__["_" + name]
+
+    def __get__(self, packet, owner=None):
+        if packet is None:
+            return self
+        try:
+            return self.slot.__get__(packet, owner)
+        except AttributeError:
+            pass
+        fields = packet.decode_field(self.name)
+        if self.name in fields:
+            return fields[self.name]
+        value = self.default if self.factory is None else self.factory()
+        self.slot.__set__(packet, value)
+        return value
+
+    def __set__(self, packet, value):
+        self.slot.__set__(packet, value)
+
+
+# {packet class : {name : LazyField}}
+_LAZY_FIELDS = {}
+
+
+def _lazy_fields(cls):
+    """ The :obj:`LazyField` attributes of a packet class by name.
+
+    """
+    fields = _LAZY_FIELDS.get(cls)
+    if fields is None:
+        fields = _LAZY_FIELDS[cls] = {
+            name: value
+            for klass in reversed(cls.__mro__)
+            for name, value in vars(klass).items()
+            if isinstance(value, LazyField)}
+    return fields
+
+
 class Packet(object):
     """ Initialization of attributes common to all packets.
 
+    Packets are made for every message on the CCCH so they are kept
+    small, every class declares its attributes in ``__slots__`` and
+    nothing is computed until it is asked for. The fields of a message
+    are :obj:`LazyField` attributes decoded from ``data`` on first read
+    with the ``layout`` of the class.
+
+    Args:
+        data: the layer 3 message from the protocol discriminator on,
+            anything that is not bytes like is kept but not decoded.
+        unix_time (float): capture time of the frame the packet was
+            decoded from.
+
     Attributes:
-        unix_time (float): packet creation time in seconds since UNIX epoch.
-        timestamp (str): packet creation time human readable format.
+        data: the message the packet was made from.
+        unix_time (float): capture time in seconds since UNIX epoch,
+            ``None`` if the packet was not made from a capture.
+        timestamp (:obj:`datetime.datetime`): capture time in UTC,
+            derived from ``unix_time`` when read.
         location: location packet was received.
+        layout (:obj:`antikythera.packets.rr.Layout`): the layout of the
+            message type, ``None`` if it is not decoded.
+        post: called with the fields of a complete decode before they
+            are cached, ``None`` caches them as they are.
 
     """
-    def __init__(self):
-        self.unix_time = time()
-        self.timestamp = datetime.utcnow()
-        self.location = "location stub"
+    __slots__ = ("unix_time", "data")
+
+    location = "location stub"
+    layout = None
+    post = None
+
+    def __init__(self, data=None, unix_time=None):
+        self.unix_time = unix_time
+        self.data = self.decode(data)
+
+    @property
+    def timestamp(self):
+        if self.unix_time is None:
+            return None
+        return datetime.fromtimestamp(self.unix_time, timezone.utc)
+
+    def decode(self, data):
+        return data
+
+    def decode_field(self, name):
+        """ Decode a field of the message and cache it.
+
+        A fixed position field is decoded on its own, any other field
+        decodes the rest of the message too and every field found is
+        cached unless it was already.
+
+        Args:
+            name (str): the attribute name.
+
+        Returns:
+            dict: the fields of the packet decoded, a field that was
+            cached before keeps its cached value.
+
+        """
+        data = self.data
+        layout = self.layout
+        if layout is None or not isinstance(data, (bytes, bytearray,
+                                                   memoryview)):
+            return {}
+        lazy = _lazy_fields(type(self))
+        if name in layout.single:
+            fields = decode_field(layout, data, name)
+            if fields:
+                lazy[name].slot.__set__(self, fields[name])
+            return fields
+        fields = decode_layout(layout, data)
+        if fields and self.post is not None:
+            fields = self.post(fields)
+        for key, value in list(fields.items()):
+            field = lazy.get(key)
+            if field is None:
+                del fields[key]
+            elif hasattr(self, "_" + key):
+                fields[key] = field.slot.__get__(self)
+            else:
+                field.slot.__set__(self, value)
+        return fields
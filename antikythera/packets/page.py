@@ -2,12 +2,16 @@
 # -*- coding: utf-8 -*-
 """ GSM paging packets.
 
+The identities of many paging packets are decoded at once by
+:func:`antikythera.packets.identities.decode_pages`.
+
 """
 
-import sys
 import logging
 
-from antikythera.packets.packet import Packet
+from antikythera.packets.packet import Packet, LazyField
+from antikythera.packets.rr import (PAGING_REQUEST_1, PAGING_REQUEST_2,
+                                    PAGING_REQUEST_3, paging_identities)
 
 __copyright__ = "Finding Ray"
 __license__ = "gpl3"
@@ -18,35 +22,45 @@ class  Page(Packet):
     """ Paging packet attributes and factory.
 
     """
-    def __init__(self):
-        super().__init__()
-        self.packet_class = "Paging"
+    __slots__ = ()
+
+    packet_class = "Paging"
 
     class Factory:
         """ Paging packet factory.
 
+        Attributes:
+            types (dict): ``{type : packet class}`` of every type the
+                factory creates.
+
         """
+        types = {}
+
         @staticmethod
-        def create(type, data):
+        def create(type, data, unix_time=None):
             """ Create a paging packet of the given type.
 
             Args:
                 type (str): the type of packet subclass to create.
                 data: the data to construct the packet with.
+                unix_time (float): capture time of the packet.
+
+            Returns:
+                the packet, ``None`` if the type is unknown.
 
             """
-            if type == "Type1": return Type1(data)
-            elif type == "Type2": return Type2(data)
-            elif type == "Type3": return Type3(data)
-            else:
-                _logger.critical("Bad packet creation of type: " + type)
-                sys.exit(127)
+            constructor = Page.Factory.types.get(type)
+            if constructor is None:
+                _logger.warning("Bad packet creation of type: {}".format(type))
+                return None
+            return constructor(data, unix_time)
 
 class Type1(Page):
     """ Type1 GSM Paging Packet.
 
     Args:
         data: the data to construct the packet with.
+        unix_time (float): capture time of the packet.
 
     The Type1 GSM Page packet is contains only a single IMSI and either
     TMSI/P-TMSI, along with some system information for the ones being
@@ -55,29 +69,45 @@ class Type1(Page):
     Attributes:
         imsi: The IMSI of the person being paged by the network.
         page_mode: The mode of paging.
-        channel_needed: The channel to connect on.
-        tmsi: The TMSI for the person being paged.
-        ptmsi: The P-TMSI for the person being paged.
+        channel_needed: The channel to connect on, a pair for the first
+            and second identity.
+        tmsi: The TMSI for the person being paged, the first of
+            ``tmsis``. Setting it replaces that one, ``None`` clears
+            them.
+        tmsis: Every TMSI paged, a second identity may be given.
+        ptmsi: The P-TMSI for the person being paged, P-TMSIs are coded
+            like TMSIs on the CCCH and are found in ``tmsi``.
 
     """
-    def __init__(self, data):
-        super().__init__()
-        self.data = self.decode(data)
-        self.imsi = None
-        self.tmsi = None
-        self.ptmsi = None
-        self.page_mode = None
-        self.channel_needed = None
+    __slots__ = ("_imsi", "_tmsis", "_ptmsi", "_page_mode", "_channel_needed")
+
+    layout = PAGING_REQUEST_1
+    post = staticmethod(paging_identities)
+
+    imsi = LazyField()
+    tmsis = LazyField(factory=list)
+    ptmsi = LazyField()
+    page_mode = LazyField()
+    channel_needed = LazyField()
+
+    @property
+    def tmsi(self):
+        tmsis = self.tmsis
+        return tmsis[0] if tmsis else None
+
+    @tmsi.setter
+    def tmsi(self, value):
+        self.tmsis = [] if value is None else [value] + self.tmsis[1:]
+
     def __str__(self):
         return "Type1 paging packet"
-    def decode(self, data):
-        return data
 
 class Type2(Page):
     """ Type2 GSM Paging Packet.
 
     Args:
         data: the data to construct the packet with.
+        unix_time (float): capture time of the packet.
 
     The Type2 GSM Page packets contains either a pair of TMSI/P-TMSI
     to page or an IMSI, along with some system information.
@@ -86,28 +116,31 @@ class Type2(Page):
         page_mode: The mode of paging.
         channel_needed: The channel to connect on.
         tmsis: A list of TMSIs being paged.
-        ptmsis: A list of P-TMSIs being paged.
+        ptmsis: A list of P-TMSIs being paged, P-TMSIs are coded like
+            TMSIs on the CCCH and are found in ``tmsis``.
         imsi: The IMSI of the person being paged by the network.
 
     """
-    def __init__(self, data):
-        super().__init__()
-        self.data = self.decode(data)
-        self.imsi = None
-        self.tmsis = []
-        self.ptmsis = []
-        self.page_mode = None
-        self.channel_needed = None
+    __slots__ = ("_imsi", "_tmsis", "_ptmsis", "_page_mode", "_channel_needed")
+
+    layout = PAGING_REQUEST_2
+    post = staticmethod(paging_identities)
+
+    imsi = LazyField()
+    tmsis = LazyField(factory=list)
+    ptmsis = LazyField(factory=list)
+    page_mode = LazyField()
+    channel_needed = LazyField()
+
     def __str__(self):
         return "Type2 paging packet"
-    def decode(self, data):
-        return data
 
 class Type3(Page):
     """ Type3 GSM Paging Packet.
 
     Args:
         data: the data to construct the packet with.
+        unix_time (float): capture time of the packet.
 
     The Type3 GSM Page packets contains four different TMSI/P-TMSI
     to page, along with some system information.
@@ -119,14 +152,21 @@ class Type3(Page):
         channel_needed: The channel to connect on.
 
     """
-    def __init__(self, data):
-        super().__init__()
-        self.data = self.decode(data)
-        self.tmsis = []
-        self.ptmsis = []
-        self.page_mode = None
-        self.channel_needed = None
+    __slots__ = ("_tmsis", "_ptmsis", "_page_mode", "_channel_needed")
+
+    layout = PAGING_REQUEST_3
+    post = staticmethod(paging_identities)
+
+    tmsis = LazyField(factory=list)
+    ptmsis = LazyField(factory=list)
+    page_mode = LazyField()
+    channel_needed = LazyField()
+
     def __str__(self):
         return "Type3 paging packet"
-    def decode(self, data):
-        return data
+
+Page.Factory.types = {
+    "Type1": Type1,
+    "Type2": Type2,
+    "Type3": Type3,
+}
@@ -0,0 +1,748 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Table driven decoding of GSM 04.08 radio resource messages.
+
+Every message type has a :obj:`Layout` listing where its information
+elements are. The fixed part of a message, the elements at a known
+offset, is described by :obj:`Field` entries which are compiled into a
+single :obj:`struct.Struct` so they are all unpacked with one call and
+then masked and shifted. The variable part, length prefixed and
+optional elements after the fixed ones, is described by :obj:`IE`
+entries walked in order, and what is left over is handed to the rest
+octets decoder of the message.
+
+Offsets count from the first octet of the layer 3 message, the skip
+indicator and protocol discriminator, so the message type is at offset
+``1``. See :func:`antikythera.l3.l3_message` for how to find that in a
+frame.
+
+Example:
+    Decode a System Information Type 3 message::
+
+        from antikythera.packets.rr import SYSTEM_INFORMATION_3, decode
+
+        fields = decode(SYSTEM_INFORMATION_3, l3)
+        fields["cell_id"], fields["lai"]
+
+"""
+import struct
+import logging
+
+from collections import namedtuple
+
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+_logger = logging.getLogger(__name__)
+
+
+Lai = namedtuple("Lai", ["mcc", "mnc", "lac"])
+Lai.__doc__ = """ Location Area Identity, MCC and MNC as digit strings. """
+
+CellSelection = namedtuple("CellSelection", [
+    "cell_reselect_hysteresis",
+    "ms_txpwr_max_cch",
+    "acs",
+    "neci",
+    "rxlev_access_min",
+])
+CellSelection.__doc__ = """ The Cell Selection Parameters element. """
+
+GprsIndicator = namedtuple("GprsIndicator", ["ra_colour", "si13_position"])
+GprsIndicator.__doc__ = """ The GPRS Indicator of the SI3 and SI4 rest
+octets. """
+
+GprsParameters = namedtuple("GprsParameters", [
+    "bcch_change_mark",
+    "si_change_field",
+    "rac",
+    "network_control_order",
+])
+GprsParameters.__doc__ = """ The GPRS cell parameters of the SI13 rest
+octets, ``rac`` and ``network_control_order`` are ``None`` in a cell with
+a PBCCH. """
+
+Utran = namedtuple("Utran", ["duplex", "uarfcn", "cells"])
+Utran.__doc__ = """ A UTRAN frequency of the 3G Neighbour Cell
+Description, ``duplex`` is ``"fdd"`` or ``"tdd"`` and ``cells`` the
+number of cells listed on it. """
+
+
+# Mobile identity types
+MI_NONE = 0
+MI_IMSI = 1
+MI_IMEI = 2
+MI_IMEISV = 3
+MI_TMSI = 4
+
+# Information element identifiers
+IEI_MOBILE_IDENTITY = 0x17
+IEI_CBCH_CHANNEL_DESCRIPTION = 0x64
+IEI_CBCH_MOBILE_ALLOCATION = 0x72
+
+# Spare bits of the rest octets are the padding pattern, a CSN.1 L bit
+# matches it and an H bit does not
+PADDING = 0x2b
+
+BCD_DIGITS = "0123456789*#abc"
+
+# Length of the FDD and TDD_CELL_INFORMATION fields by number of cells
+FDD_CELL_BITS = (0, 10, 19, 28, 36, 44, 52, 60, 67, 74, 81, 88, 95, 102, 109,
+                 116, 122)
+TDD_CELL_BITS = (0, 9, 17, 25, 32, 39, 46, 53, 59, 65, 71, 77, 83, 89, 95,
+                 101, 106, 111, 116, 121, 126)
+
+
+class Field(namedtuple("Field", ["name", "offset", "size", "mask", "shift",
+                                 "convert"])):
+    """ A fixed position information element or part of one.
+
+    Attributes:
+        name (str): the decoded attribute name.
+        offset (int): octet the element starts at.
+        size (int): length in octets.
+        mask (int): applied after shifting, ``None`` keeps every bit.
+        shift (int): bits to shift right.
+        convert: called with the value, ``None`` keeps it as is.
+
+    """
+    __slots__ = ()
+
+    def __new__(cls, name, offset, size=1, mask=None, shift=0, convert=None):
+        return super(Field, cls).__new__(cls, name, offset, size, mask, shift,
+                                         convert)
+
+
+class IE(namedtuple("IE", ["name", "iei", "size", "convert"])):
+    """ A variable position information element.
+
+    Attributes:
+        name (str): the decoded attribute name.
+        iei (int): the element identifier of an optional element,
+            ``None`` for a mandatory length prefixed (LV) element.
+        size (int): the value length of an optional element without a
+            length octet (TV), ``None`` if it has one (TLV).
+        convert: called with the value octets, ``None`` keeps them.
+
+    """
+    __slots__ = ()
+
+    def __new__(cls, name, iei=None, size=None, convert=None):
+        return super(IE, cls).__new__(cls, name, iei, size, convert)
+
+
+class Layout(object):
+    """ The compiled layout of one message type.
+
+    Args:
+        fields (list): the :obj:`Field` entries of the fixed part.
+        ies (list): the :obj:`IE` entries following the fixed part.
+        rest: called with the octets after the last element, returns a
+            dict of further attributes.
+        size (int): the length of the fixed part if it ends with
+            elements that are not decoded.
+
+    Attributes:
+        size (int): the length of the fixed part, shorter messages are
+            not decoded.
+        single (dict): ``{name : (struct, offset, mask, shift, convert)}``
+            to decode one fixed field on its own, see
+            :func:`decode_field`.
+
+    """
+    _codes = {1: "B", 2: "H", 4: "I"}
+
+    @classmethod
+    def _struct(cls, size):
+        return struct.Struct(">" + cls._codes.get(size, "{}s".format(size)))
+
+    def __init__(self, fields, ies=(), rest=None, size=0):
+        slots = sorted(set((f.offset, f.size) for f in fields))
+        fmt = ">"
+        position = 0
+        for offset, length in slots:
+            if offset < position:
+                raise ValueError("overlapping fields at offset {}".format(
+                    offset))
+            fmt += "{}x".format(offset - position) if offset > position else ""
+            fmt += self._codes.get(length, "{}s".format(length))
+            position = offset + length
+        self.struct = struct.Struct(fmt)
+        self.size = max(position, size)
+        index = {slot: i for i, slot in enumerate(slots)}
+        self.fields = [(f.name, index[(f.offset, f.size)], f.mask, f.shift,
+                        f.convert)
+                       for f in fields]
+        self.single = {f.name: (self._struct(f.size), f.offset, f.mask,
+                                f.shift, f.convert)
+                       for f in fields}
+        self.ies = list(ies)
+        self.rest = rest
+
+
+def decode(layout, data):
+    """ Decode a message with its layout.
+
+    Args:
+        layout (:obj:`Layout`): the layout of the message type.
+        data: the layer 3 message, any bytes like object.
+
+    Returns:
+        dict: the decoded attributes, empty if the message is shorter
+        than the fixed part of its layout.
+
+    """
+    if len(data) < layout.size:
+        return {}
+    values = layout.struct.unpack_from(data)
+    decoded = {}
+    for name, slot, mask, shift, convert in layout.fields:
+        value = values[slot]
+        if shift:
+            value >>= shift
+        if mask is not None:
+            value &= mask
+        decoded[name] = value if convert is None else convert(value)
+
+    position = layout.size
+    end = len(data)
+    for ie in layout.ies:
+        if ie.iei is not None:
+            if position >= end or data[position] != ie.iei:
+                continue
+            position += 1
+        if ie.size is not None:
+            length = ie.size
+        elif position < end:
+            length = data[position]
+            position += 1
+        else:
+            break
+        if position + length > end:
+            _logger.debug("RR: truncated {} element".format(ie.name))
+            break
+        value = bytes(data[position:position + length])
+        position += length
+        decoded[ie.name] = value if ie.convert is None else ie.convert(value)
+
+    if layout.rest is not None:
+        decoded.update(layout.rest(bytes(data[position:])))
+    return decoded
+
+
+def decode_field(layout, data, name):
+    """ Decode a single fixed field of a message.
+
+    Only the octets of the field are read, the rest of the message is
+    left alone.
+
+    Args:
+        layout (:obj:`Layout`): the layout of the message type.
+        data: the layer 3 message, any bytes like object.
+        name (str): a field in ``layout.single``.
+
+    Returns:
+        dict: ``{name : value}``, empty if the message is shorter than
+        the fixed part of its layout.
+
+    """
+    if len(data) < layout.size:
+        return {}
+    unpack, offset, mask, shift, convert = layout.single[name]
+    value = unpack.unpack_from(data, offset)[0]
+    if shift:
+        value >>= shift
+    if mask is not None:
+        value &= mask
+    return {name: value if convert is None else convert(value)}
+
+
+#############################
+#                           #
+# Information element types #
+#                           #
+#############################
+
+def bcd(octets):
+    """ Decode swapped nibble BCD digits, ``0xf`` ends the number.
+
+    """
+    digits = []
+    for octet in octets:
+        for nibble in (octet & 0x0f, octet >> 4):
+            if nibble == 0x0f:
+                return "".join(digits)
+            digits.append(BCD_DIGITS[nibble])
+    return "".join(digits)
+
+
+def lai(octets):
+    """ Decode a Location Area Identification element.
+
+    Returns:
+        :obj:`Lai`
+
+    """
+    mcc = bcd(bytes((octets[0], octets[1] | 0xf0)))
+    mnc = bcd(bytes((octets[2], octets[1] >> 4 | 0xf0)))
+    return Lai(mcc, mnc, octets[3] << 8 | octets[4])
+
+
+def cell_selection(value):
+    """ Decode the two octet Cell Selection Parameters element.
+
+    Returns:
+        :obj:`CellSelection`
+
+    """
+    return CellSelection(value >> 13, value >> 8 & 0x1f, value >> 7 & 1,
+                         value >> 6 & 1, value & 0x3f)
+
+
+def mobile_identity(octets):
+    """ Decode a Mobile Identity element value.
+
+    Returns:
+        tuple: ``(type, identity)`` where an IMSI, IMEI, or IMEISV is a
+        digit string and a TMSI or P-TMSI an int, or ``None`` if the
+        element holds no identity.
+
+    """
+    if not octets:
+        return None
+    kind = octets[0] & 0x07
+    if kind == MI_TMSI:
+        if len(octets) < 5:
+            return None
+        return kind, int.from_bytes(octets[1:5], "big")
+    if kind in (MI_IMSI, MI_IMEI, MI_IMEISV):
+        # An even number of digits ends with a 0xf filler nibble
+        return kind, BCD_DIGITS[octets[0] >> 4] + bcd(octets[1:])
+    return None
+
+
+def frequency_list(octets):
+    """ Decode a 16 octet Cell Channel or Neighbour Cell Description.
+
+    The bit map 0, variable bit map, and 1024, 512, 256, and 128 range
+    formats are supported.
+
+    Returns:
+        list: the sorted ARFCNs.
+
+    """
+    if len(octets) < 16:
+        return []
+    bits = int.from_bytes(octets[:16], "big")
+    first = octets[0]
+    if first & 0xc0 == 0x00:
+        return [n for n in range(1, 125) if bits >> (n - 1) & 1]
+    if first & 0xc0 != 0x80:
+        return []
+
+    fmt = first >> 1 & 0x07
+    if fmt < 4:
+        # Range 1024, F0 flags ARFCN 0
+        arfcns = [f for f in _range_decode(_w_list(bits, 6, 10), 1024)]
+        if first & 0x04:
+            arfcns.append(0)
+        return sorted(set(arfcns))
+
+    origin = bits >> 111 & 0x3ff
+    if fmt == 7:
+        arfcns = [origin]
+        arfcns.extend((origin + k) % 1024 for k in range(1, 112)
+                      if bits >> (111 - k) & 1)
+        return sorted(set(arfcns))
+    width = {4: 9, 5: 8, 6: 7}[fmt]
+    w = _w_list(bits, 17, width)
+    arfcns = [origin] + [(origin + f) % 1024
+                         for f in _range_decode(w, 2 ** width)]
+    return sorted(set(arfcns))
+
+
+def extended_frequency_list(octets):
+    """ Decode a 16 octet Neighbour Cell Description 2.
+
+    Bits 7 and 6 of the first octet hold the multiband reporting value
+    instead of a format bit, otherwise it is coded like
+    :func:`frequency_list`.
+
+    Returns:
+        list: the sorted ARFCNs.
+
+    """
+    if len(octets) < 16:
+        return []
+    return frequency_list(bytes((octets[0] & 0x9f,)) + bytes(octets[1:16]))
+
+
+def _w_list(bits, start, width):
+    """ Read the W(k) values of a range format, W(k) has
+    ``width - floor(log2(k))`` bits.
+
+    """
+    w = [0]
+    position = start
+    k = 1
+    while True:
+        size = width - (k.bit_length() - 1)
+        if size <= 0 or position + size > 128:
+            break
+        value = bits >> (128 - position - size) & ((1 << size) - 1)
+        if value == 0:
+            break
+        w.append(value)
+        position += size
+        k += 1
+    return w
+
+
+def _range_decode(w, original_range):
+    """ The frequency offsets F(k) of a range format, 3GPP TS 44.018
+    annex J.
+
+    """
+    frequencies = []
+    for k in range(1, len(w)):
+        index = k
+        j = 1 << (k.bit_length() - 1)
+        n = w[index]
+        while index > 1:
+            modulus = 2 * original_range // j - 1
+            if 2 * index < 3 * j:
+                index -= j // 2
+                n = (n + w[index] - original_range // j - 1) % modulus + 1
+            else:
+                index -= j
+                n = (n + w[index] - 1) % modulus + 1
+            j //= 2
+        frequencies.append(n)
+    return frequencies
+
+
+class BitReader(object):
+    """ Read the CSN.1 coded rest octets bit by bit.
+
+    Reading past the end returns padding so absent trailing elements
+    read as L.
+
+    """
+    def __init__(self, octets):
+        self.bits = int.from_bytes(octets, "big") if octets else 0
+        self.size = len(octets) * 8
+        self.position = 0
+
+    def read(self, count):
+        if self.position + count > self.size:
+            self.position += count
+            return 0
+        self.position += count
+        return self.bits >> (self.size - self.position) & ((1 << count) - 1)
+
+    def lh(self):
+        """ ``True`` for an H bit.
+
+        """
+        padding = PADDING >> (7 - self.position % 8) & 1
+        if self.position >= self.size:
+            self.position += 1
+            return False
+        return self.read(1) != padding
+
+
+def si3_rest_octets(octets):
+    """ The GPRS Indicator of the SI3 Rest Octets, or ``None``.
+
+    """
+    r = BitReader(octets)
+    if r.lh():
+        r.read(1 + 6 + 3 + 5)   # optional selection parameters
+    if r.lh():
+        r.read(2)               # optional power offset
+    r.lh()                      # SI2ter indicator
+    r.lh()                      # early classmark sending control
+    if r.lh():
+        r.read(3)               # scheduling if and where
+    gprs = None
+    if r.lh():
+        gprs = GprsIndicator(r.read(3), r.read(1))
+    return {"gprs": gprs}
+
+
+def si4_rest_octets(octets):
+    """ The GPRS Indicator of the SI4 Rest Octets, or ``None``.
+
+    """
+    r = BitReader(octets)
+    if r.lh():
+        r.read(1 + 6 + 3 + 5)   # optional selection parameters
+    if r.lh():
+        r.read(2)               # optional power offset
+    gprs = None
+    if r.lh():
+        gprs = GprsIndicator(r.read(3), r.read(1))
+    return {"gprs": gprs}
+
+
+def si2quater_rest_octets(octets):
+    """ The UTRAN neighbours of the SI2quater Rest Octets.
+
+    The descriptions in front of the 3G Neighbour Cell Description are
+    skipped, the cell information of each frequency is not decoded.
+    Nothing is returned for rest octets that end early.
+
+    Returns:
+        dict: ``neighbor_3g``, a list of :obj:`Utran`, empty if this
+        instance of the message does not describe any.
+
+    """
+    r = BitReader(octets)
+    r.read(1 + 1 + 1 + 4 + 4)   # BA indicators, change mark, index, count
+    if r.read(1):
+        r.read(1 + 2)           # measurement parameters
+    if r.read(1):
+        _skip_rtd(r)
+    if r.read(1):
+        if r.read(1):
+            r.read(5)           # BA_Index_Start_BSIC
+        r.read(6)               # BSIC
+        r.read(r.read(7) * 7)   # frequency scrolling and BSIC
+    if r.read(1):
+        r.read(r.read(7))       # report priority of each cell
+    if r.read(1):
+        _skip_gprs_measurement(r)
+    if r.read(1):
+        r.read(2)               # network control order
+        if r.read(1):
+            r.read(3 + 3 + 3)   # NC reporting periods
+    if r.read(1):
+        r.read(r.read(8) + 1)   # extension information
+    neighbors = []
+    if r.read(1):
+        if r.read(1):
+            r.read(7)           # Index_Start_3G
+        if r.read(1):
+            r.read(7)           # Absolute_Index_Start_EMR
+        if r.read(1):
+            neighbors.extend(_utran_cells(r, "fdd", FDD_CELL_BITS))
+        if r.read(1):
+            neighbors.extend(_utran_cells(r, "tdd", TDD_CELL_BITS))
+    if r.position > r.size:
+        _logger.debug("RR: truncated SI2quater rest octets")
+        return {}
+    return {"neighbor_3g": neighbors}
+
+
+def si13_rest_octets(octets):
+    """ The GPRS parameters of the SI13 Rest Octets.
+
+    Returns:
+        dict: ``gprs``, a :obj:`GprsParameters` or ``None`` if the cell
+        does not support GPRS. Nothing is returned for rest octets that
+        end early.
+
+    """
+    r = BitReader(octets)
+    if not r.lh():
+        return {"gprs": None}
+    bcch_change_mark = r.read(3)
+    si_change_field = r.read(4)
+    if r.read(1):
+        r.read(2)               # SI13_CHANGE_MARK
+        _skip_mobile_allocation(r)
+    rac = network_control_order = None
+    if not r.read(1):
+        # No PBCCH, the parameters are on the BCCH
+        rac = r.read(8)
+        r.read(1 + 3)           # SPGC_CCCH_SUP, PRIORITY_ACCESS_THR
+        network_control_order = r.read(2)
+    if r.position > r.size:
+        _logger.debug("RR: truncated SI13 rest octets")
+        return {}
+    return {"gprs": GprsParameters(bcch_change_mark, si_change_field, rac,
+                                   network_control_order)}
+
+
+def _utran_cells(r, duplex, cell_bits):
+    """ Read the repeated UTRAN neighbour cells of one duplex mode.
+
+    """
+    if r.read(1):
+        r.read(3)               # bandwidth
+    neighbors = []
+    while r.read(1):
+        r.read(1)               # always 0
+        uarfcn = r.read(14)
+        indic0 = r.read(1)
+        count = r.read(5)
+        r.read(cell_bits[count] if count < len(cell_bits) else 0)
+        neighbors.append(Utran(duplex, uarfcn, count + indic0))
+    return neighbors
+
+
+def _skip_rtd(r):
+    """ Skip a GPRS_Real Time Difference Description.
+
+    """
+    for width in (6, 12):
+        if not r.read(1):
+            continue
+        if r.read(1):
+            r.read(5)           # BA_Index_Start_RTD
+        # One list of RTDs per frequency, both lists end with a 1 bit
+        _skip_until_1(r, width)
+        while not r.read(1) and r.position < r.size:
+            _skip_until_1(r, width)
+
+
+def _skip_until_1(r, width):
+    """ Skip ``{ 0 < bit (width) > } ** 1``.
+
+    """
+    while not r.read(1) and r.position < r.size:
+        r.read(width)
+
+
+def _skip_gprs_measurement(r):
+    """ Skip a GPRS_MEASUREMENT_Parameters Description.
+
+    """
+    r.read(1 + 1 + 1)           # report type, rate, invalid BSIC reporting
+    for _ in range(2):
+        if r.read(1):
+            r.read(2)           # multiband, serving band reporting
+    r.read(2)                   # SCALE_ORD
+    for _ in range(5):
+        if r.read(1):
+            r.read(3 + 3)       # reporting offset and threshold of a band
+
+
+def _skip_mobile_allocation(r):
+    """ Skip a GPRS Mobile Allocation.
+
+    """
+    r.read(6)                   # HSN
+    if r.read(1):
+        _skip_list(r, 4)        # RFL numbers
+    if not r.read(1):
+        r.read(r.read(6) + 1)   # MA bitmap
+    elif r.read(1):
+        _skip_list(r, 6)        # ARFCN indexes
+
+
+def _skip_list(r, width):
+    """ Skip a list of ``width`` bit values each followed by a 1 bit if
+    another comes.
+
+    """
+    r.read(width)
+    while r.read(1):
+        r.read(width)
+
+
+def paging_identities(decoded):
+    """ Sort the mobile identities of a paging request into ``imsi`` and
+    ``tmsis``.
+
+    The ``identity_*`` entries of ``decoded`` are replaced, ``imsi`` is
+    only set if one was paged. TMSIs and P-TMSIs are coded alike on the
+    CCCH so both end up in ``tmsis``.
+
+    Returns:
+        dict: ``decoded``
+
+    """
+    imsi = None
+    tmsis = []
+    for name in ("identity_1", "identity_2", "identity_3", "identity_4"):
+        identity = decoded.pop(name, None)
+        if identity is None:
+            continue
+        kind, value = identity
+        if kind == MI_TMSI:
+            tmsis.append(value)
+        elif kind == MI_IMSI and imsi is None:
+            imsi = value
+    if imsi is not None:
+        decoded["imsi"] = imsi
+    decoded["tmsis"] = tmsis
+    return decoded
+
+
+def _tmsi(value):
+    return MI_TMSI, value
+
+
+###########
+#         #
+# Layouts #
+#         #
+###########
+
+# Page mode in bits 1-2, channel needed for the first and second
+# identity in bits 5-6 and 7-8
+_PAGE_MODE = [
+    Field("page_mode", 2, mask=0x03),
+    Field("channel_needed", 2, shift=4, mask=0x0f,
+          convert=lambda v: (v & 0x03, v >> 2)),
+]
+
+PAGING_REQUEST_1 = Layout(_PAGE_MODE, ies=[
+    IE("identity_1", convert=mobile_identity),
+    IE("identity_2", iei=IEI_MOBILE_IDENTITY, convert=mobile_identity),
+])
+
+PAGING_REQUEST_2 = Layout(_PAGE_MODE + [
+    Field("identity_1", 3, 4, convert=_tmsi),
+    Field("identity_2", 7, 4, convert=_tmsi),
+], ies=[
+    IE("identity_3", iei=IEI_MOBILE_IDENTITY, convert=mobile_identity),
+])
+
+PAGING_REQUEST_3 = Layout(_PAGE_MODE + [
+    Field("identity_1", 3, 4, convert=_tmsi),
+    Field("identity_2", 7, 4, convert=_tmsi),
+    Field("identity_3", 11, 4, convert=_tmsi),
+    Field("identity_4", 15, 4, convert=_tmsi),
+])
+
+IMMEDIATE_ASSIGNMENT = Layout([
+    Field("page_mode", 2, mask=0x03),
+    Field("dedicated_mode", 2, shift=4, mask=0x0f),
+    Field("channel_type", 3, shift=3),
+    Field("time_slot", 3, mask=0x07),
+    Field("ra", 6),
+    Field("timing_advance", 9, mask=0x3f),
+])
+
+SYSTEM_INFORMATION_1 = Layout([
+    Field("arfcns", 2, 16, convert=frequency_list),
+])
+
+SYSTEM_INFORMATION_2 = Layout([
+    Field("neighbor_arfcns", 2, 16, convert=frequency_list),
+])
+
+SYSTEM_INFORMATION_2TER = Layout([
+    Field("neighbor_arfcns", 2, 16, convert=extended_frequency_list),
+    Field("bcch_freqs", 2, 16, convert=extended_frequency_list),
+])
+
+SYSTEM_INFORMATION_2QUATER = Layout([], rest=si2quater_rest_octets, size=2)
+
+SYSTEM_INFORMATION_3 = Layout([
+    Field("cell_id", 2, 2),
+    Field("lai", 4, 5, convert=lai),
+    Field("select_params", 13, 2, convert=cell_selection),
+], rest=si3_rest_octets, size=18)
+
+SYSTEM_INFORMATION_4 = Layout([
+    Field("lai", 2, 5, convert=lai),
+    Field("select_params", 7, 2, convert=cell_selection),
+], ies=[
+    IE("cbch_channel", iei=IEI_CBCH_CHANNEL_DESCRIPTION, size=3),
+    IE("cbch_allocation", iei=IEI_CBCH_MOBILE_ALLOCATION),
+], rest=si4_rest_octets, size=12)
+
+SYSTEM_INFORMATION_13 = Layout([], rest=si13_rest_octets, size=2)
@@ -0,0 +1,215 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" Drop repeated System Information before it is decoded.
+
+A cell broadcasts the same System Information messages every few
+hundred milliseconds. A :obj:`SystemInfoCache` keeps the content last
+seen of each message type on each ARFCN, a repeat only updates when it
+was last seen and how often, and only the messages whose content changed
+are decoded. On a quiet network most of the BCCH is dropped
+and a cell that changes its broadcast stands out.
+
+The content is compared whole rather than by the cell's first content
+ever seen, a cell switching back to an earlier broadcast is a change
+too. The cache holds at most ``size`` cells and message types, the
+least recently seen is evicted first.
+
+The cache is checked on the raw frame records, only the layer 3 header
+is read and the content compared as bytes, so repeats are dropped before
+anything of them is decoded.
+
+Example:
+    Decode only the changed System Information of a batch::
+
+        from antikythera.packets.sysinfo import SystemInfoCache
+
+        cache = SystemInfoCache()
+        records = np.frombuffer(q.get(), dtype=FRAME_DTYPE)
+        keep = cache.changed_records(records)
+        packets = PacketBatch.from_records(records[keep])
+
+"""
+
+import sys
+import logging
+
+from collections import OrderedDict
+
+from antikythera.gsmtap import GSMTAP_ARFCN_MASK
+from antikythera.l3 import PD_RR, RR_SYSTEM_INFORMATION
+from antikythera.packets.batch import frame_headers
+
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError as e:
+    _logger.error("SystemInfoCache: {}".format(e))
+    _logger.info("SystemInfoCache: Maybe try "
+                 "`pip install -r requirements.txt'")
+    sys.exit(1)
+
+
+# Cells times System Information types remembered
+DEFAULT_CACHE_SIZE = 4096
+
+_SYSTEM_INFORMATION = sorted(RR_SYSTEM_INFORMATION)
+
+
+class SystemInfo(object):
+    """ The content of a System Information message last seen on a
+    cell.
+
+    Attributes:
+        message (bytes): the layer 3 message.
+        first_seen (float): capture time the content was first seen.
+        last_seen (float): capture time of the latest repeat.
+        count (int): times the content was seen.
+
+    """
+    __slots__ = ("message", "first_seen", "last_seen", "count")
+
+    def __init__(self, message, timestamp):
+        self.message = message
+        self.first_seen = timestamp
+        self.last_seen = timestamp
+        self.count = 1
+
+
+class SystemInfoCache(object):
+    """ The System Information last seen on each cell.
+
+    Args:
+        size (int): the most ``(arfcn, message type)`` entries kept.
+
+    Attributes:
+        entries (:obj:`collections.OrderedDict`): ``{(arfcn, message
+            type): SystemInfo}`` least recently seen first, the uplink
+            and PCS flag bits of the ARFCN are masked off.
+        repeats (int): messages dropped as repeats.
+        changes (int): messages kept as new or changed.
+        evictions (int): entries evicted to stay within ``size``.
+
+    """
+    def __init__(self, size=DEFAULT_CACHE_SIZE):
+        self.size = max(1, size)
+        self.entries = OrderedDict()
+        self.repeats = 0
+        self.changes = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def seen(self, arfcn, message_type, message, timestamp):
+        """ Record a System Information message.
+
+        Args:
+            arfcn (int): the ARFCN the message was broadcast on.
+            message_type (int): the RR message type.
+            message (bytes): the layer 3 message.
+            timestamp (float): the capture time.
+
+        Returns:
+            bool: ``True`` if the message repeats the content last seen
+            for its cell and type.
+
+        """
+        key = (arfcn & GSMTAP_ARFCN_MASK, message_type)
+        entry = self.entries.get(key)
+        if entry is not None and entry.message == message:
+            entry.last_seen = timestamp
+            entry.count += 1
+            self.entries.move_to_end(key)
+            self.repeats += 1
+            return True
+        if entry is None:
+            if len(self.entries) >= self.size:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+        else:
+            _logger.debug(
+                "SystemInfoCache: ARFCN {} type {:#04x} changed".format(*key))
+            self.entries.move_to_end(key)
+        self.entries[key] = SystemInfo(message, timestamp)
+        self.changes += 1
+        return False
+
+    def changed(self, batch):
+        """ The rows of a decoded batch to keep.
+
+        Args:
+            batch (:obj:`antikythera.packets.batch.PacketBatch`): the
+                decoded messages in capture order.
+
+        Returns:
+            a boolean mask, ``False`` for System Information repeating
+            the content last seen and ``True`` for every other row.
+
+        """
+        rows = np.flatnonzero((batch.pd == PD_RR)
+                              & np.isin(batch.message_type,
+                                        _SYSTEM_INFORMATION))
+        return self._changed(len(batch), rows, batch.arfcn,
+                             batch.message_type,
+                             batch.timestamp, batch.message)
+
+    def changed_records(self, records):
+        """ The frame records to keep, checked before they are decoded.
+
+        Only the layer 3 header of each record is read, see
+        :func:`antikythera.packets.batch.frame_headers`, and the System
+        Information content compared as raw bytes. Repeats are dropped
+        without ever being decoded.
+
+        Args:
+            records: an array of
+                :py:data:`antikythera.packets.batch.FRAME_DTYPE` in
+                capture order.
+
+        Returns:
+            a boolean mask, ``False`` for System Information repeating
+            the content last seen and ``True`` for every other record.
+
+        """
+        keep, offset, pd, message_type = frame_headers(records)
+        rows = np.flatnonzero(keep & (pd == PD_RR)
+                              & np.isin(message_type, _SYSTEM_INFORMATION))
+        payload = records["payload"]
+        length = records["length"]
+
+        def message(index):
+            return payload[index, offset[index]:length[index]].tobytes()
+
+        return self._changed(len(records), rows, records["arfcn"],
+                             message_type, records["timestamp"], message)
+
+    def _changed(self, count, rows, arfcn, message_type, timestamp, message):
+        """ Record the System Information rows, ``message(index)`` gives
+        the layer 3 message of a row.
+
+        """
+        keep = np.ones(count, dtype=bool)
+        arfcns = arfcn[rows].tolist()
+        message_types = message_type[rows].tolist()
+        timestamps = timestamp[rows].tolist()
+        seen = self.seen
+        for i, index in enumerate(rows.tolist()):
+            if seen(arfcns[i], message_types[i], message(index),
+                    timestamps[i]):
+                keep[index] = False
+        return keep
+
+    def stats(self):
+        """ Messages kept and dropped.
+
+        Returns:
+            dict: ``repeats``, ``changes``, ``evictions``, and the
+            ``entries`` held.
+
+        """
+        return {"repeats": self.repeats, "changes": self.changes,
+                "evictions": self.evictions, "entries": len(self.entries)}
@@ -4,7 +4,6 @@
 
 """
 
-import sys
 import logging
 
 __copyright__ = "Finding Ray"
@@ -12,188 +11,231 @@ __license__ = "gpl3"
 
 _logger = logging.getLogger(__name__)
 
-from antikythera.packets.packet import Packet
+from antikythera.packets.packet import Packet, LazyField
+from antikythera.packets.rr import (SYSTEM_INFORMATION_1,
+                                    SYSTEM_INFORMATION_2,
+                                    SYSTEM_INFORMATION_2TER,
+                                    SYSTEM_INFORMATION_2QUATER,
+                                    SYSTEM_INFORMATION_3,
+                                    SYSTEM_INFORMATION_4,
+                                    SYSTEM_INFORMATION_13)
 
 class System(Packet):
     """ System information packet attributes and factory.
 
     """
-    def __init__(self):
-        super().__init__()
+    __slots__ = ()
 
     class Factory:
         """ System information packet factory.
 
+        Attributes:
+            types (dict): ``{type : packet class}`` of every type the
+                factory creates.
+
         """
+        types = {}
+
         @staticmethod
-        def create(type, data):
+        def create(type, data, unix_time=None):
             """ Create a system packet of the given type.
 
             Args:
                 type (str): the type of packet subclass to create.
                 data: the data to construct the packet with.
+                unix_time (float): capture time of the packet.
+
+            Returns:
+                the packet, ``None`` if the type is unknown.
 
             """
-            if type == "Type1": return Type1(data)
-            elif type == "Type2": return Type2(data)
-            elif type == "Type3": return Type3(data)
-            elif type == "Type4": return Type4(data)
-            elif type == "Type2ter": return Type2ter(data)
-            elif type == "Type2quarter": return Type2quarter(data)
-            elif type == "Type13": return Type13(data)
-            else:
-                _logger.critical("Bad packet creation of type: " + type)
-                sys.exit(127)
+            constructor = System.Factory.types.get(type)
+            if constructor is None:
+                _logger.warning("Bad packet creation of type: {}".format(type))
+                return None
+            return constructor(data, unix_time)
 
 class Type1(System):
     """ Type1 GSM System Information Packet.
 
     Args:
         data: the data to construct the packet with.
+        unix_time (float): capture time of the packet.
 
     Attributes:
-        self_arfcns: Absolute Radio Frequency Channel Numbers of the
+        arfcns: Absolute Radio Frequency Channel Numbers of the
             broadcasting cell.
 
     """
-    def __init__(self, data):
-        super().__init__()
-        self.data = self.decode(data)
-        self.arfcns = None
+    __slots__ = ("_arfcns",)
+
+    layout = SYSTEM_INFORMATION_1
+
+    arfcns = LazyField()
+
     def __str__(self):
         return "Type1 system information packet"
-    def decode(self, data):
-        return data
 
 class Type2(System):
     """ Type2 GSM System Information Packet.
 
     Args:
         data: the data to construct the packet with.
+        unix_time (float): capture time of the packet.
 
     Attributes:
         neighbor_arfcns: Absolute Radio Frequency Channel Numbers of
             neighboring cells.
 
     """
-    def __init__(self, data):
-        super().__init__()
-        self.data = self.decode(data)
-        self.neighbor_arfcns = None
+    __slots__ = ("_neighbor_arfcns",)
+
+    layout = SYSTEM_INFORMATION_2
+
+    neighbor_arfcns = LazyField()
+
     def __str__(self):
         return "Type2 system information packet"
-    def decode(self, data):
-        return data
 
 class Type3(System):
     """ Type3 GSM System Information Packet.
 
     Args:
         data: the data to construct the packet with.
+        unix_time (float): capture time of the packet.
 
     Attributes:
         cell_id: The broadcasting base stations Cell ID (CID).
-        lai: Location Area Identity (LAI) this consists of the Mobile.
+        lai: Location Area Identity (LAI) this consists of the Mobile
             Country Code (MCC) the Mobile Network Code (MNC) and the
-            Location Area Code (LAC). They are concatenated together
-            in that order.
-        gprs: General Radio Packet Service (GRPS) information.
+            Location Area Code (LAC), a
+            :obj:`antikythera.packets.rr.Lai` tuple in that order.
+        select_params: Cell selection parameters.
+        gprs: General Radio Packet Service (GRPS) information, a
+            :obj:`antikythera.packets.rr.GprsIndicator` or ``None``
+            if the cell does not support GPRS.
 
     """
-    def __init__(self, data):
-        super().__init__()
-        self.data = self.decode(data)
-        self.cell_id = None
-        self.lai = None
-        self.gprs = None
+    __slots__ = ("_cell_id", "_lai", "_select_params", "_gprs")
+
+    layout = SYSTEM_INFORMATION_3
+
+    cell_id = LazyField()
+    lai = LazyField()
+    select_params = LazyField()
+    gprs = LazyField()
+
     def __str__(self):
         return "Type3 system information packet"
-    def decode(self, data):
-        return data
 
 class Type4(System):
     """ Type4 GSM System Information Packet.
 
     Args:
         data: the data to construct the packet with.
+        unix_time (float): capture time of the packet.
 
     Attributes:
-        lai: Location Area Identity (LAI) this consists of the Mobile.
+        lai: Location Area Identity (LAI) this consists of the Mobile
             Country Code (MCC) the Mobile Network Code (MNC) and the
-            Location Area Code (LAC). They are concatenated together
-            in that order.
+            Location Area Code (LAC), a
+            :obj:`antikythera.packets.rr.Lai` tuple in that order.
         select_params: Cell selection parameters.
         gprs: General Radio Packet Service (GRPS) information.
+        cbch_channel: The CBCH Channel Description octets if the cell
+            broadcasts cell information.
+        cbch_allocation: The CBCH Mobile Allocation octets.
 
     """
-    def __init__(self, data):
-        super().__init__()
-        self.data = self.decode(data)
-        self.lai = None
-        self.select_params = None
-        self.gprs = None
+    __slots__ = ("_lai", "_select_params", "_gprs", "_cbch_channel",
+                 "_cbch_allocation")
+
+    layout = SYSTEM_INFORMATION_4
+
+    lai = LazyField()
+    select_params = LazyField()
+    gprs = LazyField()
+    cbch_channel = LazyField()
+    cbch_allocation = LazyField()
+
     def __str__(self):
         return "Type4 system information packet"
-    def decode(self, data):
-        return data
 
 class Type2ter(System):
     """ Type4 GSM System Information Packet.
 
     Args:
         data: the data to construct the packet with.
+        unix_time (float): capture time of the packet.
 
     Attributes:
         neighbor_disc: Verbose neighboring cell description.
         neighbor_arfcns: Absolute Radio Frequency Channel Numbers of
             neighboring cells.
-        bcch_freqs: List of BCCH frequencies
+        bcch_freqs: List of BCCH frequencies, the ARFCNs of the
+            Extended BCCH Frequency List read as a Neighbour Cell
+            Description 2.
 
     """
-    def __init__(self, data):
-        super().__init__()
-        self.data = self.decode(data)
-        self.neighbor_arfcns = None
-        self.bcch_freqs = None
+    __slots__ = ("_neighbor_arfcns", "_bcch_freqs")
+
+    layout = SYSTEM_INFORMATION_2TER
+
+    neighbor_arfcns = LazyField()
+    bcch_freqs = LazyField()
+
     def __str__(self):
         return "Type2ter system information packet"
-    def decode(self, data):
-        return data
 
 class Type2quarter(System):
     """ Type2quarter GSM System Information Packet.
 
     Args:
         data: the data to construct the packet with.
+        unix_time (float): capture time of the packet.
 
     Attributes:
-        neighbor_3g: 3G neighbor cell description
+        neighbor_3g: 3G neighbor cell description, a list of
+            :obj:`antikythera.packets.rr.Utran` frequencies.
 
     """
-    def __init__(self, data):
-        super().__init__()
-        self.data = self.decode(data)
-        self.neighbor_3g = None
+    __slots__ = ("_neighbor_3g",)
+
+    layout = SYSTEM_INFORMATION_2QUATER
+
+    neighbor_3g = LazyField()
+
     def __str__(self):
         return "Type2quarter system information packet"
-    def decode(self, data):
-        return data
 
 class Type13(System):
     """ Type4 GSM System Information Packet.
 
     Args:
         data: the data to construct the packet with.
+        unix_time (float): capture time of the packet.
 
     Attributes:
-        gprs: General Radio Packet Service (GRPS) information.
+        gprs: General Radio Packet Service (GRPS) information, a
+            :obj:`antikythera.packets.rr.GprsParameters` or ``None`` if
+            the cell does not support GPRS.
 
     """
-    def __init__(self, data):
-        super().__init__()
-        self.data = self.decode(data)
-        self.gprs = None
+    __slots__ = ("_gprs",)
+
+    layout = SYSTEM_INFORMATION_13
+
+    gprs = LazyField()
+
     def __str__(self):
         return "Type13 system information packet"
-    def decode(self, data):
-        return data
+
+System.Factory.types = {
+    "Type1": Type1,
+    "Type2": Type2,
+    "Type3": Type3,
+    "Type4": Type4,
+    "Type2ter": Type2ter,
+    "Type2quarter": Type2quarter,
+    "Type13": Type13,
+}
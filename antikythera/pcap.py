@@ -0,0 +1,604 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" pcap.py
+
+Pure Python reader for pcap and pcapng capture files.
+
+Only the link, network, and transport headers needed to find GSMTAP
+over UDP are looked at, everything else is skipped without being
+dissected. This avoids starting ``tshark`` through ``pyshark`` when
+replaying capture files.
+
+Example:
+    Iterate over the GSMTAP frames in a capture file::
+
+        from antikythera.pcap import PcapReader
+
+        with PcapReader("tests/test_data/silent_sms.pcap") as reader:
+            for frame in reader:
+                print(frame.arfcn, frame.frame_nr)
+
+"""
+import os
+import sys
+import mmap
+import struct
+import logging
+import multiprocessing as mp
+
+from operator import attrgetter
+from itertools import islice
+from collections import deque
+
+from antikythera.gsmtap import GSMTAP_PORT, parse_gsmtap, pack_frames
+from antikythera.packets.batch import FRAME_DTYPE
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError as e:
+    _logger.error("PcapReader: {}".format(e))
+    _logger.info("PcapReader: Maybe try `pip install -r requirements.txt'")
+    sys.exit(1)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+# Classic pcap magic numbers, microsecond and nanosecond resolution
+PCAP_MAGIC_US = 0xa1b2c3d4
+PCAP_MAGIC_NS = 0xa1b23c4d
+
+# pcapng block types
+PCAPNG_SHB = 0x0a0d0d0a
+PCAPNG_IDB = 0x00000001
+PCAPNG_PB = 0x00000002
+PCAPNG_SPB = 0x00000003
+PCAPNG_EPB = 0x00000006
+PCAPNG_NRB = 0x00000004
+PCAPNG_ISB = 0x00000005
+PCAPNG_BLOCKS = (PCAPNG_SHB, PCAPNG_IDB, PCAPNG_PB, PCAPNG_SPB, PCAPNG_NRB,
+                 PCAPNG_ISB, PCAPNG_EPB)
+PCAPNG_BYTE_ORDER_MAGIC = 0x1a2b3c4d
+PCAPNG_OPT_IF_TSRESOL = 9
+
+# Link layer types
+LINKTYPE_NULL = 0
+LINKTYPE_ETHERNET = 1
+LINKTYPE_RAW = 101
+LINKTYPE_LOOP = 108
+LINKTYPE_LINUX_SLL = 113
+LINKTYPE_GSMTAP_UM = 217
+LINKTYPE_IPV4 = 228
+LINKTYPE_IPV6 = 229
+LINKTYPE_LINUX_SLL2 = 276
+
+ETHERTYPE_IPV4 = 0x0800
+ETHERTYPE_IPV6 = 0x86dd
+ETHERTYPE_VLAN = (0x8100, 0x88a8)
+
+IPPROTO_UDP = 17
+
+# Partitioning, see PcapReader.partition()
+DEFAULT_CHUNK_SIZE = 16 * 1024 * 1024
+RESYNC_DEPTH = 8
+RESYNC_WINDOW = 1024 * 1024
+RESYNC_MAX_GAP = 3600
+MAX_RECORD = 262144
+
+_timestamp = attrgetter("timestamp")
+_U16 = struct.Struct(">H")
+_UDP = struct.Struct(">HHHH")
+
+
+def _network_payload(linktype, data):
+    """ Strip the link layer header.
+
+    Returns:
+        tuple: ``(ethertype, network packet)`` or ``(None, None)`` for
+        link types that are not understood.
+
+    """
+    if linktype == LINKTYPE_ETHERNET:
+        offset = 14
+        if len(data) < offset:
+            return None, None
+        ethertype = _U16.unpack_from(data, 12)[0]
+        while ethertype in ETHERTYPE_VLAN and len(data) >= offset + 4:
+            ethertype = _U16.unpack_from(data, offset + 2)[0]
+            offset += 4
+        return ethertype, data[offset:]
+    if linktype in (LINKTYPE_RAW, LINKTYPE_IPV4, LINKTYPE_IPV6):
+        if not data:
+            return None, None
+        version = data[0] >> 4
+        return (ETHERTYPE_IPV4 if version == 4 else ETHERTYPE_IPV6), data
+    if linktype in (LINKTYPE_NULL, LINKTYPE_LOOP):
+        if len(data) < 5:
+            return None, None
+        version = data[4] >> 4
+        return (ETHERTYPE_IPV4 if version == 4 else ETHERTYPE_IPV6), data[4:]
+    if linktype == LINKTYPE_LINUX_SLL:
+        if len(data) < 16:
+            return None, None
+        return _U16.unpack_from(data, 14)[0], data[16:]
+    if linktype == LINKTYPE_LINUX_SLL2:
+        if len(data) < 20:
+            return None, None
+        return _U16.unpack_from(data, 0)[0], data[20:]
+    return None, None
+
+
+def extract_gsmtap(linktype, data, port=GSMTAP_PORT):
+    """ Find the GSMTAP message inside a captured link layer frame.
+
+    Args:
+        linktype (int): the pcap ``LINKTYPE_*`` of ``data``.
+        data (bytes): the captured frame.
+        port (int): the UDP port GSMTAP is sent to or from.
+
+    Returns:
+        bytes: the UDP payload starting at the GSMTAP header or ``None``
+        if the frame is not GSMTAP.
+
+    """
+    if linktype == LINKTYPE_GSMTAP_UM:
+        return data
+
+    ethertype, packet = _network_payload(linktype, data)
+    if ethertype == ETHERTYPE_IPV4:
+        if len(packet) < 20:
+            return None
+        ihl = (packet[0] & 0x0f) * 4
+        # Skip everything but the first fragment
+        if packet[9] != IPPROTO_UDP or _U16.unpack_from(packet, 6)[0] & 0x1fff:
+            return None
+        udp = packet[ihl:]
+    elif ethertype == ETHERTYPE_IPV6:
+        if len(packet) < 40 or packet[6] != IPPROTO_UDP:
+            return None
+        udp = packet[40:]
+    else:
+        return None
+
+    if len(udp) < _UDP.size:
+        return None
+    sport, dport, length, _checksum = _UDP.unpack_from(udp)
+    if dport != port and sport != port:
+        return None
+    return udp[_UDP.size:length] if length >= _UDP.size else udp[_UDP.size:]
+
+
+class PcapReader(object):
+    """ Read GSMTAP frames from a pcap or pcapng file.
+
+    Args:
+        path (str): path to the capture file.
+        port (int): the UDP port GSMTAP is carried on.
+
+    Iterating over the reader yields :obj:`antikythera.gsmtap.Frame`
+    records in file order, frames that are not GSMTAP are skipped.
+
+    """
+    def __init__(self, path, port=GSMTAP_PORT):
+        self.path = path
+        self.port = port
+        self.file = None
+        self.pcapng = None
+        self.endian = "<"
+        self.linktype = None
+        self.snaplen = 0
+        self.divisor = 1e6
+        self.data_start = 0
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        return self.frames()
+
+    def open(self):
+        if self.file is None:
+            self.file = open(self.path, 'rb')
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def frames(self, start=None, end=None, state=None):
+        """ Iterate over the GSMTAP frames, see :py:meth:`packets`.
+
+        """
+        port = self.port
+        for timestamp, linktype, data in self.packets(start, end, state):
+            gsmtap = extract_gsmtap(linktype, data, port)
+            if gsmtap is None:
+                continue
+            frame = parse_gsmtap(gsmtap, timestamp)
+            if frame is not None:
+                yield frame
+
+    def packets(self, start=None, end=None, state=None):
+        """ Iterate over every captured frame in the file.
+
+        Args:
+            start (int): offset of the first record to read, one of the
+                boundaries returned by :py:meth:`partition`.
+            end (int): stop before the first record starting at or after
+                this offset.
+            state: the reader state at ``start`` given by
+                :py:meth:`partition`.
+
+        Yields:
+            tuple: ``(timestamp, linktype, data)`` for each record.
+
+        """
+        self.open()
+        if self.pcapng is None and not self._read_header():
+            return
+        if self.pcapng:
+            yield from self._pcapng_packets(start, end, state)
+        else:
+            yield from self._pcap_packets(start, end)
+
+    def _read_header(self):
+        f = self.file
+        f.seek(0)
+        header = f.read(24)
+        if len(header) < 4:
+            return False
+        if struct.unpack("<I", header[:4])[0] == PCAPNG_SHB:
+            self.pcapng = True
+            order = struct.unpack("<I", header[8:12])[0]
+            self.endian = "<" if order == PCAPNG_BYTE_ORDER_MAGIC else ">"
+            self.data_start = 0
+            return True
+
+        if len(header) < 24:
+            raise ValueError("{}: truncated pcap header".format(self.path))
+        for endian in ("<", ">"):
+            magic = struct.unpack(endian + "I", header[:4])[0]
+            if magic in (PCAP_MAGIC_US, PCAP_MAGIC_NS):
+                break
+        else:
+            raise ValueError("{}: not a pcap or pcapng file".format(self.path))
+        self.pcapng = False
+        self.endian = endian
+        self.divisor = 1e9 if magic == PCAP_MAGIC_NS else 1e6
+        self.snaplen, linktype = struct.unpack(endian + "II", header[16:24])
+        self.linktype = linktype & 0x0fffffff
+        self.data_start = 24
+        return True
+
+    def _pcap_packets(self, start=None, end=None):
+        f = self.file
+        pos = self.data_start if start is None else start
+        f.seek(pos)
+        divisor = self.divisor
+        linktype = self.linktype
+        record = struct.Struct(self.endian + "IIII")
+        read = f.read
+        while end is None or pos < end:
+            rec = read(16)
+            if len(rec) < 16:
+                return
+            sec, frac, incl_len, _orig_len = record.unpack(rec)
+            data = read(incl_len)
+            if len(data) < incl_len:
+                _logger.warning("{}: truncated record".format(self.path))
+                return
+            pos += 16 + incl_len
+            yield sec + frac / divisor, linktype, data
+
+    def _pcapng_packets(self, start=None, end=None, state=None):
+        f = self.file
+        pos = self.data_start if start is None else start
+        f.seek(pos)
+        endian, interfaces = state if state is not None else (self.endian, [])
+        interfaces = list(interfaces)
+        while end is None or pos < end:
+            head = f.read(8)
+            if len(head) < 8:
+                return
+            block_type, block_len = struct.unpack(endian + "II", head)
+            if block_type == PCAPNG_SHB:
+                body = f.read(4)
+                if struct.unpack("<I", body)[0] == PCAPNG_BYTE_ORDER_MAGIC:
+                    endian = "<"
+                else:
+                    endian = ">"
+                block_len = struct.unpack(endian + "I", head[4:])[0]
+                f.seek(block_len - 12, 1)
+                pos += block_len
+                interfaces = []
+                continue
+            if block_len < 12:
+                raise ValueError("{}: corrupt pcapng block".format(self.path))
+            body = f.read(block_len - 8)
+            if len(body) < block_len - 8:
+                _logger.warning("{}: truncated block".format(self.path))
+                return
+            pos += block_len
+
+            if block_type == PCAPNG_IDB:
+                linktype = struct.unpack_from(endian + "H", body)[0]
+                interfaces.append((linktype, self._tsresol(body, endian)))
+            elif block_type in (PCAPNG_EPB, PCAPNG_PB):
+                if block_type == PCAPNG_EPB:
+                    iface, high, low, incl_len, _ = struct.unpack_from(
+                        endian + "IIIII", body)
+                else:
+                    iface, _drops, high, low, incl_len, _ = struct.unpack_from(
+                        endian + "HHIIII", body)
+                if iface >= len(interfaces):
+                    _logger.warning(
+                        "{}: packet for unknown interface {}".format(
+                            self.path, iface))
+                    continue
+                linktype, resolution = interfaces[iface]
+                timestamp = ((high << 32) | low) / resolution
+                yield timestamp, linktype, body[20:20 + incl_len]
+            elif block_type == PCAPNG_SPB:
+                linktype, _ = interfaces[0]
+                orig_len = struct.unpack_from(endian + "I", body)[0]
+                yield 0.0, linktype, body[4:4 + orig_len]
+
+    @staticmethod
+    def _tsresol(body, endian):
+        """ Units per second of the timestamps for an interface.
+
+        """
+        offset = 8
+        while offset + 4 <= len(body) - 4:
+            code, length = struct.unpack_from(endian + "HH", body, offset)
+            if code == 0:
+                break
+            if code == PCAPNG_OPT_IF_TSRESOL and length >= 1:
+                value = body[offset + 4]
+                if value & 0x80:
+                    return float(2 ** (value & 0x7f))
+                return float(10 ** value)
+            offset += 4 + ((length + 3) & ~3)
+        return 1e6
+
+    def partition(self, size):
+        """ Split the file into record aligned byte ranges.
+
+        Records carry no sync marker so each boundary is found by looking
+        forward from every ``size`` bytes for an offset where
+        :py:data:`RESYNC_DEPTH` headers in a row are plausible and chain
+        into each other, with no more than :py:data:`RESYNC_MAX_GAP`
+        seconds between neighbouring pcap records. Only a few kilobytes
+        around each boundary are read, not every record header.
+
+        Args:
+            size (int): the target length of each range in bytes.
+
+        Returns:
+            list: ``(start, end, state)`` tuples covering every record in
+            order, to be passed on to :py:meth:`packets`.
+
+        """
+        self.open()
+        if self.pcapng is None and not self._read_header():
+            return []
+        file_size = os.fstat(self.file.fileno()).st_size
+        if file_size <= self.data_start:
+            return []
+
+        with mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ) as m:
+            resync = self._pcapng_resync if self.pcapng else self._pcap_resync
+            boundaries = [self.data_start]
+            target = self.data_start + size
+            while target < file_size:
+                boundary = resync(m, max(target, boundaries[-1] + 1))
+                if boundary is None or boundary >= file_size:
+                    break
+                boundaries.append(boundary)
+                target = boundary + size
+
+            if self.pcapng:
+                states = self._interfaces_at(m, boundaries)
+            else:
+                states = [None] * len(boundaries)
+
+        boundaries.append(file_size)
+        ranges = []
+        for i, (start, end) in enumerate(zip(boundaries, boundaries[1:])):
+            ranges.append((start, end, None if i == 0 else states[i]))
+        return ranges
+
+    def _pcap_resync(self, m, pos):
+        record = struct.Struct(self.endian + "IIII")
+        limit = min(len(m) - record.size, pos + RESYNC_WINDOW)
+        max_frac = int(self.divisor)
+        max_len = max(self.snaplen, MAX_RECORD)
+        while pos <= limit:
+            p = pos
+            last = None
+            for _ in range(RESYNC_DEPTH):
+                if p == len(m):
+                    return pos
+                if p + record.size > len(m):
+                    break
+                sec, frac, incl_len, orig_len = record.unpack_from(m, p)
+                if (frac >= max_frac or not 0 < incl_len <= orig_len
+                        or incl_len > max_len or orig_len > 4 * max_len
+                        or (last is not None
+                            and abs(sec - last) > RESYNC_MAX_GAP)):
+                    break
+                last = sec
+                p += record.size + incl_len
+            else:
+                return pos
+            pos += 1
+        return None
+
+    def _pcapng_resync(self, m, pos):
+        pos += -pos % 4
+        head = struct.Struct(self.endian + "II")
+        trail = struct.Struct(self.endian + "I")
+        limit = min(len(m) - head.size, pos + RESYNC_WINDOW)
+        while pos <= limit:
+            p = pos
+            for _ in range(RESYNC_DEPTH):
+                if p == len(m):
+                    return pos
+                if p + head.size > len(m):
+                    break
+                block_type, block_len = head.unpack_from(m, p)
+                if (block_type not in PCAPNG_BLOCKS or block_len < 12
+                        or block_len % 4 or p + block_len > len(m)
+                        or trail.unpack_from(
+                            m, p + block_len - 4)[0] != block_len):
+                    break
+                p += block_len
+            else:
+                return pos
+            pos += 4
+        return None
+
+    def _interfaces_at(self, m, boundaries):
+        """ The reader state at each boundary of a pcapng file.
+
+        Interfaces may be described anywhere in a section, not only
+        before its first packet, so the block headers are walked up to
+        every boundary. Only the 8 byte header of each block is read,
+        and the body of interface and section header blocks.
+
+        Args:
+            boundaries (list): block aligned offsets in file order.
+
+        Returns:
+            list: ``(endian, interfaces)`` in effect at each boundary.
+
+        """
+        states = []
+        endian = self.endian
+        interfaces = []
+        pos = 0
+        for boundary in boundaries:
+            while pos < boundary and pos + 12 <= len(m):
+                block_type, block_len = struct.unpack_from(
+                    endian + "II", m, pos)
+                if block_type == PCAPNG_SHB:
+                    order = struct.unpack_from("<I", m, pos + 8)[0]
+                    endian = "<" if order == PCAPNG_BYTE_ORDER_MAGIC else ">"
+                    block_len = struct.unpack_from(endian + "I", m, pos + 4)[0]
+                    interfaces = []
+                elif block_type == PCAPNG_IDB:
+                    body = m[pos + 8:pos + block_len]
+                    linktype = struct.unpack_from(endian + "H", body)[0]
+                    interfaces.append((linktype, self._tsresol(body, endian)))
+                if block_len < 12:
+                    break
+                pos += block_len
+            states.append((endian, tuple(interfaces)))
+        return states
+
+
+def _read_range(task):
+    """ Parse one byte range of a capture file in a worker process.
+
+    Returns:
+        bytes: the frames in the range sorted by capture time and packed
+        with :func:`antikythera.gsmtap.pack_frames`.
+
+    """
+    path, port, start, end, state = task
+    with PcapReader(path, port) as reader:
+        frames = sorted(reader.frames(start, end, state), key=_timestamp)
+    return pack_frames(frames)
+
+
+def read_parallel(path, jobs, chunk_size=DEFAULT_CHUNK_SIZE, port=GSMTAP_PORT):
+    """ Parse a large capture file with a pool of processes.
+
+    The file is split by :py:meth:`PcapReader.partition` and each range
+    is parsed by a worker. Ranges come back in file order as packed
+    records and are merged on capture time, so frames are yielded in
+    capture time order unless the file is out of order by more than a
+    whole range. Only a few ranges per worker are in flight at once.
+
+    The frames are never unpacked in the calling process, they are
+    yielded as record arrays that can be queued as they are, see
+    :py:meth:`antikythera.capture.Capture.replay_records`.
+
+    Args:
+        path (str): the pcap or pcapng file.
+        jobs (int): the number of worker processes.
+        chunk_size (int): the target length of each range in bytes.
+        port (int): the UDP port GSMTAP is carried on.
+
+    Yields:
+        array of :py:data:`antikythera.packets.batch.FRAME_DTYPE`: the
+        records of up to a few ranges at a time.
+
+    """
+    with PcapReader(path, port) as reader:
+        ranges = reader.partition(chunk_size)
+    _logger.info("{}: parsing {} ranges with {} processes".format(
+        path, len(ranges), jobs))
+
+    tasks = iter([(path, port, start, end, state)
+                  for start, end, state in ranges])
+    with mp.Pool(jobs) as pool:
+        yield from _merge_ranges(_results(pool, tasks, 2 * jobs))
+
+
+def _results(pool, tasks, depth):
+    """ Run tasks with :func:`_read_range` and yield their results in
+    order, ``depth`` at a time in flight.
+
+    """
+    results = deque(pool.apply_async(_read_range, (task,))
+                    for task in islice(tasks, depth))
+    while results:
+        block = results.popleft().get()
+        task = next(tasks, None)
+        if task is not None:
+            results.append(pool.apply_async(_read_range, (task,)))
+        yield block
+
+
+def _merge_ranges(blocks):
+    """ Merge the frame records of consecutive ranges on capture time.
+
+    Each range is sorted already, ranges are usually in order and only
+    need merging where a range starts before the previous one ends. Only
+    the timestamp columns are compared, the records stay packed.
+
+    Args:
+        blocks: the packed frames of each range in file order.
+
+    Yields:
+        array of :py:data:`antikythera.packets.batch.FRAME_DTYPE`
+
+    """
+    pending = None
+    for block in blocks:
+        records = np.frombuffer(block, dtype=FRAME_DTYPE)
+        if not len(records):
+            continue
+        # Everything before this range's first frame is final
+        low = records["timestamp"][0]
+        if pending is None or pending["timestamp"][-1] <= low:
+            if pending is not None:
+                yield pending
+            pending = records
+            continue
+        cut = np.searchsorted(pending["timestamp"], low, side="right")
+        if cut:
+            yield pending[:cut]
+        # A stable sort keeps the earlier range first on equal timestamps
+        merged = np.concatenate((pending[cut:], records))
+        pending = merged[np.argsort(merged["timestamp"], kind="stable")]
+    if pending is not None:
+        yield pending
@@ -0,0 +1,368 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" retention.py
+
+Keep the stored data within a retention policy and a disk cap.
+
+Left alone the database and event store grow until the SD card is full.
+The :obj:`Compactor` applies a policy by the age of the data:
+
+- Raw messages, the ``message`` of System Information snapshots and
+  Immediate Assignments, are cleared after ``raw_retention`` seconds,
+  the decoded columns stay.
+- The rows of each message are deleted after ``retention`` seconds,
+  they are first counted into ``cell_minutes``, one row per ARFCN and
+  minute kept indefinitely. Event store segments are dropped at the
+  same age.
+- While the database, its write-ahead log, and the event store use
+  more than ``max_bytes`` the oldest rows and segments go first,
+  whatever their age. They are evicted until the disk used is under
+  the cap, however fast data arrives, see :py:meth:`Compactor.shrink`.
+
+Ages are counted back from the newest event stored rather than the
+clock, a replayed capture is not expired as soon as it is written.
+
+The work is done in slices of at most ``slice_rows`` rows, each in its
+own short transaction, by the writer process between flushes, see
+:py:meth:`Compactor.step`. Ingest waits at most for one slice, except
+while over the disk cap when it waits for the cap to be met. Freed
+pages are returned to the file system a few at a time with SQLite's
+incremental vacuum.
+
+"""
+import os
+import logging
+
+from time import monotonic
+
+from antikythera.packets import rr
+from antikythera.events import STREAMS
+
+_logger = logging.getLogger(__name__)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+# Seconds raw messages are kept
+RAW_RETENTION = 6 * 3600
+
+# Seconds the rows of each message are kept
+ROW_RETENTION = 7 * 86400
+
+# Rows deleted or cleared in one transaction
+SLICE_ROWS = 1000
+
+# Free pages returned to the file system in one step
+VACUUM_PAGES = 256
+
+# Seconds between steps
+COMPACT_INTERVAL = 1.0
+
+# Tables whose raw messages are cleared
+RAW_TABLES = ("si_snapshots", "assignments")
+
+# Counts a table's rows up to an id into cell_minutes before they are
+# deleted, rows without an ARFCN count under -1
+AGGREGATES = {
+    "pagings":
+        "INSERT INTO cell_minutes (arfcn, minute, pagings, imsi_pagings) "
+        "SELECT coalesce(arfcn, -1), CAST(timestamp / 60 AS INTEGER) * 60, "
+        "COUNT(*), SUM(identity_type = {}) FROM pagings WHERE id <= ? "
+        "GROUP BY 1, 2 ON CONFLICT (arfcn, minute) DO UPDATE SET "
+        "pagings = pagings + excluded.pagings, "
+        "imsi_pagings = imsi_pagings + excluded.imsi_pagings".format(
+            rr.MI_IMSI),
+    "assignments":
+        "INSERT INTO cell_minutes (arfcn, minute, assignments) "
+        "SELECT coalesce(arfcn, -1), CAST(timestamp / 60 AS INTEGER) * 60, "
+        "COUNT(*) FROM assignments WHERE id <= ? GROUP BY 1, 2 "
+        "ON CONFLICT (arfcn, minute) DO UPDATE SET "
+        "assignments = assignments + excluded.assignments",
+    "si_snapshots":
+        "INSERT INTO cell_minutes (arfcn, minute, si_changes) "
+        "SELECT coalesce(arfcn, -1), CAST(timestamp / 60 AS INTEGER) * 60, "
+        "COUNT(*) FROM si_snapshots WHERE id <= ? GROUP BY 1, 2 "
+        "ON CONFLICT (arfcn, minute) DO UPDATE SET "
+        "si_changes = si_changes + excluded.si_changes",
+}
+
+
+def _old_prefix(rows, before):
+    """ The id of the last row before the first one as new as
+    ``before``, ``None`` if the first row is.
+
+    """
+    last = None
+    for row_id, timestamp in rows:
+        if timestamp >= before:
+            break
+        last = row_id
+    return last
+
+
+class Compactor(object):
+    """ Apply the retention policy a slice at a time.
+
+    Args:
+        storage (:obj:`antikythera.storage.Storage`): the database,
+            ``None`` for none.
+        events (:obj:`antikythera.events.EventStore`): the event store,
+            ``None`` for none.
+        raw_retention (float): seconds raw messages are kept, ``None``
+            to keep them.
+        retention (float): seconds message rows and events are kept,
+            ``None`` to keep them.
+        max_bytes (int): the most disk the database and event store
+            use, ``None`` for no cap.
+        slice_rows (int): rows per transaction.
+        interval (float): seconds between steps.
+
+    Attributes:
+        cleared (int): raw messages cleared.
+        deleted (int): rows and events deleted for their age.
+        evicted (int): rows and events deleted for the disk cap.
+
+    """
+    def __init__(self, storage=None, events=None,
+                 raw_retention=RAW_RETENTION, retention=ROW_RETENTION,
+                 max_bytes=None, slice_rows=SLICE_ROWS,
+                 interval=COMPACT_INTERVAL):
+        self.storage = storage
+        self.events = events
+        self.raw_retention = raw_retention
+        self.retention = retention
+        self.max_bytes = max_bytes
+        self.slice_rows = slice_rows
+        self.interval = interval
+        # Last id of each table whose raw message is cleared
+        self.cursors = {table: 0 for table in RAW_TABLES}
+        self.last = None
+        self.cleared = 0
+        self.deleted = 0
+        self.evicted = 0
+        self.compact_time = 0.0
+
+    @property
+    def connection(self):
+        return None if self.storage is None else self.storage.connection
+
+    def due(self):
+        """ Whether the next step should run now.
+
+        """
+        return self.last is None or monotonic() - self.last >= self.interval
+
+    def due_in(self):
+        """ Seconds until the next step.
+
+        """
+        if self.last is None:
+            return 0.0
+        return max(0.0, self.interval - (monotonic() - self.last))
+
+    def step(self):
+        """ Do one slice of each kind of work due.
+
+        Returns:
+            int: the rows and events cleared or deleted.
+
+        """
+        start = self.last = monotonic()
+        done = 0
+        newest = self.newest()
+        if newest is not None:
+            if self.raw_retention is not None:
+                done += self.clear_raw(newest - self.raw_retention)
+            if self.retention is not None:
+                done += self.expire(newest - self.retention)
+        if self.max_bytes is not None:
+            done += self.shrink()
+        self.vacuum()
+        self.compact_time += monotonic() - start
+        if done:
+            _logger.debug("Compactor: {} rows in {:.3f}s".format(
+                done, monotonic() - start))
+        return done
+
+    def newest(self):
+        """ The newest time stored, that of the last row written to each
+        table and of the newest event, ``None`` if there is none.
+
+        """
+        times = []
+        if self.connection is not None:
+            for table in AGGREGATES:
+                row = self.connection.execute(
+                    "SELECT timestamp FROM {} ORDER BY id DESC "
+                    "LIMIT 1".format(table)).fetchone()
+                if row is not None:
+                    times.append(row[0])
+        if self.events is not None and self.events.newest() is not None:
+            times.append(self.events.newest())
+        return max(times, default=None)
+
+    def clear_raw(self, before):
+        """ Clear a slice of the raw messages of each table.
+
+        Args:
+            before (float): messages older are cleared.
+
+        Returns:
+            int: the messages cleared.
+
+        """
+        if self.connection is None:
+            return 0
+        cleared = 0
+        for table in RAW_TABLES:
+            rows = self.connection.execute(
+                "SELECT id, timestamp FROM {} WHERE id > ? ORDER BY id "
+                "LIMIT ?".format(table),
+                (self.cursors[table], self.slice_rows)).fetchall()
+            last = _old_prefix(rows, before)
+            if last is None:
+                continue
+            with self.connection:
+                self.connection.execute("BEGIN IMMEDIATE")
+                cleared += self.connection.execute(
+                    "UPDATE {} SET message = X'' WHERE id > ? AND id <= ? "
+                    "AND length(message) > 0".format(table),
+                    (self.cursors[table], last)).rowcount
+            self.cursors[table] = last
+        self.cleared += cleared
+        return cleared
+
+    def expire(self, before):
+        """ Delete a slice of the rows of each table, and the event store
+        segments, older than a time.
+
+        Args:
+            before (float): rows older are deleted.
+
+        Returns:
+            int: the rows and events deleted.
+
+        """
+        deleted = 0
+        if self.connection is not None:
+            for table in AGGREGATES:
+                deleted += self._delete_slice(table, before)
+        if self.events is not None:
+            for stream in STREAMS:
+                deleted += self.events.drop(stream, before)
+        self.deleted += deleted
+        return deleted
+
+    def evict(self):
+        """ Delete the oldest slice of each table and the oldest segment
+        of each stream.
+
+        Returns:
+            int: the rows and events deleted.
+
+        """
+        evicted = 0
+        if self.connection is not None:
+            for table in AGGREGATES:
+                evicted += self._delete_slice(table)
+        if self.events is not None:
+            for stream in STREAMS:
+                evicted += self.events.drop_oldest(stream)
+        self.evicted += evicted
+        return evicted
+
+    def shrink(self):
+        """ Evict until the disk used is under ``max_bytes``.
+
+        After each slice the freed pages are returned to the file system
+        and the write-ahead log is checkpointed and truncated, the log
+        counts towards the cap and does not shrink by itself.
+
+        Returns:
+            int: the rows and events deleted, ``0`` if under the cap.
+
+        """
+        evicted = 0
+        while self.disk_usage() > self.max_bytes:
+            count = self.evict()
+            self.vacuum(0)
+            self.checkpoint()
+            evicted += count
+            if not count:
+                break
+        if evicted:
+            _logger.info(
+                "Compactor: evicted {} rows to stay under {} bytes".format(
+                    evicted, self.max_bytes))
+        return evicted
+
+    def _delete_slice(self, table, before=None):
+        """ Count the oldest rows of a table into ``cell_minutes`` and
+        delete them.
+
+        Args:
+            table (str): one of :py:data:`AGGREGATES`.
+            before (float): only rows older, ``None`` for a whole slice.
+
+        """
+        rows = self.connection.execute(
+            "SELECT id, timestamp FROM {} ORDER BY id LIMIT ?".format(table),
+            (self.slice_rows,)).fetchall()
+        if not rows:
+            return 0
+        last = rows[-1][0] if before is None else _old_prefix(rows, before)
+        if last is None:
+            return 0
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.execute(AGGREGATES[table], (last,))
+            return self.connection.execute(
+                "DELETE FROM {} WHERE id <= ?".format(table), (last,)).rowcount
+
+    def vacuum(self, pages=VACUUM_PAGES):
+        """ Return free pages of the database to the file system.
+
+        Args:
+            pages (int): the most pages returned, ``0`` for all.
+
+        """
+        if self.connection is not None:
+            # executescript steps the pragma to the end, execute frees
+            # a single page
+            self.connection.executescript(
+                "PRAGMA incremental_vacuum({})".format(pages))
+
+    def checkpoint(self):
+        """ Copy the write-ahead log into the database and truncate it.
+
+        """
+        if self.connection is not None:
+            self.connection.execute(
+                "PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+
+    def disk_usage(self):
+        """ Bytes used by the database, its write-ahead log, and the
+        event store.
+
+        """
+        used = 0
+        if self.storage is not None:
+            for path in (self.storage.path, self.storage.path + "-wal"):
+                if os.path.exists(path):
+                    used += os.path.getsize(path)
+        if self.events is not None:
+            used += self.events.size()
+        return used
+
+    def stats(self):
+        """ Work done.
+
+        Returns:
+            dict: ``cleared``, ``deleted``, ``evicted``, and the
+            ``disk`` bytes used.
+
+        """
+        return {"cleared": self.cleared, "deleted": self.deleted,
+                "evicted": self.evicted, "disk": self.disk_usage()}
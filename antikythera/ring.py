@@ -0,0 +1,251 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" ring.py
+
+A ring of fixed size slots in shared memory used in place of the
+packet :obj:`multiprocessing.Queue`.
+
+Messages are written straight into a slot by the producer and handed
+to a consumer as a :obj:`memoryview` of that slot, there is no feeder
+thread, pipe, or pickling between the processes. The lock is only held
+while the head and tail counters and the slot sequence numbers are
+updated, never while the message is copied in or read out.
+
+Every slot carries a sequence number, a slot at position ``pos`` is free
+for the producer when its sequence is ``pos`` and ready for a consumer
+when it is ``pos + 1``. Consumers release a slot by setting it to
+``pos + slots`` so slots may be released in any order.
+
+"""
+import struct
+import logging
+
+from time import sleep, monotonic
+from queue import Empty, Full
+from multiprocessing import Lock, shared_memory
+
+_logger = logging.getLogger(__name__)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+# head, tail, overflows, high water mark
+_COUNTERS = struct.Struct("<QQQQ")
+# sequence number, message length
+_SLOT_HEADER = struct.Struct("<QI4x")
+
+_MIN_BACKOFF = 0.0001
+_MAX_BACKOFF = 0.01
+
+
+class RingBuffer(object):
+    """ A shared memory message ring with a :obj:`queue.Queue` like API.
+
+    One process may put messages, any number may get them. The ring is
+    created by the process that owns it and attached to by name when it
+    is passed to a child process.
+
+    Args:
+        slots (int): the number of messages the ring holds.
+        slot_size (int): the largest message in bytes.
+        lock (:obj:`multiprocessing.Lock`): guards the counters, a new
+            lock is made if not given.
+
+    Attributes:
+        name (str): the name of the shared memory block.
+
+    """
+    def __init__(self, slots, slot_size, lock=None):
+        self.slots = max(1, slots)
+        self.slot_size = slot_size
+        self.stride = _SLOT_HEADER.size + slot_size
+        self.lock = lock if lock is not None else Lock()
+        size = _COUNTERS.size + self.slots * self.stride
+        self.shm = shared_memory.SharedMemory(create=True, size=size)
+        self.name = self.shm.name
+        self._held = None
+        self._view = None
+
+        buf = self.shm.buf
+        _COUNTERS.pack_into(buf, 0, 0, 0, 0, 0)
+        for i in range(self.slots):
+            _SLOT_HEADER.pack_into(buf, self._offset(i), i, 0)
+        _logger.info("Ring: created {} with {} slots of {} bytes".format(
+            self.name, self.slots, slot_size))
+
+    def __getstate__(self):
+        return {"slots": self.slots, "slot_size": self.slot_size,
+                "stride": self.stride, "lock": self.lock, "name": self.name}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.shm = shared_memory.SharedMemory(name=self.name)
+        self._held = None
+        self._view = None
+
+    def _offset(self, index):
+        return _COUNTERS.size + index * self.stride
+
+    def _counters(self):
+        return _COUNTERS.unpack_from(self.shm.buf, 0)
+
+    def _seq(self, pos):
+        return _SLOT_HEADER.unpack_from(self.shm.buf,
+                                        self._offset(pos % self.slots))
+
+    def put(self, data, block=True, timeout=None):
+        """ Copy a message into the next free slot.
+
+        Args:
+            data: a bytes like object no longer than ``slot_size``.
+            block (bool): wait for a free slot if the ring is full.
+            timeout (float): the most seconds to wait, ``None`` is forever.
+
+        Raises:
+            queue.Full: if no slot became free, the overflow count is
+                incremented.
+
+        """
+        length = len(data)
+        if length > self.slot_size:
+            raise ValueError("Ring: message of {} bytes does not fit in {} "
+                             "byte slots".format(length, self.slot_size))
+
+        buf = self.shm.buf
+        deadline = None if timeout is None else monotonic() + timeout
+        backoff = _MIN_BACKOFF
+        while True:
+            with self.lock:
+                head, tail, overflows, high = self._counters()
+                seq, _ = self._seq(head)
+                if seq == head:
+                    break
+                if not block or (deadline is not None
+                                 and monotonic() >= deadline):
+                    _COUNTERS.pack_into(buf, 0, head, tail, overflows + 1,
+                                        high)
+                    raise Full
+            sleep(backoff)
+            backoff = min(backoff * 2, _MAX_BACKOFF)
+
+        start = self._offset(head % self.slots) + _SLOT_HEADER.size
+        buf[start:start + length] = data
+
+        with self.lock:
+            head, tail, overflows, high = self._counters()
+            _SLOT_HEADER.pack_into(buf, start - _SLOT_HEADER.size, head + 1,
+                                   length)
+            head += 1
+            _COUNTERS.pack_into(buf, 0, head, tail, overflows,
+                                max(high, head - tail))
+
+    def put_nowait(self, data):
+        return self.put(data, block=False)
+
+    def get(self, block=True, timeout=None):
+        """ Take the oldest message out of the ring.
+
+        The slot given out earlier to this process is released first.
+
+        Args:
+            block (bool): wait for a message if the ring is empty.
+            timeout (float): the most seconds to wait, ``None`` is forever.
+
+        Returns:
+            memoryview: the message read in place, it stays valid until
+            the next call to :py:meth:`get` or :py:meth:`release`.
+
+        Raises:
+            queue.Empty: if no message arrived.
+
+        """
+        self.release()
+        buf = self.shm.buf
+        deadline = None if timeout is None else monotonic() + timeout
+        backoff = _MIN_BACKOFF
+        while True:
+            with self.lock:
+                head, tail, overflows, high = self._counters()
+                seq, length = self._seq(tail)
+                if seq == tail + 1:
+                    _COUNTERS.pack_into(buf, 0, head, tail + 1, overflows,
+                                        high)
+                    break
+            if not block or (deadline is not None and monotonic() >= deadline):
+                raise Empty
+            sleep(backoff)
+            backoff = min(backoff * 2, _MAX_BACKOFF)
+
+        start = self._offset(tail % self.slots) + _SLOT_HEADER.size
+        self._held = tail
+        self._view = buf[start:start + length]
+        return self._view
+
+    def get_nowait(self):
+        return self.get(block=False)
+
+    def release(self):
+        """ Give the slot returned by the last :py:meth:`get` back.
+
+        """
+        if self._held is None:
+            return
+        if self._view is not None:
+            self._view.release()
+            self._view = None
+        pos, self._held = self._held, None
+        with self.lock:
+            _SLOT_HEADER.pack_into(self.shm.buf,
+                                   self._offset(pos % self.slots),
+                                   pos + self.slots, 0)
+
+    def qsize(self):
+        """ The number of messages written and not yet taken.
+
+        """
+        head, tail, _, _ = self._counters()
+        return head - tail
+
+    def empty(self):
+        return self.qsize() == 0
+
+    def full(self):
+        return self.qsize() >= self.slots
+
+    def stats(self):
+        """ Occupancy and overflow counts of the ring.
+
+        Returns:
+            dict: ``occupancy`` messages waiting, ``high_water`` most
+            messages ever waiting, ``overflows`` puts that found the ring
+            full, ``written`` total messages put, and ``slots``.
+
+        """
+        head, tail, overflows, high = self._counters()
+        return {"occupancy": head - tail, "high_water": high,
+                "overflows": overflows, "written": head, "slots": self.slots}
+
+    def close(self):
+        """ Detach this process from the shared memory.
+
+        """
+        if self.shm is None:
+            return
+        self.release()
+        self.shm.close()
+        self.shm = None
+
+    def unlink(self):
+        """ Free the shared memory, only the creating process should call.
+
+        """
+        if self.shm is None:
+            self.shm = shared_memory.SharedMemory(name=self.name)
+        shm = self.shm
+        self.close()
+        try:
+            shm.unlink()
+        except FileNotFoundError:
+            pass
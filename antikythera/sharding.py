@@ -0,0 +1,153 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" sharding.py
+
+Route frames to decoder workers by the cell they belong to.
+
+Every decoder has its own queue and the capture decides which queue a
+frame goes on from its ARFCN, all the frames of a cell are decoded by
+the same worker in the order they were captured. A worker can then keep
+the state of its cells without sharing or locking it.
+
+ARFCNs are first placed by hash. The traffic of each ARFCN is counted
+and every ``interval`` frames the router checks whether one worker gets
+more than its share, if so cells are moved off it to the least loaded
+worker. A single cell is never split so when one cell dominates the
+traffic the other cells are moved away and it is left with a worker of
+its own.
+
+A moved cell keeps its capture order, the capture holds its frames
+until the old worker has decoded every frame queued for it before the
+move, see :obj:`antikythera.capture.ShardedBatcher`. State a worker kept
+for the cell stays behind, the new worker's System Information cache
+has not seen the cell and decodes its current broadcast once more, as
+after a restart. The metrics compare a cell's broadcast with the last
+one they saw so that is not reported as a change.
+
+"""
+import logging
+
+from collections import Counter
+
+from antikythera.gsmtap import GSMTAP_ARFCN_MASK
+
+_logger = logging.getLogger(__name__)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+REBALANCE_INTERVAL = 10000
+REBALANCE_THRESHOLD = 1.25
+
+
+class ShardRouter(object):
+    """ Map ARFCNs to shards and rebalance them by load.
+
+    Args:
+        shards (int): the number of decoder queues.
+        interval (int): frames between load checks, ``0`` never
+            rebalances.
+        threshold (float): a shard is overloaded when it carries more
+            than ``threshold`` times the mean load.
+
+    Attributes:
+        table (dict): ``{arfcn: shard}`` for every ARFCN seen, the uplink
+            and PCS flag bits are masked off so both directions of a cell
+            share a shard.
+        counts (:obj:`collections.Counter`): frames per ARFCN since the
+            last load check.
+        moves (int): cells moved by rebalancing.
+
+    """
+    def __init__(self, shards, interval=REBALANCE_INTERVAL,
+                 threshold=REBALANCE_THRESHOLD):
+        self.shards = max(1, shards)
+        self.interval = interval
+        self.threshold = threshold
+        self.table = {}
+        self.counts = Counter()
+        self.seen = 0
+        self.moves = 0
+
+    def shard(self, frame):
+        """ The shard a frame goes to.
+
+        """
+        return self.route(frame.arfcn)
+
+    def route(self, arfcn, count=1):
+        """ The shard the frames of an ARFCN go to.
+
+        Args:
+            arfcn (int): the ARFCN, GSMTAP flag bits are ignored.
+            count (int): the number of frames routed.
+
+        """
+        arfcn &= GSMTAP_ARFCN_MASK
+        shard = self.table.get(arfcn)
+        if shard is None:
+            shard = self.table[arfcn] = arfcn % self.shards
+        self.counts[arfcn] += count
+        self.seen += count
+        return shard
+
+    def due(self):
+        """ Whether enough frames were routed to check the load.
+
+        """
+        return (self.interval > 0 and self.shards > 1
+                and self.seen >= self.interval)
+
+    def loads(self):
+        """ Frames routed to each shard since the last load check.
+
+        """
+        loads = [0] * self.shards
+        for arfcn, count in self.counts.items():
+            loads[self.table[arfcn]] += count
+        return loads
+
+    def rebalance(self):
+        """ Move cells off overloaded shards and start a new count.
+
+        Cells are moved from the busiest shard to the least busy one,
+        the busiest cell on a shard always stays. A move is only made if
+        it lowers the busiest load.
+
+        Returns:
+            list: ``(arfcn, old shard, new shard)`` for each cell moved.
+
+        """
+        loads = self.loads()
+        mean = sum(loads) / self.shards
+        moved = []
+        while mean:
+            heavy = max(range(self.shards), key=loads.__getitem__)
+            light = min(range(self.shards), key=loads.__getitem__)
+            if loads[heavy] <= self.threshold * mean:
+                break
+            cells = sorted((count, arfcn)
+                           for arfcn, count in self.counts.items()
+                           if self.table[arfcn] == heavy)
+            gap = loads[heavy] - loads[light]
+            # The busiest cell stays, of the others move the largest that
+            # still leaves the light shard below the heavy one
+            movable = [(count, arfcn) for count, arfcn in cells[:-1]
+                       if count < gap]
+            if not movable:
+                break
+            count, arfcn = movable[-1]
+            self.table[arfcn] = light
+            loads[heavy] -= count
+            loads[light] += count
+            moved.append((arfcn, heavy, light))
+
+        if moved:
+            self.moves += len(moved)
+            _logger.info("Sharding: moved {} cells, shard loads {}".format(
+                len(moved), loads))
+        self.counts.clear()
+        self.seen = 0
+        return moved
@@ -0,0 +1,173 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" sources.py
+
+Find the capture files named on the command line and replay them as a
+single stream in capture time order.
+
+Sensors rotate their captures every few minutes so a day of data is
+hundreds of files. The ``-c`` option may name a file, a directory, or a
+glob pattern, the matching files are merged by their timestamps with a
+k-way merge. Files are only opened once the merge reaches their first
+frame and at most ``max_open`` of them are open at a time.
+
+Example:
+    Replay every capture in a directory::
+
+        from antikythera.sources import expand_captures, merge_captures
+
+        for frame in merge_captures(expand_captures("/var/captures")):
+            print(frame.timestamp, frame.arfcn)
+
+"""
+import os
+import glob
+import heapq
+import logging
+
+from collections import deque
+
+from antikythera.pcap import PcapReader
+from antikythera.diag import DiagReader
+
+_logger = logging.getLogger(__name__)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+CAPTURE_EXTENSIONS = (".pcap", ".pcapng", ".cap", ".bin")
+DEFAULT_MAX_OPEN = 32
+
+
+def open_capture(path):
+    """ Pick the reader for a capture file by its extension.
+
+    Args:
+        path (str): a ``.pcap`` or ``.pcapng`` file, or a ``.bin`` raw
+            DIAG dump.
+
+    Returns:
+        :obj:`antikythera.pcap.PcapReader` or
+        :obj:`antikythera.diag.DiagReader`
+
+    """
+    if path.lower().endswith(".bin"):
+        return DiagReader(path)
+    return PcapReader(path)
+
+
+def expand_captures(spec):
+    """ List the capture files a ``-c`` argument names.
+
+    Args:
+        spec (str): a capture file, a directory, or a glob pattern such
+            as ``captures/2017-04-*.pcapng``. Directories and patterns
+            are searched for files ending in one of
+            :py:data:`CAPTURE_EXTENSIONS`, ``**`` in a pattern matches
+            any number of directories.
+
+    Returns:
+        list: the file paths sorted by name, empty if nothing matched.
+
+    """
+    spec = os.path.expanduser(spec.strip())
+    if os.path.isdir(spec):
+        paths = [os.path.join(spec, name) for name in os.listdir(spec)]
+    elif glob.has_magic(spec):
+        paths = glob.glob(spec, recursive=True)
+    else:
+        return [spec]
+    return sorted(path for path in paths
+                  if os.path.isfile(path)
+                  and path.lower().endswith(CAPTURE_EXTENSIONS))
+
+
+def first_timestamp(path):
+    """ The timestamp of the first frame in a capture file.
+
+    Returns:
+        float: the capture time or ``None`` if the file holds no frames
+        or cannot be read.
+
+    """
+    try:
+        with open_capture(path) as capture:
+            for frame in capture:
+                return frame.timestamp
+    except (OSError, ValueError) as e:
+        _logger.warning("Sources: skipping {}: {}".format(path, e))
+    return None
+
+
+def merge_captures(paths, max_open=DEFAULT_MAX_OPEN):
+    """ Iterate over the frames of many capture files in time order.
+
+    Each file is opened briefly to read its first timestamp, then the
+    files are merged with a heap keyed on the next frame of every open
+    file. A file is opened for the merge when its first frame is due
+    and closed as soon as it runs out, files that do not overlap in time
+    are therefore read one after the other.
+
+    Frames within a file are assumed to be in time order. If more than
+    ``max_open`` files overlap the next one waits for an open file to
+    finish and its frames may come out of order.
+
+    Args:
+        paths (list): the capture files, see :func:`expand_captures`.
+        max_open (int): the most files open at a time.
+
+    Yields:
+        :obj:`antikythera.gsmtap.Frame`: the frames of every file.
+
+    """
+    max_open = max(1, max_open)
+    starts = []
+    for path in paths:
+        timestamp = first_timestamp(path)
+        if timestamp is not None:
+            starts.append((timestamp, path))
+    starts.sort()
+    pending = deque(starts)
+    _logger.info("Sources: merging {} of {} capture files".format(
+        len(pending), len(paths)))
+
+    heap = []
+    warned = False
+    try:
+        while True:
+            while pending and (not heap or pending[0][0] <= heap[0][0]):
+                if len(heap) >= max_open:
+                    if not warned:
+                        _logger.warning(
+                            "Sources: more than {} capture files overlap, "
+                            "frames may be out of order".format(max_open))
+                        warned = True
+                    break
+                _, path = pending.popleft()
+                _logger.debug("Sources: opening {}".format(path))
+                capture = open_capture(path)
+                frames = iter(capture)
+                frame = next(frames, None)
+                if frame is None:
+                    capture.close()
+                    continue
+                order = len(starts) - len(pending)
+                heapq.heappush(heap, (frame.timestamp, order, frame, frames,
+                                      capture))
+
+            if not heap:
+                return
+            _, order, frame, frames, capture = heap[0]
+            yield frame
+            frame = next(frames, None)
+            if frame is None:
+                heapq.heappop(heap)
+                capture.close()
+            else:
+                heapq.heapreplace(heap, (frame.timestamp, order, frame,
+                                         frames, capture))
+    finally:
+        for _, _, _, _, capture in heap:
+            capture.close()
@@ -0,0 +1,424 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" storage.py
+
+Write the decoded messages to the SQLite database in bulk.
+
+Committing every message on its own is limited by how fast the disk
+syncs, a few hundred per second on an SD card. A :obj:`Storage` buffers
+the rows and writes them with a prepared ``executemany`` per table in a
+single transaction when ``flush_rows`` rows are pending or the oldest
+has waited ``flush_interval`` seconds. The database is in WAL mode with
+``synchronous=NORMAL``, a crash loses at most the rows of the last
+flush interval and never leaves the database corrupt.
+
+The schema, see :py:data:`SCHEMA`, is what the metrics query:
+
+``cells``
+    Every cell seen, by ARFCN and Cell Global Identity, with when it
+    was first and last seen.
+``si_snapshots``
+    The System Information a cell broadcast each time it changed.
+``pagings``
+    One row per identity paged, the IMSI digits or the TMSI as eight
+    hex digits, see :func:`format_tmsi`.
+``assignments``
+    Immediate Assignments and the channel they assign.
+``cell_minutes``
+    Counts of the above per ARFCN and minute, kept after the rows
+    themselves have expired, see :obj:`antikythera.retention.Compactor`.
+
+ARFCNs are stored without the GSMTAP uplink and PCS flag bits.
+
+Example:
+    All the pagings of a TMSI in the last hour::
+
+        connection.execute(
+            "SELECT * FROM pagings WHERE identity = ? AND timestamp > ?",
+            (format_tmsi(tmsi), time() - 3600))
+
+"""
+import os
+import sys
+import logging
+import sqlite3
+
+from time import monotonic
+
+from antikythera.gsmtap import GSMTAP_ARFCN_MASK
+from antikythera.l3 import (PD_RR, RR_SYSTEM_INFORMATION,
+                            RR_PAGING_REQUEST_1, RR_PAGING_REQUEST_2,
+                            RR_PAGING_REQUEST_3, RR_IMMEDIATE_ASSIGNMENT)
+from antikythera.packets import rr
+from antikythera.packets.batch import NONE
+
+_logger = logging.getLogger(__name__)
+
+try:
+    import numpy as np
+except ImportError as e:
+    _logger.error("Storage: {}".format(e))
+    _logger.info("Storage: Maybe try `pip install -r requirements.txt'")
+    sys.exit(1)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+FLUSH_ROWS = 10000
+FLUSH_INTERVAL = 1.0
+
+# Seconds a writer waits for another connection's transaction
+BUSY_TIMEOUT = 30.0
+
+# Bytes the write-ahead log is truncated to when it is checkpointed
+JOURNAL_SIZE_LIMIT = 4 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cells (
+    id INTEGER PRIMARY KEY,
+    arfcn INTEGER NOT NULL,
+    mcc TEXT NOT NULL,
+    mnc TEXT NOT NULL,
+    lac INTEGER NOT NULL,
+    cid INTEGER NOT NULL,
+    first_seen REAL NOT NULL,
+    last_seen REAL NOT NULL,
+    UNIQUE (arfcn, mcc, mnc, lac, cid)
+);
+CREATE INDEX IF NOT EXISTS cells_lac_cid ON cells (lac, cid);
+CREATE INDEX IF NOT EXISTS cells_arfcn_time ON cells (arfcn, last_seen);
+
+CREATE TABLE IF NOT EXISTS si_snapshots (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    arfcn INTEGER,
+    message_type INTEGER NOT NULL,
+    lac INTEGER,
+    cid INTEGER,
+    message BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS si_snapshots_arfcn_time
+    ON si_snapshots (arfcn, timestamp);
+CREATE INDEX IF NOT EXISTS si_snapshots_lac_cid ON si_snapshots (lac, cid);
+CREATE INDEX IF NOT EXISTS si_snapshots_type
+    ON si_snapshots (message_type, timestamp);
+
+CREATE TABLE IF NOT EXISTS pagings (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    arfcn INTEGER,
+    message_type INTEGER NOT NULL,
+    identity_type INTEGER NOT NULL,
+    identity TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pagings_arfcn_time ON pagings (arfcn, timestamp);
+CREATE INDEX IF NOT EXISTS pagings_identity ON pagings (identity, timestamp);
+CREATE INDEX IF NOT EXISTS pagings_type ON pagings (message_type, timestamp);
+
+CREATE TABLE IF NOT EXISTS assignments (
+    id INTEGER PRIMARY KEY,
+    timestamp REAL NOT NULL,
+    arfcn INTEGER,
+    message_type INTEGER NOT NULL,
+    channel_type INTEGER,
+    time_slot INTEGER,
+    timing_advance INTEGER,
+    ra INTEGER,
+    message BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS assignments_arfcn_time
+    ON assignments (arfcn, timestamp);
+CREATE INDEX IF NOT EXISTS assignments_type
+    ON assignments (message_type, timestamp);
+
+CREATE TABLE IF NOT EXISTS cell_minutes (
+    arfcn INTEGER NOT NULL,
+    minute INTEGER NOT NULL,
+    pagings INTEGER NOT NULL DEFAULT 0,
+    imsi_pagings INTEGER NOT NULL DEFAULT 0,
+    assignments INTEGER NOT NULL DEFAULT 0,
+    si_changes INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (arfcn, minute)
+);
+"""
+
+# Insert statement of each table the rows are buffered for
+INSERTS = {
+    "si_snapshots": "INSERT INTO si_snapshots (timestamp, arfcn, "
+                    "message_type, lac, cid, message) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+    "pagings": "INSERT INTO pagings (timestamp, arfcn, message_type, "
+               "identity_type, identity) VALUES (?, ?, ?, ?, ?)",
+    "assignments": "INSERT INTO assignments (timestamp, arfcn, message_type, "
+                   "channel_type, time_slot, timing_advance, ra, message) "
+                   "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+}
+
+UPSERT_CELL = ("INSERT INTO cells "
+               "(arfcn, mcc, mnc, lac, cid, first_seen, last_seen) "
+               "VALUES (?, ?, ?, ?, ?, ?, ?) "
+               "ON CONFLICT (arfcn, mcc, mnc, lac, cid) DO UPDATE SET "
+               "first_seen = min(first_seen, excluded.first_seen), "
+               "last_seen = max(last_seen, excluded.last_seen)")
+
+_SYSTEM_INFORMATION = sorted(RR_SYSTEM_INFORMATION)
+_PAGING = [RR_PAGING_REQUEST_1, RR_PAGING_REQUEST_2, RR_PAGING_REQUEST_3]
+_ASSIGNMENT_FIELDS = ("channel_type", "time_slot", "timing_advance", "ra")
+
+
+def format_tmsi(tmsi):
+    """ A TMSI as stored in ``pagings.identity``.
+
+    """
+    return "{:08x}".format(tmsi)
+
+
+def connect(path, timeout=BUSY_TIMEOUT):
+    """ Open the database in WAL mode and create its tables.
+
+    Args:
+        path (str): the database file, its directory is created if
+            needed.
+        timeout (float): seconds to wait for another writer.
+
+    Returns:
+        :obj:`sqlite3.Connection`: in autocommit mode, transactions
+        are begun explicitly.
+
+    """
+    directory = os.path.dirname(path)
+    if directory and not os.path.exists(directory):
+        os.makedirs(directory)
+    connection = sqlite3.connect(path, timeout=timeout, isolation_level=None)
+    # Only takes effect before the first table is created
+    connection.execute("PRAGMA auto_vacuum=INCREMENTAL")
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    # The log otherwise keeps the size of the largest transaction
+    connection.execute("PRAGMA journal_size_limit={}".format(
+        JOURNAL_SIZE_LIMIT))
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def _nullable(column):
+    """ A column as a list with :py:data:`antikythera.packets.batch.NONE`
+    as ``None``.
+
+    """
+    return [None if value == NONE else value for value in column.tolist()]
+
+
+def _messages(batch, rows):
+    """ The layer 3 messages of some rows of a batch.
+
+    """
+    width = batch.payload.shape[1]
+    payload = batch.payload[rows].tobytes()
+    bounds = zip(batch.l3_offset[rows].tolist(), batch.length[rows].tolist())
+    return [payload[i * width + start:i * width + end]
+            for i, (start, end) in enumerate(bounds)]
+
+
+class Storage(object):
+    """ Buffer rows and write them in bulk transactions.
+
+    Args:
+        path (str): the database file.
+        flush_rows (int): pending rows that trigger a flush.
+        flush_interval (float): seconds the oldest pending row waits
+            before a flush.
+
+    Attributes:
+        pending (dict): ``{table: rows}`` waiting for the next flush.
+        cells (dict): ``{(arfcn, mcc, mnc, lac, cid): [first seen, last
+            seen]}`` of the cells seen since the last flush.
+        written (int): rows written.
+        flushes (int): transactions committed.
+        write_time (float): seconds spent writing.
+
+    """
+    def __init__(self, path, flush_rows=FLUSH_ROWS,
+                 flush_interval=FLUSH_INTERVAL):
+        self.path = path
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.connection = connect(path)
+        self.pending = {table: [] for table in INSERTS}
+        self.pending_rows = 0
+        self.cells = {}
+        self.oldest = None
+        self.written = 0
+        self.flushes = 0
+        self.write_time = 0.0
+        # Cells repeat their LAI, decode each once
+        self._lais = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def add_batch(self, batch):
+        """ Queue the System Information, paging, and assignment
+        messages of a batch.
+
+        Args:
+            batch (:obj:`antikythera.packets.batch.PacketBatch`): the
+                decoded messages.
+
+        """
+        if not len(batch):
+            return
+        rr_rows = batch.pd == PD_RR
+        message_type = batch.message_type
+        arfcn = batch.arfcn & GSMTAP_ARFCN_MASK
+
+        rows = np.flatnonzero(rr_rows
+                              & np.isin(message_type, _SYSTEM_INFORMATION))
+        self._queue("si_snapshots", list(zip(
+            batch.timestamp[rows].tolist(), arfcn[rows].tolist(),
+            message_type[rows].tolist(), _nullable(batch.lac[rows]),
+            _nullable(batch.cell_id[rows]), _messages(batch, rows))))
+
+        # TMSIs only come from paging requests, one row per identity
+        owner = np.repeat(np.arange(len(batch)), np.diff(batch.tmsi_offsets))
+        self._queue("pagings", list(zip(
+            batch.timestamp[owner].tolist(), arfcn[owner].tolist(),
+            message_type[owner].tolist(), [rr.MI_TMSI] * len(owner),
+            [format_tmsi(tmsi) for tmsi in batch.tmsis.tolist()])))
+        rows = np.flatnonzero(batch.imsi != "")
+        self._queue("pagings", list(zip(
+            batch.timestamp[rows].tolist(), arfcn[rows].tolist(),
+            message_type[rows].tolist(), [rr.MI_IMSI] * len(rows),
+            batch.imsi[rows].tolist())))
+
+        rows = np.flatnonzero(rr_rows
+                              & (message_type == RR_IMMEDIATE_ASSIGNMENT))
+        assignments = []
+        for timestamp, cell, message in zip(batch.timestamp[rows].tolist(),
+                                            arfcn[rows].tolist(),
+                                            _messages(batch, rows)):
+            fields = rr.decode(rr.IMMEDIATE_ASSIGNMENT, message)
+            assignments.append(
+                (timestamp, cell, RR_IMMEDIATE_ASSIGNMENT)
+                + tuple(fields.get(name) for name in _ASSIGNMENT_FIELDS)
+                + (message,))
+        self._queue("assignments", assignments)
+
+    def add_cells(self, batch):
+        """ Record the cells of the System Information 3 in a batch.
+
+        Every message counts, repeats included, so ``last_seen`` stays
+        current when repeated System Information is not stored.
+
+        Args:
+            batch (:obj:`antikythera.packets.batch.PacketBatch`): the
+                decoded messages.
+
+        """
+        rows = np.flatnonzero(batch.cell_id != NONE)
+        if not len(rows):
+            return
+        arfcns = (batch.arfcn[rows] & GSMTAP_ARFCN_MASK).tolist()
+        cids = batch.cell_id[rows].tolist()
+        timestamps = batch.timestamp[rows].tolist()
+        for i, index in enumerate(rows.tolist()):
+            start = batch.l3_offset[index] + 4
+            octets = batch.payload[index, start:start + 5].tobytes()
+            lai = self._lais.get(octets)
+            if lai is None:
+                lai = self._lais[octets] = rr.lai(octets)
+            key = (arfcns[i], lai.mcc, lai.mnc, lai.lac, cids[i])
+            seen = self.cells.get(key)
+            if seen is None:
+                self.cells[key] = [timestamps[i], timestamps[i]]
+            else:
+                seen[0] = min(seen[0], timestamps[i])
+                seen[1] = max(seen[1], timestamps[i])
+        if self.oldest is None:
+            self.oldest = monotonic()
+        if self.due():
+            self.flush()
+
+    def _queue(self, table, rows):
+        if not rows:
+            return
+        if self.oldest is None:
+            self.oldest = monotonic()
+        self.pending[table].extend(rows)
+        self.pending_rows += len(rows)
+        if self.due():
+            self.flush()
+
+    def due(self):
+        """ Whether the pending rows should be written now.
+
+        """
+        return self.oldest is not None and (
+            self.pending_rows >= self.flush_rows
+            or monotonic() - self.oldest >= self.flush_interval)
+
+    def due_in(self):
+        """ Seconds until the pending rows are due, ``None`` if there are
+        none.
+
+        """
+        if self.oldest is None:
+            return None
+        return max(0.0, self.flush_interval - (monotonic() - self.oldest))
+
+    def flush(self):
+        """ Write the pending rows in one transaction.
+
+        Returns:
+            int: the rows written.
+
+        """
+        if self.oldest is None:
+            return 0
+        start = monotonic()
+        cells = [key + tuple(seen) for key, seen in self.cells.items()]
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            self.connection.executemany(UPSERT_CELL, cells)
+            for table, rows in self.pending.items():
+                if rows:
+                    self.connection.executemany(INSERTS[table], rows)
+        written = self.pending_rows + len(cells)
+        self.pending = {table: [] for table in INSERTS}
+        self.pending_rows = 0
+        self.cells = {}
+        self.oldest = None
+        self.written += written
+        self.flushes += 1
+        self.write_time += monotonic() - start
+        _logger.debug("Storage: wrote {} rows in {:.3f}s".format(
+            written, monotonic() - start))
+        return written
+
+    def stats(self):
+        """ Rows written and the write rate.
+
+        Returns:
+            dict: ``written``, ``pending``, ``flushes`` and ``rate`` in
+            rows per second of write time.
+
+        """
+        rate = self.written / self.write_time if self.write_time else 0.0
+        return {"written": self.written,
+                "pending": self.pending_rows + len(self.cells),
+                "flushes": self.flushes, "rate": round(rate)}
+
+    def close(self):
+        """ Write what is pending and close the database.
+
+        """
+        if self.connection is None:
+            return
+        self.flush()
+        self.connection.close()
+        self.connection = None
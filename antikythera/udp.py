@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" udp.py
+
+Receive GSMTAP frames straight from a UDP socket.
+
+gr-gsm and the osmocom tools send GSMTAP to UDP port 4729, binding
+that port directly avoids sniffing the interface with ``tshark`` and
+dissecting every frame.
+
+"""
+import socket
+import select
+import logging
+
+from time import time
+
+from antikythera.gsmtap import GSMTAP_PORT, parse_gsmtap
+
+_logger = logging.getLogger(__name__)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+DEFAULT_HOST = "127.0.0.1"
+RECEIVE_BUFFER = 4 * 1024 * 1024
+MAX_DATAGRAM = 65535
+MAX_DRAIN = 1024
+
+
+def parse_address(address):
+    """ Split a ``[host:]port`` string into a socket address.
+
+    Args:
+        address (str): the address to listen on, either a port, a host,
+            or ``host:port``. Missing parts are filled in with
+            :py:data:`DEFAULT_HOST` and the GSMTAP port.
+
+    Returns:
+        tuple: ``(host, port)``
+
+    """
+    if address is None:
+        return DEFAULT_HOST, GSMTAP_PORT
+    address = str(address).strip()
+    if not address:
+        return DEFAULT_HOST, GSMTAP_PORT
+    if address.isdigit():
+        return DEFAULT_HOST, int(address)
+    host, sep, port = address.rpartition(":")
+    if not sep:
+        return address, GSMTAP_PORT
+    return host or DEFAULT_HOST, int(port)
+
+
+class GsmtapListener(object):
+    """ A bound UDP socket that hands out GSMTAP frames in batches.
+
+    Args:
+        address (str): ``[host:]port`` to bind, see :func:`parse_address`.
+        rcvbuf (int): requested kernel receive buffer size in bytes, a
+            large buffer absorbs bursts while the frames are queued.
+
+    """
+    def __init__(self, address=None, rcvbuf=RECEIVE_BUFFER):
+        self.address = parse_address(address)
+        self.rcvbuf = rcvbuf
+        self.sock = None
+
+    def __enter__(self):
+        self.open()
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def open(self):
+        if self.sock is not None:
+            return
+        sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.rcvbuf)
+        except OSError as e:
+            _logger.warning("UDP: could not set receive buffer: {}".format(e))
+        sock.bind(self.address)
+        sock.setblocking(False)
+        self.sock = sock
+        self.address = sock.getsockname()
+        _logger.info(
+            "UDP: listening for GSMTAP on {}:{} receive buffer {}".format(
+                self.address[0], self.address[1],
+                sock.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF)))
+
+    def close(self):
+        if self.sock is not None:
+            self.sock.close()
+            self.sock = None
+
+    def drain(self, timeout=None, limit=MAX_DRAIN):
+        """ Wait for frames then read everything already queued.
+
+        Args:
+            timeout (float): seconds to wait for the first datagram,
+                ``None`` waits forever.
+            limit (int): the most datagrams to read in one call.
+
+        Returns:
+            list: the :obj:`antikythera.gsmtap.Frame` records received,
+            each stamped with when it was read, empty if the timeout
+            expired.
+
+        """
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        if not readable:
+            return []
+
+        frames = []
+        recv = self.sock.recv
+        for _ in range(limit):
+            try:
+                data = recv(MAX_DATAGRAM)
+            except (BlockingIOError, InterruptedError):
+                break
+            frame = parse_gsmtap(data, time())
+            if frame is not None:
+                frames.append(frame)
+        return frames
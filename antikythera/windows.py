@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" windows.py
+
+Sliding time windows over a stream of events for the metrics.
+
+Both windows cost O(1) amortised per event, the events leaving a window
+are dropped as newer ones arrive rather than by a periodic sweep:
+
+- :obj:`SlidingCounter` counts events, and their rate, in fixed width
+  buckets kept in a ring.
+- :obj:`SlidingDistinct` counts the distinct items and how often each
+  was seen, every event is kept until it leaves the window.
+
+Time is the capture time of the events, not the clock, a replayed
+capture gives the same counts as a live one. Events are expected in
+about time order. That holds per cell: a cell is decoded by one decoder
+at a time and only moved to another once the first has decoded all of
+its frames, see :mod:`antikythera.sharding`. A late event is still
+counted while it is within the window of the newest one.
+
+Example:
+    Pagings per second over the last minute::
+
+        from antikythera.windows import SlidingCounter
+
+        pagings = SlidingCounter(60)
+        pagings.add(timestamp)
+        pagings.rate(timestamp)
+
+"""
+import logging
+
+from collections import deque
+
+_logger = logging.getLogger(__name__)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+# Buckets of a SlidingCounter, the count is exact to one bucket width
+DEFAULT_BUCKETS = 60
+
+
+class SlidingCounter(object):
+    """ The number of events in the last ``window`` seconds.
+
+    Args:
+        window (float): seconds counted.
+        buckets (int): buckets the window is cut into.
+
+    Attributes:
+        total (int): events in the buckets of the window.
+
+    """
+    __slots__ = ("window", "width", "counts", "head", "total")
+
+    def __init__(self, window, buckets=DEFAULT_BUCKETS):
+        self.window = window
+        self.width = window / buckets
+        self.counts = [0] * buckets
+        # Number of the newest bucket, None before the first event
+        self.head = None
+        self.total = 0
+
+    def _advance(self, bucket):
+        """ Move the window to end at a bucket, emptying the buckets it
+        passes.
+
+        """
+        if self.head is None:
+            self.head = bucket
+            return
+        size = len(self.counts)
+        if bucket - self.head >= size:
+            self.counts = [0] * size
+            self.total = 0
+        else:
+            for i in range(self.head + 1, bucket + 1):
+                self.total -= self.counts[i % size]
+                self.counts[i % size] = 0
+        self.head = bucket
+
+    def add(self, timestamp, count=1):
+        """ Count events.
+
+        Events older than the window are ignored.
+
+        Args:
+            timestamp (float): capture time of the events.
+            count (int): events at that time.
+
+        """
+        bucket = int(timestamp // self.width)
+        if self.head is None or bucket > self.head:
+            self._advance(bucket)
+        elif bucket <= self.head - len(self.counts):
+            return
+        self.counts[bucket % len(self.counts)] += count
+        self.total += count
+
+    def count(self, now=None):
+        """ The events in the window ending at ``now``.
+
+        Args:
+            now (float): the end of the window, ``None`` for the newest
+                event.
+
+        """
+        if now is not None and self.head is not None:
+            bucket = int(now // self.width)
+            if bucket > self.head:
+                self._advance(bucket)
+        return self.total
+
+    def rate(self, now=None):
+        """ Events per second in the window ending at ``now``.
+
+        """
+        return self.count(now) / self.window
+
+
+class SlidingDistinct(object):
+    """ The distinct items seen in the last ``window`` seconds.
+
+    Args:
+        window (float): seconds remembered.
+
+    Attributes:
+        counts (dict): ``{item: events}`` in the window.
+
+    """
+    __slots__ = ("window", "events", "counts")
+
+    def __init__(self, window):
+        self.window = window
+        self.events = deque()
+        self.counts = {}
+
+    def __len__(self):
+        return len(self.counts)
+
+    def __contains__(self, item):
+        return item in self.counts
+
+    def expire(self, now):
+        """ Forget the events that left the window ending at ``now``.
+
+        """
+        events, counts = self.events, self.counts
+        start = now - self.window
+        while events and events[0][0] <= start:
+            item = events.popleft()[1]
+            remaining = counts[item] - 1
+            if remaining:
+                counts[item] = remaining
+            else:
+                del counts[item]
+
+    def add(self, timestamp, item):
+        """ Record an item.
+
+        Args:
+            timestamp (float): capture time of the event.
+            item: a hashable item, e.g. an identity.
+
+        Returns:
+            int: the times the item was seen in the window, this one
+            included.
+
+        """
+        self.expire(timestamp)
+        self.events.append((timestamp, item))
+        count = self.counts[item] = self.counts.get(item, 0) + 1
+        return count
+
+    def count(self, item):
+        """ The times an item was seen in the window.
+
+        """
+        return self.counts.get(item, 0)
+
+    def distinct(self, now=None):
+        """ The number of distinct items in the window ending at ``now``.
+
+        """
+        if now is not None:
+            self.expire(now)
+        return len(self.counts)
@@ -0,0 +1,249 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" writer.py
+
+The one process writing to the database.
+
+SQLite allows a single writer at a time, decoders each committing on
+their own connection would wait on each other's locks. Instead every
+decoder puts its decoded batches on the writer's queue and the
+:obj:`Writer` stores them through one :obj:`antikythera.storage.Storage`
+in large transactions, and in the columnar
+:obj:`antikythera.events.EventStore` if one is configured.
+
+The queue is bounded, when storage cannot keep up the decoders wait on
+it. How far behind the writer is shows in :py:meth:`Writer.stats`:
+``lag`` is the time from a decoder sending a batch to the transaction
+holding it being committed.
+
+Between flushes the writer also keeps the stores within the retention
+policy, see :obj:`antikythera.retention.Compactor`.
+
+"""
+import logging
+import multiprocessing as mp
+
+from time import time
+from queue import Empty
+from multiprocessing import Process
+
+from antikythera.storage import Storage, FLUSH_INTERVAL
+from antikythera.events import EventStore
+from antikythera.retention import Compactor, RAW_RETENTION, ROW_RETENTION
+
+_logger = logging.getLogger(__name__)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "GNU GPLv3+"
+
+
+# Batches waiting for the writer before the decoders block
+WRITER_QUEUE_SIZE = 1000
+
+# Seconds to wait for a batch before logging that the queue is empty
+IDLE_TIMEOUT = 10
+
+
+def writer_item(packets, cells=None):
+    """ What a decoder puts on the writer's queue.
+
+    Args:
+        packets (:obj:`antikythera.packets.batch.PacketBatch`): the
+            messages to store.
+        cells (:obj:`antikythera.packets.batch.PacketBatch`): System
+            Information 3 rows telling when cells were seen, repeats
+            included, see :py:meth:`antikythera.storage.Storage.add_cells`.
+
+    Returns:
+        tuple: ``(sent, packets, cells)``
+
+    """
+    return (time(), packets, cells)
+
+
+class Writer(Process):
+    """ Store what the decoders send in bulk transactions.
+
+    Args:
+        process_id (str): name used in the logs.
+        q: the queue of :func:`writer_item` tuples.
+        database (str): the SQLite database, ``None`` for none.
+        flush_interval (float): the longest a batch waits before it is
+            committed.
+        events (str): the directory of the event store, ``None`` for
+            none.
+        raw_retention (float): seconds raw messages are kept, ``None``
+            to keep them.
+        retention (float): seconds message rows and events are kept,
+            ``None`` to keep them.
+        max_bytes (int): the most disk the stores use, ``None`` for no
+            cap.
+
+    """
+
+    def __init__(self, process_id, q, database, flush_interval=FLUSH_INTERVAL,
+                 events=None, raw_retention=RAW_RETENTION,
+                 retention=ROW_RETENTION, max_bytes=None, *args, **kwargs):
+        super(Writer, self).__init__(*args, **kwargs)
+        self.process_id = process_id
+        self.q = q
+        self.database = database
+        self.events = events
+        self.flush_interval = flush_interval
+        self.raw_retention = raw_retention
+        self.retention = retention
+        self.max_bytes = max_bytes
+        # Opened in run(), each with the interface of Storage
+        self.stores = []
+        self.compactor = None
+        # Shared so the manager can report them
+        self.written = mp.Value("q", 0)
+        self.flushes = mp.Value("q", 0)
+        self.write_time = mp.Value("d", 0.0)
+        self.lag = mp.Value("d", 0.0)
+        self.max_lag = mp.Value("d", 0.0)
+        self.compacted = mp.Value("q", 0)
+        self.disk = mp.Value("q", 0)
+        # Send time of the oldest batch not yet committed
+        self.oldest_sent = None
+        self.exit = mp.Event()
+
+    def run(self):
+        """
+
+        """
+        _logger.debug("{}: Process started successfully".format(
+            self.process_id))
+        self.open()
+        while not self.exit.is_set():
+            due_in = [t for t in (store.due_in() for store in self.stores)
+                      if t is not None]
+            timeout = IDLE_TIMEOUT
+            if due_in:
+                timeout = min(due_in + [self.compactor.due_in()])
+            try:
+                self.write(self.q.get(timeout=timeout))
+            except Empty:
+                if not due_in:
+                    _logger.info("{}: Queue empty".format(self.process_id))
+            if any(store.due() for store in self.stores):
+                self.flush()
+            if self.compactor.due():
+                self.compact()
+        # The decoders have stopped, store what they sent last
+        while True:
+            try:
+                self.write(self.q.get_nowait())
+            except Empty:
+                break
+        self.flush()
+        for store in self.stores:
+            store.close()
+        _logger.info("{}: Storage {}".format(self.process_id, self.stats()))
+        _logger.info("{}: Exiting".format(self.process_id))
+
+    def open(self):
+        """ Open the stores and their compactor.
+
+        """
+        storage = events = None
+        if self.database is not None:
+            storage = Storage(self.database,
+                              flush_interval=self.flush_interval)
+            self.stores.append(storage)
+        if self.events is not None:
+            events = EventStore(self.events,
+                                flush_interval=self.flush_interval)
+            self.stores.append(events)
+        self.compactor = Compactor(storage, events,
+                                   raw_retention=self.raw_retention,
+                                   retention=self.retention,
+                                   max_bytes=self.max_bytes)
+
+    def write(self, item):
+        """ Queue an item for the next flush.
+
+        The storage flushes by itself when enough rows are pending.
+
+        Args:
+            item (tuple): see :func:`writer_item`.
+
+        """
+        sent, packets, cells = item
+        if self.oldest_sent is None:
+            self.oldest_sent = sent
+        flushes = self._total("flushes")
+        for store in self.stores:
+            if cells is not None:
+                store.add_cells(cells)
+            if packets is not None:
+                store.add_batch(packets)
+        if self._total("flushes") != flushes:
+            self._committed(sent)
+
+    def flush(self):
+        """ Commit what is pending.
+
+        """
+        if sum(store.flush() for store in self.stores):
+            self._committed(None)
+
+    def compact(self):
+        """ Do one slice of retention work.
+
+        """
+        self.compactor.step()
+        stats = self.compactor.stats()
+        self.compacted.value = (stats["cleared"] + stats["deleted"]
+                                + stats["evicted"])
+        self.disk.value = stats["disk"]
+
+    def _total(self, name):
+        return sum(getattr(store, name) for store in self.stores)
+
+    def _committed(self, sent):
+        """ Update the shared counters after a commit.
+
+        Args:
+            sent (float): send time of the oldest batch still pending,
+                ``None`` if nothing is.
+
+        """
+        lag = 0.0
+        if self.oldest_sent is not None:
+            lag = time() - self.oldest_sent
+        pending = any(store.oldest is not None for store in self.stores)
+        self.oldest_sent = sent if pending else None
+        self.written.value = self._total("written")
+        self.flushes.value = self._total("flushes")
+        self.write_time.value = self._total("write_time")
+        self.lag.value = lag
+        self.max_lag.value = max(self.max_lag.value, lag)
+
+    def stats(self):
+        """ Writer throughput and lag.
+
+        Returns:
+            dict: ``written`` rows, ``flushes``, ``rate`` in rows per
+            second of write time, ``lag`` of the last commit and
+            ``max_lag`` in seconds, rows ``compacted`` by the
+            retention policy, the ``disk`` bytes used, and the
+            ``queued`` batches if the queue can tell.
+
+        """
+        write_time = self.write_time.value
+        rate = round(self.written.value / write_time) if write_time else 0
+        stats = {"written": self.written.value, "flushes": self.flushes.value,
+                 "rate": rate, "lag": round(self.lag.value, 3),
+                 "max_lag": round(self.max_lag.value, 3),
+                 "compacted": self.compacted.value, "disk": self.disk.value}
+        try:
+            stats["queued"] = self.q.qsize()
+        except NotImplementedError:
+            pass
+        return stats
+
+    def shutdown(self):
+        _logger.info("{}: Recieved shutdown command".format(self.process_id))
+        self.exit.set()
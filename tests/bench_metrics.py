@@ -0,0 +1,74 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" bench_metrics.py
+
+Messages per second through the metrics.
+
+The messages of a capture are decoded into batches of ``--batch-size``
+frames and fed ``--repeat`` times to a
+:obj:`antikythera.metrics.MetricEngine` with the default metrics. The
+capture time is moved on every repeat so the sliding windows keep
+expiring events as they would on a live capture.
+
+Example:
+    Run against the default capture::
+
+        $ python tests/bench_metrics.py
+        $ python tests/bench_metrics.py -b 1 \
+            -c tests/test_data/tracking_catcher.pcap
+
+"""
+import os
+import sys
+import logging
+import argparse
+
+from time import perf_counter
+
+from antikythera.gsmtap import pack_frames
+from antikythera.sources import open_capture
+from antikythera.packets.batch import PacketBatch
+from antikythera.metrics import MetricEngine
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="Metric engine throughput benchmark")
+    parser.add_argument("-c", "--capture",
+                        default=os.path.join(TEST_DATA, "silent_sms.pcap"))
+    parser.add_argument("-r", "--repeat", type=int, default=200)
+    parser.add_argument("-b", "--batch-size", type=int, default=64)
+    args = parser.parse_args(args)
+
+    # Detections repeat with the capture, only count them
+    logging.getLogger("antikythera.metrics").setLevel(logging.ERROR)
+    frames = list(open_capture(args.capture))
+    size = args.batch_size
+    batches = [PacketBatch.from_records(pack_frames(frames[i:i + size]))
+               for i in range(0, len(frames), size)]
+
+    engine = MetricEngine()
+    elapsed = 0.0
+    for repeat in range(args.repeat):
+        for batch in batches:
+            batch.timestamp += 1.0
+        start = perf_counter()
+        for batch in batches:
+            engine.feed(batch)
+        elapsed += perf_counter() - start
+
+    stats = engine.stats()
+    print("{} messages to the metrics, {} detections".format(
+        stats["events"], stats["detections"]))
+    print("{:.0f} messages/s".format(stats["events"] / elapsed))
+    print("{:.3f} ms per batch".format(1000 * elapsed / stats["batches"]))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,104 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" bench_packets.py
+
+Time and memory per packet for the messages of a capture.
+
+Every RR message of the capture is created through
+:py:meth:`antikythera.packets.factory.PacketFactory.createMessage`
+``--repeat`` times, the construction time and the memory held by the
+packets are reported per packet. With ``--no-decode`` the packets are
+made without a message to time and size the packet objects alone.
+With ``--access`` the fields named are read from every packet that has
+them and the time to decode them is reported too.
+
+Example:
+    Run against the default capture::
+
+        $ python tests/bench_packets.py
+        $ python tests/bench_packets.py -c tests/test_data/silent_sms.bin
+        $ python tests/bench_packets.py --no-decode
+        $ python tests/bench_packets.py --access page_mode tmsis
+
+"""
+import os
+import sys
+import argparse
+import tracemalloc
+
+from time import perf_counter
+
+from antikythera.l3 import l3_header, l3_message
+from antikythera.sources import open_capture
+from antikythera.packets.factory import PacketFactory
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def messages(path):
+    """ ``(pd, message type, message, timestamp)`` of every frame with a
+    known packet class.
+
+    """
+    found = []
+    for frame in open_capture(path):
+        header = l3_header(frame.channel, frame.payload)
+        if header in PacketFactory.messages:
+            message = bytes(l3_message(frame.channel, frame.payload))
+            found.append(header + (message, frame.timestamp))
+    return found
+
+
+def create(found, repeat):
+    create_message = PacketFactory.createMessage
+    return [create_message(pd, message_type, data, timestamp)
+            for _ in range(repeat)
+            for pd, message_type, data, timestamp in found]
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="Packet construction benchmark")
+    parser.add_argument("-c", "--capture",
+                        default=os.path.join(TEST_DATA, "silent_sms.pcap"))
+    parser.add_argument("-r", "--repeat", type=int, default=200)
+    parser.add_argument("--no-decode", dest="decode", action="store_false")
+    parser.add_argument("-a", "--access", nargs="+", default=[])
+    args = parser.parse_args(args)
+
+    found = messages(args.capture)
+    if not args.decode:
+        found = [(pd, message_type, None, timestamp)
+                 for pd, message_type, _, timestamp in found]
+    count = len(found) * args.repeat
+
+    start = perf_counter()
+    create(found, args.repeat)
+    elapsed = perf_counter() - start
+
+    tracemalloc.start()
+    packets = create(found, args.repeat)
+    held = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    print("{} packets from {} messages".format(count, len(found)))
+    print("{:.2f} us per packet".format(elapsed / count * 1e6))
+    print("{:.0f} bytes per packet".format(held / len(packets)))
+    if args.access:
+        start = perf_counter()
+        for packet in packets:
+            for name in args.access:
+                getattr(packet, name, None)
+        print("{:.2f} us per packet to read {}".format(
+            (perf_counter() - start) / count * 1e6, ", ".join(args.access)))
+    size = sum(sys.getsizeof(p) + sys.getsizeof(getattr(p, "__dict__", None))
+               * hasattr(p, "__dict__") for p in packets)
+    print("{:.0f} bytes per packet object".format(size / len(packets)))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
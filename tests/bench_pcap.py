@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" bench_pcap.py
+
+Frames per second read from a large capture file.
+
+A capture is repeated ``--repeat`` times into a temporary pcap file,
+moving the timestamps on every copy, and read once by a single
+:obj:`antikythera.pcap.PcapReader` and once by
+:func:`antikythera.pcap.read_parallel` for each number of ``--jobs``.
+The ranges the workers send back are merged by the caller on their
+timestamp columns without unpacking the records, that part is timed on
+its own over ranges read beforehand.
+
+Example:
+    Run against the default capture::
+
+        $ python tests/bench_pcap.py
+        $ python tests/bench_pcap.py -r 2000 -j 2 4 --chunk-size 4
+
+"""
+import os
+import sys
+import struct
+import argparse
+import tempfile
+
+from time import perf_counter
+
+from antikythera.gsmtap import GSMTAP_PORT
+from antikythera.pcap import (PcapReader, read_parallel, _read_range,
+                              _merge_ranges)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def write_repeated(source, path, repeat):
+    """ Write the records of a pcap file ``repeat`` times, each copy
+    later than the one before.
+
+    """
+    with PcapReader(source) as reader:
+        packets = list(reader.packets())
+        linktype = reader.linktype
+    span = packets[-1][0] - packets[0][0] + 1.0
+    with open(path, "wb") as f:
+        f.write(struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 0xffff,
+                            linktype))
+        for i in range(repeat):
+            for timestamp, _, data in packets:
+                timestamp += i * span
+                sec = int(timestamp)
+                usec = min(999999, int(round((timestamp - sec) * 1e6)))
+                f.write(struct.pack("<IIII", sec, usec, len(data), len(data))
+                        + data)
+
+
+def timed(frames):
+    start = perf_counter()
+    count = sum(1 for _ in frames)
+    return count, perf_counter() - start
+
+
+def timed_records(blocks):
+    start = perf_counter()
+    count = sum(len(records) for records in blocks)
+    return count, perf_counter() - start
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="Parallel capture file reading benchmark")
+    parser.add_argument(
+        "-c", "--capture",
+        default=os.path.join(TEST_DATA, "tracking_catcher.pcap"))
+    parser.add_argument("-r", "--repeat", type=int, default=500)
+    parser.add_argument("-j", "--jobs", type=int, nargs="+", default=[2, 4])
+    parser.add_argument("--chunk-size", type=int, default=16,
+                        help="Range size in MB.")
+    args = parser.parse_args(args)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "repeated.pcap")
+        write_repeated(args.capture, path, args.repeat)
+        print("{:.1f} MB".format(os.path.getsize(path) / 1e6))
+
+        with PcapReader(path) as reader:
+            count, elapsed = timed(reader)
+        print("sequential: {} frames {:.0f} frames/s".format(
+            count, count / elapsed))
+
+        # The caller's share, merging ranges already read
+        chunk_size = args.chunk_size * 1024 * 1024
+        with PcapReader(path) as reader:
+            ranges = reader.partition(chunk_size)
+        blocks = [_read_range((path, GSMTAP_PORT, start, end, state))
+                  for start, end, state in ranges]
+        count, elapsed = timed_records(_merge_ranges(blocks))
+        print("merging {} ranges: {:.0f} frames/s".format(
+            len(blocks), count / elapsed))
+
+        for jobs in args.jobs:
+            count, elapsed = timed_records(
+                read_parallel(path, jobs, chunk_size))
+            print("{} jobs: {} frames {:.0f} frames/s".format(
+                jobs, count, count / elapsed))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+""" bench_storage.py
+
+Rows per second written to the database.
+
+The messages of a capture are decoded into batches of ``--batch-size``
+frames and the batches are stored ``--repeat`` times through
+:obj:`antikythera.storage.Storage` in a temporary database, the time
+includes building the rows of every table and the final flush. With
+``--flush-rows 1`` every batch is committed on its own. With
+``--events`` the batches go to an :obj:`antikythera.events.EventStore`
+instead.
+
+Example:
+    Run against the default capture::
+
+        $ python tests/bench_storage.py
+        $ python tests/bench_storage.py --flush-rows 1 -r 10
+        $ python tests/bench_storage.py --events
+
+"""
+import os
+import sys
+import argparse
+import tempfile
+
+from time import perf_counter
+
+from antikythera.gsmtap import pack_frames
+from antikythera.sources import open_capture
+from antikythera.packets.batch import PacketBatch
+from antikythera.storage import Storage, FLUSH_ROWS
+from antikythera.events import EventStore
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def main(args):
+    parser = argparse.ArgumentParser(
+        description="Storage throughput benchmark")
+    parser.add_argument("-c", "--capture",
+                        default=os.path.join(TEST_DATA, "silent_sms.pcap"))
+    parser.add_argument("-r", "--repeat", type=int, default=200)
+    parser.add_argument("-b", "--batch-size", type=int, default=64)
+    parser.add_argument("--flush-rows", type=int, default=FLUSH_ROWS)
+    parser.add_argument("--events", action="store_true")
+    args = parser.parse_args(args)
+
+    frames = list(open_capture(args.capture))
+    size = args.batch_size
+    batches = [PacketBatch.from_records(pack_frames(frames[i:i + size]))
+               for i in range(0, len(frames), size)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.events:
+            storage = EventStore(os.path.join(directory, "events"),
+                                 flush_rows=args.flush_rows)
+        else:
+            storage = Storage(os.path.join(directory, "bench.db"),
+                              flush_rows=args.flush_rows)
+        start = perf_counter()
+        for _ in range(args.repeat):
+            for batch in batches:
+                storage.add_cells(batch)
+                storage.add_batch(batch)
+        storage.close()
+        elapsed = perf_counter() - start
+
+    print("{} rows in {} flushes".format(storage.written, storage.flushes))
+    print("{:.0f} rows/s".format(storage.written / elapsed))
+    print("{:.0f} rows/s writing".format(storage.stats()["rate"]))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+
+from time import monotonic
+from queue import Queue, Full
+from collections import Counter
+
+from antikythera.backpressure import (Backpressure, frame_class, PAGING,
+                                      ASSIGNMENT, SYSTEM_INFORMATION,
+                                      REPEATED_SYSTEM_INFORMATION)
+from antikythera.gsmtap import FRAME_SIZE, frame_count, unpack_frames
+from antikythera.pcap import PcapReader
+from antikythera.ring import RingBuffer
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+@pytest.fixture(scope="module")
+def frames():
+    with PcapReader(os.path.join(TEST_DATA, "silent_sms.pcap")) as reader:
+        return list(reader)
+
+
+class Limited(Queue):
+    """ A queue refusing batches of more than ``limit`` frames.
+
+    """
+    def __init__(self, limit):
+        super(Limited, self).__init__()
+        self.limit = limit
+        self.messages = []
+
+    def put(self, data, block=True, timeout=None):
+        if frame_count(data) > self.limit:
+            raise Full
+        self.messages.append(data)
+
+
+def by_class(frames, cls):
+    return [f for f in frames if frame_class(f) == cls]
+
+
+######################
+#                    #
+# Test frame_class() #
+#                    #
+######################
+
+def test_frame_class(frames):
+    classes = Counter(frame_class(f) for f in frames)
+    assert classes[PAGING] == 495
+    assert classes[ASSIGNMENT] == 3
+    assert classes[SYSTEM_INFORMATION] == 80 + 32
+    assert sum(classes.values()) == len(frames)
+
+
+def test_classify_repeats(frames):
+    backpressure = Backpressure(Queue())
+    classes = Counter(backpressure.classify(f)
+                      for f in by_class(frames, SYSTEM_INFORMATION))
+    assert classes[SYSTEM_INFORMATION] > 0
+    assert classes[REPEATED_SYSTEM_INFORMATION] > classes[SYSTEM_INFORMATION]
+
+
+#######################
+#                     #
+# Test Backpressure() #
+#                     #
+#######################
+
+def test_Backpressure_unknown_policy():
+    with pytest.raises(ValueError):
+        Backpressure(Queue(), "drop-everything")
+
+
+def test_Backpressure_block_until_exit(frames):
+    class Exit(object):
+        def is_set(self):
+            return True
+    q = Queue(1)
+    backpressure = Backpressure(q, "block", exit=Exit())
+    backpressure.put(frames[:10])
+    backpressure.put(frames[10:20])
+    assert q.qsize() == 1
+    assert backpressure.queued == 10
+    assert sum(backpressure.dropped.values()) == 10
+
+
+def test_Backpressure_drop_newest(frames):
+    q = Queue(2)
+    backpressure = Backpressure(q, "drop-newest")
+    for i in range(4):
+        backpressure.put(frames[i * 10:(i + 1) * 10])
+    assert backpressure.queued == 20
+    assert sum(backpressure.dropped.values()) == 20
+    assert next(unpack_frames(q.get())).frame_nr == frames[0].frame_nr
+
+
+def test_Backpressure_drop_oldest(frames):
+    q = Queue(2)
+    backpressure = Backpressure(q, "drop-oldest")
+    for i in range(4):
+        backpressure.put(frames[i * 10:(i + 1) * 10])
+    assert sum(backpressure.dropped.values()) == 20
+    assert backpressure.queued - backpressure.evicted == 20
+    assert next(unpack_frames(q.get())).frame_nr == frames[20].frame_nr
+
+
+def test_Backpressure_drop_oldest_ring(frames):
+    ring = RingBuffer(2, 10 * FRAME_SIZE)
+    try:
+        backpressure = Backpressure(ring, "drop-oldest")
+        for i in range(3):
+            backpressure.put(frames[i * 10:(i + 1) * 10])
+        assert sum(backpressure.dropped.values()) == 10
+        assert ring.qsize() == 2
+        oldest = next(unpack_frames(ring.get_nowait()))
+        assert oldest.frame_nr == frames[10].frame_nr
+    finally:
+        ring.unlink()
+
+
+def test_Backpressure_priority_sheds_repeats_first(frames):
+    si = by_class(frames, SYSTEM_INFORMATION)
+    paging = by_class(frames, PAGING)
+    q = Limited(9)
+    backpressure = Backpressure(q, "priority")
+    backpressure.put(si[:4])
+    assert backpressure.dropped == {}
+    # Frames are only classified once the queue is full
+    assert backpressure.system_information == {}
+
+    # Only nine frames fit, the repeated System Information goes first
+    backpressure.put(si[:4] + paging[:5] + si[:4])
+    assert backpressure.dropped == {REPEATED_SYSTEM_INFORMATION: 4}
+    last = [f.frame_nr for f in unpack_frames(q.messages[-1])]
+    assert last == [f.frame_nr for f in si[:4] + paging[:5]]
+
+
+def test_Backpressure_priority_sheds_by_class(frames):
+    si = by_class(frames, SYSTEM_INFORMATION)
+    paging = by_class(frames, PAGING)
+    q = Limited(2)
+    backpressure = Backpressure(q, "priority")
+    backpressure.put(si[:4] + paging[:2] + si[:4])
+    assert backpressure.dropped == {REPEATED_SYSTEM_INFORMATION: 4,
+                                    SYSTEM_INFORMATION: 4}
+    assert backpressure.queued == 2
+
+
+def test_Backpressure_priority_protected_dropped_last(frames):
+    paging = by_class(frames, PAGING)
+    assignment = by_class(frames, ASSIGNMENT)
+    q = Queue(1)
+    backpressure = Backpressure(q, "priority")
+    backpressure.put(paging[:5])
+    start = monotonic()
+    backpressure.put(paging[5:10] + assignment)
+    # Dropped without waiting for room
+    assert monotonic() - start < 0.5
+    assert backpressure.dropped == {PAGING: 5, ASSIGNMENT: 3}
+    assert backpressure.stats() == {"queued": 5,
+                                    "dropped": {PAGING: 5, ASSIGNMENT: 3}}
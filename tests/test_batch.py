@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+import numpy as np
+
+from antikythera.gsmtap import (Frame, GSMTAP_TYPE_UM,
+                                GSMTAP_CHANNEL_CCCH, GSMTAP_CHANNEL_SDCCH8,
+                                GSMTAP_CHANNEL_TCH_F)
+from antikythera.l3 import (l3_header, PD_RR, RR_PAGING_REQUEST_1,
+                            RR_SYSTEM_INFORMATION_2, RR_SYSTEM_INFORMATION_3)
+from antikythera.pcap import PcapReader
+from antikythera.packets.batch import PacketBatch, NONE
+from antikythera.packets import system
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+TMSI = 0x646fe2d4
+PAGING_IMSI = bytes.fromhex("2d0621000809101010325476982b2b2b2b2b2b2b2b2b2b2b")
+LAPDM_EMPTY = bytes.fromhex("030301") + b'\x2b' * 20
+
+
+def frame(channel, payload, arfcn=873, timestamp=0.0):
+    return Frame(timestamp, arfcn, 0, GSMTAP_TYPE_UM, channel, 0, 0, payload)
+
+
+@pytest.fixture(scope="module")
+def frames():
+    with PcapReader(os.path.join(TEST_DATA, "silent_sms.pcap")) as reader:
+        return list(reader)
+
+
+@pytest.fixture(scope="module")
+def batch(frames):
+    return PacketBatch.from_frames(frames)
+
+
+#######################
+#                     #
+# Test from_records() #
+#                     #
+#######################
+
+def test_from_records_headers(frames, batch):
+    headers = [l3_header(f.channel, f.payload) for f in frames]
+    headers = [h for h in headers if h is not None]
+    assert list(zip(batch.pd.tolist(), batch.message_type.tolist())) == headers
+
+
+def test_from_records_columns(frames, batch):
+    assert batch.timestamp[0] == frames[0].timestamp
+    assert batch.arfcn.dtype == np.uint16
+    assert len(batch.tmsi_offsets) == len(batch) + 1
+    assert len(batch.neighbor_offsets) == len(batch) + 1
+
+
+def test_from_records_cell(batch):
+    si3 = (batch.pd == PD_RR) & (batch.message_type == RR_SYSTEM_INFORMATION_3)
+    assert set(batch.cell_id[si3]) == {0x0539}
+    assert set(batch.lac[si3]) == {0x17}
+    assert set(batch.cell_id[~si3]) == {NONE}
+
+
+def test_from_records_neighbors(batch):
+    index = np.flatnonzero(batch.message_type == RR_SYSTEM_INFORMATION_2)[0]
+    assert batch.neighbors_of(index).tolist() == [871, 872, 873]
+
+
+def test_from_records_tmsis(batch):
+    assert TMSI in batch.tmsis
+    counts = np.diff(batch.tmsi_offsets)
+    assert (counts[batch.message_type != RR_PAGING_REQUEST_1] <= 3).all()
+    assert counts.sum() == len(batch.tmsis)
+
+
+def test_from_records_imsi():
+    batch = PacketBatch.from_frames([frame(GSMTAP_CHANNEL_CCCH, PAGING_IMSI)])
+    assert batch.imsi.tolist() == ["001010123456789"]
+    assert len(batch.tmsis) == 0
+
+
+def test_from_records_no_l3():
+    batch = PacketBatch.from_frames([
+        frame(GSMTAP_CHANNEL_TCH_F | 0x40, b'\x06\x1b'),
+        frame(GSMTAP_CHANNEL_SDCCH8, LAPDM_EMPTY)])
+    assert len(batch) == 0
+
+
+def test_from_records_empty():
+    batch = PacketBatch.from_records(b'')
+    assert len(batch) == 0
+    assert batch.tmsi_offsets.tolist() == [0]
+
+
+###########################
+#                         #
+# Test select/concatenate #
+#                         #
+###########################
+
+def test_select(batch):
+    paging = batch.message_type == RR_PAGING_REQUEST_1
+    selected = batch.select(paging)
+    assert len(selected) == paging.sum()
+    for i, j in enumerate(np.flatnonzero(paging)):
+        assert selected.tmsis_of(i).tolist() == batch.tmsis_of(j).tolist()
+
+
+def test_concatenate(batch):
+    joined = PacketBatch.concatenate([batch.select(slice(0, 100)),
+                                      PacketBatch(),
+                                      batch.select(slice(100, None))])
+    assert joined.tmsis.tolist() == batch.tmsis.tolist()
+    assert joined.tmsi_offsets.tolist() == batch.tmsi_offsets.tolist()
+    assert joined.neighbor_offsets.tolist() == batch.neighbor_offsets.tolist()
+
+
+################
+#              #
+# Test packets #
+#              #
+################
+
+def test_packet_view(batch):
+    index = np.flatnonzero(batch.message_type == RR_SYSTEM_INFORMATION_3)[0]
+    packet = batch[index]
+    assert isinstance(packet, system.Type3)
+    assert packet.cell_id == batch.cell_id[index]
+    assert packet.unix_time == batch.timestamp[index]
+
+
+def test_packet_iteration(batch):
+    packets = list(batch)
+    assert len(packets) == len(batch)
+
+
+def test_packet_view_paging(batch):
+    index = np.flatnonzero(batch.message_type == RR_PAGING_REQUEST_1)[0]
+    packet = batch[index]
+    assert packet._tmsis == batch.tmsis_of(index).tolist()
+    assert packet.tmsis == packet._tmsis
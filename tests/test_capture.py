@@ -0,0 +1,319 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import sys
+import subprocess
+
+from queue import Queue
+from time import sleep
+
+from antikythera.capture import Batcher, ShardedBatcher, Capture, Pacer
+from antikythera.gsmtap import (Frame, GSMTAP_CHANNEL_BCCH, frame_count,
+                                pack_frames, unpack_frames)
+from antikythera.metrics import metrics_filter
+from antikythera.pcap import PcapReader
+from antikythera.sharding import ShardRouter
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def bcch(timestamp, arfcn):
+    return Frame(float(timestamp), arfcn, 0, 1, GSMTAP_CHANNEL_BCCH, 0, 0, b'')
+
+
+def batched(capture):
+    capture.batch = Batcher(capture.put_batch, capture.batch_size,
+                            capture.batch_delay)
+
+
+##################
+#                #
+# Test Batcher() #
+#                #
+##################
+
+def test_Batcher_flush_on_size():
+    batches = []
+    batcher = Batcher(batches.append, size=3, delay=60)
+    for i in range(7):
+        batcher.add(i)
+    assert batches == [[0, 1, 2], [3, 4, 5]]
+    assert len(batcher) == 1
+
+
+def test_Batcher_flush_on_delay():
+    batches = []
+    batcher = Batcher(batches.append, size=100, delay=0.01)
+    batcher.add(1)
+    assert batches == []
+    sleep(0.02)
+    batcher.poll()
+    assert batches == [[1]]
+    assert batcher.timeout() is None
+
+
+def test_Batcher_flush_empty():
+    batches = []
+    batcher = Batcher(batches.append)
+    batcher.flush()
+    assert batches == []
+
+
+#########################
+#                       #
+# Test ShardedBatcher() #
+#                       #
+#########################
+
+def sharded(delivered, drain_timeout=60):
+    """ A batcher over two queues that moves ARFCN 4 off queue 0 after
+    four frames, ``delivered`` are the frames that left each queue.
+
+    """
+    sent = [[], []]
+
+    def progress(shard):
+        return sum(map(len, sent[shard])), delivered[shard]
+
+    batcher = ShardedBatcher(ShardRouter(2, interval=4),
+                             [sent[0].append, sent[1].append],
+                             size=100, delay=60, drain_timeout=drain_timeout,
+                             progress=progress)
+    for t, arfcn in enumerate((2, 4, 2, 2)):
+        batcher.add(bcch(t, arfcn))
+    return batcher, sent
+
+
+def arfcns(batches):
+    return [[frame.arfcn for frame in batch] for batch in batches]
+
+
+def test_ShardedBatcher_waits_for_drain():
+    delivered = [0, 0]
+    batcher, sent = sharded(delivered)
+    # The old queue is flushed when the cell moves
+    assert arfcns(sent[0]) == [[2, 4, 2, 2]]
+    assert list(batcher.pending) == [4]
+    for t, arfcn in enumerate((4, 2, 4), 4):
+        batcher.add(bcch(t, arfcn))
+    batcher.flush()
+    assert arfcns(sent[0]) == [[2, 4, 2, 2], [2]]
+    assert sent[1] == [] and len(batcher) == 2
+    # Frames queued after the move do not hold it up
+    delivered[0] = 4
+    batcher.flush()
+    assert arfcns(sent[1]) == [[4, 4]]
+    assert [frame.timestamp for frame in sent[1][0]] == [4.0, 6.0]
+    assert not batcher.pending
+
+
+def test_ShardedBatcher_drain_timeout():
+    batcher, sent = sharded([0, 0], drain_timeout=0)
+    batcher.add(bcch(4, 4))
+    batcher.flush()
+    assert arfcns(sent[1]) == [[4]]
+
+
+def test_ShardedBatcher_close_sends_held():
+    batcher, sent = sharded([0, 0], drain_timeout=0.05)
+    batcher.add(bcch(4, 4))
+    batcher.close()
+    assert arfcns(sent[1]) == [[4]]
+    assert len(batcher) == 0
+
+
+def test_ShardedBatcher_no_progress_no_moves():
+    sent = [[], []]
+    batcher = ShardedBatcher(ShardRouter(2, interval=4),
+                             [sent[0].append, sent[1].append])
+    for arfcn in (2, 4, 2, 2, 4):
+        batcher.add(bcch(0, arfcn))
+    batcher.flush()
+    assert arfcns(sent[0]) == [[2, 4, 2, 2, 4]]
+
+
+################
+#              #
+# Test Pacer() #
+#              #
+################
+
+def test_Pacer_fast():
+    pacer = Pacer(0)
+    assert pacer.delay(100.0) == 0
+    assert pacer.delay(200.0) == 0
+
+
+def test_Pacer_real_time():
+    pacer = Pacer(1)
+    assert pacer.delay(100.0) == 0
+    assert 0.9 < pacer.delay(101.0) <= 1.0
+
+
+def test_Pacer_speed_multiplier():
+    pacer = Pacer(10)
+    pacer.delay(100.0)
+    assert 0.9 < pacer.delay(110.0) <= 1.0
+
+
+def test_Pacer_does_not_drift():
+    pacer = Pacer(1)
+    pacer.delay(0.0)
+    sleep(0.05)
+    assert pacer.delay(0.04) == 0
+    assert pacer.delay(0.1) <= 0.05
+
+
+def test_Pacer_timestamp_backwards():
+    pacer = Pacer(1)
+    pacer.delay(100.0)
+    assert pacer.delay(50.0) == 0
+
+
+#######################
+#                     #
+# Test pcap_capture() #
+#                     #
+#######################
+
+def test_Capture_pcap_batches():
+    q = Queue()
+    capture = Capture("capture", q, speed=0,
+                      capturefile=os.path.join(TEST_DATA, "silent_sms.pcap"),
+                      batch_size=100, batch_delay=60)
+    batched(capture)
+    capture.pcap_capture()
+    capture.batch.flush()
+
+    batches = []
+    while not q.empty():
+        batches.append(q.get())
+    assert [frame_count(b) for b in batches] == [100] * 6 + [59]
+    frame = next(unpack_frames(batches[0]))
+    assert frame.arfcn == 873
+    assert frame.payload[:3] == b'\x15\x06\x21'
+
+
+def test_Capture_diag_batches():
+    q = Queue()
+    capture = Capture("capture", q, speed=0,
+                      capturefile=os.path.join(TEST_DATA, "silent_sms.bin"),
+                      batch_size=100, batch_delay=60)
+    batched(capture)
+    capture.pcap_capture()
+
+    count = 0
+    while not q.empty():
+        count += frame_count(q.get())
+    assert count == 652
+
+
+def test_Capture_glob_merges_files():
+    q = Queue()
+    capture = Capture("capture", q, speed=0,
+                      capturefile=os.path.join(TEST_DATA, "*_catcher.pcap"),
+                      batch_size=100, batch_delay=60, max_open=1)
+    batched(capture)
+    capture.pcap_capture()
+
+    frames = []
+    while not q.empty():
+        frames.extend(unpack_frames(q.get()))
+    assert len(frames) == 872 + 1008
+    timestamps = [f.timestamp for f in frames]
+    assert timestamps == sorted(timestamps)
+
+
+def test_Capture_frame_filter():
+    q = Queue()
+    path = os.path.join(TEST_DATA, "intercepting_catcher.pcap")
+    capture = Capture("capture", q, speed=0, capturefile=path,
+                      batch_size=100, batch_delay=60,
+                      frame_filter=metrics_filter())
+    batched(capture)
+    capture.pcap_capture()
+
+    count = 0
+    while not q.empty():
+        count += frame_count(q.get())
+    assert count + capture.filtered == 872
+    assert capture.filtered > 0
+
+
+def test_Capture_sharded_queues():
+    queues = [Queue(), Queue()]
+    capture = Capture("capture", queues, speed=0,
+                      capturefile=os.path.join(TEST_DATA, "*_catcher.pcap"),
+                      batch_size=100, batch_delay=60)
+    capture.batch = capture.make_batcher()
+    capture.pcap_capture()
+
+    arfcns = []
+    for q in queues:
+        frames = []
+        while not q.empty():
+            frames.extend(unpack_frames(q.get()))
+        arfcns.append(set(f.arfcn & 0x3fff for f in frames))
+        timestamps = [f.timestamp for f in frames]
+        assert timestamps == sorted(timestamps)
+    assert not arfcns[0] & arfcns[1]
+
+
+def test_Capture_parallel_records():
+    """ Ranges read by a pool are queued as packed records, filtered
+    like single frames.
+
+    """
+    path = os.path.join(TEST_DATA, "intercepting_catcher.pcap")
+    accept = metrics_filter()
+    q = Queue()
+    capture = Capture("capture", q, speed=0, capturefile=path, jobs=2,
+                      batch_size=100, batch_delay=60, frame_filter=accept)
+    batched(capture)
+    capture.pcap_capture()
+
+    batches = []
+    while not q.empty():
+        batches.append(q.get())
+    with PcapReader(path) as reader:
+        expected = [f for f in reader if accept(f)]
+    assert all(isinstance(b, bytes) and frame_count(b) <= 100
+               for b in batches)
+    assert b"".join(batches) == pack_frames(expected)
+    assert capture.filtered == 872 - len(expected)
+
+
+def test_Capture_parallel_records_sharded():
+    queues = [Queue(), Queue()]
+    capture = Capture("capture", queues, speed=0, jobs=2,
+                      capturefile=os.path.join(TEST_DATA,
+                                               "tracking_catcher.pcap"),
+                      batch_size=100, batch_delay=60)
+    capture.batch = capture.make_batcher()
+    capture.pcap_capture()
+
+    arfcns = []
+    count = 0
+    for q in queues:
+        frames = []
+        while not q.empty():
+            frames.extend(unpack_frames(q.get()))
+        count += len(frames)
+        arfcns.append(set(f.arfcn & 0x3fff for f in frames))
+        timestamps = [f.timestamp for f in frames]
+        assert timestamps == sorted(timestamps)
+    assert count == 1008
+    assert not arfcns[0] & arfcns[1]
+
+
+def test_Capture_without_pyshark():
+    # Only the network interface source needs pyshark
+    code = ("import sys; sys.modules['pyshark'] = None; "
+            "import antikythera.capture")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    subprocess.run([sys.executable, "-c", code], cwd=root, check=True)
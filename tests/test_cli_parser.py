@@ -6,6 +6,7 @@ import logging
 import argparse
 
 from antikythera.cli import main, create_parser
+from antikythera.antikythera import retention_options
 
 def test_cli_verbose():
     test_parser = create_parser()
@@ -41,3 +42,114 @@ def test_cli_interface():
     test_parser = create_parser()
     args = test_parser.parse_args(['-i eth0'])
     assert args.interface == ' eth0'
+
+def test_cli_udpDefault():
+    test_parser = create_parser()
+    args = test_parser.parse_args(['-u'])
+    assert args.udp == '4729'
+
+def test_cli_udpAddress():
+    test_parser = create_parser()
+    args = test_parser.parse_args(['--udp', '0.0.0.0:4730'])
+    assert args.udp == '0.0.0.0:4730'
+
+def test_cli_batchDefault():
+    test_parser = create_parser()
+    args = test_parser.parse_args([])
+    assert args.batch_size == 64
+    assert args.batch_delay == 0.05
+
+def test_cli_batch():
+    test_parser = create_parser()
+    args = test_parser.parse_args(['--batch-size', '256',
+                                   '--batch-delay', '0.5'])
+    assert args.batch_size == 256
+    assert args.batch_delay == 0.5
+
+def test_cli_transportDefault():
+    test_parser = create_parser()
+    args = test_parser.parse_args([])
+    assert args.transport == 'queue'
+
+def test_cli_transportShm():
+    test_parser = create_parser()
+    args = test_parser.parse_args(['--transport', 'shm'])
+    assert args.transport == 'shm'
+
+def test_cli_speedDefault():
+    test_parser = create_parser()
+    args = test_parser.parse_args([])
+    assert args.speed == 1.0
+
+def test_cli_speed():
+    test_parser = create_parser()
+    args = test_parser.parse_args(['-s', '10'])
+    assert args.speed == 10.0
+
+def test_cli_jobs():
+    test_parser = create_parser()
+    args = test_parser.parse_args(['-j', '4'])
+    assert args.jobs == 4
+
+def test_cli_filterDefault():
+    test_parser = create_parser()
+    args = test_parser.parse_args([])
+    assert args.filter_frames
+    assert args.arfcns is None
+
+def test_cli_noFilter():
+    test_parser = create_parser()
+    args = test_parser.parse_args(['--no-filter'])
+    assert not args.filter_frames
+
+def test_cli_arfcns():
+    test_parser = create_parser()
+    args = test_parser.parse_args(['-a', '873', '21'])
+    assert args.arfcns == [873, 21]
+
+def test_cli_overflowDefault():
+    test_parser = create_parser()
+    args = test_parser.parse_args([])
+    assert args.overflow is None
+
+def test_cli_overflowPriority():
+    test_parser = create_parser()
+    args = test_parser.parse_args(['--overflow', 'priority'])
+    assert args.overflow == 'priority'
+
+def test_cli_noSharding():
+    test_parser = create_parser()
+    assert test_parser.parse_args([]).sharding
+    assert not test_parser.parse_args(['--no-sharding']).sharding
+
+def test_cli_siCacheDefault():
+    test_parser = create_parser()
+    args = test_parser.parse_args([])
+    assert args.si_cache == 4096
+
+def test_cli_siCacheOff():
+    test_parser = create_parser()
+    args = test_parser.parse_args(['--si-cache', '0'])
+    assert args.si_cache == 0
+
+def test_cli_database():
+    test_parser = create_parser()
+    args = test_parser.parse_args(['-d', '/tmp/anti.db',
+                                   '--flush-interval', '0.5'])
+    assert args.database == '/tmp/anti.db'
+    assert args.flush_interval == 0.5
+
+def test_cli_events():
+    test_parser = create_parser()
+    assert test_parser.parse_args([]).events is None
+    args = test_parser.parse_args(['--events', '/tmp/events'])
+    assert args.events == '/tmp/events'
+
+def test_cli_retention():
+    test_parser = create_parser()
+    args = test_parser.parse_args(['--raw-retention', '2', '--retention', '0',
+                                   '--max-disk', '512'])
+    assert retention_options(args) == {'raw_retention': 7200,
+                                       'retention': None,
+                                       'max_disk': 512 * 1024 * 1024}
+    assert retention_options(test_parser.parse_args([]))['max_disk'] is None
@@ -0,0 +1,97 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+
+from antikythera.diag import DiagReader, hdlc_unescape, diag_timestamp
+from antikythera.pcap import PcapReader
+from antikythera.gsmtap import (GSMTAP_CHANNEL_BCCH, GSMTAP_CHANNEL_CCCH,
+                                GSMTAP_CHANNEL_ACCH, pack_frames,
+                                unpack_frames)
+from antikythera.l3 import l3_header
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def test_hdlc_unescape():
+    assert hdlc_unescape(b'\x01\x7d\x5e\x02\x7d\x5d') == b'\x01\x7e\x02\x7d'
+
+
+def test_diag_timestamp():
+    assert diag_timestamp(0xd0d579ca490000) == pytest.approx(1437133207.77125)
+
+
+#####################
+#                   #
+# Test DiagReader() #
+#                   #
+#####################
+
+@pytest.mark.parametrize("name,count", [
+    ("silent_sms.bin", 652),
+    ("intercepting_catcher.bin", 831),
+    ("tracking_catcher.bin", 487),
+])
+def test_DiagReader_frame_count(name, count):
+    with DiagReader(os.path.join(TEST_DATA, name)) as reader:
+        assert sum(1 for _ in reader) == count
+
+
+def test_DiagReader_zero_copy():
+    with DiagReader(os.path.join(TEST_DATA, "silent_sms.bin")) as reader:
+        frame = next(iter(reader))
+        assert isinstance(frame.payload, memoryview)
+        assert frame.channel == GSMTAP_CHANNEL_CCCH
+        assert bytes(frame.payload[:3]) == b'\x15\x06\x21'
+        del frame
+
+
+def test_DiagReader_serving_arfcn():
+    with DiagReader(os.path.join(TEST_DATA, "silent_sms.bin")) as reader:
+        arfcns = set(f.arfcn for f in reader
+                     if f.channel == GSMTAP_CHANNEL_BCCH)
+    assert 873 in arfcns
+
+
+@pytest.mark.parametrize("name", ["silent_sms", "intercepting_catcher",
+                                  "tracking_catcher"])
+def test_DiagReader_matches_pcap(name):
+    """ The system information in the dump is the same as in the pcap.
+
+    """
+    with DiagReader(os.path.join(TEST_DATA, name + ".bin")) as reader:
+        diag = set(bytes(f.payload) for f in reader
+                   if f.channel == GSMTAP_CHANNEL_BCCH)
+    with PcapReader(os.path.join(TEST_DATA, name + ".pcap")) as reader:
+        pcap = set(f.payload for f in reader
+                   if f.channel == GSMTAP_CHANNEL_BCCH)
+    assert diag and diag <= pcap
+
+
+def test_DiagReader_pack():
+    with DiagReader(os.path.join(TEST_DATA, "tracking_catcher.bin")) as reader:
+        block = pack_frames(reader)
+    frames = list(unpack_frames(block))
+    assert len(frames) == 487
+    assert frames[0].timestamp > 1.4e9
+
+
+def test_DiagReader_dedicated_layout():
+    """ DCCH messages get the same layer 2 headers as GSMTAP frames.
+
+    """
+    with DiagReader(os.path.join(TEST_DATA, "silent_sms.bin")) as reader:
+        frames = [f for f in reader if f.channel not in
+                  (GSMTAP_CHANNEL_BCCH, GSMTAP_CHANNEL_CCCH)]
+    assert frames
+    for frame in frames:
+        assert l3_header(frame.channel, frame.payload) is not None
+    sacch = [f for f in frames if f.channel & GSMTAP_CHANNEL_ACCH]
+    length = len(sacch[0].payload) - 5
+    assert bytes(sacch[0].payload[:5]) == (b'\x00\x00\x01\x03'
+                                           + bytes([length << 2 | 1]))
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import json
+import pytest
+import numpy as np
+
+from antikythera.l3 import RR_SYSTEM_INFORMATION_3
+from antikythera.pcap import PcapReader
+from antikythera.packets.batch import PacketBatch
+from antikythera.packets.rr import MI_IMSI, MI_TMSI
+from antikythera.events import EventStore, STREAMS, MANIFEST
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+TMSI = 0x646fe2d4
+
+
+@pytest.fixture(scope="module")
+def batch():
+    with PcapReader(os.path.join(TEST_DATA, "silent_sms.pcap")) as reader:
+        return PacketBatch.from_frames(list(reader))
+
+
+@pytest.fixture
+def directory(tmpdir):
+    return str(tmpdir.join("events"))
+
+
+def system(timestamps, arfcn=1):
+    records = np.zeros(len(timestamps), dtype=STREAMS["system"])
+    records["timestamp"] = timestamps
+    records["arfcn"] = arfcn
+    return records
+
+
+###############
+#             #
+# Test append #
+#             #
+###############
+
+def test_append_buffers(directory):
+    store = EventStore(directory, flush_interval=60)
+    store.append("system", system([1.0, 2.0]))
+    assert store.pending_rows == 2
+    assert len(store.read("system")["timestamp"]) == 0
+    assert store.flush() == store.written == 2
+    assert store.read("system")["timestamp"].tolist() == [1.0, 2.0]
+
+
+def test_append_flush_rows(directory):
+    store = EventStore(directory, flush_rows=3, flush_interval=60)
+    store.append("system", system([1.0, 2.0, 3.0]))
+    assert store.flushes == 1
+    assert store.due_in() is None
+
+
+def test_partitions(directory):
+    store = EventStore(directory, partition=10)
+    store.append("system", system([1.0, 9.0, 12.0, 25.0]))
+    store.flush()
+    store.append("system", system([5.0]))
+    store.flush()
+    assert store.segments("system") == ["0", "10", "20"]
+    assert store.manifest["system"]["0"]["rows"] == 3
+    column = os.path.join(directory, "system", "0", "timestamp.col")
+    assert os.path.getsize(column) == 3 * 8
+
+
+#############
+#           #
+# Test scan #
+#           #
+#############
+
+def test_scan_time(directory):
+    store = EventStore(directory, partition=10)
+    store.append("system", system(np.arange(0.0, 40.0)))
+    store.flush()
+    assert store.segments("system", start=15, end=25) == ["10", "20"]
+    read = store.read("system", start=15, end=25)
+    assert read["timestamp"].tolist() == list(range(15, 26))
+
+
+def test_scan_whole_segment_mapped(directory):
+    store = EventStore(directory, partition=10)
+    store.append("system", system(np.arange(0.0, 40.0)))
+    store.flush()
+    parts = list(store.scan("system", start=10, end=19.5,
+                            columns=["timestamp"]))
+    assert len(parts) == 1
+    assert isinstance(parts[0]["timestamp"], np.memmap)
+
+
+def test_scan_arfcns(directory):
+    store = EventStore(directory, partition=10)
+    store.append("system", system([1.0, 2.0], arfcn=1))
+    store.append("system", system([3.0], arfcn=2))
+    store.append("system", system([15.0], arfcn=1))
+    store.flush()
+    assert store.segments("system", arfcns=[2]) == ["0"]
+    assert store.read("system", arfcns=[2])["timestamp"].tolist() == [3.0]
+
+
+###################
+#                 #
+# Test durability #
+#                 #
+###################
+
+def test_reopen(directory):
+    with EventStore(directory, partition=10) as store:
+        store.append("system", system([1.0, 12.0]))
+    store = EventStore(directory)
+    assert store.partition == 10
+    assert store.read("system")["timestamp"].tolist() == [1.0, 12.0]
+
+
+def test_reopen_truncates_uncommitted(directory):
+    with EventStore(directory) as store:
+        store.append("system", system([1.0, 2.0]))
+    # An interrupted flush, the column grew but the manifest was not saved
+    column = os.path.join(directory, "system", "0", "timestamp.col")
+    with open(column, "ab") as f:
+        f.write(np.float64(3.0).tobytes())
+    store = EventStore(directory)
+    assert os.path.getsize(column) == 2 * 8
+    store.append("system", system([4.0]))
+    store.flush()
+    assert store.read("system")["timestamp"].tolist() == [1.0, 2.0, 4.0]
+
+
+def test_reopen_short_column(directory):
+    with EventStore(directory) as store:
+        store.append("system", system([1.0, 2.0, 3.0]))
+    # The manifest reached the disk but not all of a column did
+    with open(os.path.join(directory, "system", "0", "arfcn.col"), "r+b") as f:
+        f.truncate(2 * 2 + 1)
+    store = EventStore(directory)
+    assert store.manifest["system"]["0"]["rows"] == 2
+    assert store.manifest["system"]["0"]["end"] == 2.0
+    assert store.read("system")["timestamp"].tolist() == [1.0, 2.0]
+    store.append("system", system([4.0]))
+    store.flush()
+    read = EventStore(directory).read("system")
+    assert read["timestamp"].tolist() == [1.0, 2.0, 4.0]
+
+
+def test_reopen_missing_column(directory):
+    with EventStore(directory, partition=10) as store:
+        store.append("system", system([1.0, 12.0]))
+    os.remove(os.path.join(directory, "system", "0", "lac.col"))
+    store = EventStore(directory)
+    assert store.segments("system") == ["10"]
+    assert store.read("system")["timestamp"].tolist() == [12.0]
+
+
+def test_flush_syncs_columns_first(directory, monkeypatch):
+    synced = []
+    fsync = os.fsync
+
+    def spy(fd):
+        synced.append(os.readlink("/proc/self/fd/{}".format(fd)))
+        fsync(fd)
+
+    monkeypatch.setattr(os, "fsync", spy)
+    with EventStore(directory) as store:
+        store.append("system", system([1.0]))
+        store.flush()
+    manifest = synced.index(os.path.join(directory, "manifest.json.tmp"))
+    segment = os.path.join(directory, "system", "0")
+    columns = [os.path.join(segment, name + ".col")
+               for name in STREAMS["system"].names]
+    assert set(columns + [segment]) <= set(synced[:manifest])
+
+
+def test_drop(directory):
+    store = EventStore(directory, partition=10)
+    store.append("system", system([1.0, 12.0, 25.0]))
+    store.flush()
+    assert store.drop("system", before=20) == 2
+    assert store.segments("system") == ["20"]
+    assert not os.path.exists(os.path.join(directory, "system", "0"))
+    with open(os.path.join(directory, MANIFEST)) as f:
+        assert list(json.load(f)["streams"]["system"]) == ["20"]
+
+
+##################
+#                #
+# Test add_batch #
+#                #
+##################
+
+def test_add_batch_pagings(directory, batch):
+    with EventStore(directory) as store:
+        store.add_batch(batch)
+    pagings = store.read("pagings")
+    imsis = int((batch.imsi != "").sum())
+    assert len(pagings["timestamp"]) == len(batch.tmsis) + imsis
+    tmsi = pagings["identity_type"] == MI_TMSI
+    assert TMSI in pagings["tmsi"][tmsi]
+    assert set(pagings["identity_type"].tolist()) <= {MI_TMSI, MI_IMSI}
+
+
+def test_add_batch_system(directory, batch):
+    with EventStore(directory) as store:
+        store.add_batch(batch)
+    system = store.read("system")
+    si3 = system["message_type"] == RR_SYSTEM_INFORMATION_3
+    cells = zip(system["lac"][si3].tolist(), system["cid"][si3].tolist())
+    assert set(cells) == {(0x17, 0x0539)}
+    assert set(system["arfcn"][si3].tolist()) == {0, 873}
+
+
+def test_add_batch_assignments(directory, batch):
+    with EventStore(directory) as store:
+        store.add_batch(batch)
+    assignments = store.read("assignments")
+    assert (1, 8) in zip(assignments["time_slot"].tolist(),
+                         assignments["channel_type"].tolist())
@@ -0,0 +1,186 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+import numpy as np
+
+from antikythera.filters import FrameFilter
+from antikythera.gsmtap import (Frame, GSMTAP_TYPE_UM, GSMTAP_TYPE_UM_BURST,
+                                GSMTAP_CHANNEL_BCCH, GSMTAP_CHANNEL_CCCH,
+                                GSMTAP_CHANNEL_SDCCH8, GSMTAP_CHANNEL_ACCH,
+                                GSMTAP_CHANNEL_TCH_F, GSMTAP_ARFCN_F_UPLINK,
+                                pack_frames)
+from antikythera.l3 import (l3_header, PD_RR, PD_MM, RR_PAGING_REQUEST_1,
+                            RR_SYSTEM_INFORMATION_3, RR_SYSTEM_INFORMATION_5)
+from antikythera.metrics import METRICS, Paging, metrics_filter
+from antikythera.packets.batch import FRAME_DTYPE
+from antikythera.pcap import PcapReader
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+RR_MEASUREMENT_REPORT = 0x15
+
+PAGING = b'\x15\x06\x21\x00\x01\xf0\x2b' + b'\x2b' * 16
+SI3 = b'\x49\x06\x1b\x05\x39\x00\xf1' + b'\x2b' * 16
+SI5 = b'\x00\x00\x03\x03\x49\x06\x1d' + b'\x00' * 16
+MM = b'\x01\x03\x09\x05\x48' + b'\x2b' * 18
+
+
+def frame(channel, payload, arfcn=873, gsmtap_type=GSMTAP_TYPE_UM):
+    return Frame(0.0, arfcn, 0, gsmtap_type, channel, 0, 0, payload)
+
+
+####################
+#                  #
+# Test l3_header() #
+#                  #
+####################
+
+def test_l3_header_ccch():
+    header = l3_header(GSMTAP_CHANNEL_BCCH, PAGING)
+    assert header == (PD_RR, RR_PAGING_REQUEST_1)
+
+
+def test_l3_header_sacch():
+    channel = GSMTAP_CHANNEL_SDCCH8 | GSMTAP_CHANNEL_ACCH
+    assert l3_header(channel, SI5) == (PD_RR, RR_SYSTEM_INFORMATION_5)
+
+
+def test_l3_header_mm_sequence_masked():
+    assert l3_header(GSMTAP_CHANNEL_SDCCH8, MM) == (PD_MM, 0x08)
+
+
+def test_l3_header_lapdm_without_information():
+    unknown = b'\x01\x73\x01' + b'\x2b' * 20
+    assert l3_header(GSMTAP_CHANNEL_SDCCH8, unknown) is None
+
+
+def test_l3_header_unknown_channel():
+    assert l3_header(0x0d, PAGING) is None
+    assert l3_header(GSMTAP_CHANNEL_BCCH, b'\x15') is None
+
+
+######################
+#                    #
+# Test FrameFilter() #
+#                    #
+######################
+
+def test_FrameFilter_accepts_all():
+    accept = FrameFilter(types=None)
+    assert accept(frame(GSMTAP_CHANNEL_TCH_F, b'',
+                        gsmtap_type=GSMTAP_TYPE_UM_BURST))
+
+
+def test_FrameFilter_type():
+    accept = FrameFilter()
+    assert accept(frame(GSMTAP_CHANNEL_BCCH, PAGING))
+    assert not accept(frame(GSMTAP_CHANNEL_BCCH, PAGING,
+                            gsmtap_type=GSMTAP_TYPE_UM_BURST))
+
+
+def test_FrameFilter_channel_and_message():
+    accept = FrameFilter(channels=[GSMTAP_CHANNEL_BCCH, GSMTAP_CHANNEL_CCCH],
+                         messages=[(PD_RR, RR_PAGING_REQUEST_1)])
+    assert accept(frame(GSMTAP_CHANNEL_CCCH, PAGING))
+    assert not accept(frame(GSMTAP_CHANNEL_CCCH, SI3))
+    assert not accept(frame(GSMTAP_CHANNEL_SDCCH8, PAGING))
+
+
+def test_FrameFilter_messages_any_channel():
+    accept = FrameFilter(messages=[(PD_RR, RR_SYSTEM_INFORMATION_5)])
+    assert accept(frame(GSMTAP_CHANNEL_SDCCH8 | GSMTAP_CHANNEL_ACCH, SI5))
+    assert not accept(frame(GSMTAP_CHANNEL_TCH_F, b''))
+
+
+def test_FrameFilter_arfcn_ignores_flags():
+    accept = FrameFilter(arfcns=[873])
+    assert accept(frame(GSMTAP_CHANNEL_BCCH, SI3,
+                        arfcn=873 | GSMTAP_ARFCN_F_UPLINK))
+    assert not accept(frame(GSMTAP_CHANNEL_BCCH, SI3, arfcn=21))
+
+
+def test_FrameFilter_union():
+    paging = FrameFilter(channels=[GSMTAP_CHANNEL_CCCH],
+                         messages=[(PD_RR, RR_PAGING_REQUEST_1)])
+    si3 = FrameFilter(channels=[GSMTAP_CHANNEL_CCCH],
+                      messages=[(PD_RR, RR_SYSTEM_INFORMATION_3)])
+    tch = FrameFilter(channels=[GSMTAP_CHANNEL_TCH_F])
+    accept = FrameFilter.union([paging, si3, tch])
+    assert accept(frame(GSMTAP_CHANNEL_CCCH, PAGING))
+    assert accept(frame(GSMTAP_CHANNEL_CCCH, SI3))
+    assert accept(frame(GSMTAP_CHANNEL_TCH_F, b''))
+    assert not accept(frame(GSMTAP_CHANNEL_SDCCH8, MM))
+
+
+def test_FrameFilter_union_empty():
+    assert not FrameFilter.union([])(frame(GSMTAP_CHANNEL_CCCH, PAGING))
+
+
+#########################
+#                       #
+# Test metrics_filter() #
+#                       #
+#########################
+
+def test_metrics_filter_declared_messages():
+    accept = metrics_filter()
+    assert accept(frame(GSMTAP_CHANNEL_BCCH, PAGING))
+    assert accept(frame(GSMTAP_CHANNEL_BCCH, SI3))
+    # No metric reads the neighbour lists of dedicated channels
+    assert not accept(frame(GSMTAP_CHANNEL_SDCCH8 | GSMTAP_CHANNEL_ACCH, SI5))
+    assert not accept(frame(GSMTAP_CHANNEL_SDCCH8, MM))
+    assert not accept(frame(GSMTAP_CHANNEL_TCH_F, b''))
+
+
+def test_metrics_filter_subset():
+    accept = metrics_filter([Paging])
+    assert accept(frame(GSMTAP_CHANNEL_BCCH, PAGING))
+    assert not accept(frame(GSMTAP_CHANNEL_BCCH, SI3))
+
+
+def test_metrics_filter_arfcns():
+    accept = metrics_filter(arfcns=[21])
+    assert not accept(frame(GSMTAP_CHANNEL_BCCH, PAGING))
+
+
+def test_metrics_filter_capture():
+    """ Measurement reports and the MM and CC dialogue are not needed.
+
+    """
+    accept = metrics_filter(METRICS)
+    path = os.path.join(TEST_DATA, "intercepting_catcher.pcap")
+    with PcapReader(path) as reader:
+        frames = list(reader)
+    kept = [f for f in frames if accept(f)]
+    assert 0 < len(kept) < len(frames)
+    headers = [l3_header(f.channel, f.payload) for f in kept]
+    assert (PD_RR, RR_MEASUREMENT_REPORT) not in headers
+    assert headers.count((PD_RR, RR_PAGING_REQUEST_1)) == 531
+
+
+#############################
+#                           #
+# Test FrameFilter.select() #
+#                           #
+#############################
+
+def test_FrameFilter_select_matches_call():
+    path = os.path.join(TEST_DATA, "intercepting_catcher.pcap")
+    with PcapReader(path) as reader:
+        frames = list(reader)
+    frames += [frame(GSMTAP_CHANNEL_ACCH, SI5, arfcn=21),
+               frame(GSMTAP_CHANNEL_SDCCH8, MM),
+               frame(GSMTAP_CHANNEL_BCCH, SI3,
+                     gsmtap_type=GSMTAP_TYPE_UM_BURST)]
+    records = np.frombuffer(pack_frames(frames), dtype=FRAME_DTYPE)
+    filters = [metrics_filter(METRICS), metrics_filter(arfcns=[21]),
+               FrameFilter(messages=[(PD_MM, 0x08)]), FrameFilter(),
+               FrameFilter.union([])]
+    for accept in filters:
+        assert accept.select(records).tolist() == [accept(f) for f in frames]
@@ -0,0 +1,40 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+from antikythera.gsmtap import (Frame, FRAME_SIZE, FRAME_PAYLOAD_SIZE,
+                                pack_frames, unpack_frames, frame_count)
+from antikythera.pcap import PcapReader
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def test_Frame_record_size():
+    assert FRAME_SIZE == 64
+
+
+def test_Frame_pack_unpack():
+    frame = Frame(1489968390.25, 873, 2275269, 1, 1, 0, -71, b'\x15\x06\x21')
+    record = frame.pack()
+    assert len(record) == FRAME_SIZE
+    assert Frame.unpack(record) == frame
+
+
+def test_Frame_pack_truncates_payload():
+    frame = Frame(0.0, 1, 2, 1, 8, 0, 0, bytes(range(54)))
+    payload = Frame.unpack(frame.pack()).payload
+    assert payload == bytes(range(FRAME_PAYLOAD_SIZE))
+
+
+def test_pack_frames_round_trip():
+    path = os.path.join(TEST_DATA, "tracking_catcher.pcap")
+    with PcapReader(path) as reader:
+        frames = [f for f in reader if len(f.payload) <= FRAME_PAYLOAD_SIZE]
+    block = pack_frames(frames)
+    assert frame_count(block) == len(frames)
+    assert list(unpack_frames(memoryview(block))) == frames
@@ -0,0 +1,121 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+
+from antikythera.l3 import (l3_header, l3_message, PD_RR, RR_PAGING_REQUEST_1,
+                            RR_PAGING_REQUEST_2, RR_PAGING_REQUEST_3)
+from antikythera.pcap import PcapReader
+from antikythera.packets.factory import PacketFactory
+from antikythera.packets.identities import (decode_pages, message_matrix,
+                                            paging_identities)
+from antikythera.packets.rr import (decode, PAGING_REQUEST_1, PAGING_REQUEST_2,
+                                    PAGING_REQUEST_3)
+from antikythera.packets import rr
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+TMSI = 0x646fe2d4
+# Paging Request Type 1 for IMSI 001010123456789
+PAGING_IMSI = bytes.fromhex("0621000809101010325476982b2b2b2b2b2b2b2b2b2b2b")
+PAGING_2 = bytes.fromhex("0622000000000100000002") + b'\x2b' * 12
+PAGING_3 = (bytes.fromhex("062400000000010000000200000003000000040000")
+            + b'\x2b' * 2)
+
+LAYOUTS = {
+    RR_PAGING_REQUEST_1: PAGING_REQUEST_1,
+    RR_PAGING_REQUEST_2: PAGING_REQUEST_2,
+    RR_PAGING_REQUEST_3: PAGING_REQUEST_3,
+}
+
+
+def identities(messages):
+    matrix, lengths = message_matrix(messages)
+    imsi, tmsis, offsets = paging_identities(matrix, lengths, matrix[:, 1])
+    return [(str(imsi[row]) or None,
+             tmsis[offsets[row]:offsets[row + 1]].tolist())
+            for row in range(len(messages))]
+
+
+def scalar(message):
+    fields = rr.paging_identities(decode(LAYOUTS[message[1]], message))
+    return fields.get("imsi"), fields.get("tmsis", [])
+
+
+@pytest.fixture(scope="module")
+def pages():
+    found = []
+    for capture in ("silent_sms.pcap", "tracking_catcher.pcap",
+                    "intercepting_catcher.pcap"):
+        with PcapReader(os.path.join(TEST_DATA, capture)) as reader:
+            found += [bytes(l3_message(f.channel, f.payload)) for f in reader
+                      if l3_header(f.channel, f.payload) in
+                      [(PD_RR, t) for t in LAYOUTS]]
+    return found
+
+
+############################
+#                          #
+# Test paging_identities() #
+#                          #
+############################
+
+def test_identities_imsi():
+    assert identities([PAGING_IMSI]) == [("001010123456789", [])]
+
+
+def test_identities_optional_tmsi():
+    data = PAGING_IMSI[:12] + b'\x17\x05\xf4' + TMSI.to_bytes(4, "big")
+    assert identities([data]) == [("001010123456789", [TMSI])]
+
+
+def test_identities_fixed_tmsis():
+    assert identities([PAGING_2, PAGING_3]) == [(None, [1, 2]),
+                                                (None, [1, 2, 3, 4])]
+
+
+def test_identities_short_message():
+    short = [PAGING_3[:10], PAGING_IMSI[:3], b'']
+    assert identities(short) == [(None, [])] * 3
+
+
+def test_identities_not_paging():
+    assert identities([b'\x06\x1b' + PAGING_2[2:]]) == [(None, [])]
+
+
+def test_identities_match_scalar(pages):
+    assert len(pages) > 0
+    assert identities(pages) == [scalar(m) for m in pages]
+
+
+#######################
+#                     #
+# Test decode_pages() #
+#                     #
+#######################
+
+def test_decode_pages():
+    packets = [PacketFactory.createMessage(PD_RR, m[1], m)
+               for m in (PAGING_IMSI, PAGING_3)]
+    decode_pages(packets)
+    assert packets[0]._imsi == "001010123456789"
+    assert packets[0].tmsis == []
+    assert packets[1]._tmsis == [1, 2, 3, 4]
+
+
+def test_decode_pages_undecoded():
+    packet = PacketFactory.createMessage(PD_RR, RR_PAGING_REQUEST_1, None)
+    decode_pages([packet])
+    assert packet.imsi is None
+
+
+def test_decode_pages_ptmsis():
+    packet = PacketFactory.createMessage(PD_RR, RR_PAGING_REQUEST_2, PAGING_2)
+    decode_pages([packet])
+    assert packet._ptmsis == []
+    assert packet.tmsis == [1, 2]
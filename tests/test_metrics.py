@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+
+from time import time
+
+from antikythera.gsmtap import pack_frames, GSMTAP_CHANNEL_SDCCH4
+from antikythera.l3 import (l3_header, PD_RR, RR_CIPHERING_MODE_COMMAND,
+                            RR_SYSTEM_INFORMATION_2,
+                            RR_SYSTEM_INFORMATION_2TER)
+from antikythera.pcap import PcapReader
+from antikythera.decoder import Decoder
+from antikythera.packets.batch import PacketBatch
+from antikythera.metrics import (Metric, MetricEngine, Metrics, Detection,
+                                 METRICS, CellConfiguration, NeighborList,
+                                 Paging, Ciphering, metrics_item)
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+TMSI = "646fe2d4"
+
+
+def frames(name):
+    with PcapReader(os.path.join(TEST_DATA, name)) as reader:
+        return list(reader)
+
+
+def batch(name):
+    return PacketBatch.from_frames(frames(name))
+
+
+#####################
+#                   #
+# Test MetricEngine #
+#                   #
+#####################
+
+def test_engine_default_metrics():
+    assert [type(metric) for metric in MetricEngine().metrics] == list(METRICS)
+
+
+def test_engine_routes_declared_messages():
+    seen = []
+
+    class Ciphers(Metric):
+        messages = frozenset([(PD_RR, RR_CIPHERING_MODE_COMMAND)])
+
+        def update(self, packets, rows):
+            seen.extend(packets.message_type[rows].tolist())
+            return [self.detection(packets, rows[0], "seen")]
+
+    engine = MetricEngine([])
+    assert isinstance(engine.register(Ciphers()), Ciphers)
+    found = engine.feed(batch("silent_sms.pcap"))
+    assert seen == [RR_CIPHERING_MODE_COMMAND] * 2
+    assert found == [Detection(found[0].timestamp, 873, "Ciphers", "seen")]
+    assert engine.stats()["detections"] == 1
+    assert list(engine.detections) == found
+
+
+def test_engine_channels():
+    packets = batch("silent_sms.pcap")
+    engine = MetricEngine([CellConfiguration()])
+    engine.feed(packets)
+    assert engine.events > 0
+    # System Information on a dedicated channel is not what the metric reads
+    packets.channel[:] = GSMTAP_CHANNEL_SDCCH4
+    engine = MetricEngine([CellConfiguration()])
+    engine.feed(packets)
+    assert engine.events == 0
+
+
+def test_engine_quiet_network():
+    engine = MetricEngine()
+    assert engine.feed(batch("silent_sms.pcap")) == []
+    assert engine.stats()["events"] > 0
+
+
+#################
+#               #
+# Test metrics  #
+#               #
+#################
+
+def test_cell_configuration_copied_identity():
+    engine = MetricEngine([CellConfiguration()])
+    found = engine.feed(batch("tracking_catcher.pcap"))
+    assert [(d.arfcn, d.description) for d in found] == [
+        (872, "CID 1337 in LAC 1212 is also in LAC 23")]
+
+
+def test_cell_configuration_changed():
+    engine = MetricEngine([CellConfiguration()])
+    found = engine.feed(batch("intercepting_catcher.pcap"))
+    assert ("cell 001-01 LAC 23 CID 1337 became 001-01 LAC 13 CID 1337"
+            in [d.description for d in found])
+
+
+def test_neighbor_list_empty():
+    packets = batch("silent_sms.pcap")
+    rows = (packets.message_type == RR_SYSTEM_INFORMATION_2).nonzero()[0][:1]
+    packets = packets.select(rows)
+    packets.neighbor_offsets[1:] = 0
+    found = MetricEngine([NeighborList()]).feed(packets)
+    assert [d.description for d in found] == ["no neighbouring cells"]
+
+
+def test_neighbor_list_combines_parts():
+    si2 = [f for f in frames("silent_sms.pcap")
+           if l3_header(f.channel, f.payload) == (PD_RR,
+                                                  RR_SYSTEM_INFORMATION_2)][0]
+
+    def si2ter(timestamp, arfcn):
+        # A bit map 0 list of one ARFCN
+        ncd = bytearray(16)
+        ncd[15 - (arfcn - 1) // 8] = 1 << (arfcn - 1) % 8
+        payload = (si2.payload[:2] + bytes([RR_SYSTEM_INFORMATION_2TER])
+                   + bytes(ncd) + si2.payload[19:])
+        return si2._replace(timestamp=timestamp, payload=payload)
+
+    packets = PacketBatch.from_frames([
+        si2, si2ter(si2.timestamp + 1, 100),
+        si2._replace(timestamp=si2.timestamp + 2),
+        si2ter(si2.timestamp + 3, 101)])
+    found = MetricEngine([NeighborList()]).feed(packets)
+    assert [d.description for d in found] == [
+        "neighbours changed from [100, 871, 872, 873] to "
+        "[101, 871, 872, 873]"]
+
+
+def test_paging_repeated():
+    paging = Paging(repeat=2)
+    found = MetricEngine([paging]).feed(batch("silent_sms.pcap"))
+    assert [(d.arfcn, d.description) for d in found] == [
+        (873, "{} paged 2 times in 60s".format(TMSI))]
+    stats = paging.stats()
+    assert stats[873]["identities"] == 1
+    assert stats[873]["pagings"] == round(2 / 60, 3)
+    assert stats[0]["pagings"] == round(1 / 60, 3)
+
+
+def test_paging_window_expires():
+    paging = Paging(window=10, repeat=2)
+    packets = batch("silent_sms.pcap")
+    rows = [i for i in range(len(packets))
+            if len(packets.tmsis_of(i)) and packets.arfcn[i] == 873][:2]
+    first, second = packets.select(rows[:1]), packets.select(rows[1:2])
+    second.timestamp += 20
+    engine = MetricEngine([paging])
+    assert engine.feed(first) == engine.feed(second) == []
+    second.timestamp -= 15
+    assert len(engine.feed(second)) == 1
+
+
+def test_ciphering_not_started():
+    packets = batch("silent_sms.pcap")
+    commands = packets.message_type == RR_CIPHERING_MODE_COMMAND
+    packets = packets.select(commands.nonzero()[0])
+    ciphering = Ciphering()
+    assert MetricEngine([ciphering]).feed(packets) == []
+    # Cipher mode setting without start ciphering
+    packets.payload[:, packets.l3_offset[0] + 2] = 0x00
+    found = MetricEngine([ciphering]).feed(packets)
+    assert [d.description for d in found] == ["ciphering not started"] * 2
+    assert ciphering.stats() == {873: {"commands": 4, "weak": 2}}
+
+
+################
+#              #
+# Test Metrics #
+#              #
+################
+
+def test_decoder_sends_metrics():
+    metrics_q = queue.Queue()
+    decoder = Decoder("test", None, metrics_q=metrics_q)
+    packets = decoder.decode_batch(
+        pack_frames(frames("tracking_catcher.pcap")), 5.0)
+    received, sent_packets = metrics_q.get_nowait()
+    assert sent_packets is packets
+    assert received == 5.0
+
+
+def test_decoder_put_full_queue_at_shutdown():
+    metrics_q = queue.Queue(1)
+    metrics_q.put(None)
+    decoder = Decoder("test", None, metrics_q=metrics_q)
+    decoder.shutdown()
+    assert not decoder.put(metrics_q, "batch")
+    metrics_q.get_nowait()
+    assert decoder.put(metrics_q, "batch")
+
+
+def test_metrics_run_drains_queue():
+    metrics_q = queue.Queue()
+    metrics_q.put(metrics_item(batch("tracking_catcher.pcap")))
+    metrics = Metrics("metrics", metrics_q)
+    metrics.shutdown()
+    metrics.run()
+    assert metrics_q.empty()
+    stats = metrics.stats()
+    assert stats["detections"] == 1
+    assert stats["events"] > 0
+    assert 0 <= stats["max_latency"] < 60
+
+
+def test_metrics_live_latency():
+    packets = batch("tracking_catcher.pcap")
+    packets.timestamp += time() - 30 - packets.timestamp.min()
+    # A replay only counts from the decoder
+    replay = Metrics("metrics")
+    replay.feed(metrics_item(packets))
+    assert replay.stats()["max_latency"] < 30
+    live = Metrics("metrics", live=True)
+    live.feed(metrics_item(packets))
+    assert 30 <= live.stats()["max_latency"] < 90
@@ -2,7 +2,12 @@
 # -*- coding: utf-8 -*-
 
 import pytest
-from antikythera.packets.factory import PacketFactory
+
+from datetime import datetime, timezone
+
+from antikythera.packets.factory import PacketFactory, MESSAGES
+from antikythera.packets import system, page
+from antikythera.l3 import PD_RR, PD_MM, RR_SYSTEM_INFORMATION_3
 from antikythera.packets.system import System
 from antikythera.packets.page import Page
 from antikythera.packets.assign import Assign
@@ -21,6 +26,8 @@ def run_around_tests():
     # Code that will run before test
     factory = PacketFactory
     factory.factories = {}
+    factory.messages = dict(MESSAGES)
+    factory.unknown.clear()
 
     # A test function will be run at this point
     yield
@@ -131,3 +138,123 @@ def test_createPacket_assign_packet_immediate():
     factory.addFactory("Assign", Assign.Factory)
     sys_pkt = factory.createPacket("Assign", "Immediate", '\x42')
     assert sys_pkt.data == 'B'
+
+# Test unknown packets
+
+def test_createPacket_unknown_type():
+    factory = PacketFactory
+    factory.addFactory("Page", Page.Factory)
+    assert factory.createPacket("Page", "Type9", '\x42') is None
+    assert factory.unknown[("Page", "Type9")] == 1
+
+def test_createPacket_unknown_factory():
+    factory = PacketFactory
+    assert factory.createPacket("Bogus", "Type1", '\x42') is None
+    assert factory.unknown[("Bogus", "Type1")] == 1
+
+def test_createPacket_not_added_factory():
+    factory = PacketFactory
+    sys_pkt = factory.createPacket("System", "Type1", '\x42')
+    assert sys_pkt.data == 'B'
+    assert factory.factories == {"System" : System.Factory}
+
+########################
+#                      #
+# Test createMessage() #
+#                      #
+########################
+
+def test_createMessage_system_type3():
+    factory = PacketFactory
+    data = b'\x06\x1b\x05\x39' + bytes(19)
+    sys_pkt = factory.createMessage(PD_RR, RR_SYSTEM_INFORMATION_3, data)
+    assert isinstance(sys_pkt, system.Type3)
+    assert sys_pkt.cell_id == 0x0539
+
+def test_createMessage_unknown():
+    factory = PacketFactory
+    assert factory.createMessage(PD_MM, 0x24, b'\x05\x24') is None
+    assert factory.createMessage(PD_MM, 0x24, b'\x05\x24') is None
+    assert factory.unknown == {(PD_MM, 0x24): 2}
+
+def test_addMessage():
+    factory = PacketFactory
+    factory.addMessage(PD_MM, 0x24, page.Type1)
+    packet = factory.createMessage(PD_MM, 0x24, b'\x05\x24')
+    assert isinstance(packet, page.Type1)
+    assert not factory.unknown
+
+def test_createMessage_unix_time():
+    factory = PacketFactory
+    data = b'\x06\x1b\x05\x39' + bytes(19)
+    sys_pkt = factory.createMessage(PD_RR, RR_SYSTEM_INFORMATION_3, data,
+                                    1437133207.5)
+    assert sys_pkt.unix_time == 1437133207.5
+    assert sys_pkt.timestamp == datetime(2015, 7, 17, 11, 40, 7, 500000,
+                                         tzinfo=timezone.utc)
+
+##################
+#                #
+# Test __slots__ #
+#                #
+##################
+
+@pytest.mark.parametrize("packet_class",
+                         sorted(set(MESSAGES.values()), key=repr))
+def test_packet_slots(packet_class):
+    packet = packet_class(b'\x06\x00')
+    assert not hasattr(packet, "__dict__")
+    assert packet.timestamp is None
+    assert packet.location == "location stub"
+
+##################
+#                #
+# Test LazyField #
+#                #
+##################
+
+SI3 = bytes.fromhex("06 1b 0539 00f110 0017 c9 0350 05 00 65 55 2b 2b 2b 2b")
+
+def test_lazy_not_decoded():
+    sys_pkt = system.Type3(SI3)
+    assert not hasattr(sys_pkt, "_cell_id")
+    assert not hasattr(sys_pkt, "_lai")
+
+def test_lazy_fixed_field():
+    sys_pkt = system.Type3(SI3)
+    assert sys_pkt.cell_id == 0x0539
+    assert not hasattr(sys_pkt, "_lai")
+    assert sys_pkt.lai.lac == 0x17
+
+def test_lazy_rest_octets():
+    sys_pkt = system.Type3(SI3)
+    assert sys_pkt.gprs is None
+    assert hasattr(sys_pkt, "_cell_id")
+    assert sys_pkt.cell_id == 0x0539
+
+def test_lazy_set():
+    sys_pkt = system.Type3(SI3)
+    sys_pkt.cell_id = 42
+    assert sys_pkt.gprs is None
+    assert sys_pkt.cell_id == 42
+
+def test_lazy_defaults():
+    first = page.Type2('\x42')
+    second = page.Type2('\x42')
+    assert first.imsi is None
+    assert first.tmsis == []
+    assert first.tmsis is not second.tmsis
+
+def test_lazy_page_tmsi():
+    pkt = page.Type1(bytes.fromhex("06 21 00 05 f4 646fe2d4") + b'\x2b' * 14)
+    assert pkt.tmsi == 0x646fe2d4
+    assert pkt.imsi is None
+
+def test_lazy_page_set_tmsi():
+    pkt = page.Type1(bytes.fromhex("06 21 00 05 f4 646fe2d4") + b'\x2b' * 14)
+    pkt.tmsi = 42
+    assert pkt.tmsi == 42
+    assert pkt.tmsis == [42]
+    pkt.tmsi = None
+    assert pkt.tmsi is None
+    assert pkt.tmsis == []
@@ -0,0 +1,260 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+import pytest
+
+import numpy as np
+
+from antikythera.pcap import (PcapReader, extract_gsmtap, read_parallel,
+                              LINKTYPE_ETHERNET)
+from antikythera.gsmtap import GSMTAP_CHANNEL_BCCH, parse_gsmtap, pack_frames
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def block(block_type, body):
+    """ A pcapng block.
+
+    """
+    body += b"\x00" * (-len(body) % 4)
+    length = len(body) + 12
+    return (struct.pack("<II", block_type, length) + body
+            + struct.pack("<I", length))
+
+
+def packet_block(interface, timestamp, data, resolution=1e6):
+    ts = int(round(timestamp * resolution))
+    header = struct.pack("<IIIII", interface, ts >> 32, ts & 0xffffffff,
+                         len(data), len(data))
+    return block(0x00000006, header + data)
+
+
+def to_pcapng(pcap_path, out_path):
+    """ Rewrite a classic pcap file as pcapng with enhanced packet blocks.
+
+    """
+    with PcapReader(pcap_path) as reader:
+        packets = list(reader.packets())
+
+    out = block(0x0a0d0d0a, struct.pack("<IHHq", 0x1a2b3c4d, 1, 0, -1))
+    out += block(0x00000001, struct.pack("<HHI", LINKTYPE_ETHERNET, 0, 0xffff))
+    for timestamp, _, data in packets:
+        out += packet_block(0, timestamp, data)
+    with open(out_path, "wb") as f:
+        f.write(out)
+
+
+def write_pcap(path, packets):
+    """ Write ``(timestamp, data)`` pairs as a classic Ethernet pcap.
+
+    """
+    out = struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 0xffff,
+                      LINKTYPE_ETHERNET)
+    for timestamp, data in packets:
+        sec = int(timestamp)
+        usec = int(round((timestamp - sec) * 1e6))
+        out += struct.pack("<IIII", sec, usec, len(data), len(data)) + data
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def record_offsets(path):
+    """ The offset of every record in a classic pcap file.
+
+    """
+    with open(path, "rb") as f:
+        data = f.read()
+    offsets = []
+    pos = 24
+    while pos < len(data):
+        offsets.append(pos)
+        pos += 16 + struct.unpack_from("<I", data, pos + 8)[0]
+    return offsets
+
+
+def joined(blocks):
+    """ The record arrays :func:`read_parallel` yields as one block.
+
+    """
+    return b"".join(records.tobytes() for records in blocks)
+
+
+#####################
+#                   #
+# Test PcapReader() #
+#                   #
+#####################
+
+@pytest.mark.parametrize("name,count", [
+    ("silent_sms.pcap", 659),
+    ("intercepting_catcher.pcap", 872),
+    ("tracking_catcher.pcap", 1008),
+])
+def test_PcapReader_frame_count(name, count):
+    with PcapReader(os.path.join(TEST_DATA, name)) as reader:
+        assert len(list(reader)) == count
+
+
+def test_PcapReader_first_frame():
+    with PcapReader(os.path.join(TEST_DATA, "silent_sms.pcap")) as reader:
+        frame = next(iter(reader))
+    assert frame.arfcn == 873
+    assert frame.frame_nr == 0x22b7c5
+    assert frame.channel == GSMTAP_CHANNEL_BCCH
+    assert frame.payload[:3] == b'\x15\x06\x21'
+    assert len(frame.payload) == 23
+
+
+def test_PcapReader_pcapng(tmpdir):
+    pcap = os.path.join(TEST_DATA, "silent_sms.pcap")
+    pcapng = str(tmpdir.join("silent_sms.pcapng"))
+    to_pcapng(pcap, pcapng)
+    with PcapReader(pcap) as reader:
+        expected = list(reader)
+    with PcapReader(pcapng) as reader:
+        frames = list(reader)
+    assert frames == expected
+
+
+def test_PcapReader_not_pcap(tmpdir):
+    path = tmpdir.join("bad.pcap")
+    path.write_binary(b"\x00" * 64)
+    with pytest.raises(ValueError):
+        with PcapReader(str(path)) as reader:
+            list(reader)
+
+
+####################
+#                  #
+# Test partition() #
+#                  #
+####################
+
+@pytest.mark.parametrize("name", ["silent_sms.pcap", "tracking_catcher.pcap"])
+def test_partition_record_aligned(name):
+    path = os.path.join(TEST_DATA, name)
+    with PcapReader(path) as reader:
+        ranges = reader.partition(4096)
+    assert len(ranges) > 10
+    offsets = set(record_offsets(path))
+    for start, end, _ in ranges:
+        assert start in offsets
+    assert ranges[-1][1] == os.path.getsize(path)
+    assert all(a[1] == b[0] for a, b in zip(ranges, ranges[1:]))
+
+
+def test_partition_covers_every_frame():
+    path = os.path.join(TEST_DATA, "intercepting_catcher.pcap")
+    with PcapReader(path) as reader:
+        expected = list(reader)
+        frames = []
+        for start, end, state in reader.partition(3000):
+            frames.extend(reader.frames(start, end, state))
+    assert frames == expected
+
+
+def test_partition_pcapng(tmpdir):
+    pcapng = str(tmpdir.join("tracking_catcher.pcapng"))
+    to_pcapng(os.path.join(TEST_DATA, "tracking_catcher.pcap"), pcapng)
+    with PcapReader(pcapng) as reader:
+        expected = list(reader)
+        ranges = reader.partition(4096)
+        frames = []
+        for start, end, state in ranges:
+            frames.extend(reader.frames(start, end, state))
+    assert len(ranges) > 10
+    assert frames == expected
+
+
+def test_partition_pcapng_late_interface(tmpdir):
+    """ An interface described after the first packets is known to the
+    ranges after it.
+
+    """
+    path = os.path.join(TEST_DATA, "tracking_catcher.pcap")
+    with PcapReader(path) as reader:
+        packets = list(reader.packets())
+    half = len(packets) // 2
+    out = block(0x0a0d0d0a, struct.pack("<IHHq", 0x1a2b3c4d, 1, 0, -1))
+    out += block(0x00000001, struct.pack("<HHI", LINKTYPE_ETHERNET, 0, 0xffff))
+    for timestamp, _, data in packets[:half]:
+        out += packet_block(0, timestamp, data)
+    # A second interface with nanosecond timestamps
+    out += block(0x00000001, struct.pack("<HHIHHB3xHH", LINKTYPE_ETHERNET, 0,
+                                         0xffff, 9, 1, 9, 0, 0))
+    for timestamp, _, data in packets[half:]:
+        out += packet_block(1, timestamp, data, 1e9)
+    pcapng = str(tmpdir.join("late_interface.pcapng"))
+    with open(pcapng, "wb") as f:
+        f.write(out)
+
+    with PcapReader(pcapng) as reader:
+        expected = list(reader)
+        ranges = reader.partition(4096)
+        frames = []
+        for start, end, state in ranges:
+            frames.extend(reader.frames(start, end, state))
+    assert len(expected) == 1008
+    assert frames == expected
+    parallel = read_parallel(pcapng, 2, chunk_size=4096)
+    assert joined(parallel) == pack_frames(expected)
+
+
+def test_partition_small_file():
+    path = os.path.join(TEST_DATA, "silent_sms.pcap")
+    with PcapReader(path) as reader:
+        assert reader.partition(1 << 30) == [(24, os.path.getsize(path), None)]
+
+
+########################
+#                      #
+# Test read_parallel() #
+#                      #
+########################
+
+def test_read_parallel_matches_sequential():
+    path = os.path.join(TEST_DATA, "tracking_catcher.pcap")
+    with PcapReader(path) as reader:
+        expected = pack_frames(reader)
+    assert joined(read_parallel(path, 3, chunk_size=4096)) == expected
+
+
+def test_read_parallel_time_order(tmpdir):
+    """ Records a little out of order come back sorted by capture time.
+
+    """
+    with PcapReader(os.path.join(TEST_DATA, "silent_sms.pcap")) as reader:
+        packets = [data for _, _, data in reader.packets()]
+    timestamps = [1000.0 + i * 0.01 for i in range(len(packets))]
+    for i in range(0, len(timestamps) - 1, 7):
+        timestamps[i], timestamps[i + 1] = timestamps[i + 1], timestamps[i]
+    path = str(tmpdir.join("shuffled.pcap"))
+    write_pcap(path, zip(timestamps, packets))
+
+    blocks = list(read_parallel(path, 2, chunk_size=2048))
+    assert len(blocks) > 1
+    timestamps = np.concatenate([b["timestamp"] for b in blocks])
+    assert len(timestamps) == len(packets)
+    assert timestamps.tolist() == sorted(timestamps)
+
+
+#########################
+#                       #
+# Test extract_gsmtap() #
+#                       #
+#########################
+
+def test_extract_gsmtap_wrong_port():
+    with PcapReader(os.path.join(TEST_DATA, "silent_sms.pcap")) as reader:
+        _, linktype, data = next(reader.packets())
+    assert extract_gsmtap(linktype, data, port=1234) is None
+
+
+def test_parse_gsmtap_short():
+    assert parse_gsmtap(b"\x02\x04", 0.0) is None
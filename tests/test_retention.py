@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+import numpy as np
+
+from antikythera.l3 import RR_PAGING_REQUEST_1, RR_IMMEDIATE_ASSIGNMENT
+from antikythera.packets.rr import MI_IMSI, MI_TMSI
+from antikythera.storage import Storage, INSERTS
+from antikythera.events import EventStore, STREAMS
+from antikythera.retention import Compactor
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+HOUR = 3600
+
+
+@pytest.fixture
+def storage(tmpdir):
+    storage = Storage(str(tmpdir.join("antikythera.db")))
+    yield storage
+    storage.close()
+
+
+def insert(storage, table, rows):
+    with storage.connection:
+        storage.connection.executemany(INSERTS[table], rows)
+
+
+def pagings(timestamps, arfcn=1, identity_type=MI_TMSI):
+    return [(t, arfcn, RR_PAGING_REQUEST_1, identity_type, "00000001")
+            for t in timestamps]
+
+
+def assignments(timestamps, arfcn=1):
+    return [(t, arfcn, RR_IMMEDIATE_ASSIGNMENT, 8, 1, 0, 0, b"\x06\x3f")
+            for t in timestamps]
+
+
+def query(storage, sql, *args):
+    return storage.connection.execute(sql, args).fetchall()
+
+
+#################
+#               #
+# Test raw data #
+#               #
+#################
+
+def test_clear_raw(storage):
+    insert(storage, "assignments", assignments([0, HOUR, 2 * HOUR, 10 * HOUR]))
+    compactor = Compactor(storage, raw_retention=5 * HOUR, retention=None)
+    assert compactor.step() == 3
+    assert query(storage, "SELECT length(message) FROM assignments "
+                          "ORDER BY id") == [(0,), (0,), (0,), (2,)]
+    # Decoded columns are kept
+    assert query(storage, "SELECT COUNT(*) FROM assignments "
+                          "WHERE time_slot = 1")[0][0] == 4
+    assert compactor.step() == 0
+    assert compactor.cleared == 3
+
+
+def test_clear_raw_slices(storage):
+    insert(storage, "assignments", assignments(range(10)))
+    insert(storage, "assignments", assignments([10 * HOUR]))
+    compactor = Compactor(storage, raw_retention=HOUR, retention=None,
+                          slice_rows=4)
+    assert [compactor.step() for _ in range(4)] == [4, 4, 2, 0]
+
+
+###############################
+#                             #
+# Test expiry and aggregation #
+#                             #
+###############################
+
+def test_expire_aggregates(storage):
+    insert(storage, "pagings", pagings([0, 10, 70]))
+    insert(storage, "pagings", pagings([30], identity_type=MI_IMSI))
+    insert(storage, "pagings", pagings([20], arfcn=2))
+    insert(storage, "assignments", assignments([5]))
+    insert(storage, "pagings", pagings([HOUR]))
+    compactor = Compactor(storage, raw_retention=None, retention=HOUR / 2)
+    assert compactor.step() == 6
+    assert query(storage, "SELECT timestamp FROM pagings") == [(HOUR,)]
+    assert query(storage, "SELECT arfcn, minute, pagings, imsi_pagings, "
+                          "assignments FROM cell_minutes "
+                          "ORDER BY arfcn, minute") == [
+        (1, 0, 3, 1, 1), (1, 60, 1, 0, 0), (2, 0, 1, 0, 0)]
+
+
+def test_expire_adds_to_aggregates(storage):
+    compactor = Compactor(storage, raw_retention=None, retention=HOUR,
+                          slice_rows=2)
+    insert(storage, "pagings", pagings([0, 1, 2, 2 * HOUR]))
+    while compactor.step():
+        pass
+    assert query(storage, "SELECT pagings FROM cell_minutes") == [(3,)]
+    assert compactor.deleted == 3
+
+
+def test_expire_keeps_newer_rows_behind_older(storage):
+    # Rows are expired in id order up to the first one still kept
+    insert(storage, "pagings", pagings([0, 2 * HOUR, 1, 2 * HOUR]))
+    Compactor(storage, raw_retention=None, retention=HOUR).step()
+    assert query(storage, "SELECT timestamp FROM pagings ORDER BY id") == [
+        (2 * HOUR,), (1,), (2 * HOUR,)]
+
+
+def test_expire_events(storage, tmpdir):
+    events = EventStore(str(tmpdir.join("events")), partition=HOUR)
+    records = np.zeros(3, dtype=STREAMS["system"])
+    records["timestamp"] = [0, HOUR, 5 * HOUR]
+    events.append("system", records)
+    events.flush()
+    compactor = Compactor(None, events, raw_retention=None, retention=2 * HOUR)
+    assert compactor.step() == 2
+    assert events.read("system")["timestamp"].tolist() == [5 * HOUR]
+
+
+##################
+#                #
+# Test disk cap  #
+#                #
+##################
+
+def test_max_bytes(storage):
+    insert(storage, "pagings", pagings(range(20000)))
+    storage.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    size = os.path.getsize(storage.path)
+    compactor = Compactor(storage, raw_retention=None, retention=None,
+                          max_bytes=size // 2)
+    # Slices are evicted until the cap is met, not one per step
+    evicted = compactor.step()
+    assert evicted == compactor.evicted > 1000
+    assert evicted % 1000 == 0
+    assert compactor.disk_usage() <= size // 2
+    assert query(storage, "SELECT MIN(timestamp) FROM pagings") == [(evicted,)]
+    assert query(storage, "SELECT SUM(pagings) FROM cell_minutes") == [
+        (evicted,)]
+
+
+def test_max_bytes_everything(storage):
+    insert(storage, "pagings", pagings(range(20000)))
+    compactor = Compactor(storage, raw_retention=None, retention=None,
+                          max_bytes=1)
+    assert compactor.step() == 20000
+    assert query(storage, "SELECT COUNT(*) FROM pagings") == [(0,)]
+    assert compactor.step() == 0
+
+
+def test_max_bytes_below_wal(storage):
+    insert(storage, "pagings", pagings(range(20000)))
+    wal = os.path.getsize(storage.path + "-wal")
+    assert wal > os.path.getsize(storage.path)
+    compactor = Compactor(storage, raw_retention=None, retention=None,
+                          max_bytes=wal // 2)
+    assert compactor.step() > 0
+    # The log is truncated rather than more rows evicted
+    assert os.path.getsize(storage.path + "-wal") == 0
+    assert compactor.disk_usage() <= wal // 2
+    assert query(storage, "SELECT COUNT(*) FROM pagings")[0][0] >= 10000
+
+
+def test_max_bytes_not_reached(storage):
+    insert(storage, "pagings", pagings(range(100)))
+    compactor = Compactor(storage, raw_retention=None, retention=None,
+                          max_bytes=1 << 30)
+    assert compactor.step() == 0
+    assert compactor.stats()["disk"] == compactor.disk_usage() > 0
+
+
+def test_vacuum_shrinks(storage):
+    insert(storage, "pagings", pagings(range(20000)))
+    storage.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    pages = query(storage, "PRAGMA page_count")[0][0]
+    compactor = Compactor(storage, raw_retention=None, retention=1,
+                          slice_rows=20000)
+    compactor.step()
+    storage.connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    assert query(storage, "PRAGMA page_count")[0][0] < pages
+
+
+def test_due(storage):
+    compactor = Compactor(storage, interval=60)
+    assert compactor.due()
+    compactor.step()
+    assert not compactor.due()
+    assert 0 < compactor.due_in() <= 60
@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import pytest
+import multiprocessing as mp
+
+from queue import Empty, Full
+
+from antikythera.ring import RingBuffer
+from antikythera.gsmtap import Frame, pack_frames, unpack_frames
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+
+@pytest.fixture
+def ring():
+    ring = RingBuffer(4, 256)
+    yield ring
+    ring.unlink()
+
+
+def consume(ring, results):
+    """ Take messages until the ring stays empty.
+
+    """
+    received = []
+    while True:
+        try:
+            received.append(bytes(ring.get(timeout=1)))
+        except Empty:
+            break
+    results.put(received)
+    ring.close()
+
+
+#####################
+#                   #
+# Test RingBuffer() #
+#                   #
+#####################
+
+def test_RingBuffer_fifo(ring):
+    for i in range(3):
+        ring.put(bytes([i]) * 8)
+    assert ring.qsize() == 3
+    messages = [bytes(ring.get_nowait()) for _ in range(3)]
+    assert messages == [b'\x00' * 8, b'\x01' * 8, b'\x02' * 8]
+    assert ring.empty()
+
+
+def test_RingBuffer_empty(ring):
+    with pytest.raises(Empty):
+        ring.get_nowait()
+    with pytest.raises(Empty):
+        ring.get(timeout=0.01)
+
+
+def test_RingBuffer_overflow(ring):
+    for i in range(4):
+        ring.put_nowait(b'x')
+    assert ring.full()
+    with pytest.raises(Full):
+        ring.put_nowait(b'y')
+    with pytest.raises(Full):
+        ring.put(b'y', timeout=0.01)
+    stats = ring.stats()
+    assert stats["overflows"] == 2
+    assert stats["occupancy"] == 4
+    assert stats["high_water"] == 4
+
+
+def test_RingBuffer_message_too_large(ring):
+    with pytest.raises(ValueError):
+        ring.put(b'x' * 257)
+
+
+def test_RingBuffer_view_released_on_next_get(ring):
+    ring.put(b'first')
+    ring.put(b'second')
+    view = ring.get()
+    assert bytes(view) == b'first'
+    ring.get()
+    with pytest.raises(ValueError):
+        bytes(view)
+
+
+def test_RingBuffer_wraps(ring):
+    for i in range(20):
+        ring.put(b'%d' % i)
+        assert bytes(ring.get()) == b'%d' % i
+    assert ring.stats()["written"] == 20
+
+
+def test_RingBuffer_frames(ring):
+    frames = [Frame(float(i), 873, i, 1, 1, 0, -60, b'\x15\x06\x21')
+              for i in range(4)]
+    ring.put(pack_frames(frames))
+    assert list(unpack_frames(ring.get())) == frames
+
+
+def test_RingBuffer_processes(ring):
+    results = mp.Queue()
+    consumers = [mp.Process(target=consume, args=(ring, results))
+                 for _ in range(2)]
+    for p in consumers:
+        p.start()
+    for i in range(100):
+        ring.put(b'%d' % i, timeout=10)
+    received = results.get(timeout=10) + results.get(timeout=10)
+    for p in consumers:
+        p.join()
+    assert sorted(int(m) for m in received) == list(range(100))
@@ -0,0 +1,190 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+
+from antikythera.l3 import l3_header, l3_message, PD_RR
+from antikythera.pcap import PcapReader
+from antikythera.packets.rr import (decode, frequency_list, mobile_identity,
+                                    paging_identities, Lai, MI_IMSI, MI_TMSI,
+                                    PAGING_REQUEST_1, SYSTEM_INFORMATION_3,
+                                    SYSTEM_INFORMATION_2QUATER,
+                                    SYSTEM_INFORMATION_13, PADDING,
+                                    GprsParameters, Utran)
+from antikythera.packets import system, page, assign
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+TMSI = 0x646fe2d4
+# Paging Request Type 1 for IMSI 001010123456789
+PAGING_IMSI = bytes.fromhex("0621000809101010325476982b2b2b2b2b2b2b2b2b2b2b")
+
+
+def rest_octets(bits, size):
+    """ Rest octets from a string of bits, filled up with padding.
+
+    """
+    padding = format(PADDING, "08b")
+    bits += "".join(padding[i % 8] for i in range(len(bits), size * 8))
+    return int(bits, 2).to_bytes(size, "big")
+
+
+def messages(message_type, capture="silent_sms.pcap"):
+    """ The RR messages of a type in a test capture.
+
+    """
+    with PcapReader(os.path.join(TEST_DATA, capture)) as reader:
+        return [bytes(l3_message(f.channel, f.payload)) for f in reader
+                if l3_header(f.channel, f.payload) == (PD_RR, message_type)]
+
+
+#################
+#               #
+# Test decode() #
+#               #
+#################
+
+def test_decode_short_message():
+    assert decode(SYSTEM_INFORMATION_3, b'\x06\x1b\x05') == {}
+
+
+def test_decode_paging_imsi():
+    fields = paging_identities(decode(PAGING_REQUEST_1, PAGING_IMSI))
+    assert fields["imsi"] == "001010123456789"
+    assert fields["tmsis"] == []
+
+
+def test_decode_paging_optional_identity():
+    data = PAGING_IMSI[:12] + b'\x17\x05\xf4' + TMSI.to_bytes(4, "big")
+    fields = paging_identities(decode(PAGING_REQUEST_1, data))
+    assert fields["imsi"] == "001010123456789"
+    assert fields["tmsis"] == [TMSI]
+
+
+####################
+#                  #
+# Test IE decoders #
+#                  #
+####################
+
+def test_mobile_identity_tmsi():
+    identity = b'\xf4' + TMSI.to_bytes(4, "big")
+    assert mobile_identity(identity) == (MI_TMSI, TMSI)
+
+
+def test_mobile_identity_even_imsi():
+    identity = b'\x01\x10\x10\x32\x54\x76\xf8'
+    assert mobile_identity(identity) == (MI_IMSI, "001012345678")
+
+
+def test_mobile_identity_none():
+    assert mobile_identity(b'\xf0') is None
+
+
+def test_frequency_list_bitmap_0():
+    bits = 1 | 1 << 123
+    assert frequency_list(bits.to_bytes(16, "big")) == [1, 124]
+
+
+def test_frequency_list_range_1024():
+    bits = 0x80 << 120 | 100 << 112
+    assert frequency_list(bits.to_bytes(16, "big")) == [100]
+
+
+def test_frequency_list_range_1024_f0():
+    bits = 0x84 << 120 | 100 << 112
+    assert frequency_list(bits.to_bytes(16, "big")) == [0, 100]
+
+
+def test_frequency_list_short():
+    assert frequency_list(b'\x8f') == []
+
+
+##############################
+#                            #
+# Test packets from captures #
+#                            #
+##############################
+
+def test_system_type1_arfcns():
+    packet = system.Type1(messages(0x19)[0])
+    assert packet.arfcns == [873]
+
+
+def test_system_type2_neighbors():
+    packet = system.Type2(messages(0x1a)[0])
+    assert packet.neighbor_arfcns == [871, 872, 873]
+
+
+def test_system_type2ter_bcch_freqs():
+    # Bit map 0 with the multiband reporting bits set
+    freqs = b'\x60' + b'\x00' * 14 + b'\x05'
+    packet = system.Type2ter(b'\x06\x03' + freqs + rest_octets("", 4))
+    assert packet.bcch_freqs == [1, 3]
+
+
+def test_system_type2quarter_neighbor_3g():
+    # Index and count, an RTD6 list, a BSIC description, then one FDD
+    # frequency with two cells
+    bits = ("0" * 11 + "0" + "1" "1" "0" "0000001" "0000010" "1" "1" "0"
+            + "1" "0" "000011" "0000010" + "0" * 14 + "0" * 4
+            + "1" "0" "0" "1" "0" "1" "0" + format(10700, "014b") + "0"
+            + "00010" + "0" * 19 + "0" "0")
+    packet = system.Type2quarter(b'\x06\x07' + rest_octets(bits, 20))
+    assert packet.neighbor_3g == [Utran("fdd", 10700, 2)]
+
+
+def test_system_type2quarter_truncated():
+    assert decode(SYSTEM_INFORMATION_2QUATER, b'\x06\x07\x00') == {}
+
+
+def test_system_type13_gprs():
+    bits = "1" "101" "0000" "0" "0" "00101010" "1" "000" "01"
+    packet = system.Type13(b'\x06\x00' + rest_octets(bits, 20))
+    assert packet.gprs == GprsParameters(5, 0, 0x2a, 1)
+
+
+def test_system_type13_no_gprs():
+    message = b'\x06\x00' + rest_octets("", 20)
+    assert decode(SYSTEM_INFORMATION_13, message) == {"gprs": None}
+
+
+def test_system_type3_cell():
+    packet = system.Type3(messages(0x1b)[0])
+    assert packet.cell_id == 0x0539
+    assert packet.lai == Lai("001", "01", 0x17)
+    assert packet.select_params.neci == 1
+    assert packet.gprs is None
+
+
+def test_system_type4_catcher_lai():
+    lacs = {system.Type4(m).lai.lac
+            for m in messages(0x1c, "tracking_catcher.pcap")}
+    assert lacs == {0x17, 0x04bc}
+
+
+def test_page_type1_tmsi():
+    packets = [page.Type1(m) for m in messages(0x21)]
+    assert TMSI in [p.tmsi for p in packets]
+    assert all(p.imsi is None for p in packets)
+
+
+def test_page_type2_tmsis():
+    packet = page.Type2(messages(0x22)[0])
+    assert packet.tmsis == [TMSI, TMSI, TMSI]
+
+
+def test_assign_immediate():
+    packet = assign.Immediate(messages(0x3f)[0])
+    assert packet.time_slot == 1
+    assert packet.channel_type >> 3 == 0b01
+
+
+def test_packet_undecoded_data():
+    packet = system.Type3('\x42')
+    assert packet.data == '\x42'
+    assert packet.cell_id is None
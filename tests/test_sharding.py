@@ -0,0 +1,96 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+from antikythera.gsmtap import (Frame, GSMTAP_ARFCN_F_UPLINK,
+                                GSMTAP_CHANNEL_BCCH)
+from antikythera.sharding import ShardRouter
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+
+def frame(arfcn):
+    return Frame(0.0, arfcn, 0, 1, GSMTAP_CHANNEL_BCCH, 0, 0, b'')
+
+
+def route(router, traffic):
+    """ Route ``{arfcn: count}`` frames interleaved.
+
+    """
+    remaining = dict(traffic)
+    shards = {}
+    while remaining:
+        for arfcn in list(remaining):
+            shards.setdefault(arfcn, set()).add(router.shard(frame(arfcn)))
+            remaining[arfcn] -= 1
+            if not remaining[arfcn]:
+                del remaining[arfcn]
+    return shards
+
+
+######################
+#                    #
+# Test ShardRouter() #
+#                    #
+######################
+
+def test_ShardRouter_cell_affine():
+    router = ShardRouter(4, interval=0)
+    shards = route(router, {arfcn: 10 for arfcn in range(1, 20)})
+    assert all(len(s) == 1 for s in shards.values())
+    assert set.union(*shards.values()) == {0, 1, 2, 3}
+
+
+def test_ShardRouter_uplink_same_shard():
+    router = ShardRouter(4, interval=0)
+    uplink = frame(873 | GSMTAP_ARFCN_F_UPLINK)
+    assert router.shard(frame(873)) == router.shard(uplink)
+
+
+def test_ShardRouter_route_counts():
+    router = ShardRouter(2, interval=10)
+    shard = router.route(873 | GSMTAP_ARFCN_F_UPLINK, 6)
+    assert router.route(873, 4) == shard == router.shard(frame(873))
+    assert router.counts == {873: 11}
+    assert router.due()
+
+
+def test_ShardRouter_single_shard():
+    router = ShardRouter(1)
+    assert route(router, {1: 5, 2: 5}) == {1: {0}, 2: {0}}
+    assert not router.due()
+
+
+def test_ShardRouter_balanced_no_moves():
+    router = ShardRouter(2, interval=100)
+    route(router, {1: 25, 2: 25, 3: 25, 4: 25})
+    assert router.due()
+    assert router.rebalance() == []
+    assert router.seen == 0
+
+
+def test_ShardRouter_dominant_cell_isolated():
+    """ The cells sharing a shard with a busy cell are moved away.
+
+    """
+    router = ShardRouter(2, interval=0)
+    route(router, {2: 600, 4: 100, 6: 100, 1: 50, 3: 50})
+    assert router.loads() == [800, 100]
+    moved = router.rebalance()
+    assert sorted(arfcn for arfcn, _, _ in moved) == [4, 6]
+    assert all(old == 0 and new == 1 for _, old, new in moved)
+    assert router.table[2] == 0
+    assert router.moves == 2
+
+    # The moved cells stay on their new shard
+    route(router, {2: 600, 4: 100, 6: 100, 1: 50, 3: 50})
+    assert router.loads() == [600, 300]
+    assert router.rebalance() == []
+
+
+def test_ShardRouter_cell_never_split():
+    router = ShardRouter(3, interval=0)
+    route(router, {3: 1000, 1: 10})
+    assert router.rebalance() == []
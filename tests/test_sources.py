@@ -0,0 +1,150 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import struct
+import pytest
+
+import antikythera.sources
+from antikythera.sources import (expand_captures, first_timestamp,
+                                 merge_captures, open_capture)
+from antikythera.pcap import PcapReader, LINKTYPE_ETHERNET
+from antikythera.diag import DiagReader
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def write_pcap(path, packets):
+    """ Write ``(timestamp, data)`` pairs as a classic Ethernet pcap.
+
+    """
+    out = struct.pack("<IHHiIII", 0xa1b2c3d4, 2, 4, 0, 0, 0xffff,
+                      LINKTYPE_ETHERNET)
+    for timestamp, data in packets:
+        sec = int(timestamp)
+        usec = int(round((timestamp - sec) * 1e6))
+        out += struct.pack("<IIII", sec, usec, len(data), len(data)) + data
+    with open(path, "wb") as f:
+        f.write(out)
+
+
+def rotated(tmpdir, count, step, overlap=0.0):
+    """ Split a test capture into ``count`` files of ``step`` seconds.
+
+    Each file starts ``overlap`` seconds before the previous one ends.
+
+    """
+    with PcapReader(os.path.join(TEST_DATA, "silent_sms.pcap")) as reader:
+        packets = [data for _, _, data in reader.packets()]
+    per_file = len(packets) // count
+    paths = []
+    for i in range(count):
+        chunk = packets[i * per_file:(i + 1) * per_file]
+        start = 1000.0 + i * (step - overlap)
+        timestamps = [start + step * j / len(chunk) for j in range(len(chunk))]
+        path = str(tmpdir.join("capture-{:02d}.pcap".format(i)))
+        write_pcap(path, zip(timestamps, chunk))
+        paths.append(path)
+    return paths, per_file * count
+
+
+#######################
+#                     #
+# Test open_capture() #
+#                     #
+#######################
+
+def test_open_capture_reader():
+    assert isinstance(open_capture("a/b.pcapng"), PcapReader)
+    assert isinstance(open_capture("a/b.BIN"), DiagReader)
+
+
+##########################
+#                        #
+# Test expand_captures() #
+#                        #
+##########################
+
+def test_expand_captures_file():
+    assert expand_captures("missing.pcap") == ["missing.pcap"]
+
+
+def test_expand_captures_directory():
+    paths = expand_captures(TEST_DATA)
+    names = [os.path.basename(p) for p in paths]
+    assert names == sorted(names)
+    assert "silent_sms.pcap" in names
+    assert "silent_sms.bin" in names
+
+
+def test_expand_captures_glob(tmpdir):
+    rotated(tmpdir, 3, 10)
+    tmpdir.join("notes.txt").write("not a capture")
+    paths = expand_captures(str(tmpdir.join("capture-*.pcap")))
+    assert [os.path.basename(p) for p in paths] == [
+        "capture-00.pcap", "capture-01.pcap", "capture-02.pcap"]
+    assert expand_captures(str(tmpdir.join("*"))) == paths
+    assert expand_captures(str(tmpdir.join("*.pcapng"))) == []
+
+
+#########################
+#                       #
+# Test merge_captures() #
+#                       #
+#########################
+
+def test_first_timestamp(tmpdir):
+    paths, _ = rotated(tmpdir, 2, 10)
+    assert first_timestamp(paths[1]) == pytest.approx(1010.0)
+    empty = tmpdir.join("empty.pcap")
+    write_pcap(str(empty), [])
+    assert first_timestamp(str(empty)) is None
+
+
+def test_merge_captures_time_order(tmpdir):
+    paths, count = rotated(tmpdir, 4, 10, overlap=4)
+    frames = list(merge_captures(list(reversed(paths))))
+    assert len(frames) == count
+    timestamps = [f.timestamp for f in frames]
+    assert timestamps == sorted(timestamps)
+
+
+def test_merge_captures_bounded_open(tmpdir, monkeypatch):
+    paths, count = rotated(tmpdir, 6, 10, overlap=2)
+    state = {"open": 0, "most": 0}
+
+    class Counted(PcapReader):
+        def open(self):
+            if self.file is None:
+                state["open"] += 1
+                state["most"] = max(state["most"], state["open"])
+            super(Counted, self).open()
+
+        def close(self):
+            if self.file is not None:
+                state["open"] -= 1
+            super(Counted, self).close()
+
+    monkeypatch.setattr(antikythera.sources, "open_capture", Counted)
+    frames = list(merge_captures(paths, max_open=2))
+    assert len(frames) == count
+    assert state["most"] == 2
+    assert state["open"] == 0
+
+
+def test_merge_captures_overlap_beyond_limit(tmpdir):
+    """ Every frame is still replayed when too many files overlap.
+
+    """
+    paths, count = rotated(tmpdir, 4, 10, overlap=9)
+    assert len(list(merge_captures(paths, max_open=1))) == count
+
+
+def test_merge_captures_mixed_sources():
+    paths = [os.path.join(TEST_DATA, "silent_sms.pcap"),
+             os.path.join(TEST_DATA, "silent_sms.bin")]
+    assert len(list(merge_captures(paths))) == 659 + 652
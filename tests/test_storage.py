@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+import pytest
+import sqlite3
+
+from antikythera.gsmtap import pack_frames
+from antikythera.l3 import PD_RR, RR_SYSTEM_INFORMATION_3
+from antikythera.pcap import PcapReader
+from antikythera.decoder import Decoder
+from antikythera.packets.batch import PacketBatch
+from antikythera.packets.rr import MI_TMSI
+from antikythera.storage import Storage, connect, format_tmsi
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+TMSI = 0x646fe2d4
+
+
+@pytest.fixture(scope="module")
+def frames():
+    with PcapReader(os.path.join(TEST_DATA, "silent_sms.pcap")) as reader:
+        return list(reader)
+
+
+@pytest.fixture(scope="module")
+def batch(frames):
+    return PacketBatch.from_frames(frames)
+
+
+@pytest.fixture
+def database(tmpdir):
+    return str(tmpdir.join("data", "antikythera.db"))
+
+
+def query(database, sql, *args):
+    connection = sqlite3.connect(database)
+    try:
+        return connection.execute(sql, args).fetchall()
+    finally:
+        connection.close()
+
+
+def count(database, table="pagings"):
+    return query(database, "SELECT COUNT(*) FROM {}".format(table))[0][0]
+
+
+def paged(batch):
+    return len(batch.tmsis) + int((batch.imsi != "").sum())
+
+
+################
+#              #
+# Test connect #
+#              #
+################
+
+def test_connect_wal(database):
+    connection = connect(database)
+    assert connection.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+    connection.close()
+
+
+def test_connect_schema(database):
+    connect(database).close()
+    rows = query(database,
+                 "SELECT name FROM sqlite_master WHERE type = 'table'")
+    tables = {name for name, in rows}
+    assert {"cells", "si_snapshots", "pagings", "assignments"} <= tables
+
+
+def test_paging_lookup_uses_index(database):
+    connect(database).close()
+    plan = query(database, "EXPLAIN QUERY PLAN SELECT * FROM pagings "
+                 "WHERE identity = ? AND timestamp > ?",
+                 format_tmsi(TMSI), 0.0)
+    assert "pagings_identity" in plan[0][-1]
+
+
+##################
+#                #
+# Test add/flush #
+#                #
+##################
+
+def test_add_batch_buffers(database, batch):
+    storage = Storage(database, flush_rows=len(batch) * 10, flush_interval=60)
+    storage.add_batch(batch)
+    assert len(storage.pending["pagings"]) == paged(batch)
+    assert count(database) == 0
+    assert storage.flush() == storage.written > paged(batch)
+    assert count(database) == paged(batch)
+    storage.close()
+
+
+def test_add_batch_flush_rows(database, batch):
+    storage = Storage(database, flush_rows=10, flush_interval=60)
+    storage.add_batch(batch.select(slice(0, 100)))
+    assert storage.flushes == 1
+    storage.close()
+
+
+def test_flush_interval(database, batch):
+    storage = Storage(database, flush_interval=0)
+    storage.add_batch(batch.select(slice(0, 100)))
+    assert storage.flushes == 1
+    assert storage.due_in() is None
+    storage.close()
+
+
+def test_add_batch_pagings(database, batch):
+    with Storage(database) as storage:
+        storage.add_batch(batch)
+    rows = query(database, "SELECT identity_type, message_type FROM pagings "
+                 "WHERE identity = ?", format_tmsi(TMSI))
+    assert rows and set(rows) <= {(MI_TMSI, t) for t in (0x21, 0x22, 0x24)}
+
+
+def test_add_batch_snapshots(database, batch):
+    with Storage(database) as storage:
+        storage.add_batch(batch)
+    rows = query(database, "SELECT lac, cid, message FROM si_snapshots "
+                 "WHERE message_type = ?", RR_SYSTEM_INFORMATION_3)
+    assert {row[:2] for row in rows} == {(0x17, 0x0539)}
+    assert rows[0][2][:2] == bytes([PD_RR, RR_SYSTEM_INFORMATION_3])
+
+
+def test_add_batch_assignments(database, batch):
+    with Storage(database) as storage:
+        storage.add_batch(batch)
+    rows = query(database, "SELECT time_slot, channel_type FROM assignments")
+    assert (1, 8) in rows
+
+
+def test_add_cells(database, batch):
+    with Storage(database) as storage:
+        storage.add_cells(batch)
+        storage.add_cells(batch.select(slice(0, 100)))
+    si3 = batch.cell_id != -1
+    rows = query(database, "SELECT arfcn, mcc, mnc, lac, cid, first_seen, "
+                 "last_seen FROM cells ORDER BY arfcn")
+    assert [row[:5] for row in rows] == [(0, "001", "01", 0x17, 0x0539),
+                                         (873, "001", "01", 0x17, 0x0539)]
+    assert min(row[5] for row in rows) == batch.timestamp[si3].min()
+    assert max(row[6] for row in rows) == batch.timestamp[si3].max()
+
+
+def test_add_cells_upsert(database, batch):
+    for part in (slice(0, len(batch) // 2), slice(len(batch) // 2, None)):
+        with Storage(database) as storage:
+            storage.add_cells(batch.select(part))
+    si3 = batch.cell_id != -1
+    assert count(database, "cells") == 2
+    rows = query(database, "SELECT last_seen FROM cells")
+    assert max(row[0] for row in rows) == batch.timestamp[si3].max()
+
+
+def test_flush_rollback(database, batch):
+    storage = Storage(database)
+    storage.pending["pagings"] = [(None,) * 5]
+    storage.oldest = 0
+    with pytest.raises(sqlite3.IntegrityError):
+        storage.flush()
+    assert not storage.connection.in_transaction
+    storage.pending["pagings"] = []
+    storage.close()
+    assert count(database) == 0
+
+
+################
+#              #
+# Test Decoder #
+#              #
+################
+
+def test_decoder_store_batch(frames):
+    store_q = queue.Queue()
+    decoder = Decoder("test", None, store_q=store_q)
+    packets = decoder.decode_batch(pack_frames(frames))
+    sent, stored, cells = store_q.get_nowait()
+    assert stored is packets
+    si3 = cells.message_type == RR_SYSTEM_INFORMATION_3
+    assert len(cells) == si3.sum() > 1
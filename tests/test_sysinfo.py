@@ -0,0 +1,133 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import pytest
+import numpy as np
+
+from antikythera.gsmtap import pack_frames
+from antikythera.l3 import (PD_RR, RR_SYSTEM_INFORMATION,
+                            RR_SYSTEM_INFORMATION_3, RR_PAGING_REQUEST_1)
+from antikythera.pcap import PcapReader
+from antikythera.decoder import Decoder
+from antikythera.packets.batch import PacketBatch, FRAME_DTYPE, frame_headers
+from antikythera.packets.sysinfo import SystemInfoCache
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+SI3 = bytes.fromhex("061b0539")
+
+
+def system_information(packets):
+    return ((packets.pd == PD_RR)
+            & np.isin(packets.message_type, sorted(RR_SYSTEM_INFORMATION)))
+
+
+@pytest.fixture(scope="module")
+def frames():
+    with PcapReader(os.path.join(TEST_DATA, "silent_sms.pcap")) as reader:
+        return list(reader)
+
+
+###############
+#             #
+# Test seen() #
+#             #
+###############
+
+def test_seen_repeat():
+    cache = SystemInfoCache()
+    assert not cache.seen(873, RR_SYSTEM_INFORMATION_3, SI3, 1.0)
+    assert cache.seen(873, RR_SYSTEM_INFORMATION_3, SI3, 2.0)
+    entry = cache.entries[(873, RR_SYSTEM_INFORMATION_3)]
+    assert (entry.first_seen, entry.last_seen, entry.count) == (1.0, 2.0, 2)
+    assert cache.stats() == {"repeats": 1, "changes": 1, "evictions": 0,
+                             "entries": 1}
+
+
+def test_seen_per_cell():
+    cache = SystemInfoCache()
+    assert not cache.seen(873, RR_SYSTEM_INFORMATION_3, SI3, 1.0)
+    assert not cache.seen(871, RR_SYSTEM_INFORMATION_3, SI3, 1.0)
+    # Uplink flag bit of the ARFCN is the same cell
+    assert cache.seen(873 | 0x4000, RR_SYSTEM_INFORMATION_3, SI3, 1.0)
+
+
+def test_seen_changed_back():
+    cache = SystemInfoCache()
+    changed = SI3[:-1] + b'\x40'
+    assert not cache.seen(873, RR_SYSTEM_INFORMATION_3, SI3, 1.0)
+    assert not cache.seen(873, RR_SYSTEM_INFORMATION_3, changed, 2.0)
+    assert not cache.seen(873, RR_SYSTEM_INFORMATION_3, SI3, 3.0)
+    assert len(cache) == 1
+
+
+def test_seen_lru_eviction():
+    cache = SystemInfoCache(size=2)
+    cache.seen(1, RR_SYSTEM_INFORMATION_3, SI3, 1.0)
+    cache.seen(2, RR_SYSTEM_INFORMATION_3, SI3, 1.0)
+    cache.seen(1, RR_SYSTEM_INFORMATION_3, SI3, 2.0)
+    cache.seen(3, RR_SYSTEM_INFORMATION_3, SI3, 3.0)
+    assert list(cache.entries) == [(1, RR_SYSTEM_INFORMATION_3),
+                                   (3, RR_SYSTEM_INFORMATION_3)]
+    assert cache.evictions == 1
+
+
+##################
+#                #
+# Test changed() #
+#                #
+##################
+
+def test_changed_batch(frames):
+    batch = PacketBatch.from_frames(frames)
+    cache = SystemInfoCache()
+    keep = cache.changed(batch)
+    si3 = batch.message_type == RR_SYSTEM_INFORMATION_3
+    # The capture has SI3 on two ARFCNs
+    assert keep[si3].sum() == len(set(batch.arfcn[si3])) == 2
+    assert keep[batch.message_type == RR_PAGING_REQUEST_1].all()
+    assert not cache.changed(batch.select(si3)).any()
+
+
+def test_decoder_drops_repeats(frames):
+    records = pack_frames(frames)
+    packets = Decoder("test", None).decode_batch(records)
+    everything = Decoder("test", None, si_cache=0).decode_batch(records)
+    assert len(packets) < len(everything)
+    assert (packets.message_type == RR_SYSTEM_INFORMATION_3).sum() == 2
+
+
+def test_changed_records(frames):
+    records = np.frombuffer(pack_frames(frames), dtype=FRAME_DTYPE)
+    batch = PacketBatch.from_records(records)
+    layer3 = frame_headers(records)[0]
+    assert (SystemInfoCache().changed_records(records)[layer3] ==
+            SystemInfoCache().changed(batch)).all()
+
+
+def test_decoder_never_decodes_repeats(frames, monkeypatch):
+    decoded = []
+    from_records = PacketBatch.from_records
+
+    def spy(buffer):
+        packets = from_records(buffer)
+        decoded.append(packets)
+        return packets
+
+    monkeypatch.setattr(PacketBatch, "from_records", spy)
+    decoder = Decoder("test", None)
+    records = pack_frames(frames)
+    decoder.decode_batch(records)
+    first = decoded.pop()
+    assert system_information(first).sum() == decoder.si_cache.changes
+    # The same broadcast again is dropped before any of it is decoded
+    decoder.decode_batch(records)
+    second = decoded.pop()
+    assert not decoded
+    assert not system_information(second).any()
+    assert len(second) == len(first) - decoder.si_cache.changes
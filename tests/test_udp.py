@@ -0,0 +1,108 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import socket
+import itertools
+
+from antikythera.udp import GsmtapListener, parse_address, DEFAULT_HOST
+from antikythera.pcap import PcapReader, extract_gsmtap
+from antikythera.gsmtap import GSMTAP_PORT
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+def gsmtap_messages(name, count):
+    """ The first ``count`` raw GSMTAP messages of a test capture.
+
+    """
+    messages = []
+    with PcapReader(os.path.join(TEST_DATA, name)) as reader:
+        for _, linktype, data in reader.packets():
+            messages.append(extract_gsmtap(linktype, data))
+            if len(messages) == count:
+                break
+    return messages
+
+
+########################
+#                      #
+# Test parse_address() #
+#                      #
+########################
+
+def test_parse_address_default():
+    assert parse_address(None) == (DEFAULT_HOST, GSMTAP_PORT)
+
+
+def test_parse_address_port():
+    assert parse_address("4730") == (DEFAULT_HOST, 4730)
+
+
+def test_parse_address_host_port():
+    assert parse_address("0.0.0.0:4731") == ("0.0.0.0", 4731)
+
+
+def test_parse_address_host():
+    assert parse_address("192.168.1.2") == ("192.168.1.2", GSMTAP_PORT)
+
+
+#########################
+#                       #
+# Test GsmtapListener() #
+#                       #
+#########################
+
+def test_GsmtapListener_receives_batch():
+    messages = gsmtap_messages("silent_sms.pcap", 50)
+    with GsmtapListener("127.0.0.1:0") as listener:
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for message in messages:
+            sender.sendto(message, listener.address)
+        sender.close()
+
+        frames = []
+        while len(frames) < len(messages):
+            batch = listener.drain(timeout=2)
+            assert batch
+            frames.extend(batch)
+
+    with PcapReader(os.path.join(TEST_DATA, "silent_sms.pcap")) as reader:
+        expected = [f.frame_nr for f, _ in zip(reader, messages)]
+    assert [f.frame_nr for f in frames] == expected
+    assert frames[0].arfcn == 873
+    assert frames[0].payload[:3] == b'\x15\x06\x21'
+    assert len(frames) == 50
+
+
+def test_GsmtapListener_stamps_each_datagram(monkeypatch):
+    clock = itertools.count(100.0)
+    monkeypatch.setattr("antikythera.udp.time", lambda: next(clock))
+    messages = gsmtap_messages("silent_sms.pcap", 3)
+    with GsmtapListener("127.0.0.1:0") as listener:
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        for message in messages:
+            sender.sendto(message, listener.address)
+        sender.close()
+        frames = []
+        while len(frames) < len(messages):
+            frames.extend(listener.drain(timeout=2))
+    timestamps = [f.timestamp for f in frames]
+    assert timestamps == sorted(set(timestamps))
+
+
+def test_GsmtapListener_ignores_garbage():
+    with GsmtapListener("127.0.0.1:0") as listener:
+        sender = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        sender.sendto(b"not gsmtap", listener.address)
+        sender.close()
+        assert listener.drain(timeout=2) == []
+
+
+def test_GsmtapListener_timeout():
+    with GsmtapListener("127.0.0.1:0") as listener:
+        assert listener.drain(timeout=0.01) == []
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+from antikythera.windows import SlidingCounter, SlidingDistinct
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+
+#######################
+#                     #
+# Test SlidingCounter #
+#                     #
+#######################
+
+def test_counter_counts_window():
+    counter = SlidingCounter(60, buckets=60)
+    for t in range(100):
+        counter.add(float(t))
+    assert counter.count() == 60
+    assert counter.rate() == 1.0
+
+
+def test_counter_expires_on_read():
+    counter = SlidingCounter(60)
+    counter.add(0.0, 5)
+    assert counter.count(30.0) == 5
+    assert counter.count(60.0) == 0
+    assert counter.count() == 0
+
+
+def test_counter_long_gap():
+    counter = SlidingCounter(10, buckets=10)
+    counter.add(0.0, 3)
+    counter.add(1000.0)
+    assert counter.count() == 1
+
+
+def test_counter_late_events():
+    counter = SlidingCounter(10, buckets=10)
+    counter.add(20.0)
+    counter.add(15.0)
+    counter.add(5.0)
+    assert counter.count() == 2
+
+
+def test_counter_buckets_bounded():
+    counter = SlidingCounter(1, buckets=4)
+    for t in range(10000):
+        counter.add(t / 100.0)
+    assert len(counter.counts) == 4
+    assert counter.count() == 100
+
+
+########################
+#                      #
+# Test SlidingDistinct #
+#                      #
+########################
+
+def test_distinct_counts():
+    distinct = SlidingDistinct(60)
+    events = ((0, "a"), (1, "b"), (2, "a"))
+    assert [distinct.add(t, item) for t, item in events] == [1, 1, 2]
+    assert len(distinct) == 2
+    assert distinct.count("a") == 2
+    assert "b" in distinct
+
+
+def test_distinct_expires():
+    distinct = SlidingDistinct(10)
+    distinct.add(0, "a")
+    distinct.add(5, "b")
+    distinct.add(8, "a")
+    assert distinct.distinct(12) == 2
+    assert distinct.count("a") == 1
+    assert distinct.distinct(16) == 1
+    assert "b" not in distinct
+    assert distinct.distinct(100) == 0
+    assert not distinct.events
@@ -0,0 +1,130 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+import os
+import queue
+import pytest
+import sqlite3
+
+from antikythera.gsmtap import pack_frames
+from antikythera.pcap import PcapReader
+from antikythera.decoder import Decoder
+from antikythera.storage import Storage
+from antikythera.events import EventStore
+from antikythera.writer import Writer
+
+__author__ = "Finding Ray"
+__copyright__ = "Finding Ray"
+__license__ = "gpl3"
+
+TEST_DATA = os.path.join(os.path.dirname(__file__), "test_data")
+
+
+@pytest.fixture(scope="module")
+def records():
+    with PcapReader(os.path.join(TEST_DATA, "silent_sms.pcap")) as reader:
+        frames = list(reader)
+    return [pack_frames(frames[i:i + 64]) for i in range(0, len(frames), 64)]
+
+
+@pytest.fixture
+def database(tmpdir):
+    return str(tmpdir.join("antikythera.db"))
+
+
+def count(database, table):
+    connection = sqlite3.connect(database)
+    try:
+        query = "SELECT COUNT(*) FROM {}".format(table)
+        return connection.execute(query).fetchone()[0]
+    finally:
+        connection.close()
+
+
+def decoded(records):
+    """ What the decoders would send the writer.
+
+    """
+    store_q = queue.Queue()
+    decoder = Decoder("test", None, store_q=store_q)
+    for batch in records:
+        decoder.decode_batch(batch)
+    return store_q
+
+
+##############
+#            #
+# Test run() #
+#            #
+##############
+
+def test_run_drains_queue(database, records):
+    store_q = decoded(records)
+    sent = store_q.qsize()
+    writer = Writer("writer", store_q, database)
+    # Shut down before it starts, everything queued is still stored
+    writer.shutdown()
+    writer.run()
+    assert store_q.empty()
+    assert sent > 0
+    assert count(database, "cells") == 2
+    assert count(database, "pagings") > 0
+    assert writer.stats()["written"] == writer.stores[0].written > 0
+
+
+def test_run_event_store(database, records, tmpdir):
+    store_q = decoded(records)
+    events = str(tmpdir.join("events"))
+    writer = Writer("writer", store_q, database, events=events)
+    writer.shutdown()
+    writer.run()
+    store = EventStore(events)
+    pagings = store.read("pagings")["timestamp"]
+    assert len(pagings) == count(database, "pagings")
+    written = sum(store.written for store in writer.stores)
+    assert writer.stats()["written"] == written
+
+
+def test_run_event_store_only(records, tmpdir):
+    store_q = decoded(records)
+    events = str(tmpdir.join("events"))
+    writer = Writer("writer", store_q, None, events=events)
+    writer.shutdown()
+    writer.run()
+    assert [type(store) for store in writer.stores] == [EventStore]
+    assert len(EventStore(events).read("system")["timestamp"]) > 0
+
+
+##############
+#            #
+# Test stats #
+#            #
+##############
+
+def test_stats_lag(database, records):
+    store_q = decoded(records)
+    writer = Writer("writer", store_q, database, flush_interval=60)
+    writer.stores = [Storage(database)]
+    item = store_q.get_nowait()
+    writer.write((item[0] - 5.0,) + item[1:])
+    assert writer.stats()["flushes"] == 0
+    writer.flush()
+    stats = writer.stats()
+    assert stats["flushes"] == 1
+    assert 5.0 <= stats["lag"] == stats["max_lag"] < 60
+    assert stats["queued"] == store_q.qsize()
+    writer.stores[0].close()
+
+
+def test_compact(database, records):
+    store_q = decoded(records)
+    writer = Writer("writer", store_q, database, raw_retention=None,
+                    retention=None, max_bytes=1)
+    writer.open()
+    writer.write(store_q.get_nowait())
+    writer.flush()
+    writer.compact()
+    stats = writer.stats()
+    assert stats["compacted"] == writer.compactor.evicted > 0
+    assert stats["disk"] > 0
+    writer.stores[0].close()